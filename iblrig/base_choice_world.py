@@ -1,9 +1,9 @@
 """Extends the base_tasks modules by providing task logic around the Choice World protocol."""
 
 import abc
+import contextlib
 import logging
 import math
-import random
 import subprocess
 import time
 from pathlib import Path
@@ -17,9 +17,12 @@ from pydantic import NonNegativeFloat, NonNegativeInt
 
 import iblrig.base_tasks
 import iblrig.graphic
+import iblrig.net
 from iblrig import choiceworld, misc
-from iblrig.hardware import SOFTCODE
+from iblrig.hardware import SOFTCODE, StateMachineRecorder, StateMachineTemplates, start_devices
 from iblrig.pydantic_definitions import TrialDataModel
+from iblrig.session_creator import TrialSequenceGenerator
+from iblrig.timing import TRIAL_PHASES, TRIAL_TIMING_FILE_NAME, TrialPhaseTimer
 from iblutil.io import jsonable
 from iblutil.util import Bunch
 from pybpodapi.com.messaging.trial import Trial
@@ -126,8 +129,22 @@ class ChoiceWorldSession(
         self.trial_num = -1
         self.block_num = -1
         self.block_trial_num = -1
+        # pre-draws the random variables of the trials, the seed is recorded in the task settings
+        if self.task_params.get('TRIAL_SEQUENCE_SEED') is None:
+            self.task_params['TRIAL_SEQUENCE_SEED'] = self.session_info['RANDOM_SEED']
+        self.trial_sequence = TrialSequenceGenerator(seed=self.task_params['TRIAL_SEQUENCE_SEED'])
+        self.task_params['TRIAL_SEQUENCE_SEED'] = self.trial_sequence.seed
+        # pushes the trial records to the online plots, see ActiveChoiceWorldSession._run
+        self.trial_publisher = None
+        # records the duration of the phases of each trial, see ChoiceWorldSession._run
+        self.trial_timer: TrialPhaseTimer | None = None
+        # start-up time of each device in seconds, see ChoiceWorldSession.start_hardware
+        self.hardware_startup_durations: dict[str, float] = {}
+        # compiled state machines reused across trials, see ChoiceWorldSession._get_state_machine_trial
+        self.state_machine_templates: StateMachineTemplates | None = None
+        self._record_state_machine = False
         # init the tables, there are 2 of them: a trials table and a ambient sensor data table
-        self.trials_table = self.TrialDataModel.preallocate_dataframe(NTRIALS_INIT)
+        self.trials_table = self.TrialDataModel.preallocate_table(NTRIALS_INIT)
         self.ambient_sensor_table = pd.DataFrame(
             {
                 'Temperature_C': np.zeros(NTRIALS_INIT) * np.nan,
@@ -162,66 +179,115 @@ class ChoiceWorldSession(
     def start_hardware(self):
         """
         In this step we explicitly run the start methods of the various mixins.
-        The super class start method is overloaded because we need to start the different hardware pieces in order
+        The super class start method is overloaded because we need to start the different hardware pieces in order:
+        the devices are started concurrently, each once the devices it depends on are started.
         """
         if not self.is_mock:
-            self.start_mixin_frame2ttl()
-            self.start_mixin_bpod()
-            self.start_mixin_valve()
-            self.start_mixin_sound()
-            self.start_mixin_rotary_encoder()
-            self.start_mixin_bonsai_cameras()
-            self.start_mixin_bonsai_microphone()
-            self.start_mixin_bonsai_visual_stimulus()
+            self.hardware_startup_durations = start_devices(
+                {
+                    'frame2ttl': (self.start_mixin_frame2ttl, []),
+                    'bpod': (self.start_mixin_bpod, []),
+                    'valve': (self.start_mixin_valve, []),
+                    'sound_upload': (self.upload_sounds, []),
+                    'sound': (self.define_sound_actions, ['bpod', 'sound_upload']),
+                    # the rotary encoder module is configured through the serial link of the Bpod, once it is started
+                    'rotary_encoder': (self.start_mixin_rotary_encoder, ['bpod']),
+                    'bonsai_cameras': (self.start_mixin_bonsai_cameras, []),
+                    'bonsai_microphone': (self.start_mixin_bonsai_microphone, ['bonsai_cameras']),
+                    # Bonsai reads the rotary encoder once it is configured
+                    'bonsai_visual_stimulus': (self.start_mixin_bonsai_visual_stimulus, ['rotary_encoder', 'bonsai_cameras']),
+                }
+            )
             self.bpod.register_softcodes(self.softcode_dictionary())
 
     def _run(self):
         """Run the task with the actual state machine."""
+        # The ITI_DELAY_SECS defines the grey screen period within the state machine, where the
+        # Bpod TTL is HIGH. The DEAD_TIME param defines the time between last trial and the next
+        dead_time = self.task_params.get('DEAD_TIME', 0.5)
+        self.trial_timer = TrialPhaseTimer(
+            file_path=self.paths.SESSION_RAW_DATA_FOLDER.joinpath(TRIAL_TIMING_FILE_NAME),
+            max_overhead=dead_time if self.task_params.get('WARN_TRIAL_OVERHEAD', True) else None,
+        )
+        timing_in_trial_data = self.task_params.get('TRIAL_TIMING_IN_TRIAL_DATA', False)
+        if self.task_params.get('STATE_MACHINE_TEMPLATES', True):
+            self.state_machine_templates = StateMachineTemplates(self.bpod)
+        # in pipelined mode the trial data is written in the background while the next trial is prepared and run
+        if self.task_params.get('PIPELINE_TRIALS', False):
+            self.start_trial_writer()
+        phase = self.trial_timer.phase
         time_last_trial_end = time.time()
-        for i in range(self.task_params.NTRIALS):  # Main loop
-            # t_overhead = time.time()
-            self.next_trial()
-            log.info(f'Starting trial: {i}')
-            # =============================================================================
-            #     Start state machine definition
-            # =============================================================================
-            sma = self.get_state_machine_trial(i)
-            log.debug('Sending state machine to bpod')
-            # Send state machine description to Bpod device
-            self.bpod.send_state_machine(sma)
-            # t_overhead = time.time() - t_overhead
-            # The ITI_DELAY_SECS defines the grey screen period within the state machine, where the
-            # Bpod TTL is HIGH. The DEAD_TIME param defines the time between last trial and the next
-            dead_time = self.task_params.get('DEAD_TIME', 0.5)
-            dt = self.task_params.ITI_DELAY_SECS - dead_time - (time.time() - time_last_trial_end)
-            # wait to achieve the desired ITI duration
-            if dt > 0:
-                time.sleep(dt)
-            # Run state machine
-            log.debug('running state machine')
-            self.bpod.run_state_machine(sma)  # Locks until state machine 'exit' is reached
-            time_last_trial_end = time.time()
-            # handle pause event
-            flag_pause = self.paths.SESSION_FOLDER.joinpath('.pause')
-            flag_stop = self.paths.SESSION_FOLDER.joinpath('.stop')
-            if flag_pause.exists() and i < (self.task_params.NTRIALS - 1):
-                log.info(f'Pausing session inbetween trials {i} and {i + 1}')
-                while flag_pause.exists() and not flag_stop.exists():
-                    time.sleep(1)
-                self.trials_table.at[self.trial_num, 'pause_duration'] = time.time() - time_last_trial_end
-                if not flag_stop.exists():
-                    log.info('Resuming session')
-
-            # save trial and update log
-            self.trial_completed(self.bpod.session.current_trial.export())
-            self.ambient_sensor_table.loc[i] = self.bpod.get_ambient_sensor_reading()
-            self.show_trial_log()
-
-            # handle stop event
-            if flag_stop.exists():
-                log.info('Stopping session after trial %d', i)
-                flag_stop.unlink()
-                break
+        try:
+            for i in range(self.task_params.NTRIALS):  # Main loop
+                with phase('next_trial'):
+                    self.next_trial()
+                log.info(f'Starting trial: {i}')
+                # =============================================================================
+                #     Start state machine definition
+                # =============================================================================
+                with phase('get_state_machine_trial'):
+                    sma = self._get_state_machine_trial(i)
+                log.debug('Sending state machine to bpod')
+                # Send state machine description to Bpod device
+                with phase('send_state_machine'):
+                    self.bpod.send_state_machine(sma)
+                dt = self.task_params.ITI_DELAY_SECS - dead_time - (time.time() - time_last_trial_end)
+                # wait to achieve the desired ITI duration
+                if dt > 0:
+                    with phase('iti_wait'):
+                        time.sleep(dt)
+                # Run state machine
+                log.debug('running state machine')
+                with phase('run_state_machine'):
+                    self.bpod.run_state_machine(sma)  # Locks until state machine 'exit' is reached
+                time_last_trial_end = time.time()
+                self.control.trial_num = i
+                # a pause requested during the trial starts once the trial has been reported: the trial data is held
+                # meanwhile, so that it is saved with the duration of the pause
+                pause = self.control.paused and i < (self.task_params.NTRIALS - 1)
+
+                # optionally store the durations of the phases preceding the state machine with the trial data
+                if timing_in_trial_data:
+                    durations = self.trial_timer.current
+                    for name in TRIAL_PHASES[: TRIAL_PHASES.index('trial_completed')]:
+                        self.trials_table.at[self.trial_num, f'timing_{name}'] = durations[name]
+
+                with self.hold_trial_io() if pause else contextlib.nullcontext({}) as trial_updates:
+                    # save trial and update log
+                    with phase('trial_completed'):
+                        self.trial_completed(self.bpod.session.current_trial.export())
+                    with phase('ambient_sensor'):
+                        self.ambient_sensor_table.loc[i] = self.bpod.get_ambient_sensor_reading()
+                    with phase('show_trial_log'):
+                        self.show_trial_log()
+                    self.progress.emit('trial', **self.progress_record())
+
+                    # handle pause event
+                    if pause:
+                        log.info(f'Pausing session inbetween trials {i} and {i + 1}')
+                        self.progress.emit('paused', trial_num=i)
+                        with phase('pause'):
+                            self.control.wait_while_paused()
+                        trial_updates['pause_duration'] = time.time() - time_last_trial_end
+                        if not self.control.stop_requested:
+                            log.info('Resuming session')
+                            self.progress.emit('resumed', trial_num=i)
+                self.trial_timer.end_trial(i)
+
+                # handle stop event
+                if self.control.stop_requested:
+                    log.info('Stopping session after trial %d', i)
+                    self.control.clear_stop()
+                    break
+        finally:
+            self.stop_trial_writer()
+            self.trial_timer.close()
+            self.trial_timer.log_summary()
+            if self.state_machine_templates is not None:
+                log.info(
+                    f'State machine templates: {len(self.state_machine_templates.templates)} compiled, '
+                    f'reused in {self.state_machine_templates.n_hits} trials'
+                )
 
     def mock(self, file_jsonable_fixture=None):
         """
@@ -233,6 +299,7 @@ class ChoiceWorldSession(
 
         if file_jsonable_fixture is not None:
             task_data = jsonable.read(file_jsonable_fixture)
+            rng = self.rng
             # pop-out the bpod data from the table
             bpod_data = []
             for td in task_data:
@@ -240,7 +307,7 @@ class ChoiceWorldSession(
 
             class MockTrial(Trial):
                 def export(self):
-                    return np.random.choice(bpod_data)
+                    return rng.choice(bpod_data)
         else:
 
             class MockTrial(Trial):
@@ -305,8 +372,28 @@ class ChoiceWorldSession(
         return dot
 
     def _instantiate_state_machine(self, *args, **kwargs):
+        if self._record_state_machine:
+            return StateMachineRecorder()
         return StateMachine(self.bpod)
 
+    def _get_state_machine_trial(self, i):
+        """
+        Get the state machine of trial `i`, reusing a compiled template if the state machine templates are enabled.
+
+        The definition of the trial is recorded by :meth:`get_state_machine_trial` and compiled by
+        :class:`~iblrig.hardware.StateMachineTemplates`: the topology is only built and serialized once and the state
+        timers are patched for each trial. Overrides of :meth:`get_state_machine_trial` that do not instantiate the state
+        machine with :meth:`_instantiate_state_machine` are unaffected.
+        """
+        if self.state_machine_templates is None:
+            return self.get_state_machine_trial(i)
+        self._record_state_machine = True
+        try:
+            sma = self.get_state_machine_trial(i)
+        finally:
+            self._record_state_machine = False
+        return self.state_machine_templates.compile(sma)
+
     def get_state_machine_trial(self, i):
         # we define the trial number here for subclasses that may need it
         sma = self._instantiate_state_machine(trial_number=i)
@@ -486,14 +573,14 @@ class ChoiceWorldSession(
         This is called by the `next_trial` method before updating the Bpod state machine.
         """
         assert len(self.task_params.STIM_POSITIONS) == 2, 'Only two positions are supported'
-        contrast = misc.draw_contrast(self.task_params.CONTRAST_SET, self.task_params.CONTRAST_SET_PROBABILITY_TYPE)
-        position = int(np.random.choice(self.task_params.STIM_POSITIONS, p=[pleft, 1 - pleft]))
-        quiescent_period = self.task_params.QUIESCENT_PERIOD + misc.truncated_exponential(
+        contrast = self.trial_sequence.contrast(self.task_params.CONTRAST_SET, self.task_params.CONTRAST_SET_PROBABILITY_TYPE)
+        position = self.trial_sequence.position(self.task_params.STIM_POSITIONS, pleft)
+        quiescent_period = self.task_params.QUIESCENT_PERIOD + self.trial_sequence.quiescent_period(
             scale=0.35, min_value=0.2, max_value=0.5
         )
         self.trials_table.at[self.trial_num, 'quiescent_period'] = quiescent_period
         self.trials_table.at[self.trial_num, 'contrast'] = contrast
-        self.trials_table.at[self.trial_num, 'stim_phase'] = random.uniform(0, 2 * math.pi)
+        self.trials_table.at[self.trial_num, 'stim_phase'] = self.trial_sequence.stim_phase()
         self.trials_table.at[self.trial_num, 'stim_sigma'] = self.task_params.STIM_SIGMA
         self.trials_table.at[self.trial_num, 'stim_angle'] = self.task_params.STIM_ANGLE
         self.trials_table.at[self.trial_num, 'stim_gain'] = self.stimulus_gain
@@ -521,12 +608,27 @@ class ChoiceWorldSession(
         self.session_info.TOTAL_WATER_DELIVERED += self.trials_table.at[self.trial_num, 'reward_amount']
         self.session_info.NTRIALS += 1
         # SAVE TRIAL DATA
-        self.save_trial_data_to_json(bpod_data)
-        # this is a flag for the online plots. If online plots were in pyqt5, there is a file watcher functionality
-        Path(self.paths['DATA_FILE_PATH']).parent.joinpath('new_trial.flag').touch()
-        self.paths.SESSION_FOLDER.joinpath('transfer_me.flag').touch()
+        trial_data = self.save_trial_data_to_json(bpod_data)
+        self.submit_trial_io(self._notify_trial_saved, self.trial_num, trial_data, bpod_data)
         self.check_sync_pulses(bpod_data=bpod_data)
 
+    def progress_record(self) -> dict[str, Any]:
+        """Return the counters of the session after the current trial, sent to the wizard with each trial."""
+        return {
+            'trial_num': self.trial_num,
+            'ntrials': int(self.session_info.NTRIALS),
+            'water_delivered': float(self.session_info.TOTAL_WATER_DELIVERED),
+            'time_elapsed': self.time_elapsed.total_seconds(),
+            'contrast': float(self.trials_table.at[self.trial_num, 'contrast']),
+            'position': float(self.trials_table.at[self.trial_num, 'position']),
+        }
+
+    def _notify_trial_saved(self, trial_num: int, trial_data: dict, bpod_data: dict[str, Any]) -> None:
+        # push the trial to the online plots, the flag file is the fallback for viewers that did not subscribe
+        if self.trial_publisher is None or not self.trial_publisher.publish(trial_num, trial_data, bpod_data):
+            Path(self.paths['DATA_FILE_PATH']).parent.joinpath('new_trial.flag').touch()
+        self.paths.SESSION_FOLDER.joinpath('transfer_me.flag').touch()
+
     def check_sync_pulses(self, bpod_data):
         # todo move this in the post trial when we have a task flow
         if not self.bpod.is_connected:
@@ -650,11 +752,13 @@ class HabituationChoiceWorldSession(ChoiceWorldSession):
 
     def draw_next_trial_info(self, *args, **kwargs):
         # update trial table fields specific to habituation choice world
-        self.trials_table.at[self.trial_num, 'delay_to_stim_center'] = np.random.normal(self.task_params.DELAY_TO_STIM_CENTER, 2)
+        self.trials_table.at[self.trial_num, 'delay_to_stim_center'] = self.trial_sequence.normal(
+            self.task_params.DELAY_TO_STIM_CENTER, 2
+        )
         super().draw_next_trial_info(*args, **kwargs)
 
     def get_state_machine_trial(self, i):
-        sma = StateMachine(self.bpod)
+        sma = self._instantiate_state_machine(trial_number=i)
 
         if i == 0:  # First trial exception start camera
             log.info('Waiting for camera pulses...')
@@ -739,12 +843,24 @@ class ActiveChoiceWorldSession(ChoiceWorldSession):
     def _run(self):
         # starts online plotting
         if self.interactive:
+            self.trial_publisher = iblrig.net.TrialPublisher()
             subprocess.Popen(
-                ['view_session', str(self.paths['DATA_FILE_PATH']), str(self.paths['SETTINGS_FILE_PATH'])],
+                [
+                    'view_session',
+                    str(self.paths['DATA_FILE_PATH']),
+                    str(self.paths['SETTINGS_FILE_PATH']),
+                    '--port',
+                    str(self.trial_publisher.port),
+                ],
                 stdout=subprocess.DEVNULL,
                 stderr=subprocess.STDOUT,
             )
-        super()._run()
+        try:
+            super()._run()
+        finally:
+            if self.trial_publisher is not None:
+                self.trial_publisher.close()
+                self.trial_publisher = None
 
     def show_trial_log(self, extra_info: dict[str, Any] | None = None, log_level: int = logging.INFO):
         # construct info dict
@@ -763,6 +879,13 @@ class ActiveChoiceWorldSession(ChoiceWorldSession):
         # call parent method
         super().show_trial_log(extra_info=info_dict, log_level=log_level)
 
+    def progress_record(self) -> dict[str, Any]:
+        return super().progress_record() | {
+            'trial_correct': bool(self.trials_table.at[self.trial_num, 'trial_correct']),
+            'response_time': float(self.trials_table.at[self.trial_num, 'response_time']),
+            'ntrials_correct': int(self.session_info.NTRIALS_CORRECT),
+        }
+
     def trial_completed(self, bpod_data):
         """
         The purpose of this method is to
@@ -845,17 +968,17 @@ class BiasedChoiceWorldSession(ActiveChoiceWorldSession):
         if self.task_params.BLOCK_INIT_5050 and self.block_num == 0:
             block_len = 90
         else:
-            block_len = int(
-                misc.truncated_exponential(
-                    scale=self.task_params.BLOCK_LEN_FACTOR,
-                    min_value=self.task_params.BLOCK_LEN_MIN,
-                    max_value=self.task_params.BLOCK_LEN_MAX,
-                )
+            block_len = self.trial_sequence.block_length(
+                factor=self.task_params.BLOCK_LEN_FACTOR,
+                min_value=self.task_params.BLOCK_LEN_MIN,
+                max_value=self.task_params.BLOCK_LEN_MAX,
             )
         if self.block_num == 0:
-            pleft = 0.5 if self.task_params.BLOCK_INIT_5050 else np.random.choice(self.task_params.BLOCK_PROBABILITY_SET)
+            pleft = (
+                0.5 if self.task_params.BLOCK_INIT_5050 else self.trial_sequence.choice(self.task_params.BLOCK_PROBABILITY_SET)
+            )
         elif self.block_num == 1 and self.task_params.BLOCK_INIT_5050:
-            pleft = np.random.choice(self.task_params.BLOCK_PROBABILITY_SET)
+            pleft = self.trial_sequence.choice(self.task_params.BLOCK_PROBABILITY_SET)
         else:
             # this switches the probability of leftward stim for the next block
             pleft = round(abs(1 - self.blocks_table.loc[self.block_num - 1, 'probability_left']), 1)
@@ -967,10 +1090,14 @@ class TrainingChoiceWorldSession(ActiveChoiceWorldSession):
 
     def compute_performance(self):
         """Aggregate the trials table to compute the performance of the mouse on each contrast."""
-        self.trials_table['signed_contrast'] = self.trials_table.contrast * self.trials_table.position
-        performance = self.trials_table.groupby(['signed_contrast']).agg(
-            last_50_perf=pd.NamedAgg(column='trial_correct', aggfunc=lambda x: np.sum(x[np.maximum(-50, -x.size) :]) / 50),
-            ntrials=pd.NamedAgg(column='trial_correct', aggfunc='count'),
+        self.trials_table['signed_contrast'] = self.trials_table['contrast'] * np.sign(self.trials_table['position'])
+        performance = (
+            self.trials_table.to_dataframe()
+            .groupby(['signed_contrast'])
+            .agg(
+                last_50_perf=pd.NamedAgg(column='trial_correct', aggfunc=lambda x: np.sum(x[np.maximum(-50, -x.size) :]) / 50),
+                ntrials=pd.NamedAgg(column='trial_correct', aggfunc='count'),
+            )
         )
         return performance
 
@@ -1001,23 +1128,23 @@ class TrainingChoiceWorldSession(ActiveChoiceWorldSession):
         # check if the subject graduates to a new training phase
         self.check_training_phase()
         # draw the next trial
-        signed_contrast = choiceworld.draw_training_contrast(self.training_phase)
+        signed_contrast = self.trial_sequence.choice(
+            choiceworld.CONTRASTS, p=choiceworld.training_contrasts_probabilities(self.training_phase)
+        )
         position = self.task_params.STIM_POSITIONS[int(np.sign(signed_contrast) == 1)]
         contrast = np.abs(signed_contrast)
         # debiasing: if the previous trial was incorrect and easy repeat the trial
         if self.task_params.DEBIAS and self.trial_num >= 1 and self.training_phase < 5:
-            last_contrast = self.trials_table.loc[self.trial_num - 1, 'contrast']
-            do_debias_trial = (self.trials_table.loc[self.trial_num - 1, 'trial_correct'] != 1) and last_contrast >= 0.5
+            last_contrast = self.trials_table.at[self.trial_num - 1, 'contrast']
+            do_debias_trial = (self.trials_table.at[self.trial_num - 1, 'trial_correct'] != 1) and last_contrast >= 0.5
             self.trials_table.at[self.trial_num, 'debias_trial'] = do_debias_trial
             if do_debias_trial:
-                iresponse = np.logical_and(
-                    ~self.trials_table['response_side'].isna(), self.trials_table['response_side'] != 0
-                )  # trials that had a response
+                iresponse = self.trials_table['response_side'] != 0  # trials that had a response
                 # takes the average of right responses over last 10 response trials
                 average_right = np.mean(self.trials_table['response_side'][iresponse[-np.maximum(10, iresponse.size) :]] == 1)
                 # the next probability of next stimulus being on the left is a draw from a normal distribution
                 # centered on average right with sigma 0.5. If it is less than 0.5 the next stimulus will be on the left
-                position = self.task_params.STIM_POSITIONS[int(np.random.normal(average_right, 0.5) >= 0.5)]
+                position = self.task_params.STIM_POSITIONS[int(self.trial_sequence.normal(average_right, 0.5) >= 0.5)]
                 # contrast is the last contrast
                 contrast = last_contrast
         else:
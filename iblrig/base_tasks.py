@@ -12,33 +12,39 @@ import importlib.metadata
 import inspect
 import json
 import logging
+import os
 import signal
+import socket
+import subprocess
 import sys
+import threading
 import time
 import traceback
 from abc import ABC, abstractmethod
 from collections import OrderedDict
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
 from pathlib import Path
-from typing import Protocol, final
+from typing import Any, Protocol, final
+from xml.etree import ElementTree
 
 import numpy as np
 import pandas as pd
 import yaml
 from pythonosc import udp_client
+from pythonosc.osc_message import OscMessage, ParseError
 
 import ibllib.io.session_params as ses_params
 import iblrig.graphic as graph
 import iblrig.path_helper
 import pybpodapi
-from ibllib.oneibl.registration import IBLRegistrationClient
 from iblrig import net, path_helper, sound
 from iblrig.constants import BASE_PATH, BONSAI_EXE, PYSPIN_AVAILABLE
 from iblrig.frame2ttl import Frame2TTL
 from iblrig.hardware import SOFTCODE, Bpod, RotaryEncoderModule, sound_device_factory
 from iblrig.hifi import HiFi
-from iblrig.path_helper import load_pydantic_yaml
+from iblrig.path_helper import SessionIndex, load_pydantic_yaml
 from iblrig.pydantic_definitions import HardwareSettings, RigSettings, TrialDataModel
+from iblrig.raw_data_loaders import TRIALS_TABLE_FILE_NAME, BackgroundWriter, TrialsTableWriter, dumps_trial_data
 from iblrig.tools import call_bonsai
 from iblrig.transfer_experiments import BehaviorCopier, VideoCopier
 from iblrig.valve import Valve
@@ -46,7 +52,6 @@ from iblutil.io.net.base import ExpMessage
 from iblutil.spacer import Spacer
 from iblutil.util import Bunch, flatten, setup_logger
 from one.alf.io import next_num_folder
-from one.api import ONE, OneAlyx
 from pybpodapi.protocol import StateMachine
 
 OSC_CLIENT_IP = '127.0.0.1'
@@ -97,6 +102,8 @@ class BaseSession(ABC):
         append=False,
         wizard=False,
         log_level='INFO',
+        random_seed=None,
+        progress_port=None,
         **kwargs,
     ):
         """
@@ -113,6 +120,10 @@ class BaseSession(ABC):
         :param subject_weight_grams: weight of the subject
         :param stub: A full path to an experiment description file containing experiment information.
         :param append: bool, if True, append to the latest existing session of the same subject for the same day
+        :param random_seed: int, seed of the random generator of the session, recorded in the task settings. If None, a
+         new seed is drawn from the operating system's entropy
+        :param progress_port: int, an optional local UDP port to which the progress of the session is sent, see
+         iblrig.net.ProgressPublisher
         """
         self.extractor_tasks = getattr(self, 'extractor_tasks', None)
         self._logger = None
@@ -128,6 +139,9 @@ class BaseSession(ABC):
         log.info(f'Session call: {" ".join(sys.argv)}')
         self.interactive = interactive
         self._one = one
+        self._trials_table_writer: TrialsTableWriter | None = None
+        self._trial_writer: BackgroundWriter | None = None
+        self._held_trial_io: list[tuple[Callable, tuple]] | None = None
         self.init_datetime = datetime.datetime.now()
 
         # loads in the settings: first load the files, then update with the input argument if provided
@@ -159,9 +173,16 @@ class BaseSession(ABC):
                 'TOTAL_WATER_DELIVERED': 0,
             }
         )
+        # All the random draws of the session use this generator: the session can be regenerated from the recorded seed
+        self.session_info['RANDOM_SEED'] = int(np.random.SeedSequence().entropy) if random_seed is None else int(random_seed)
+        self.rng = np.random.default_rng(self.session_info['RANDOM_SEED'])
         # Executes mixins init methods
         self._execute_mixins_shared_function('init_mixin')
         self.paths = self._init_paths(append=append)
+        # receives the pause and stop commands of the wizard while the task runs, see BaseSession.run
+        self.control = net.TaskControl(self.paths.SESSION_FOLDER)
+        # sends the lifecycle events and the trial counters of the session to the wizard
+        self.progress = net.ProgressPublisher(progress_port)
         if not isinstance(self, EmptySession):
             log.info(f'Session raw data: {self.paths.SESSION_RAW_DATA_FOLDER}')
         # Prepare the experiment description dictionary
@@ -466,6 +487,11 @@ class BaseSession(ABC):
         ----------
         bpod_data : dict
             Trial data returned from pybpod.
+
+        Returns
+        -------
+        dict
+            The validated trial data, including the bpod data as 'behavior_data'.
         """
         # get trial's data as a dict
         trial_data = self.trials_table.iloc[self.trial_num].to_dict()
@@ -484,9 +510,106 @@ class BaseSession(ABC):
         # add bpod_data as 'behavior_data'
         trial_data['behavior_data'] = bpod_data
 
+        # write to disk, in the background if the trial writer is running
+        self.submit_trial_io(self._write_trial_data, trial_data)
+        return trial_data
+
+    def _write_trial_data(self, trial_data: dict) -> None:
         # write json data to file
-        with open(self.paths['DATA_FILE_PATH'], 'a') as fp:
-            fp.write(json.dumps(trial_data) + '\n')
+        with open(self.paths['DATA_FILE_PATH'], 'ab') as fp:
+            fp.write(dumps_trial_data(trial_data))
+            if self.task_params.get('TRIAL_DATA_FSYNC', 'session') == 'trial':
+                fp.flush()
+                os.fsync(fp.fileno())
+
+        # append the scalar columns to the columnar sidecar, finalized at the end of the session
+        if self._trials_table_writer is None:
+            file_sidecar = Path(self.paths['DATA_FILE_PATH']).with_name(TRIALS_TABLE_FILE_NAME)
+            self._trials_table_writer = TrialsTableWriter(file_sidecar, jsonable_file=self.paths['DATA_FILE_PATH'])
+        self._trials_table_writer.append(trial_data)
+
+    def _close_trial_data(self) -> None:
+        """Write the pending trial data, finalize the trials table sidecar and sync the task data file to disk."""
+        self.stop_trial_writer()
+        if self._trials_table_writer is not None:
+            self._trials_table_writer.close()
+        file_jsonable = Path(self.paths.get('DATA_FILE_PATH', ''))
+        if self.task_params.get('TRIAL_DATA_FSYNC', 'session') != 'never' and file_jsonable.is_file():
+            with open(file_jsonable, 'ab') as fp:  # fsync requires write access on Windows
+                os.fsync(fp.fileno())
+
+    def start_trial_writer(self, max_queue_size: int = 32) -> None:
+        """
+        Start writing the trial data in a background thread.
+
+        The calls passed to :meth:`submit_trial_io` are then executed in order by a
+        :class:`~iblrig.raw_data_loaders.BackgroundWriter`, while the task moves on to the next trial. They must not read
+        the trials table: pass them the values they need instead.
+
+        Parameters
+        ----------
+        max_queue_size : int, optional
+            Maximum number of pending writes before the task waits for the disk. Defaults to 32.
+        """
+        if self._trial_writer is None:
+            self._trial_writer = BackgroundWriter(max_queue_size=max_queue_size)
+
+    def stop_trial_writer(self) -> None:
+        """Wait for the pending trial data to be written in order, stop the background thread and log its metrics."""
+        if self._trial_writer is not None:
+            self._trial_writer.close()
+            self._trial_writer.log_metrics()
+            self._trial_writer = None
+
+    def submit_trial_io(self, fn: Callable, *args) -> None:
+        """
+        Execute a call that persists or publishes the trial data.
+
+        The call is executed immediately, or queued to the background thread if the trial writer has been started with
+        :meth:`start_trial_writer`.
+
+        Parameters
+        ----------
+        fn : Callable
+            The function to call.
+        *args
+            The arguments passed to `fn`.
+        """
+        if self._held_trial_io is not None:
+            self._held_trial_io.append((fn, args))
+        elif self._trial_writer is None:
+            fn(*args)
+        else:
+            self._trial_writer.submit(fn, *args)
+
+    @contextlib.contextmanager
+    def hold_trial_io(self) -> Iterator[dict[str, Any]]:
+        """
+        Hold the calls passed to :meth:`submit_trial_io` until the context exits.
+
+        The held calls are submitted in order on exit. The context yields a dictionary of the trial data fields that are
+        only known once the trial has been completed, such as the duration of a pause: on exit, they are set in the trials
+        table and in the held trial data before it is written.
+
+        Yields
+        ------
+        dict
+            The trial data fields to update on exit.
+        """
+        held, trial_updates = [], {}
+        self._held_trial_io = held
+        try:
+            yield trial_updates
+        finally:
+            self._held_trial_io = None
+            for key, value in trial_updates.items():
+                self.trials_table.at[self.trial_num, key] = value
+            for fn, args in held:
+                # the trial data returned by save_trial_data_to_json holds the bpod data as 'behavior_data'
+                for arg in args:
+                    if isinstance(arg, dict) and 'behavior_data' in arg:
+                        arg.update(trial_updates)
+                self.submit_trial_io(fn, *args)
 
     @property
     def one(self):
@@ -499,6 +622,8 @@ class BaseSession(ABC):
                 + f"and url: {self.iblrig_settings['ALYX_URL']}"
             )
             try:
+                from one.api import ONE
+
                 self._one = ONE(
                     base_url=str(self.iblrig_settings['ALYX_URL']),
                     username=self.iblrig_settings['ALYX_USER'],
@@ -547,6 +672,8 @@ class BaseSession(ABC):
         if not self.one or self.one.offline:
             return
         try:
+            from ibllib.oneibl.registration import IBLRegistrationClient
+
             client = IBLRegistrationClient(self.one)
             ses, _ = client.register_session(self.paths.SESSION_FOLDER, register_reward=False)
         except Exception:
@@ -603,6 +730,8 @@ class BaseSession(ABC):
         # copy the acquisition stub to the remote session folder
         sc = BehaviorCopier(self.paths.SESSION_FOLDER, remote_subjects_folder=self.paths['REMOTE_SUBJECT_FOLDER'])
         sc.initialize_experiment(self.experiment_description, overwrite=False)
+        # the running session is indexed, so that the sessions started afterwards find it
+        self.update_session_index()
         self.register_to_alyx()
 
     def run(self):
@@ -623,16 +752,35 @@ class BaseSession(ABC):
             )
 
         def sigint_handler(*args, **kwargs):
-            # create a signal handler for a graceful exit: create a stop flag in the session folder
-            self.paths.SESSION_FOLDER.joinpath('.stop').touch()
+            # create a signal handler for a graceful exit: request a stop at the end of the trial
+            self.control.handle('stop')
             log.critical('SIGINT signal detected, will exit at the end of the trial')
+            if self._trial_writer is not None:
+                log.critical(f'{self._trial_writer.queue_depth} pending trial writes will be flushed before exiting')
 
         # if upon starting there is a flag just remove it, this is to prevent killing a session in the egg
-        if self.paths.SESSION_FOLDER.joinpath('.stop').exists():
-            self.paths.SESSION_FOLDER.joinpath('.stop').unlink()
+        self.control.clear_stop()
 
         signal.signal(signal.SIGINT, sigint_handler)
-        self._run()  # runs the specific task logic i.e. trial loop etc...
+        self.control.start()
+        self.progress.emit(
+            'started',
+            protocol=self.protocol_name,
+            subject=self.session_info.SUBJECT_NAME,
+            session_folder=str(self.paths.SESSION_FOLDER),
+            ntrials=self.task_params.get('NTRIALS'),
+        )
+        try:
+            self._run()  # runs the specific task logic i.e. trial loop etc...
+        finally:
+            self.control.close()
+            self._close_trial_data()
+            self.progress.emit(
+                'ended',
+                ntrials=int(self.session_info.NTRIALS),
+                water_delivered=float(self.session_info.TOTAL_WATER_DELIVERED),
+            )
+            self.progress.close()
         # post task instructions
         log.critical('Graceful exit')
         log.info(f'Session {self.paths.SESSION_RAW_DATA_FOLDER}')
@@ -642,10 +790,21 @@ class BaseSession(ABC):
                 'Poop count', f'{self.session_info.SUBJECT_NAME} droppings count:', nullable=True, askint=True
             )
         self.save_task_parameters_to_json_file()
+        self.update_session_index()
         self.register_to_alyx()
         self._execute_mixins_shared_function('stop_mixin')
         self._execute_mixins_shared_function('cleanup_mixin')
 
+    def update_session_index(self):
+        """Add the session to the subject's session index, used to look up previous sessions, when it starts and ends."""
+        try:
+            index = SessionIndex.for_subject(self.session_info.SUBJECT_NAME, self.paths.LOCAL_SUBJECT_FOLDER)
+            index.update_session(self.paths.SESSION_FOLDER)
+            index.save()
+        except Exception:
+            log.error(traceback.format_exc())
+            log.error('Could not update the session index')
+
     @abstractmethod
     def start_hardware(self):
         """
@@ -738,12 +897,143 @@ class OSCClient(udp_client.SimpleUDPClient):
         self.send_message('/x', 1)
 
 
+class BonsaiStartupError(RuntimeError):
+    """Raised when a Bonsai workflow exits or fails to report that it is ready."""
+
+
+class BonsaiHandshake:
+    """
+    Readiness handshake with a Bonsai workflow.
+
+    The workflow reports back through OSC messages sent to its return port - 7120 for the visual stimulus, 7121 for the
+    cameras and 7122 for the microphone, next to the ports of their OSC clients:
+        /ready  -> (int)    the workflow is running
+        /frame  -> (int)    the first frame is rendered or acquired
+
+    The handshake awaits the messages sent by the workflow file: the shipped workflows send /frame. A workflow sending
+    none of them, e.g. a custom workflow predating the handshake, is given a fixed delay instead. A workflow that does
+    not report within the timeout, e.g. if its messages are lost, is logged and the task carries on as it did before the
+    handshake: only a Bonsai process exiting fails the start-up.
+
+    Parameters
+    ----------
+    workflow_file : Path
+        The Bonsai workflow file.
+    port : int
+        The return port on which the workflow reports.
+    ip : str, optional
+        The address on which the workflow reports.
+
+    Examples
+    --------
+    The socket is bound before starting the workflow, so that no message is missed:
+
+    >>> with BonsaiHandshake(workflow_file, port=7120) as handshake:
+    ...     process = call_bonsai(workflow_file, wait=False)
+    ...     handshake.wait(process, timeout=60, name='visual stimulus')
+    """
+
+    ADDRESSES = ('/ready', '/frame')
+    TIMEOUT = 60  # default time allowed to the workflow to report, in seconds
+
+    def __init__(self, workflow_file: Path, port: int, ip: str = OSC_CLIENT_IP):
+        sent = self.sent_addresses(workflow_file)
+        self.addresses = [address for address in self.ADDRESSES if address in sent]
+        self.received: dict[str, float] = {}
+        self.port = port
+        self._sock = None
+        if self.addresses:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.bind((ip, port))
+            self.port = self._sock.getsockname()[1]
+
+    @staticmethod
+    def sent_addresses(workflow_file: Path) -> set[str]:
+        """
+        Get the addresses of the OSC messages sent by a Bonsai workflow.
+
+        Parameters
+        ----------
+        workflow_file : Path
+            The Bonsai workflow file.
+
+        Returns
+        -------
+        set of str
+            The addresses of the SendMessage operators of the workflow, including its nested workflows.
+        """
+        addresses = set()
+        for element in ElementTree.parse(workflow_file).iter():
+            # the prefix of the Bonsai.Osc namespace is chosen by the workflow file
+            if element.get('{http://www.w3.org/2001/XMLSchema-instance}type', '').endswith(':SendMessage'):
+                addresses.update(child.text for child in element if child.tag.endswith('}Address'))
+        return addresses
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+
+    def wait(self, process: subprocess.Popen, timeout: float = TIMEOUT, delay: float = 0, name: str = 'Bonsai') -> float | None:
+        """
+        Wait for the workflow to report that it is ready.
+
+        Parameters
+        ----------
+        process : subprocess.Popen
+            The Bonsai process running the workflow.
+        timeout : float, optional
+            The time allowed to the workflow to report, in seconds.
+        delay : float, optional
+            The fixed delay given to a workflow that does not report, in seconds.
+        name : str, optional
+            The name of the workflow in the error messages.
+
+        Returns
+        -------
+        float | None
+            The time the workflow took to report in seconds, None if it does not report or did not report in time.
+
+        Raises
+        ------
+        BonsaiStartupError
+            The Bonsai process exited before reporting.
+        """
+        if self._sock is None:
+            time.sleep(delay)
+            return None
+        t0 = time.monotonic()
+        while missing := [address for address in self.addresses if address not in self.received]:
+            if (return_code := process.poll()) is not None:
+                raise BonsaiStartupError(f'{name}: Bonsai exited with code {return_code} before reporting {", ".join(missing)}')
+            if (remaining := t0 + timeout - time.monotonic()) <= 0:
+                log.warning(
+                    f'{name}: Bonsai did not report {", ".join(missing)} within {timeout} s, carrying on - '
+                    f'consider increasing BONSAI_READY_TIMEOUT in the task parameters'
+                )
+                return None
+            self._sock.settimeout(min(remaining, 0.1))
+            try:
+                message = OscMessage(self._sock.recv(1024))
+            except (TimeoutError, ParseError):
+                continue
+            if message.address in self.addresses and message.address not in self.received:
+                self.received[message.address] = time.monotonic() - t0
+                log.debug(f'{name}: Bonsai reported {message.address} after {self.received[message.address]:.2f} s')
+        return time.monotonic() - t0
+
+
 class BonsaiRecordingMixin(BaseSession):
     config: dict
 
     def init_mixin_bonsai_recordings(self, *args, **kwargs):
-        self.bonsai_camera = Bunch({'udp_client': OSCClient(port=7111)})
-        self.bonsai_microphone = Bunch({'udp_client': OSCClient(port=7112)})
+        self.bonsai_camera = Bunch({'udp_client': OSCClient(port=7111), 'return_port': 7121})
+        self.bonsai_microphone = Bunch({'udp_client': OSCClient(port=7112), 'return_port': 7122})
         self.config = None  # the name of the configuration to run
 
     def stop_mixin_bonsai_recordings(self):
@@ -766,7 +1056,9 @@ class BonsaiRecordingMixin(BaseSession):
             'FileNameMic': self.paths.SESSION_RAW_DATA_FOLDER.joinpath('_iblrig_micData.raw.wav'),
             'RecordSound': self.task_params.RECORD_SOUND,
         }
-        call_bonsai(workflow_file, parameters, wait=False, editor=False)
+        with BonsaiHandshake(workflow_file, port=self.bonsai_microphone.return_port) as handshake:
+            process = call_bonsai(workflow_file, parameters, wait=False, editor=False)
+            handshake.wait(process, self.task_params.get('BONSAI_READY_TIMEOUT', handshake.TIMEOUT), name='microphone')
         log.info('Bonsai microphone recording module loaded: OK')
 
     @staticmethod
@@ -837,14 +1129,30 @@ class BonsaiRecordingMixin(BaseSession):
             'FileNameMic': self.paths.SESSION_RAW_DATA_FOLDER.joinpath('_iblrig_micData.raw.wav'),
             'RecordSound': self.task_params.RECORD_SOUND,
         }
-        call_bonsai(workflow_file, parameters, wait=False, editor=False)
+        handshake = BonsaiHandshake(workflow_file, port=self.bonsai_camera.return_port)
+        process = call_bonsai(workflow_file, parameters, wait=False, editor=False)
+        # this is the handler of a Bpod softcode: the handshake is awaited in the background, not in the Bpod event loop
+        self.bonsai_camera.handshake = threading.Thread(
+            target=self._await_bonsai_cameras, args=(handshake, process), name='bonsai_cameras', daemon=True
+        )
+        self.bonsai_camera.handshake.start()
         log.info('Bonsai camera recording process started')
 
+    def _await_bonsai_cameras(self, handshake: BonsaiHandshake, process: subprocess.Popen) -> None:
+        with handshake:
+            try:
+                timeout = self.task_params.get('BONSAI_READY_TIMEOUT', handshake.TIMEOUT)
+                if handshake.wait(process, timeout, name='camera recording') is not None:
+                    log.info('Bonsai camera recording: first frame acquired')
+            except BonsaiStartupError as e:
+                log.error(e)
+
 
 class BonsaiVisualStimulusMixin(BaseSession):
     def init_mixin_bonsai_visual_stimulus(self, *args, **kwargs):
         # camera 7111, microphone 7112
         self.bonsai_visual_udp_client = OSCClient(port=7110)
+        self.bonsai_visual_return_port = 7120  # see BonsaiHandshake
 
     def start_mixin_bonsai_visual_stimulus(self):
         self.choice_world_visual_stimulus()
@@ -860,13 +1168,13 @@ class BonsaiVisualStimulusMixin(BaseSession):
         The OSC protocol is documented in iblrig.base_tasks.BonsaiVisualStimulusMixin
         """
         bonsai_dict = {
-            k: self.trials_table[k][self.trial_num]
+            k: self.trials_table.at[self.trial_num, k]
             for k in self.bonsai_visual_udp_client.OSC_PROTOCOL
             if k in self.trials_table.columns
         }
 
         # reverse wheel contingency: if stim_reverse is True we invert stim_gain
-        if self.trials_table.get('stim_reverse', {}).get(self.trial_num, False):
+        if 'stim_reverse' in self.trials_table.columns and self.trials_table.at[self.trial_num, 'stim_reverse']:
             bonsai_dict['stim_gain'] = -bonsai_dict['stim_gain']
 
         self.bonsai_visual_udp_client.send2bonsai(**bonsai_dict)
@@ -905,9 +1213,12 @@ class BonsaiVisualStimulusMixin(BaseSession):
             'Stim.sync_y': self.task_params.SYNC_SQUARE_Y,
             'Stim.TranslationZ': -self.task_params.STIM_TRANSLATION_Z,  # MINUS!!
         }
-        call_bonsai(workflow_file, parameters, wait=False, editor=self.task_params.BONSAI_EDITOR, bootstrap=False)
-        log.info('Giving Bonsai some extra time to start ...')
-        time.sleep(5)
+        with BonsaiHandshake(workflow_file, port=self.bonsai_visual_return_port) as handshake:
+            process = call_bonsai(workflow_file, parameters, wait=False, editor=self.task_params.BONSAI_EDITOR, bootstrap=False)
+            if not handshake.addresses:
+                log.info('Giving Bonsai some extra time to start ...')
+            timeout = self.task_params.get('BONSAI_READY_TIMEOUT', handshake.TIMEOUT)
+            handshake.wait(process, timeout, delay=5, name='visual stimulus')
         log.info('Bonsai visual stimulus module loaded: OK')
 
 
@@ -1104,6 +1415,7 @@ class SoundMixin(BaseSession, HasBpod):
             amplitude=self.task_params.WHITE_NOISE_AMPLITUDE * amp_gain_factor,
             fade=0.01,
             chans=self.sound['channels'],
+            rng=self.rng,
         )
 
     def start_mixin_sound(self):
@@ -1111,16 +1423,32 @@ class SoundMixin(BaseSession, HasBpod):
         Depends on bpod mixin start for hard sound card
         :return:
         """
-        assert self.bpod.is_connected, 'The sound mixin depends on the bpod mixin being connected'
-        # SoundCard config params
+        self.upload_sounds()
+        self.define_sound_actions()
+
+    def upload_sounds(self):
+        """Load the sounds to the harp or HiFi sound card, through its own port: this does not depend on the bpod."""
         match self.hardware_settings.device_sound['OUTPUT']:
             case 'harp':
-                assert self.bpod.sound_card is not None, 'No harp sound-card connected to Bpod'
                 sound.configure_sound_card(
                     sounds=[self.sound.GO_TONE, self.sound.WHITE_NOISE],
                     indexes=[self.task_params.GO_TONE_IDX, self.task_params.WHITE_NOISE_IDX],
                     sample_rate=self.sound['samplerate'],
                 )
+            case 'hifi':
+                assert self.hardware_settings.device_sound.COM_SOUND is not None
+                hifi = HiFi(port=self.hardware_settings.device_sound.COM_SOUND, sampling_rate_hz=self.sound['samplerate'])
+                hifi.load(index=self.task_params.GO_TONE_IDX, data=self.sound.GO_TONE)
+                hifi.load(index=self.task_params.WHITE_NOISE_IDX, data=self.sound.WHITE_NOISE)
+                hifi.push()
+                hifi.close()
+
+    def define_sound_actions(self):
+        """Define the output actions of the bpod playing the sounds, once the bpod is connected."""
+        assert self.bpod.is_connected, 'The sound mixin depends on the bpod mixin being connected'
+        match self.hardware_settings.device_sound['OUTPUT']:
+            case 'harp':
+                assert self.bpod.sound_card is not None, 'No harp sound-card connected to Bpod'
                 self.bpod.define_harp_sounds_actions(
                     module=self.bpod.sound_card,
                     go_tone_index=self.task_params.GO_TONE_IDX,
@@ -1129,12 +1457,6 @@ class SoundMixin(BaseSession, HasBpod):
             case 'hifi':
                 module = self.bpod.get_module('^HiFi')
                 assert module is not None, 'No HiFi module connected to Bpod'
-                assert self.hardware_settings.device_sound.COM_SOUND is not None
-                hifi = HiFi(port=self.hardware_settings.device_sound.COM_SOUND, sampling_rate_hz=self.sound['samplerate'])
-                hifi.load(index=self.task_params.GO_TONE_IDX, data=self.sound.GO_TONE)
-                hifi.load(index=self.task_params.WHITE_NOISE_IDX, data=self.sound.WHITE_NOISE)
-                hifi.push()
-                hifi.close()
                 self.bpod.define_harp_sounds_actions(
                     module=module,
                     go_tone_index=self.task_params.GO_TONE_IDX,
@@ -1237,6 +1559,8 @@ class NetworkSession(BaseSession):
             An instance of ONE.
         """
         if super().one is None:
+            from one.api import OneAlyx
+
             self._one = OneAlyx(silent=True, mode='local')
         return self._one
 
@@ -1450,10 +1774,7 @@ class SpontaneousSession(BaseSession):
     def _run(self):
         """Run the task with the actual state machine."""
         log.info('Starting spontaneous acquisition')
-        while True:
-            time.sleep(1.5)
+        while not self.control.wait_for_stop(timeout=1.5):
             if self.duration_secs is not None and self.time_elapsed.seconds > self.duration_secs:
                 break
-            if self.paths.SESSION_FOLDER.joinpath('.stop').exists():
-                self.paths.SESSION_FOLDER.joinpath('.stop').unlink()
-                break
+        self.control.clear_stop()
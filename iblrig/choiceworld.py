@@ -87,7 +87,7 @@ def get_subject_training_info(
         if len(session_info) > 0:
             session_info = session_info[0]
             task_settings = session_info.get('task_settings')
-            trials_data, _ = iblrig.raw_data_loaders.load_task_jsonable(session_info.get('file_task_data'))
+            trials_data = iblrig.raw_data_loaders.load_task_trials_table(session_info.get('file_task_data'))
     except Exception as e:
         log.exception(msg='Error obtaining training information from previous session!', exc_info=e)
         training_info['adaptive_gain'] = stim_gain_on_error
@@ -147,9 +147,9 @@ def training_contrasts_probabilities(phase=1):
     return frequencies / np.sum(frequencies)
 
 
-def draw_training_contrast(phase: int) -> float:
+def draw_training_contrast(phase: int, size: int | None = None, rng: np.random.Generator | None = None) -> float | np.ndarray:
     probabilities = training_contrasts_probabilities(phase)
-    return np.random.choice(CONTRASTS, p=probabilities)
+    return (np.random if rng is None else rng).choice(CONTRASTS, p=probabilities, size=size)
 
 
 def contrasts_set(phase: int) -> np.array:
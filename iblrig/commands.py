@@ -2,17 +2,26 @@ import argparse
 import datetime
 import logging
 import shutil
+import traceback
 import warnings
+from collections import defaultdict
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import yaml
 
 import iblrig
-from iblrig.hardware import Bpod
-from iblrig.online_plots import OnlinePlots
-from iblrig.path_helper import get_local_and_remote_paths
-from iblrig.transfer_experiments import BehaviorCopier, EphysCopier, SessionCopier, VideoCopier
+from iblrig.path_helper import SessionIndex, get_local_and_remote_paths
+from iblrig.transfer_experiments import (
+    TRANSFER_MAX_WORKERS,
+    BandwidthLimiter,
+    BehaviorCopier,
+    CopyState,
+    EphysCopier,
+    SessionCopier,
+    VideoCopier,
+)
 from iblutil.util import setup_logger
 
 logger = logging.getLogger(__name__)
@@ -55,6 +64,16 @@ def _transfer_parser(description: str) -> argparse.ArgumentParser:
     parser.add_argument(
         '--date', type=str, help='an optional date pattern to filter sessions by. Wildcards accepted.', default='*-*-*'
     )
+    parser.add_argument('--sessions', type=int, dest='max_sessions', help='number of sessions copied concurrently', default=1)
+    parser.add_argument(
+        '--workers', type=int, dest='max_workers', help='number of files copied concurrently per session', default=4
+    )
+    parser.add_argument(
+        '--max-bandwidth', type=float, dest='max_bandwidth', help='cap on the combined transfer rate in MB/s', default=None
+    )
+    parser.add_argument(
+        '--verify', action='store_true', dest='verify', help='re-hash files already transferred rather than comparing stats'
+    )
     return parser
 
 
@@ -203,6 +222,28 @@ def _print_status(copiers: Iterable[SessionCopier], heading: str = '') -> None:
         print(f' * {copier.session_path}: {state}')
 
 
+def _update_session_indices(copiers: Iterable[SessionCopier], local_subjects_folder: Path) -> None:
+    """
+    Add the transferred sessions to the session index of their subject, so that they can be found once removed locally.
+
+    The index of each subject is read and written once, after all the copiers have run: copiers running concurrently
+    would otherwise overwrite each other's updates of the same index.
+    """
+    subjects = defaultdict(list)
+    for copier in copiers:
+        if copier.state in (CopyState.COMPLETE, CopyState.FINALIZED):
+            subjects[copier.session_path.parents[1].name].append(copier)
+    for subject, subject_copiers in subjects.items():
+        try:
+            index = SessionIndex.for_subject(subject, local_subjects_folder)
+            for copier in subject_copiers:
+                index.update_session(copier.remote_session_path)
+            index.save()
+        except Exception:
+            logger.error(traceback.format_exc())
+            logger.error(f'Could not update the session index of {subject}')
+
+
 def _build_glob_pattern(subject='*', date='*-*-*', number='*', flag_file='transfer_me.flag', **kwargs):
     """
     Build the copier glob pattern from filter keyword arguments.
@@ -228,6 +269,22 @@ def _build_glob_pattern(subject='*', date='*-*-*', number='*', flag_file='transf
     return kwargs.get('glob_pattern', '/'.join((subject, date, number, flag_file)))
 
 
+class TransferError(Exception):
+    """
+    Raised when the transfer of sessions failed, listing the failures.
+
+    Parameters
+    ----------
+    errors : dict of str, Exception
+        The exception raised by the copier of each session that failed, keyed by local session path.
+    """
+
+    def __init__(self, errors: dict[str, Exception]):
+        self.errors = errors
+        report = [f'{session_path}: {type(e).__name__}: {e}' for session_path, e in errors.items()]
+        super().__init__(f'Transfer failed for {len(errors)} session(s):\n' + '\n'.join(f'  - {line}' for line in report))
+
+
 def transfer_data(
     tag=None,
     local_path: Path = None,
@@ -235,6 +292,10 @@ def transfer_data(
     dry: bool = False,
     interactive: bool = False,
     cleanup_weeks=2,
+    max_sessions: int = 1,
+    max_workers: int = TRANSFER_MAX_WORKERS,
+    max_bandwidth: float | None = None,
+    verify: bool = False,
     **kwargs,
 ) -> list[SessionCopier]:
     """
@@ -254,6 +315,14 @@ def transfer_data(
         If true, users are prompted to review the sessions to copy before proceeding.
     cleanup_weeks : int, bool
         Remove local data older than this number of weeks. If False, do not remove.
+    max_sessions : int
+        The number of sessions copied concurrently.
+    max_workers : int
+        The number of files copied concurrently for each session.
+    max_bandwidth : float
+        An optional cap on the combined transfer rate of all sessions, in MB/s.
+    verify : bool
+        If True, files already transferred are hashed on both ends rather than compared with the transfer manifest.
     kwargs
         Optional arguments to pass to SessionCopier constructor.
 
@@ -261,6 +330,13 @@ def transfer_data(
     -------
     list of SessionCopier
         A list of the copier objects that were run.
+
+    Raises
+    ------
+    ValueError
+        No tag was given.
+    TransferError
+        The transfer of one or more sessions failed, once all the sessions have been processed.
     """
     if not tag:
         raise ValueError('Tag required.')
@@ -271,13 +347,29 @@ def transfer_data(
     copier = tag2copier.get(tag.lower(), SessionCopier)
     logger.info('Searching for %s sessions using %s class', tag.lower(), copier.__name__)
     expected_devices = kwargs.pop('number_of_expected_devices', None)
+    kwargs['max_workers'] = max_workers
+    kwargs['verify'] = verify
+    kwargs['bandwidth_limiter'] = BandwidthLimiter(max_bandwidth * 1024**2) if max_bandwidth else None
     copiers = _get_copiers(copier, local_subject_folder, remote_subject_folder, interactive=interactive, tag=tag, **kwargs)
 
-    for copier in copiers:
+    def run_copier(copier: SessionCopier) -> None:
         logger.critical(f'{copier.state}, {copier.session_path}')
         if not dry:
             copier.run(number_of_expected_devices=expected_devices)
 
+    # all the copiers run to completion, the failure of one session does not stop the transfer of the others
+    with ThreadPoolExecutor(max_workers=max_sessions) as executor:
+        futures = {executor.submit(run_copier, copier): copier for copier in copiers}
+    errors = {}
+    for future, copier in futures.items():
+        if (error := future.exception()) is not None:
+            errors[str(copier.session_path)] = error
+            logger.error(f'Could not transfer {copier.session_path}', exc_info=error)
+    if not dry:
+        _update_session_indices(copiers, local_subject_folder)
+    if errors:
+        raise TransferError(errors) from next(iter(errors.values()))
+
     if interactive:
         _print_status(copiers, 'States after transfer operation:')
 
@@ -341,20 +433,24 @@ def view_session():
     >>> view_session /full/path/to/jsonable/_iblrig_taskData.raw.jsonable
     :return: None
     """
+    from iblrig.online_plots import OnlinePlots
     from iblutil.util import setup_logger
 
     setup_logger('iblrig', level='INFO')
     parser = argparse.ArgumentParser()
     parser.add_argument('file_jsonable', help='full file path to jsonable file')
     parser.add_argument('file_settings', help='full file path to settings file', nargs='?', default=None)
+    parser.add_argument('--port', type=int, default=None, help='port of the task pushing the trials, polls the file if unset')
     args = parser.parse_args()
 
     online_plots = OnlinePlots(settings_file=args.file_settings)
-    online_plots.run(file_jsonable=args.file_jsonable)
+    online_plots.run(file_jsonable=args.file_jsonable, port=args.port)
 
 
 def flush():
     """Flush the valve until the user hits enter."""
+    from iblrig.hardware import Bpod
+
     file_settings = Path(iblrig.__file__).parents[1].joinpath('settings', 'hardware_settings.yaml')
     hardware_settings = yaml.safe_load(file_settings.read_text())
     bpod = Bpod(hardware_settings['device_bpod']['COM_BPOD'])
@@ -1,4 +1,5 @@
 import argparse
+import json
 import logging
 import subprocess
 import sys
@@ -20,6 +21,7 @@ from PyQt5.QtCore import (
     pyqtSlot,
 )
 from PyQt5.QtGui import QStandardItem, QStandardItemModel
+from PyQt5.QtNetwork import QHostAddress, QUdpSocket
 from PyQt5.QtWidgets import QAction, QLineEdit, QListView, QProgressBar, QPushButton
 from requests import HTTPError
 
@@ -139,6 +141,43 @@ class DiskSpaceIndicator(QProgressBar):
         self.setStatusTip(f'{self._directory}: {self._gigs_dir:.1f} GB  •  ' f'available space: {self._gigs_free:.1f} GB')
 
 
+class SessionProgressReceiver(QObject):
+    """
+    Receive the progress records of a running task, as sent by :class:`iblrig.net.ProgressPublisher`.
+
+    The receiver binds a UDP socket on the loopback interface, whose port is passed to the task with the
+    `--progress-port` argument. Records are read by the Qt event loop as they arrive.
+
+    Attributes
+    ----------
+    recordReceived : pyqtSignal
+        Emitted for each record received. The signal carries the record as a dictionary.
+    """
+
+    recordReceived = pyqtSignal(dict)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._socket = QUdpSocket(self)
+        self._socket.bind(QHostAddress.LocalHost, 0)
+        self._socket.readyRead.connect(self._on_ready_read)
+
+    @property
+    def port(self) -> int:
+        """int: The port the task sends its records to."""
+        return self._socket.localPort()
+
+    def _on_ready_read(self):
+        while self._socket.hasPendingDatagrams():
+            datagram = self._socket.receiveDatagram()
+            try:
+                record = json.loads(bytes(datagram.data()))
+            except ValueError:
+                log.debug('Ignoring invalid progress record')
+                continue
+            self.recordReceived.emit(record)
+
+
 class Worker(QRunnable):
     """
     A generic worker class for executing functions concurrently in a separate thread.
@@ -35,7 +35,7 @@ from iblrig.gui.tab_about import TabAbout
 from iblrig.gui.tab_data import TabData
 from iblrig.gui.tab_docs import TabDocs
 from iblrig.gui.tab_log import TabLog
-from iblrig.gui.tools import DiskSpaceIndicator, RemoteDevicesItemModel, Worker
+from iblrig.gui.tools import DiskSpaceIndicator, RemoteDevicesItemModel, SessionProgressReceiver, Worker
 from iblrig.gui.ui_login import Ui_login
 from iblrig.gui.ui_update import Ui_update
 from iblrig.gui.ui_wizard import Ui_wizard
@@ -44,9 +44,10 @@ from iblrig.gui.valve import ValveCalibrationDialog
 from iblrig.hardware import Bpod
 from iblrig.hardware_validation import Status
 from iblrig.misc import get_task_argument_parser
+from iblrig.net import control_task
 from iblrig.path_helper import load_pydantic_yaml
 from iblrig.pydantic_definitions import HardwareSettings, RigSettings
-from iblrig.raw_data_loaders import load_task_jsonable
+from iblrig.raw_data_loaders import load_task_trials_table
 from iblrig.tools import alyx_reachable, get_lab_location_dict, internet_available
 from iblrig.valve import Valve
 from iblrig.version_management import check_for_updates, get_changelog
@@ -289,7 +290,7 @@ class RigWizard(QtWidgets.QMainWindow, Ui_wizard):
     append_session: bool = False
     previous_subject: str | None = None
 
-    def __init__(self, debug: bool = False, remote_devices: bool = False):
+    def __init__(self, debug: bool = False, remote_devices: bool = False, prewarm: bool = False):
         super().__init__()
         self.setupUi(self)
 
@@ -362,10 +363,25 @@ class RigWizard(QtWidgets.QMainWindow, Ui_wizard):
         self.task_arguments = dict()
         self.task_settings_widgets = None
 
+        # optionally, a worker imports the selected task in the background, see iblrig.task_worker
+        self.prewarm = prewarm
+        self.prewarmed_task: tuple[Path, QtCore.QProcess] | None = None
+        self.uiComboTask.currentTextChanged.connect(self._prewarm_task)
+        self._prewarm_task()
+
         self.uiPushStart.installEventFilter(self)
+        self.uiPushStart.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.uiPushStart.customContextMenuRequested.connect(self._on_start_context_menu)
         self.uiPushStart.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
         self.uiPushPause.setIcon(self.style().standardIcon(QStyle.SP_MediaPause))
 
+        # live counters of the running session, fed by the progress records of the task
+        self.uiLabelProgress = QtWidgets.QLabel(self.uiGroupSessionControl)
+        self.uiLabelProgress.setAlignment(QtCore.Qt.AlignCenter)
+        self.verticalLayout.addWidget(self.uiLabelProgress)
+        self.session_progress = SessionProgressReceiver(self)
+        self.session_progress.recordReceived.connect(self._on_progress_record)
+
         self.controller2model()
 
         self.tabWidget.currentChanged.connect(self._on_switch_tab)
@@ -535,7 +551,7 @@ class RigWizard(QtWidgets.QMainWindow, Ui_wizard):
         if file_jsonable is None:
             QtWidgets.QMessageBox().critical(self, 'Error', f'No jsonable found in {session_path}')
             return
-        trials_table, _ = load_task_jsonable(file_jsonable)
+        trials_table = load_task_trials_table(file_jsonable)
         if trials_table.empty:
             QtWidgets.QMessageBox().critical(self, 'Error', f'No trials found in {session_path}')
             return
@@ -687,6 +703,7 @@ class RigWizard(QtWidgets.QMainWindow, Ui_wizard):
             self.toggle_status_led(is_toggled=True)
             bpod = Bpod(self.hardware_settings['device_bpod']['COM_BPOD'])  # bpod is a singleton
             bpod.close()
+            self._discard_prewarmed_task()
             event.accept()
 
         if self.running_task_process is None:
@@ -955,12 +972,43 @@ class RigWizard(QtWidgets.QMainWindow, Ui_wizard):
         match self.uiPushPause.isChecked():
             case True:
                 print('Pausing after current trial ...')
-                if self.model.session_folder.exists():
-                    self.model.session_folder.joinpath('.pause').touch()
+                self._control_task('pause')
             case False:
                 print('Resuming ...')
-                if self.model.session_folder.joinpath('.pause').exists():
-                    self.model.session_folder.joinpath('.pause').unlink()
+                self._control_task('resume')
+
+    def _control_task(self, command: str, value: int | None = None) -> dict | None:
+        """Send a command to the running task, falling back on the flag files if the task cannot be reached."""
+        if not self.model.session_folder:
+            return None
+        acknowledgement = control_task(self.model.session_folder, command, value)
+        if acknowledgement is None:
+            log.info(f'No acknowledgement of the {command} command, relayed by flag file')
+        elif acknowledgement['ok']:
+            self.tabLog.appendText(f'Task acknowledged {command} after trial {acknowledgement["trial_num"]}', 'White')
+        else:
+            log.error(acknowledgement.get('error'))
+        return acknowledgement
+
+    def _on_start_context_menu(self, position: QtCore.QPoint):
+        if self.uiPushStart.text() != 'Stop' or not self.uiPushStart.isEnabled():
+            return
+        menu = QtWidgets.QMenu(self)
+        action_stop_after = menu.addAction('Stop after a number of trials ...')
+        if menu.exec_(self.uiPushStart.mapToGlobal(position)) != action_stop_after:
+            return
+        dlg = QtWidgets.QInputDialog()
+        n_trials, ok = dlg.getInt(
+            self,
+            'Stop After',
+            'Stop the session once this number of trials is completed:',
+            value=1,
+            min=1,
+            max=10000,
+            flags=dlg.windowFlags() & ~QtCore.Qt.WindowContextHelpButtonHint,
+        )
+        if ok:
+            self._control_task('stop_after', n_trials)
 
     def start_stop(self):
         match self.uiPushStart.text():
@@ -1043,28 +1091,69 @@ class RigWizard(QtWidgets.QMainWindow, Ui_wizard):
                         cmd.extend([key, value])
                 cmd.extend(['--weight', f'{weight}'])
                 cmd.extend(['--log-level', 'DEBUG' if self.debug else 'INFO'])
+                cmd.extend(['--progress-port', str(self.session_progress.port)])
                 cmd.append('--wizard')
                 if self.append_session:
                     cmd.append('--append')
                 if self.running_task_process is None:
                     self.tabLog.clear()
+                    self.uiLabelProgress.clear()
                     self.tabLog.appendText(f'Starting subprocess: {self.model.task_name} ...\n', 'White')
                     log.info('Starting subprocess')
                     log.info(subprocess.list2cmdline(cmd))
-                    self.running_task_process = QtCore.QProcess()
-                    self.running_task_process.setWorkingDirectory(BASE_DIR)
-                    self.running_task_process.setProcessChannelMode(QtCore.QProcess.SeparateChannels)
+                    worker = self._take_prewarmed_task(self.model.task_file)
+                    self.running_task_process = worker or self._new_task_process()
                     self.running_task_process.finished.connect(self._on_task_finished)
                     self.running_task_process.readyReadStandardOutput.connect(self._on_read_standard_output)
                     self.running_task_process.readyReadStandardError.connect(self._on_read_standard_error)
-                    self.running_task_process.start(shutil.which('python'), cmd)
+                    if worker is None:
+                        self.running_task_process.start(shutil.which('python'), cmd)
+                    else:
+                        # the worker runs the session as soon as it receives the arguments
+                        log.info('Running the session in the pre-warmed task worker')
+                        self.running_task_process.write(f'{json.dumps(cmd[1:])}\n'.encode())
                 self.uiPushStart.setStatusTip('stop the session after the current trial')
                 self.uiPushStart.setIcon(self.style().standardIcon(QStyle.SP_MediaStop))
                 self.tabWidget.setCurrentIndex(self.tabWidget.indexOf(self.tabLog))
             case 'Stop':
                 self.uiPushStart.setEnabled(False)
-                if self.model.session_folder and self.model.session_folder.exists():
-                    self.model.session_folder.joinpath('.stop').touch()
+                self._control_task('stop')
+
+    @staticmethod
+    def _new_task_process() -> QtCore.QProcess:
+        process = QtCore.QProcess()
+        process.setWorkingDirectory(BASE_DIR)
+        process.setProcessChannelMode(QtCore.QProcess.SeparateChannels)
+        return process
+
+    def _prewarm_task(self, *_):
+        """Start a worker importing the selected task in the background, replacing the previous one."""
+        self._discard_prewarmed_task()
+        task_file = self.model.all_tasks.get(self.uiComboTask.currentText())
+        if not self.prewarm or self.running_task_process is not None or task_file is None:
+            return
+        worker = self._new_task_process()
+        worker.start(shutil.which('python'), ['-m', 'iblrig.task_worker', str(task_file)])
+        self.prewarmed_task = (task_file, worker)
+
+    def _take_prewarmed_task(self, task_file: Path) -> QtCore.QProcess | None:
+        """Return the worker pre-warmed for a task, None if there is none or if it exited."""
+        if self.prewarmed_task is None or self.prewarmed_task[0] != task_file:
+            return None
+        worker = self.prewarmed_task[1]
+        if worker.state() != QtCore.QProcess.Running:
+            self._discard_prewarmed_task()
+            return None
+        self.prewarmed_task = None
+        return worker
+
+    def _discard_prewarmed_task(self):
+        if self.prewarmed_task is not None:
+            # the worker is idle: no session is running in it
+            worker = self.prewarmed_task[1]
+            worker.kill()
+            worker.waitForFinished(1000)
+            self.prewarmed_task = None
 
     def _on_read_standard_output(self):
         """
@@ -1084,6 +1173,26 @@ class RigWizard(QtWidgets.QMainWindow, Ui_wizard):
         if self.debug:
             print(data)
 
+    def _on_progress_record(self, record: dict):
+        """Update the counters of the running session with a progress record of the task."""
+        match record.get('event'):
+            case 'started':
+                ntrials = record.get('ntrials')
+                self.uiLabelProgress.setText('Started' if ntrials is None else f'Started, {ntrials} trials max')
+            case 'trial':
+                counters = [f'Trial {record["trial_num"] + 1}']
+                if (ntrials_correct := record.get('ntrials_correct')) is not None:
+                    counters.append(f'{ntrials_correct / record["ntrials"]:.0%} correct')
+                counters.append(f'{record["water_delivered"]:.1f} μl')
+                counters.append(f'{int(record["time_elapsed"] // 60)}:{int(record["time_elapsed"] % 60):02d}')
+                self.uiLabelProgress.setText('\n'.join(counters))
+            case 'paused':
+                self.uiLabelProgress.setText(f'Paused after trial {record["trial_num"] + 1}')
+            case 'resumed':
+                self.uiLabelProgress.setText('Resumed')
+            case 'ended':
+                self.uiLabelProgress.setText(f'Ended: {record["ntrials"]} trials\n{record["water_delivered"]:.1f} μl')
+
     def _on_read_standard_error(self):
         """
         Read and process standard error entries.
@@ -1107,6 +1216,7 @@ class RigWizard(QtWidgets.QMainWindow, Ui_wizard):
             msg_box.exec_()
 
         self.running_task_process = None
+        self._prewarm_task()
 
         # re-enable UI elements
         self.uiPushStart.setText('Start')
@@ -1275,6 +1385,12 @@ def main():
     parser.add_argument(
         '-r', '--remote_devices', action='store_true', dest='remote_devices', help='show controls for remote devices'
     )
+    parser.add_argument(
+        '--prewarm',
+        action='store_true',
+        dest='prewarm',
+        help='import the selected task in a background process, to start sessions faster',
+    )
     args = parser.parse_args()
 
     if args.debug:
@@ -1290,7 +1406,7 @@ def main():
         ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(app_id)
     app = QtWidgets.QApplication(['', '--no-sandbox'])
     app.setStyle('Fusion')
-    w = RigWizard(debug=args.debug, remote_devices=args.remote_devices)
+    w = RigWizard(debug=args.debug, remote_devices=args.remote_devices, prewarm=args.prewarm)
     w.show()
     app.exec()
 
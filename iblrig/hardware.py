@@ -8,14 +8,14 @@ import struct
 import subprocess
 import threading
 import time
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from enum import IntEnum
 from pathlib import Path
 from typing import Annotated, Literal
 
 import numpy as np
 import serial
-import sounddevice as sd
 from annotated_types import Ge, Le
 from pydantic import PositiveFloat, PositiveInt, validate_call
 from serial.serialutil import SerialException
@@ -45,6 +45,8 @@ class Bpod(BpodIO):
     _instances = {}
     _lock = threading.RLock()
     _is_initialized = False
+    _last_state_machine_sent = None
+    _last_state_machine_timers = None
 
     def __new__(cls, *args, **kwargs):
         serial_port = args[0] if len(args) > 0 else ''
@@ -291,6 +293,30 @@ class Bpod(BpodIO):
         self.softcode_handler_function = original_softcode_handler
         return counter
 
+    def send_state_machine(self, sma: StateMachine, run_asap=None):
+        """
+        Send a state machine to the Bpod.
+
+        The Bpod runs the last state machine it received: sending is skipped if `sma` is a :class:`StateMachineTemplate`
+        that is identical to the last state machine sent, timers included.
+
+        Parameters
+        ----------
+        sma : StateMachine
+            The state machine.
+        run_asap : bool, optional
+            Run the state machine as soon as the previous one exits.
+        """
+        message = None
+        if isinstance(sma, StateMachineTemplate) and run_asap is None:
+            message = sma.build_message_32_bits()
+            if sma is self._last_state_machine_sent and message == self._last_state_machine_timers:
+                log.debug('State machine unchanged, skip sending')
+                return
+        super().send_state_machine(sma, run_asap=run_asap)
+        self._last_state_machine_sent = sma
+        self._last_state_machine_timers = message
+
     @static_vars(supported=True)
     def set_status_led(self, state: bool) -> bool:
         if self.can_control_led and self._arcom is not None:
@@ -324,6 +350,162 @@ class Bpod(BpodIO):
         self.softcode_handler_function = lambda code: softcode_dict[code]()
 
 
+class StateMachineRecorder:
+    """
+    Lightweight stand-in for a :class:`~pybpodapi.state_machine.StateMachine` that records its definition.
+
+    The recorded definition is compiled into a :class:`StateMachineTemplate` by :class:`StateMachineTemplates`. The state
+    timers are kept apart from the topology (states, transitions, output actions, global timers, counters and conditions)
+    so that trials that only differ by their timers share the same template.
+    """
+
+    def __init__(self):
+        self.definition: list[tuple] = []
+        self.state_timers: list[float] = []
+
+    @property
+    def topology(self) -> tuple:
+        """tuple: Hashable description of the state machine, excluding the state timers."""
+        return tuple(self.definition)
+
+    def add_state(self, state_name: str, state_timer: float = 0, state_change_conditions: dict | None = None, output_actions=()):
+        """Record a state, see :meth:`pybpodapi.state_machine.StateMachine.add_state`."""
+        conditions = () if state_change_conditions is None else tuple(state_change_conditions.items())
+        self.definition.append(('add_state', state_name, conditions, tuple(output_actions)))
+        self.state_timers.append(state_timer)
+
+    def _record(self, method: str, args: tuple, kwargs: dict) -> None:
+        self.definition.append((method, args, tuple(kwargs.items())))
+
+    def set_global_timer(self, *args, **kwargs):
+        """Record a global timer, see :meth:`pybpodapi.state_machine.StateMachine.set_global_timer`."""
+        self._record('set_global_timer', args, kwargs)
+
+    def set_global_timer_legacy(self, *args, **kwargs):
+        """Record a global timer, see :meth:`pybpodapi.state_machine.StateMachine.set_global_timer_legacy`."""
+        self._record('set_global_timer_legacy', args, kwargs)
+
+    def set_global_counter(self, *args, **kwargs):
+        """Record a global counter, see :meth:`pybpodapi.state_machine.StateMachine.set_global_counter`."""
+        self._record('set_global_counter', args, kwargs)
+
+    def set_condition(self, *args, **kwargs):
+        """Record a condition, see :meth:`pybpodapi.state_machine.StateMachine.set_condition`."""
+        self._record('set_condition', args, kwargs)
+
+
+class StateMachineTemplate(StateMachine):
+    """
+    State machine compiled from a :class:`StateMachineRecorder` whose topology is only serialized once.
+
+    The state timers of each trial are applied with :meth:`patch_state_timers`: sending the state machine then only
+    re-serializes the 32 bit part of the message that contains the timers.
+    """
+
+    def __init__(self, bpod, recorder: StateMachineRecorder):
+        super().__init__(bpod)
+        timers = iter(recorder.state_timers)
+        for method, *args in recorder.definition:
+            if method == 'add_state':
+                state_name, conditions, output_actions = args
+                self.add_state(state_name, next(timers), dict(conditions), list(output_actions))
+            else:
+                getattr(self, method)(*args[0], **dict(args[1]))
+        self._timer_indices = [self.manifest.index(d[1]) for d in recorder.definition if d[0] == 'add_state']
+        self._state_numbers_updated = False
+        self._message = None
+        self._message_global_timer = None
+        self._headers = {}
+        # serialize the topology
+        self.update_state_numbers()
+        self.build_message()
+        self.build_message_global_timer()
+
+    def patch_state_timers(self, state_timers: list[float]) -> None:
+        """
+        Set the state timers and rewind the state machine for a new trial.
+
+        Parameters
+        ----------
+        state_timers : list[float]
+            State timers in the order the states have been recorded.
+        """
+        for index, state_timer in zip(self._timer_indices, state_timers, strict=True):
+            self.state_timers[index] = state_timer
+        self.current_state = 0
+
+    def update_state_numbers(self):
+        if not self._state_numbers_updated:
+            super().update_state_numbers()
+            self._state_numbers_updated = True
+
+    def build_header(self, run_asap=None, statemachine_body_size=0):
+        key = (run_asap, statemachine_body_size)
+        if key not in self._headers:
+            self._headers[key] = super().build_header(run_asap, statemachine_body_size)
+        return self._headers[key]
+
+    def build_message(self):
+        if self._message is None:
+            self._message = super().build_message()
+        return self._message
+
+    def build_message_global_timer(self):
+        if self._message_global_timer is None:
+            self._message_global_timer = super().build_message_global_timer()
+        return self._message_global_timer
+
+
+class StateMachineTemplates:
+    """
+    Cache of state machine templates, keyed by topology.
+
+    The first trial of a given topology compiles its recorded definition into a :class:`StateMachineTemplate`. The
+    following trials with the same topology reuse the template and only patch the state timers.
+    """
+
+    def __init__(self, bpod):
+        """
+        Cache of state machine templates, keyed by topology.
+
+        Parameters
+        ----------
+        bpod : Bpod
+            The Bpod instance the state machines are sent to.
+        """
+        self.bpod = bpod
+        self.templates: dict[tuple, StateMachineTemplate] = {}
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def compile(self, sma: StateMachineRecorder | StateMachine) -> StateMachine:
+        """
+        Get the state machine corresponding to a recorded definition.
+
+        Parameters
+        ----------
+        sma : StateMachineRecorder or StateMachine
+            The recorded definition - actual state machines are returned unchanged.
+
+        Returns
+        -------
+        StateMachine
+            The template matching the topology of the recorded definition, with its state timers patched.
+        """
+        if not isinstance(sma, StateMachineRecorder):
+            return sma
+        topology = sma.topology
+        template = self.templates.get(topology)
+        if template is None:
+            template = StateMachineTemplate(self.bpod, sma)
+            self.templates[topology] = template
+            self.n_misses += 1
+        else:
+            template.patch_state_timers(sma.state_timers)
+            self.n_hits += 1
+        return template
+
+
 class RotaryEncoderModule(PybpodRotaryEncoderModule):
     _name = 'Rotary Encoder Module'
 
@@ -391,6 +573,8 @@ def sound_device_factory(output: Literal['xonar', 'harp', 'hifi', 'sysdefault']
     samplerate
         audio sample rate, defaults to 44100
     """
+    import sounddevice as sd
+
     match output:
         case 'xonar':
             samplerate = samplerate if samplerate is not None else 192000
@@ -419,6 +603,101 @@ def sound_device_factory(output: Literal['xonar', 'harp', 'hifi', 'sysdefault']
     return sd, samplerate, channels
 
 
+class HardwareStartupError(Exception):
+    """
+    Raised when devices fail to start, listing the failures and the devices that were not started.
+
+    Parameters
+    ----------
+    errors : dict of str, Exception
+        The exception raised by each device that failed to start.
+    skipped : list of str
+        The devices that were not started because of the failures.
+    durations : dict of str, float
+        The start-up time of each device that was started, in seconds.
+    """
+
+    def __init__(self, errors: dict[str, Exception], skipped: Sequence[str], durations: dict[str, float]):
+        self.errors = errors
+        self.skipped = list(skipped)
+        self.durations = durations
+        report = [f'{name}: {type(e).__name__}: {e}' for name, e in errors.items()]
+        report.extend(f'{name}: not started' for name in self.skipped)
+        super().__init__('Hardware start-up failed:\n' + '\n'.join(f'  - {line}' for line in report))
+
+
+def _timed_call(fcn: Callable[[], object]) -> tuple[float, Exception | None]:
+    t0 = time.perf_counter()
+    try:
+        fcn()
+    except Exception as e:
+        return time.perf_counter() - t0, e
+    return time.perf_counter() - t0, None
+
+
+def start_devices(
+    steps: dict[str, tuple[Callable[[], object], Sequence[str]]], max_workers: int | None = None
+) -> dict[str, float]:
+    """
+    Start devices concurrently, each device starting once the devices it depends on have started.
+
+    Once a device fails, no other device is started: the devices starting at that time are left to finish, as their
+    threads cannot be interrupted, after which a combined report of the failures is raised.
+
+    Parameters
+    ----------
+    steps : dict of str, tuple
+        For each device, the function starting it and the names of the devices it depends on.
+    max_workers : int, optional
+        The maximum number of devices starting at once, all of them by default.
+
+    Returns
+    -------
+    dict of str, float
+        The start-up time of each device in seconds, in order of completion.
+
+    Raises
+    ------
+    ValueError
+        The dependencies are unknown or circular.
+    HardwareStartupError
+        One or more devices failed to start.
+
+    Examples
+    --------
+    >>> start_devices({'bpod': (start_bpod, []), 'sound': (start_sound, ['bpod']), 'frame2ttl': (start_frame2ttl, [])})
+    """
+    if unknown := {d for _, dependencies in steps.values() for d in dependencies} - steps.keys():
+        raise ValueError(f'unknown dependencies: {", ".join(sorted(unknown))}')
+    pending = dict(steps)
+    running: dict[Future, str] = {}
+    durations: dict[str, float] = {}
+    errors: dict[str, Exception] = {}
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(steps), 1), thread_name_prefix='start_device') as executor:
+        while pending or running:
+            if not errors:
+                for name in [n for n, (_, dependencies) in pending.items() if all(d in durations for d in dependencies)]:
+                    running[executor.submit(_timed_call, pending.pop(name)[0])] = name
+            if not running:
+                if errors:
+                    break
+                raise ValueError(f'circular dependencies: {", ".join(pending)}')
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                duration, error = future.result()
+                if error is None:
+                    durations[name] = duration
+                    log.debug(f'{name} started in {duration:.2f} s')
+                else:
+                    errors[name] = error
+                    log.error(f'{name} failed to start after {duration:.2f} s', exc_info=error)
+    log.info('Hardware start-up times: ' + ', '.join(f'{name} {duration:.2f} s' for name, duration in durations.items()))
+    if errors:
+        raise HardwareStartupError(errors, pending, durations) from next(iter(errors.values()))
+    return durations
+
+
 def restart_com_port(regexp: str) -> bool:
     """
     Restart the communication port(s) matching the specified regular expression.
@@ -56,7 +56,15 @@ def get_task_argument_parser(parents: Sequence[argparse.ArgumentParser] = None):
         help='verbosity of the console logger (default: INFO)',
         choices=['NOTSET', 'DEBUG', 'INFO', 'WARN', 'ERROR', 'CRITICAL'],
     )
+    parser.add_argument(
+        '--random-seed',
+        dest='random_seed',
+        type=int,
+        default=None,
+        help='seed of the random draws of the session, as recorded in the task settings (default: drawn at random)',
+    )
     parser.add_argument('--wizard', dest='wizard', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--progress-port', dest='progress_port', type=int, default=None, help=argparse.SUPPRESS)
     return parser
 
 
@@ -143,7 +151,13 @@ def get_port_events(events: dict, name: str = '') -> list:
     return out
 
 
-def truncated_exponential(scale: float = 0.35, min_value: float = 0.2, max_value: float = 0.5) -> float:
+def truncated_exponential(
+    scale: float = 0.35,
+    min_value: float = 0.2,
+    max_value: float = 0.5,
+    size: int | None = None,
+    rng: np.random.Generator | None = None,
+) -> float | np.ndarray:
     """
     Generate a truncated exponential random variable within a specified range.
 
@@ -155,28 +169,26 @@ def truncated_exponential(scale: float = 0.35, min_value: float = 0.2, max_value
         Minimum value for the truncated range. Defaults to 0.2.
     max_value : float, optional
         Maximum value for the truncated range. Defaults to 0.5.
+    size : int, optional
+        Number of values to draw. If None (default), a single value is returned.
+    rng : numpy.random.Generator, optional
+        The random generator to draw from. Defaults to the global numpy random state.
 
     Returns
     -------
-    float
-        Truncated exponential random variable.
+    float or np.ndarray
+        Truncated exponential random variable(s).
 
     Notes
     -----
-    This function generates a random variable from an exponential distribution
-    with the specified `scale`. It then checks if the generated value is within
-    the specified range `[min_value, max_value]`. If it is within the range, it returns
-    the generated value; otherwise, it recursively generates a new value until it falls
-    within the specified range.
-
-    The `scale` should typically be greater than or equal to the `min_value` to avoid
-    potential issues with infinite recursion.
+    Values are drawn by inverse transform sampling of the exponential distribution with the specified `scale`,
+    conditioned on the range `[min_value, max_value]`. This yields the same distribution as drawing exponential values
+    until one falls within the range, without rejections.
     """
-    x = np.random.exponential(scale)
-    if min_value <= x <= max_value:
-        return x
-    else:
-        return truncated_exponential(scale, min_value, max_value)
+    rng = np.random if rng is None else rng
+    u = rng.random(size)
+    x = min_value - scale * np.log1p(-u * -np.expm1(-(max_value - min_value) / scale))
+    return float(x) if size is None else x
 
 
 def get_biased_probs(n: int, idx: int = -1, p_idx: float = 0.5) -> list[float]:
@@ -225,7 +237,9 @@ def draw_contrast(
     probability_type: Literal['skew_zero', 'biased', 'uniform'] = 'biased',
     idx: int = -1,
     idx_probability: float = 0.5,
-) -> float:
+    size: int | None = None,
+    rng: np.random.Generator | None = None,
+) -> float | np.ndarray:
     """
     Draw a contrast value from a given iterable based to the specified probability type.
 
@@ -242,22 +256,27 @@ def draw_contrast(
         Index for probability manipulation (with "skew_zero" or "biased"), default: -1.
     idx_probability : float, optional
         Probability for the specified index (with "skew_zero" or "biased"), default: 0.5.
+    size : int, optional
+        Number of values to draw. If None (default), a single value is returned.
+    rng : numpy.random.Generator, optional
+        The random generator to draw from. Defaults to the global numpy random state.
 
     Returns
     -------
-    float
-        The drawn contrast value.
+    float or np.ndarray
+        The drawn contrast value(s).
 
     Raises
     ------
     ValueError
         If an unsupported `probability_type` is provided.
     """
+    rng = np.random if rng is None else rng
     if probability_type in ['skew_zero', 'biased']:
         p = get_biased_probs(n=len(contrast_set), idx=idx, p_idx=idx_probability)
-        return np.random.choice(contrast_set, p=p)
+        return rng.choice(contrast_set, p=p, size=size)
     elif probability_type == 'uniform':
-        return np.random.choice(contrast_set)
+        return rng.choice(contrast_set, size=size)
     else:
         raise ValueError("Unsupported probability_type. Use 'skew_zero', 'biased', or 'uniform'.")
 
@@ -61,11 +61,15 @@ NB: use with causion: can cause infinite loops if both not correctly configured
 """
 
 import asyncio
+import contextlib
+import json
 import logging
+import socket
 import sys
 import threading
 import time
 from dataclasses import dataclass, field
+from pathlib import Path
 from urllib.parse import urlparse
 
 import yaml
@@ -81,6 +85,14 @@ from one.webclient import AlyxClient
 log = logging.getLogger(__name__)
 log.setLevel(10)
 
+TRIAL_CHANNEL_HOST = '127.0.0.1'
+TRIAL_CHANNEL_DATAGRAM_SIZE = 65_507  # maximum payload of a UDP datagram
+TRIAL_CHANNEL_SUBSCRIBE = b'subscribe'
+TRIAL_CHANNEL_UNSUBSCRIBE = b'unsubscribe'
+CONTROL_CHANNEL_FILE_NAME = '.control'  # holds the port of the control channel of the task running in a session folder
+CONTROL_CHANNEL_DATAGRAM_SIZE = 1024
+CONTROL_COMMANDS = ('pause', 'resume', 'stop', 'stop_after', 'status')
+
 
 class Auxiliaries:
     services = None
@@ -287,6 +299,463 @@ class Auxiliaries:
             return self._log[request_time]
 
 
+class TrialPublisher:
+    """
+    Push the trial records of a running task to local subscribers, e.g. the online plots.
+
+    The publisher binds a UDP socket on the loopback interface. Subscribers register by sending a `subscribe` datagram
+    to its port, and each published trial is sent to all registered subscribers as a JSON datagram. Registrations are
+    processed without blocking when a trial is published, so the task loop never waits on a subscriber.
+
+    Parameters
+    ----------
+    host : str
+        The address of the interface to bind to.
+    port : int
+        The port to bind to, by default an ephemeral port is chosen by the operating system.
+    """
+
+    def __init__(self, host: str = TRIAL_CHANNEL_HOST, port: int = 0):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, port))
+        self._socket.setblocking(False)
+        self.subscribers: set[tuple[str, int]] = set()
+
+    @property
+    def port(self) -> int:
+        """int: The port subscribers register to."""
+        return self._socket.getsockname()[1]
+
+    def _process_registrations(self) -> None:
+        while True:
+            try:
+                message, address = self._socket.recvfrom(TRIAL_CHANNEL_DATAGRAM_SIZE)
+            except BlockingIOError:
+                return
+            except ConnectionResetError:
+                # on Windows, an unreachable subscriber surfaces as an error on the next read
+                continue
+            if message == TRIAL_CHANNEL_SUBSCRIBE:
+                self.subscribers.add(address)
+            elif message == TRIAL_CHANNEL_UNSUBSCRIBE:
+                self.subscribers.discard(address)
+
+    def publish(self, trial_num: int, trial_data: dict, bpod_data: dict | None = None) -> bool:
+        """
+        Send a trial record to all subscribers.
+
+        The bpod events timestamps are not sent. If the record still exceeds the size of a datagram, only the trial
+        number is sent and subscribers are expected to read the trial from the task data file.
+
+        Parameters
+        ----------
+        trial_num : int
+            The trial number, starting at 0.
+        trial_data : dict
+            The validated trial data.
+        bpod_data : dict, optional
+            The bpod data of the trial.
+
+        Returns
+        -------
+        bool
+            True if the record was sent to at least one subscriber.
+        """
+        self._process_registrations()
+        if not self.subscribers:
+            return False
+        if bpod_data is not None:
+            bpod_data = {k: v for k, v in bpod_data.items() if k != 'Events timestamps'}
+        trial_data = {k: v for k, v in trial_data.items() if k != 'behavior_data'}
+        message = json.dumps({'trial_num': trial_num, 'trial_data': trial_data, 'bpod_data': bpod_data}).encode()
+        if len(message) > TRIAL_CHANNEL_DATAGRAM_SIZE:
+            message = json.dumps({'trial_num': trial_num}).encode()
+        for address in list(self.subscribers):
+            try:
+                self._socket.sendto(message, address)
+            except OSError as e:
+                log.debug('Removing trial subscriber %s:%i: %s', *address, e)
+                self.subscribers.discard(address)
+        return len(self.subscribers) > 0
+
+    def close(self) -> None:
+        """Close the socket."""
+        self._socket.close()
+
+
+class TrialSubscriber:
+    """
+    Receive the trial records pushed by a :class:`TrialPublisher`.
+
+    Parameters
+    ----------
+    port : int
+        The port of the publisher.
+    host : str
+        The address of the publisher.
+    """
+
+    def __init__(self, port: int, host: str = TRIAL_CHANNEL_HOST):
+        self.address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, 0))
+        self.is_registered = False
+        """bool: True once a record has been received from the publisher."""
+        self.subscribe()
+
+    def subscribe(self) -> None:
+        """Register to the publisher - this is repeated by `receive` until the first record arrives."""
+        try:
+            self._socket.sendto(TRIAL_CHANNEL_SUBSCRIBE, self.address)
+        except OSError as e:
+            log.debug('Failed to subscribe to trial publisher: %s', e)
+
+    def receive(self, timeout: float = 0) -> list[tuple[int, dict | None, dict | None]]:
+        """
+        Receive the pending trial records.
+
+        Parameters
+        ----------
+        timeout : float
+            Time to wait for a first record in seconds.
+
+        Returns
+        -------
+        list of tuple
+            The trial number, the trial data and the bpod data of every record received. The trial and bpod data are
+            None if the record was too large to be pushed.
+        """
+        if not self.is_registered:
+            self.subscribe()
+        records = []
+        self._socket.settimeout(timeout)
+        while True:
+            try:
+                message, _ = self._socket.recvfrom(TRIAL_CHANNEL_DATAGRAM_SIZE)
+            except (TimeoutError, BlockingIOError, ConnectionResetError):
+                break
+            record = json.loads(message)
+            records.append((record['trial_num'], record.get('trial_data'), record.get('bpod_data')))
+            self.is_registered = True
+            self._socket.setblocking(False)
+        return records
+
+    def close(self) -> None:
+        """Unregister from the publisher and close the socket."""
+        with contextlib.suppress(OSError):
+            self._socket.sendto(TRIAL_CHANNEL_UNSUBSCRIBE, self.address)
+        self._socket.close()
+
+
+class TaskControl:
+    """
+    Receive the pause, resume and stop commands of a running task.
+
+    Once started, a background thread receives the commands sent by :class:`TaskControlClient` on a UDP socket bound to
+    the loopback interface, and acknowledges each of them immediately with the state of the task. The port is written
+    to the `.control` file of the session folder for clients to find it.
+
+    The `.pause` and `.stop` flag files of the session folder remain supported for clients that cannot reach the task,
+    e.g. before the control channel is started: the task is paused while the pause flag exists and stops once the stop
+    flag exists. The flags are polled every `poll_interval` seconds while the task is paused.
+
+    Parameters
+    ----------
+    session_folder : Path
+        The session folder, holding the flag files and the control file.
+    host : str
+        The address of the interface to bind to.
+    poll_interval : float
+        The interval at which the flag files are checked while paused, in seconds.
+    """
+
+    def __init__(self, session_folder: Path, host: str = TRIAL_CHANNEL_HOST, poll_interval: float = 1.0):
+        self.session_folder = Path(session_folder)
+        self.host = host
+        self.poll_interval = poll_interval
+        self.trial_num = -1
+        """int: The number of the last completed trial, reported in the acknowledgements."""
+        self.stop_after: int | None = None
+        """int: The number of trials after which the task stops, None to run all trials."""
+        self._paused = False
+        self._stop = False
+        self._condition = threading.Condition()
+        self._socket: socket.socket | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def flag_pause(self) -> Path:
+        return self.session_folder.joinpath('.pause')
+
+    @property
+    def flag_stop(self) -> Path:
+        return self.session_folder.joinpath('.stop')
+
+    @property
+    def port(self) -> int | None:
+        """int: The port of the control channel, None if not started."""
+        return None if self._socket is None else self._socket.getsockname()[1]
+
+    @property
+    def paused(self) -> bool:
+        """bool: True if the task is to pause after the current trial."""
+        return self._paused or self.flag_pause.exists()
+
+    @property
+    def stop_requested(self) -> bool:
+        """bool: True if the task is to stop after the current trial."""
+        if self._stop or (self.stop_after is not None and self.trial_num + 1 >= self.stop_after):
+            return True
+        return self.flag_stop.exists()
+
+    @property
+    def state(self) -> dict:
+        """dict: The state of the task reported in the acknowledgements."""
+        return {'trial_num': self.trial_num, 'paused': self.paused, 'stop': self.stop_requested, 'stop_after': self.stop_after}
+
+    def start(self) -> None:
+        """Bind the socket, write the control file and start receiving commands."""
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((self.host, 0))
+        self._socket.settimeout(0.1)
+        self.session_folder.joinpath(CONTROL_CHANNEL_FILE_NAME).write_text(str(self.port))
+        self._thread = threading.Thread(target=self._listen, name='task_control', daemon=True)
+        self._thread.start()
+
+    def _listen(self) -> None:
+        sock = self._socket
+        while self._socket is not None:
+            try:
+                message, address = sock.recvfrom(CONTROL_CHANNEL_DATAGRAM_SIZE)
+            except (TimeoutError, ConnectionResetError):
+                continue
+            except OSError:  # the socket was closed
+                return
+            try:
+                request = json.loads(message)
+                acknowledgement = self.handle(request['command'], request.get('value'))
+                acknowledgement['id'] = request.get('id')
+            except (ValueError, KeyError, TypeError) as e:
+                acknowledgement = {'ok': False, 'error': f'invalid request: {e}'}
+            with contextlib.suppress(OSError):
+                sock.sendto(json.dumps(acknowledgement).encode(), address)
+
+    def handle(self, command: str, value: int | None = None) -> dict:
+        """
+        Apply a command and wake up the task if it is paused.
+
+        Parameters
+        ----------
+        command : str
+            One of 'pause', 'resume', 'stop', 'stop_after' or 'status'.
+        value : int, optional
+            The number of trials for the 'stop_after' command.
+
+        Returns
+        -------
+        dict
+            The acknowledgement: the command, whether it was applied and the state of the task.
+        """
+        with self._condition:
+            match command:
+                case 'pause':
+                    self._paused = True
+                case 'resume':
+                    self._paused = False
+                    self.flag_pause.unlink(missing_ok=True)
+                case 'stop':
+                    self._stop = True
+                case 'stop_after':
+                    self.stop_after = None if value is None else int(value)
+                case 'status':
+                    pass
+                case _:
+                    return {'command': command, 'ok': False, 'error': f'unknown command {command!r}', **self.state}
+            log.debug('Task control command: %s %s', command, '' if value is None else value)
+            self._condition.notify_all()
+            return {'command': command, 'ok': True, **self.state}
+
+    def wait_while_paused(self) -> None:
+        """Block while the task is paused, until resumed or stopped."""
+        with self._condition:
+            while self.paused and not self.stop_requested:
+                self._condition.wait(self.poll_interval)
+
+    def wait_for_stop(self, timeout: float) -> bool:
+        """Block until a stop is requested or the timeout expires, return True if a stop was requested."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._stop, timeout)
+            return self.stop_requested
+
+    def clear_stop(self) -> None:
+        """Discard the stop request and the stop flag, once the task stopped or before it starts."""
+        with self._condition:
+            self._stop = False
+            self.flag_stop.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """Stop receiving commands, close the socket and remove the control file."""
+        if self._socket is None:
+            return
+        sock, self._socket = self._socket, None
+        self._thread.join()
+        sock.close()
+        self.session_folder.joinpath(CONTROL_CHANNEL_FILE_NAME).unlink(missing_ok=True)
+
+
+class TaskControlClient:
+    """
+    Send the pause, resume and stop commands to a task listening on a :class:`TaskControl` channel.
+
+    Parameters
+    ----------
+    port : int
+        The port of the control channel.
+    host : str
+        The address of the control channel.
+    timeout : float
+        Time to wait for an acknowledgement in seconds.
+    """
+
+    def __init__(self, port: int, host: str = TRIAL_CHANNEL_HOST, timeout: float = 0.5):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((host, 0))
+        self._request_id = 0
+
+    @classmethod
+    def from_session_folder(cls, session_folder: Path, **kwargs) -> 'TaskControlClient | None':
+        """Connect to the task running in a session folder, return None if it has no control channel."""
+        try:
+            port = int(Path(session_folder).joinpath(CONTROL_CHANNEL_FILE_NAME).read_text())
+        except (OSError, ValueError):
+            return None
+        return cls(port, **kwargs)
+
+    def send(self, command: str, value: int | None = None) -> dict | None:
+        """
+        Send a command and wait for its acknowledgement.
+
+        Parameters
+        ----------
+        command : str
+            One of 'pause', 'resume', 'stop', 'stop_after' or 'status'.
+        value : int, optional
+            The number of trials for the 'stop_after' command.
+
+        Returns
+        -------
+        dict, None
+            The acknowledgement of the task, see :meth:`TaskControl.handle`, None if it was not received in time.
+        """
+        self._request_id += 1
+        message = json.dumps({'command': command, 'value': value, 'id': self._request_id}).encode()
+        deadline = time.perf_counter() + self.timeout
+        try:
+            self._socket.sendto(message, self.address)
+            while (timeout := deadline - time.perf_counter()) > 0:
+                self._socket.settimeout(timeout)
+                acknowledgement = json.loads(self._socket.recvfrom(CONTROL_CHANNEL_DATAGRAM_SIZE)[0])
+                # acknowledgements of requests that timed out previously are discarded
+                if acknowledgement.get('id') == self._request_id:
+                    return acknowledgement
+        except (TimeoutError, OSError) as e:
+            log.debug('No acknowledgement of the %s command: %s', command, e)
+        return None
+
+    def close(self) -> None:
+        """Close the socket."""
+        self._socket.close()
+
+
+def control_task(session_folder: Path, command: str, value: int | None = None) -> dict | None:
+    """
+    Send a command to the task running in a session folder, falling back on the flag files.
+
+    Parameters
+    ----------
+    session_folder : Path
+        The session folder of the task.
+    command : str
+        One of 'pause', 'resume', 'stop', 'stop_after' or 'status'.
+    value : int, optional
+        The number of trials for the 'stop_after' command.
+
+    Returns
+    -------
+    dict, None
+        The acknowledgement of the task, None if the task could not be reached. In that case the pause and stop
+        commands are relayed by the flag files, which the task checks after each trial.
+    """
+    assert command in CONTROL_COMMANDS, f'unknown command {command!r}'
+    session_folder = Path(session_folder)
+    if (client := TaskControlClient.from_session_folder(session_folder)) is not None:
+        try:
+            if (acknowledgement := client.send(command, value)) is not None:
+                return acknowledgement
+        finally:
+            client.close()
+    if not session_folder.exists():
+        return None
+    match command:
+        case 'pause':
+            session_folder.joinpath('.pause').touch()
+        case 'resume':
+            session_folder.joinpath('.pause').unlink(missing_ok=True)
+        case 'stop':
+            session_folder.joinpath('.stop').touch()
+        case 'stop_after':
+            log.warning('The task could not be reached: the stop after %s trials command was not sent', value)
+    return None
+
+
+class ProgressPublisher:
+    """
+    Send the progress of a running task to the process that launched it, e.g. the wizard.
+
+    Each record is a JSON object sent as a datagram to a UDP port of the loopback interface, with the name of the event
+    and the time at which it was sent: the lifecycle events of the session ('started', 'paused', 'resumed', 'ended')
+    and one 'trial' record per completed trial holding the counters of the session. Records are sent without waiting
+    for the receiver and are lost if nobody listens. Without a port, nothing is sent.
+
+    Parameters
+    ----------
+    port : int, optional
+        The port of the receiver.
+    host : str
+        The address of the receiver.
+    """
+
+    def __init__(self, port: int | None = None, host: str = TRIAL_CHANNEL_HOST):
+        self.address = None if port is None else (host, int(port))
+        self._socket = None if port is None else socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def emit(self, event: str, **fields) -> None:
+        """
+        Send a record.
+
+        Parameters
+        ----------
+        event : str
+            The name of the event.
+        **fields
+            The content of the record, JSON serializable.
+        """
+        if self._socket is None:
+            return
+        try:
+            self._socket.sendto(json.dumps({'event': event, 'time': time.time(), **fields}).encode(), self.address)
+        except OSError as e:
+            log.debug('Failed to send the %s progress record: %s', event, e)
+
+    def close(self) -> None:
+        """Close the socket."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
 def install_alyx_token(base_url, token):
     """Save Alyx token sent from remote device.
 
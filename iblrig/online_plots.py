@@ -4,16 +4,13 @@ import logging
 import time
 from pathlib import Path
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from pandas.api.types import CategoricalDtype
 
 import one.alf.io
 from iblrig.choiceworld import get_subject_training_info
-from iblrig.misc import online_std
-from iblrig.raw_data_loaders import load_task_jsonable
+from iblrig.net import TrialSubscriber
+from iblrig.raw_data_loaders import TaskJsonableReader, load_task_jsonable
 from iblutil.util import Bunch
 
 NTRIALS_INIT = 2000
@@ -22,19 +19,21 @@ CONTRAST_SET = np.array([0, 1 / 16, 1 / 8, 1 / 4, 1 / 2, 1])  # used as a defaul
 PROBABILITY_SET = np.array([0.2, 0.5, 0.8])  # used as a default if instantiated without settings
 # if the mouse does less than 400 trials in the first 45mins it's disengaged
 ENGAGED_CRITIERION = {'secs': 45 * 60, 'trial_count': 400}
+FRAME_TIME_BUDGET_SECS = 0.05  # average time allowed to redraw the figure after a trial
+LAST_TRIALS_FIELDS = ['correct', 'signed_contrast', 'stim_on', 'play_tone', 'reward_time', 'error_time', 'response_time']
 
 log = logging.getLogger(__name__)
-sns.set_style('darkgrid')
 
 
 class DataModel:
     """
-    The data model is a pure numpy / pandas container for the choice world task.
+    The data model is a pure numpy container for the choice world task.
     It contains:
-    - a psychometrics dataframe that contains the count / choice and response time
-    per signed contrast and block contingency
-    - a last trials dataframe that contains 20 trials worth of data for the timeline view
+    - dense (block probability x signed contrast) arrays with the count and the running mean and variance of the
+    choice and response time, updated with Welford's online algorithm
+    - a ring buffer with the last 20 trials worth of data for the timeline view
     - various counters such as ntrials and water delivered
+    The psychometrics and last trials dataframes are built from the arrays on demand.
     """
 
     task_settings = None
@@ -51,10 +50,6 @@ class DataModel:
 
     def __init__(self, settings_file: Path | None):
         self.session_path = one.alf.files.get_session_path(settings_file) or ''
-        self.last_trials = pd.DataFrame(
-            columns=['correct', 'signed_contrast', 'stim_on', 'play_tone', 'reward_time', 'error_time', 'response_time'],
-            index=np.arange(NTRIALS_PLOT),
-        )
         if settings_file is not None and settings_file.exists():
             # most of the IBL tasks have a predefined set of probabilities (0.2, 0.5, 0.8), but in the
             # case of the advanced choice world task, the probabilities are defined in the task settings
@@ -68,25 +63,38 @@ class DataModel:
                 f'Settings file not found - using default probabilities {self.probability_set} and contrasts {CONTRAST_SET}'
             )
 
-        # instantiate the psychometrics dataframe
-        signed_contrasts = np.r_[-np.flipud(np.unique(np.abs(self.contrast_set))[1:]), np.unique(np.abs(self.contrast_set))]
-        self.psychometrics = pd.DataFrame(
-            columns=['count', 'response_time', 'choice', 'response_time_std', 'choice_std'],
-            index=pd.MultiIndex.from_product([self.probability_set, signed_contrasts]),
-        )
-        self.psychometrics['count'] = 0
-        self.trials_table = pd.DataFrame(columns=['response_time'], index=np.arange(NTRIALS_INIT))
-
-        # for the trials plots this is the background image showing green if correct, red if incorrect
-        self.rgb_background = np.ones((NTRIALS_PLOT, 1, 3), dtype=np.uint8) * 229
-        self.rgb_background[self.last_trials.correct == False, 0, 0] = 255  # noqa
-        self.rgb_background[self.last_trials.correct == True, 0, 1] = 255  # noqa
-        # keep the last contrasts as a 20 by 2 array
-        ileft = np.where(self.last_trials.signed_contrast < 0)[0]  # negative position is left
-        iright = np.where(self.last_trials.signed_contrast > 0)[0]
-        self.last_contrasts = np.zeros((NTRIALS_PLOT, 2))
-        self.last_contrasts[ileft, 0] = np.abs(self.last_trials.signed_contrast[ileft])
-        self.last_contrasts[iright, 1] = np.abs(self.last_trials.signed_contrast[iright])
+        # instantiate the psychometrics arrays: the first axis of the statistics is (response time, choice)
+        self.probabilities = np.array(self.probability_set, dtype=float)
+        self.signed_contrasts = np.r_[
+            -np.flipud(np.unique(np.abs(self.contrast_set))[1:]), np.unique(np.abs(self.contrast_set))
+        ].astype(float)
+        self._index_psychometrics()
+        self._count = np.zeros((self.probabilities.size, self.signed_contrasts.size), dtype=np.int64)
+        self._mean = np.zeros((2, *self._count.shape))
+        self._m2 = np.zeros((2, *self._count.shape))
+        self._response_times = np.full(NTRIALS_INIT, np.nan)
+
+        # the last trials are kept in a ring buffer, self._ilast being the position of the oldest trial
+        self._last_trials = np.full((NTRIALS_PLOT, len(LAST_TRIALS_FIELDS)), np.nan)
+        self._ilast = 0
+
+    def _index_psychometrics(self) -> None:
+        self._iprobability = {p: i for i, p in enumerate(self.probabilities)}
+        self._icontrast = {c: j for j, c in enumerate(self.signed_contrasts)}
+
+    def _psychometrics_cell(self, probability: float, signed_contrast: float) -> tuple[int, int]:
+        """Return the indices of a block probability and signed contrast, extending the arrays for unexpected values."""
+        if probability not in self._iprobability:
+            i = self.probabilities.size
+            self.probabilities = np.insert(self.probabilities, i, probability)
+            self._count, self._mean, self._m2 = (np.insert(a, i, 0, axis=-2) for a in (self._count, self._mean, self._m2))
+            self._index_psychometrics()
+        if signed_contrast not in self._icontrast:
+            j = np.searchsorted(self.signed_contrasts, signed_contrast)
+            self.signed_contrasts = np.insert(self.signed_contrasts, j, signed_contrast)
+            self._count, self._mean, self._m2 = (np.insert(a, j, 0, axis=-1) for a in (self._count, self._mean, self._m2))
+            self._index_psychometrics()
+        return self._iprobability[probability], self._icontrast[signed_contrast]
 
     def update_trial(self, trial_data, bpod_data) -> None:
         # update counters
@@ -98,48 +106,93 @@ class DataModel:
         self.ntrials_correct += trial_data.trial_correct
         signed_contrast = np.sign(trial_data['position']) * trial_data['contrast']
         choice = trial_data.position > 0 if trial_data.trial_correct else trial_data.position < 0
-        self.trials_table.at[self.ntrials, 'response_time'] = trial_data.response_time
-
-        # update psychometrics using online statistics method
-        indexer = (trial_data.stim_probability_left, signed_contrast)
-        if indexer not in self.psychometrics.index:
-            self.psychometrics.loc[indexer, :] = np.nan
-            self.psychometrics.loc[indexer, ('count')] = 0
-        self.psychometrics.loc[indexer, ('count')] += 1
-        self.psychometrics.loc[indexer, ('response_time')], self.psychometrics.loc[indexer, ('response_time_std')] = online_std(
-            new_sample=trial_data.response_time,
-            new_count=self.psychometrics.loc[indexer, ('count')],
-            old_mean=self.psychometrics.loc[indexer, ('response_time')],
-            old_std=self.psychometrics.loc[indexer, ('response_time_std')],
-        )
-        self.psychometrics.loc[indexer, ('choice')], self.psychometrics.loc[indexer, ('choice_std')] = online_std(
-            new_sample=float(choice),
-            new_count=self.psychometrics.loc[indexer, ('count')],
-            old_mean=self.psychometrics.loc[indexer, ('choice')],
-            old_std=self.psychometrics.loc[indexer, ('choice_std')],
-        )
-        # update last trials table
-        self.last_trials = self.last_trials.shift(-1)
-        i = NTRIALS_PLOT - 1
-        self.last_trials.at[i, 'correct'] = trial_data.trial_correct
-        self.last_trials.at[i, 'signed_contrast'] = signed_contrast
-        self.last_trials.at[i, 'stim_on'] = bpod_data['States timestamps'].get('stim_on', [[np.nan]])[0][0]
-        self.last_trials.at[i, 'play_tone'] = bpod_data['States timestamps'].get('play_tone', [[np.nan]])[0][0]
-        self.last_trials.at[i, 'reward_time'] = bpod_data['States timestamps'].get('reward', [[np.nan]])[0][0]
-        self.last_trials.at[i, 'error_time'] = bpod_data['States timestamps'].get('error', [[np.nan]])[0][0]
-        self.last_trials.at[i, 'response_time'] = trial_data.response_time
-        # update rgb image
-        self.rgb_background = np.roll(self.rgb_background, -1, axis=0)
-        self.rgb_background[-1] = np.array([0, 255, 0]) if trial_data.trial_correct else np.array([255, 0, 0])
-        # update contrasts
-        self.last_contrasts = np.roll(self.last_contrasts, -1, axis=0)
-        self.last_contrasts[-1, :] = 0
-        self.last_contrasts[-1, int(self.last_trials.signed_contrast.iloc[-1] > 0)] = abs(
-            self.last_trials.signed_contrast.iloc[-1]
+        if self.ntrials > self._response_times.size:
+            self._response_times = np.r_[self._response_times, np.full(self._response_times.size, np.nan)]
+        self._response_times[self.ntrials - 1] = trial_data.response_time
+
+        # update psychometrics using Welford's online algorithm
+        i, j = self._psychometrics_cell(trial_data.stim_probability_left, signed_contrast)
+        self._count[i, j] += 1
+        samples = np.array([trial_data.response_time, float(choice)])
+        delta = samples - self._mean[:, i, j]
+        self._mean[:, i, j] += delta / self._count[i, j]
+        self._m2[:, i, j] += delta * (samples - self._mean[:, i, j])
+
+        # overwrite the oldest trial of the ring buffer
+        states = bpod_data['States timestamps']
+        self._last_trials[self._ilast] = (
+            trial_data.trial_correct,
+            signed_contrast,
+            states.get('stim_on', [[np.nan]])[0][0],
+            states.get('play_tone', [[np.nan]])[0][0],
+            states.get('reward', [[np.nan]])[0][0],
+            states.get('error', [[np.nan]])[0][0],
+            trial_data.response_time,
         )
+        self._ilast = (self._ilast + 1) % NTRIALS_PLOT
         self.ntrials_nan = self.ntrials if self.ntrials > 0 else np.nan
         self.percent_correct = self.ntrials_correct / self.ntrials_nan * 100
 
+    def psychometric_curve(self, probability: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the psychometric and reaction time curves of a block probability.
+
+        Parameters
+        ----------
+        probability : float
+            The block probability of the stimulus appearing on the left.
+
+        Returns
+        -------
+        numpy.ndarray
+            The signed contrasts that were presented at least once.
+        numpy.ndarray
+            The mean choice for each signed contrast.
+        numpy.ndarray
+            The mean response time for each signed contrast.
+        """
+        if (i := self._iprobability.get(probability)) is None:
+            return np.array([]), np.array([]), np.array([])
+        iok = self._count[i] > 0
+        return self.signed_contrasts[iok], self._mean[1, i, iok], self._mean[0, i, iok]
+
+    @property
+    def psychometrics(self) -> pd.DataFrame:
+        """pandas.DataFrame: Count, mean and standard deviation of choice and response time per probability and contrast."""
+        count = np.where(self._count > 0, self._count, np.nan)
+        mean = np.where(self._count > 0, self._mean, np.nan)
+        std = np.sqrt(self._m2 / count)
+        return pd.DataFrame(
+            {
+                'count': self._count.flatten(),
+                'response_time': mean[0].flatten(),
+                'choice': mean[1].flatten(),
+                'response_time_std': std[0].flatten(),
+                'choice_std': std[1].flatten(),
+            },
+            index=pd.MultiIndex.from_product([self.probabilities, self.signed_contrasts]),
+        )
+
+    @property
+    def last_trials(self) -> pd.DataFrame:
+        """pandas.DataFrame: The last 20 trials, from the oldest to the most recent."""
+        return pd.DataFrame(np.roll(self._last_trials, -self._ilast, axis=0), columns=LAST_TRIALS_FIELDS)
+
+    @property
+    def rgb_background(self) -> np.ndarray:
+        """numpy.ndarray: The background image of the trials plot, green if correct, red if incorrect."""
+        correct = np.roll(self._last_trials[:, 0], -self._ilast)
+        rgb_background = np.ones((NTRIALS_PLOT, 1, 3), dtype=np.uint8) * 229
+        rgb_background[correct == 1, 0] = [0, 255, 0]
+        rgb_background[correct == 0, 0] = [255, 0, 0]
+        return rgb_background
+
+    @property
+    def last_contrasts(self) -> np.ndarray:
+        """numpy.ndarray: The contrasts of the last trials as a 20 by 2 array, left and right."""
+        signed_contrast = np.nan_to_num(np.roll(self._last_trials[:, 1], -self._ilast))
+        return np.c_[np.abs(np.minimum(signed_contrast, 0)), np.maximum(signed_contrast, 0)]
+
     def compute_end_session_criteria(self):
         """Implement critera to change the color of the figure display, according to the specifications of the task."""
         colour = {'red': '#eb5757', 'green': '#57eb8b', 'yellow': '#ede34e', 'white': '#ffffff'}
@@ -153,7 +206,7 @@ class DataModel:
         elif self.ntrials_engaged <= ENGAGED_CRITIERION['trial_count']:
             return colour['green']
         # the subject reaction time over the last 20 trials is more than 5 times greater than the overall reaction time
-        elif (self.trials_table['response_time'][: self.ntrials].median() * 5) < self.last_trials['response_time'].median():
+        elif (np.nanmedian(self._response_times[: self.ntrials]) * 5) < np.nanmedian(self._last_trials[:, -1]):
             return colour['yellow']
         # 90 > time > 45 min and subject's avg response time hasn't significantly decreased
         else:
@@ -171,6 +224,11 @@ class OnlinePlots:
     """
 
     def __init__(self, settings_file=None):
+        # the graphics libraries are only imported with the figure, the data model does not need them
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        sns.set_style('darkgrid')
         settings_file = Path(settings_file) if settings_file is not None else None
         self.data = DataModel(settings_file=settings_file)
 
@@ -204,56 +262,79 @@ class OnlinePlots:
         # create psych curves
         h.curve_psych = {}
         h.curve_reaction = {}
+        psychometrics = self.data.psychometrics
         for p in self.data.probability_set:
             h.curve_psych[p] = h.ax_psych.plot(
-                self.data.psychometrics.loc[p].index,
-                self.data.psychometrics.loc[p]['choice'],
+                psychometrics.loc[p].index,
+                psychometrics.loc[p]['choice'],
                 '.-',
                 zorder=10,
                 clip_on=False,
                 label=f'p = {p}',
             )
             h.curve_reaction[p] = h.ax_reaction.plot(
-                self.data.psychometrics.loc[p].index, self.data.psychometrics.loc[p]['response_time'], '.-', label=f'p = {p}'
+                psychometrics.loc[p].index, psychometrics.loc[p]['response_time'], '.-', label=f'p = {p}'
             )
-        h.ax_psych.legend()
-        h.ax_reaction.legend()
+        h.ax_psych.legend(loc='upper left')
+        h.ax_reaction.legend(loc='upper left')
 
         # create the two bars on the right side
         h.bar_correct = h.ax_performance.bar(0, self.data.percent_correct, label='correct', color='k')
         h.bar_water = h.ax_water.bar(0, self.data.water_delivered, label='water delivered', color='b')
 
         # create the trials timeline view in a single axis
+        last_trials = self.data.last_trials
         xpos = np.tile([[-3.75, -1.25]], (NTRIALS_PLOT, 1)).T.flatten()
         ypos = np.tile(np.arange(NTRIALS_PLOT), 2)
-        h.im_trials = h.ax_trials.imshow(
-            self.data.rgb_background, alpha=0.2, extent=[-10, 50, -0.5, NTRIALS_PLOT - 0.5], aspect='auto', origin='lower'
+        # the trial outcomes are shown as one rectangle per trial, which can be blitted as opposed to an image
+        h.bars_trials = h.ax_trials.barh(
+            np.arange(NTRIALS_PLOT), 60, left=-10, height=1, color=self.data.rgb_background[:, 0] / 255, alpha=0.2, linewidth=0
         )
+        h.ax_trials.set_ylim(-0.5, NTRIALS_PLOT - 0.5)
         kwargs = dict(markersize=10, markeredgewidth=2)
         h.lines_trials = {
             'stim_on': h.ax_trials.plot(
-                self.data.last_trials.stim_on, np.arange(NTRIALS_PLOT), '|', color='b', **kwargs, label='stimulus on'
+                last_trials.stim_on, np.arange(NTRIALS_PLOT), '|', color='b', **kwargs, label='stimulus on'
             ),
             'reward_time': h.ax_trials.plot(
-                self.data.last_trials.reward_time, np.arange(NTRIALS_PLOT), '|', color='g', **kwargs, label='reward'
+                last_trials.reward_time, np.arange(NTRIALS_PLOT), '|', color='g', **kwargs, label='reward'
             ),
             'error_time': h.ax_trials.plot(
-                self.data.last_trials.error_time, np.arange(NTRIALS_PLOT), '|', color='r', **kwargs, label='error'
-            ),
-            'play_tone': h.ax_trials.plot(
-                self.data.last_trials.play_tone, np.arange(NTRIALS_PLOT), '|', color='m', **kwargs, label='tone'
+                last_trials.error_time, np.arange(NTRIALS_PLOT), '|', color='r', **kwargs, label='error'
             ),
+            'play_tone': h.ax_trials.plot(last_trials.play_tone, np.arange(NTRIALS_PLOT), '|', color='m', **kwargs, label='tone'),
         }
         h.scatter_contrast = h.ax_trials.scatter(
             xpos, ypos, s=250, c=self.data.last_contrasts.T.flatten(), alpha=1, marker='o', vmin=0.0, vmax=1, cmap='Greys'
         )
-        h.ax_trials.legend()
+        h.ax_trials.legend(loc='upper right')
 
         xticks = np.arange(-1, 1.1, 0.25)
         xticklabels = np.array([f'{x:g}' for x in xticks])
         xticklabels[1::2] = ''
         h.ax_psych.set_xticks(xticks, xticklabels)
 
+        # the artists updated after each trial are blitted onto a cached background of the static figure
+        h.animated_artists = [
+            h.fig_title,
+            h.ax_performance.title,
+            h.ax_water.title,
+            *h.bars_trials,
+            *[line for p in self.data.probability_set for line in (h.curve_psych[p][0], h.curve_reaction[p][0])],
+            *[lines[0] for lines in h.lines_trials.values()],
+            h.scatter_contrast,
+            h.bar_correct[0],
+            h.bar_water[0],
+        ]
+        self._blit = h.fig.canvas.supports_blit
+        self._background = None
+        self._stale = False
+        self.frame_time = Bunch({'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+        if self._blit:
+            for artist in h.animated_artists:
+                artist.set_animated(True)
+            h.fig.canvas.mpl_connect('draw_event', self._on_draw)
+
         self.h = h
         self.update_titles()
         if plt.rcParams['backend'] != 'agg':
@@ -286,29 +367,65 @@ class OnlinePlots:
         self.data.update_trial(trial_data, bpod_data)
         self.update_graphics(pupdate=trial_data.stim_probability_left)
 
+    def _on_draw(self, event) -> None:
+        """Cache the background after a full redraw of the canvas and draw the animated artists on top of it."""
+        self._background = self.h.fig.canvas.copy_from_bbox(self.h.fig.bbox)
+        for artist in self.h.animated_artists:
+            self.h.fig.draw_artist(artist)
+
+    def draw(self) -> None:
+        """
+        Redraw the figure and record the frame time.
+
+        The animated artists are blitted onto the cached background. A full redraw is performed if there is no valid
+        background, e.g. when the figure color changed, or if the canvas does not support blitting.
+        """
+        t0 = time.perf_counter()
+        canvas = self.h.fig.canvas
+        if self._blit and self._background is not None:
+            canvas.restore_region(self._background)
+            for artist in self.h.animated_artists:
+                self.h.fig.draw_artist(artist)
+            canvas.blit(self.h.fig.bbox)
+        else:
+            canvas.draw()
+        canvas.flush_events()
+        self._stale = False
+        self.frame_time.last = time.perf_counter() - t0
+        self.frame_time.count += 1
+        self.frame_time.total += self.frame_time.last
+        self.frame_time.max = max(self.frame_time.max, self.frame_time.last)
+
     def update_graphics(self, pupdate: float | None = None):
+        from matplotlib.colors import to_hex
+
         background_color = self.data.compute_end_session_criteria()
         h = self.h
-        h.fig.set_facecolor(background_color)
+        if to_hex(h.fig.get_facecolor()) != background_color:
+            # the figure color is part of the cached background, which needs to be redrawn
+            h.fig.set_facecolor(background_color)
+            self._background = None
+        self._stale = True
         self.update_titles()
         for p in self.data.probability_set:
             if pupdate is not None and p != pupdate:
                 continue
-            if self.data.psychometrics.loc[p]['count'].sum() == 0:
-                continue
             # update psychometric curves
-            iok = ~np.isnan(self.data.psychometrics.loc[p]['choice'].values.astype(np.float32))
-            xval = self.data.psychometrics.loc[p].index[iok]
-            h.curve_psych[p][0].set(xdata=xval, ydata=self.data.psychometrics.loc[p]['choice'][iok])
-            h.curve_reaction[p][0].set(xdata=xval, ydata=self.data.psychometrics.loc[p]['response_time'][iok])
-            # update the last trials plot
-            self.h.im_trials.set_array(self.data.rgb_background)
-            for k in ['stim_on', 'reward_time', 'error_time', 'play_tone']:
-                h.lines_trials[k][0].set(xdata=self.data.last_trials[k])
-            self.h.scatter_contrast.set_array(self.data.last_contrasts.T.flatten())
-            # update barplots
-            self.h.bar_correct[0].set(height=self.data.percent_correct)
-            self.h.bar_water[0].set(height=self.data.water_delivered)
+            signed_contrasts, choice, response_time = self.data.psychometric_curve(p)
+            if signed_contrasts.size == 0:
+                continue
+            h.curve_psych[p][0].set(xdata=signed_contrasts, ydata=choice)
+            h.curve_reaction[p][0].set(xdata=signed_contrasts, ydata=response_time)
+        # update the last trials plot
+        last_trials = self.data.last_trials
+        for bar, color in zip(h.bars_trials, self.data.rgb_background[:, 0] / 255, strict=True):
+            bar.set_facecolor(color)
+        for k in ['stim_on', 'reward_time', 'error_time', 'play_tone']:
+            h.lines_trials[k][0].set(xdata=last_trials[k])
+        self.h.scatter_contrast.set_array(self.data.last_contrasts.T.flatten())
+        # update barplots
+        self.h.bar_correct[0].set(height=self.data.percent_correct)
+        self.h.bar_water[0].set(height=self.data.water_delivered)
 
     def _set_session_string(self) -> None:
         self._session_string = ''
@@ -331,80 +448,92 @@ class OnlinePlots:
             # in which case the iblrig_settings.yaml are not necessarily on the machine
             pass
 
-    def run(self, file_jsonable: Path | str) -> None:
+    def run(self, file_jsonable: Path | str, port: int | None = None) -> None:
         """
         Watch a jsonable file in conjunction with an iblrigv8 running task (for online use).
 
+        If the port of the task's trial publisher is given, the trials pushed by the task are displayed as they
+        arrive. The file is read only to catch up on trials that were not pushed, and the `new_trial.flag` file
+        is polled as a fallback.
+
         Parameters
         ----------
         file_jsonable : Path or str
             The sessions jsonable file
+        port : int, optional
+            The port of the task's iblrig.net.TrialPublisher
         """
+        import matplotlib.pyplot as plt
+
         file_jsonable = Path(file_jsonable)
         self._set_session_string()
         self.update_titles()
-        self.h.fig.canvas.flush_events()
-        self.real_time = Bunch({'fseek': 0, 'time_last_check': 0})
+        self.draw()
+        self.real_time = Bunch({'reader': TaskJsonableReader(file_jsonable), 'time_last_check': 0})
         flag_file = file_jsonable.parent.joinpath('new_trial.flag')
+        subscriber = TrialSubscriber(port) if port is not None else None
+        # the trials completed before the subscription was registered are read from the file
+        self._read_new_trials()
 
-        while True:
-            self.h.fig.canvas.draw_idle()
-            self.h.fig.canvas.flush_events()
-            time.sleep(0.4)
-            if not plt.fignum_exists(self.h.fig.number):
-                break
-            if flag_file.exists():
-                trial_data, bpod_data = load_task_jsonable(file_jsonable, offset=self.real_time.fseek)
-                new_size = file_jsonable.stat().st_size
-                for i in np.arange(len(bpod_data)):
-                    self.update_trial(trial_data.iloc[i], bpod_data[i])
-                self.real_time.fseek = new_size
-                self.real_time.time_last_check = time.time()
-                flag_file.unlink()
+        try:
+            while True:
+                # the figure is only redrawn after a trial, otherwise we only process the GUI events
+                if self._stale:
+                    self.draw()
+                else:
+                    self.h.fig.canvas.flush_events()
+                if subscriber is None:
+                    time.sleep(0.4)
+                    records = []
+                else:
+                    records = subscriber.receive(timeout=0.4)
+                if not plt.fignum_exists(self.h.fig.number):
+                    break
+                for trial_num, trial_data, bpod_data in records:
+                    if trial_num < self.data.ntrials:
+                        continue
+                    elif trial_data is None or trial_num > self.data.ntrials:
+                        # the record was too large to be pushed, or previous records were lost
+                        self._read_new_trials()
+                    else:
+                        self.update_trial(pd.Series(trial_data), bpod_data)
+                    self.real_time.time_last_check = time.time()
+                if flag_file.exists():
+                    self._read_new_trials()
+                    self.real_time.time_last_check = time.time()
+                    flag_file.unlink()
+        finally:
+            if subscriber is not None:
+                subscriber.close()
+            self.log_frame_time()
+
+    def log_frame_time(self) -> None:
+        """Log the frame time statistics, warn if the average frame time exceeds the budget."""
+        if self.frame_time.count == 0:
+            return
+        mean = self.frame_time.total / self.frame_time.count
+        message = (
+            f'Online plots: {self.frame_time.count} frames, {mean * 1e3:.1f} ms average frame time, '
+            f'{self.frame_time.max * 1e3:.1f} ms maximum'
+        )
+        if mean > FRAME_TIME_BUDGET_SECS:
+            log.warning(f'{message} - exceeding the budget of {FRAME_TIME_BUDGET_SECS * 1e3:.0f} ms')
+        else:
+            log.info(message)
+
+    def _read_new_trials(self) -> None:
+        """Display the trials appended to the jsonable file that have not been displayed yet."""
+        # only the trials appended since the last read are parsed
+        trial_data, bpod_data = self.real_time.reader.read_new()
+        for i in np.arange(len(bpod_data)):
+            if trial_data.index[i] < self.data.ntrials:
+                continue
+            self.update_trial(trial_data.iloc[i], bpod_data[i])
 
     def display_full_jsonable(self, jsonable_file: Path | str):
         trials_table, bpod_data = load_task_jsonable(jsonable_file)
+        for i in np.arange(trials_table.shape[0]):
+            self.data.update_trial(trials_table.iloc[i], bpod_data[i])
         # here we take the end time of the first trial as reference to avoid factoring in the delay
         self.data.time_elapsed = bpod_data[-1]['Trial end timestamp'] - bpod_data[0]['Trial end timestamp']
-        trials_table['signed_contrast'] = np.sign(trials_table['position']) * trials_table['contrast']
-        trials_table['choice'] = trials_table['position'] > 0
-        trials_table.loc[~trials_table.trial_correct, 'choice'] = ~trials_table['choice'][~trials_table.trial_correct]
-        trials_table['contrast'] = trials_table['contrast'].astype(
-            CategoricalDtype(categories=np.unique(np.r_[-CONTRAST_SET, CONTRAST_SET]), ordered=True)
-        )
-        trials_table['stim_probability_left'] = trials_table['stim_probability_left'].astype(
-            CategoricalDtype(categories=self.data.probability_set, ordered=True)
-        )
-        self.data.psychometrics = trials_table.groupby(['stim_probability_left', 'signed_contrast']).agg(
-            count=pd.NamedAgg(column='signed_contrast', aggfunc='count'),
-            response_time=pd.NamedAgg(column='response_time', aggfunc=np.nanmean),
-            choice=pd.NamedAgg(column='choice', aggfunc='mean'),
-            response_time_std=pd.NamedAgg(column='response_time', aggfunc=np.nanstd),
-            choice_std=pd.NamedAgg(column='choice', aggfunc=np.nanmean),
-        )
-        self.data.ntrials = trials_table.shape[0]
-        self.data.ntrials_correct = np.sum(trials_table.trial_correct)
-        self.data.ntrials_nan = self.data.ntrials if self.data.ntrials > 0 else np.nan
-        self.data.percent_correct = self.data.ntrials_correct / self.data.ntrials_nan * 100
-        # agg.water_delivered = trials_table.water_delivered.iloc[-1]
-        self.data.water_delivered = trials_table.reward_amount.sum()
-        # init the last trials table
-        it = self.data.last_trials.index[-np.minimum(self.data.ntrials, NTRIALS_PLOT) :]
-        self.data.last_trials.loc[it, 'correct'] = trials_table.trial_correct.iloc[-NTRIALS_PLOT:].values
-        self.data.last_trials.loc[it, 'signed_contrast'] = trials_table.signed_contrast.iloc[-NTRIALS_PLOT:].values
-        self.data.last_trials.loc[it, 'response_time'] = trials_table.response_time.iloc[-NTRIALS_PLOT:].values
-        self.data.last_trials.loc[it, 'stim_on'] = np.array(
-            [bpod_data[i]['States timestamps']['stim_on'][0][0] for i in np.arange(-it.size, 0)]
-        )
-        self.data.last_trials.loc[it, 'play_tone'] = np.array(
-            [bpod_data[i]['States timestamps']['play_tone'][0][0] for i in np.arange(-it.size, 0)]
-        )
-        self.data.last_trials.loc[it, 'reward_time'] = np.array(
-            [bpod_data[i]['States timestamps']['reward'][0][0] for i in np.arange(-it.size, 0)]
-        )
-        self.data.last_trials.loc[it, 'error_time'] = np.array(
-            [bpod_data[i]['States timestamps']['error'][0][0] for i in np.arange(-it.size, 0)]
-        )
-        # we keep only a single column as buffer
-        self.data.trials_table = trials_table[['response_time']]
         self.update_graphics()
@@ -1,8 +1,11 @@
+import json
 import logging
 import os
 import re
 import shutil
 import subprocess
+import tempfile
+import time
 from pathlib import Path
 from typing import TypeVar
 
@@ -12,8 +15,6 @@ from packaging import version
 from pydantic import BaseModel, ValidationError
 
 import iblrig
-from ibllib.io import session_params
-from ibllib.io.raw_data_loaders import load_settings
 from iblrig.constants import HARDWARE_SETTINGS_YAML, RIG_SETTINGS_YAML
 from iblrig.pydantic_definitions import HardwareSettings, RigSettings
 from iblutil.util import Bunch
@@ -23,7 +24,7 @@ log = logging.getLogger(__name__)
 T = TypeVar('T', bound=BaseModel)
 
 
-def iterate_previous_sessions(subject_name: str, task_name: str, n: int = 1, **kwargs) -> list[dict]:
+def iterate_previous_sessions(subject_name: str, task_name: str, n: int = 1, use_index: bool = True, **kwargs) -> list[dict]:
     """
     Iterate over the sessions of a given subject in both the remote and local path and search for a given protocol name.
     Return the information of the last n found matching protocols in the form of a dictionary.
@@ -36,6 +37,9 @@ def iterate_previous_sessions(subject_name: str, task_name: str, n: int = 1, **k
         Name of the protocol to look for in experiment description.
     n : int, optional
         maximum number of protocols to return
+    use_index : bool, optional
+        Use the subject's session index (see :class:`SessionIndex`) rather than crawling the subject folders.
+        Defaults to True.
     **kwargs
         Optional arguments to be passed to iblrig.path_helper.get_local_and_remote_paths
         If not used, will use the arguments from iblrig/settings/iblrig_settings.yaml
@@ -48,18 +52,50 @@ def iterate_previous_sessions(subject_name: str, task_name: str, n: int = 1, **k
     rig_paths = get_local_and_remote_paths(**kwargs)
     local_subjects_folder = rig_paths['local_subjects_folder']
     remote_subjects_folder = rig_paths['remote_subjects_folder']
-    sessions = _iterate_protocols(local_subjects_folder.joinpath(subject_name), task_name=task_name, n=n)
+    index = SessionIndex.for_subject(subject_name, local_subjects_folder) if use_index else None
+    sessions = _iterate_protocols(local_subjects_folder.joinpath(subject_name), task_name=task_name, n=n, index=index)
     if remote_subjects_folder is not None:
-        remote_sessions = _iterate_protocols(remote_subjects_folder.joinpath(subject_name), task_name=task_name, n=n)
+        remote_sessions = _iterate_protocols(remote_subjects_folder.joinpath(subject_name), task_name=task_name, n=n, index=index)
         if remote_sessions is not None:
             sessions.extend(remote_sessions)
         # here we rely on the fact that np.unique sort and then we output sessions with the last one first
         _, ises = np.unique([s['session_stub'] for s in sessions], return_index=True)
         sessions = [sessions[i] for i in np.flipud(ises)]
+    if index is not None:
+        index.save()
     return sessions
 
 
-def _iterate_protocols(subject_folder: Path, task_name: str, n: int = 1, min_trials: int = 43) -> list[dict]:
+def _proc_num(x: dict | None) -> int:
+    """Return protocol number.
+
+    Use 'protocol_number' key if present (unlikely), otherwise use collection name.
+    """
+    i = (x or {}).get('collection', '00').split('_')
+    collection_int = int(i[-1]) if i[-1].isnumeric() else 0
+    return x.get('protocol_number', collection_int)
+
+
+def _protocol_info(file_experiment: Path, adt: dict, task_settings: dict) -> Bunch:
+    """Return the information on a protocol, as output by `_iterate_protocols`."""
+    from ibllib.io import session_params
+
+    session_path = file_experiment.parent
+    return Bunch(
+        {
+            'session_stub': '_'.join(session_path.parts[-2:]),  # 2019-01-01_001
+            'session_path': session_path,
+            'task_collection': adt['collection'],
+            'experiment_description': session_params.read_params(file_experiment),
+            'task_settings': task_settings,
+            'file_task_data': session_path.joinpath(adt['collection'], '_iblrig_taskData.raw.jsonable'),
+        }
+    )
+
+
+def _iterate_protocols(
+    subject_folder: Path, task_name: str, n: int = 1, min_trials: int = 43, index: 'SessionIndex | None' = None
+) -> list[dict]:
     """
     Return information on the last n sessions with matching protocol.
 
@@ -75,6 +111,8 @@ def _iterate_protocols(subject_folder: Path, task_name: str, n: int = 1, min_tri
         The number of previous protocols to return.
     min_trials : int
         Skips sessions with fewer than this number of trials.
+    index : SessionIndex, optional
+        A session index used to avoid reading the experiment description and settings file of every session.
 
     Returns
     -------
@@ -82,16 +120,12 @@ def _iterate_protocols(subject_folder: Path, task_name: str, n: int = 1, min_tri
         list of dictionaries with keys: session_stub, session_path, experiment_description,
         task_settings, file_task_data.
     """
+    # ibllib is imported when the subject history is read, as it pulls in pandas and ONE
+    from ibllib.io import session_params
+    from ibllib.io.raw_data_loaders import load_settings
 
-    def proc_num(x):
-        """Return protocol number.
-
-        Use 'protocol_number' key if present (unlikely), otherwise use collection name.
-        """
-        i = (x or {}).get('collection', '00').split('_')
-        collection_int = int(i[-1]) if i[-1].isnumeric() else 0
-        return x.get('protocol_number', collection_int)
-
+    if index is not None:
+        return index.iterate_protocols(subject_folder, task_name=task_name, n=n, min_trials=min_trials)
     protocols = []
     if subject_folder is None or Path(subject_folder).exists() is False:
         return protocols
@@ -103,28 +137,271 @@ def _iterate_protocols(subject_folder: Path, task_name: str, n: int = 1, min_tri
         ad = session_params.read_params(file_experiment)
         # reversed: we look for the last task first if the protocol ran twice
         tasks = filter(None, map(lambda x: x.get(task_name), ad.get('tasks', [])))
-        for adt in sorted(tasks, key=proc_num, reverse=True):
+        for adt in sorted(tasks, key=_proc_num, reverse=True):
             if not (task_settings := load_settings(session_path, task_collection=adt['collection'])):
                 continue
             if task_settings.get('NTRIALS', min_trials + 1) < min_trials:  # ignore sessions with too few trials
                 continue
-            protocols.append(
-                Bunch(
-                    {
-                        'session_stub': '_'.join(file_experiment.parent.parts[-2:]),  # 2019-01-01_001
-                        'session_path': file_experiment.parent,
-                        'task_collection': adt['collection'],
-                        'experiment_description': ad,
-                        'task_settings': task_settings,
-                        'file_task_data': session_path.joinpath(adt['collection'], '_iblrig_taskData.raw.jsonable'),
-                    }
-                )
-            )
+            protocols.append(_protocol_info(file_experiment, adt, task_settings))
             if len(protocols) >= n:
                 return protocols
     return protocols
 
 
+class SessionIndex:
+    """
+    Persistent per-subject index of the protocols run in each session.
+
+    The index replaces crawling the subject folders - and reading the experiment description and task settings of each
+    session - in :func:`iterate_previous_sessions`. It is stored as a JSON file next to the local subjects folder and
+    holds, for each subject folder (local and remote), the protocols of each session keyed by the path of its experiment
+    description file, along with the modification times used to invalidate the entries. The file system remains the
+    source of truth:
+
+    -   before each lookup, the modification times of the subject folder, its date folders and its session folders are
+        compared with those recorded when the folder was last scanned: a session created, removed or extended - e.g. by
+        another rig or by a transfer - triggers a new scan (see :meth:`update`), as does an index older than `max_age`;
+    -   a scan only re-reads the sessions whose experiment description changed or whose protocols were still running;
+    -   sessions are also re-indexed when they start, end and once they've been transferred (see :meth:`update_session`).
+
+    Only the experiment description and settings files of the returned sessions are read, along with the settings of
+    the sessions that were still running when indexed.
+    """
+
+    version = 3
+    """int: Version of the index file format - index files with a different version are discarded."""
+
+    max_age = 3600
+    """int: Age in seconds after which a subject folder is scanned again, even if none of its folders changed."""
+
+    def __init__(self, file_index: str | Path):
+        """
+        Persistent per-subject index of the protocols run in each session.
+
+        Parameters
+        ----------
+        file_index : str or Path
+            Full path to the JSON file holding the index.
+        """
+        self.file_index = Path(file_index)
+        self._folders: dict[str, dict] = {}
+        self._dirty = False
+        if self.file_index.exists():
+            try:
+                with open(self.file_index) as fp:
+                    content = json.load(fp)
+                if content.get('version') == self.version:
+                    self._folders = content['folders']
+            except (OSError, ValueError, KeyError) as e:
+                log.warning(f'Discarding session index {self.file_index}: {e}')
+
+    @classmethod
+    def for_subject(cls, subject_name: str, local_subjects_folder: str | Path) -> 'SessionIndex':
+        """
+        Get the session index of a subject.
+
+        The index files are stored in a `.session_index` folder next to the local subjects folder.
+
+        Parameters
+        ----------
+        subject_name : str
+            Name of the subject.
+        local_subjects_folder : str or Path
+            The local subjects folder.
+
+        Returns
+        -------
+        SessionIndex
+            The subject's session index.
+        """
+        return cls(Path(local_subjects_folder).parent.joinpath('.session_index', f'{subject_name}.json'))
+
+    def save(self) -> None:
+        """Write the index to disk if it changed."""
+        if not self._dirty:
+            return
+        self.file_index.parent.mkdir(parents=True, exist_ok=True)
+        # a unique temporary file, so that concurrent writers never write to nor replace the same file
+        with tempfile.NamedTemporaryFile('w', dir=self.file_index.parent, suffix='.tmp', delete=False) as fp:
+            json.dump({'version': self.version, 'folders': self._folders}, fp)
+        try:
+            os.replace(fp.name, self.file_index)
+        except OSError:
+            Path(fp.name).unlink(missing_ok=True)
+            raise
+        self._dirty = False
+
+    @staticmethod
+    def _stat(file: Path) -> list[int] | None:
+        try:
+            stat = file.stat()
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _index_session(self, file_experiment: Path) -> dict:
+        from ibllib.io import session_params
+        from ibllib.io.raw_data_loaders import load_settings
+
+        session_path = file_experiment.parent
+        ad = session_params.read_params(file_experiment) or {}
+        protocols = []
+        for task in ad.get('tasks', []):
+            for task_name, adt in task.items():
+                task_settings = load_settings(session_path, task_collection=adt['collection'])
+                file_settings = session_path.joinpath(adt['collection'], '_iblrig_taskSettings.raw.json')
+                protocols.append(
+                    {
+                        'task_name': task_name,
+                        'collection': adt['collection'],
+                        'protocol_number': _proc_num(adt),
+                        'ntrials': task_settings.get('NTRIALS') if task_settings else None,
+                        'has_settings': bool(task_settings),
+                        'complete': bool(task_settings) and task_settings.get('SESSION_END_TIME') is not None,
+                        'stat_settings': self._stat(file_settings),
+                    }
+                )
+        self._dirty = True
+        return {'stat': self._stat(file_experiment), 'protocols': protocols}
+
+    def _is_stale(self, file_experiment: Path, entry: dict) -> bool:
+        """Whether the experiment description changed, or the settings of a protocol running when indexed changed."""
+        if entry['stat'] != self._stat(file_experiment):
+            return True
+        for p in filter(lambda x: not x['complete'], entry['protocols']):
+            file_settings = file_experiment.parent.joinpath(p['collection'], '_iblrig_taskSettings.raw.json')
+            if p['stat_settings'] != self._stat(file_settings):
+                return True
+        return False
+
+    @staticmethod
+    def _folder_mtimes(subject_folder: Path) -> dict[str, int]:
+        """Modification times (in ns) of a subject folder, its date folders and its session folders."""
+        mtimes = {}
+        for folder in (subject_folder, *subject_folder.glob('????-??-??'), *subject_folder.glob('????-??-??/*')):
+            try:
+                mtimes[folder.relative_to(subject_folder).as_posix()] = folder.stat().st_mtime_ns
+            except OSError:
+                continue
+        return mtimes
+
+    def is_stale(self, subject_folder: Path) -> bool:
+        """
+        Whether a subject folder needs to be scanned before a lookup.
+
+        Parameters
+        ----------
+        subject_folder : Path
+            A subject folder containing dated folders.
+
+        Returns
+        -------
+        bool
+            True if the folder was never scanned, was scanned more than `max_age` seconds ago, or if one of its date or
+            session folders was created, removed or modified since.
+        """
+        folder = self._folders.get(str(subject_folder))
+        if folder is None or 'mtimes' not in folder or time.time() - folder['scanned'] > self.max_age:
+            return True
+        return folder['mtimes'] != self._folder_mtimes(Path(subject_folder))
+
+    def update(self, subject_folder: Path) -> None:
+        """
+        Scan a subject folder and refresh its index.
+
+        The sessions of the subject folder are listed, and only those whose experiment description changed - e.g. when
+        a protocol is appended to the session - or whose protocols were still running when last indexed are re-read.
+
+        Parameters
+        ----------
+        subject_folder : Path
+            A subject folder containing dated folders.
+        """
+        subject_folder = Path(subject_folder)
+        # the modification times are taken before the scan, so that a session created meanwhile triggers another scan
+        mtimes = self._folder_mtimes(subject_folder)
+        if not subject_folder.exists():
+            if self._folders.pop(str(subject_folder), None) is not None:
+                self._dirty = True
+            return
+        indexed = self._folders.get(str(subject_folder), {}).get('sessions', {})
+        sessions = {}
+        for file_experiment in subject_folder.glob('????-??-??/*/_ibl_experiment.description*.yaml'):
+            if not is_session_path(file_experiment.relative_to(subject_folder.parent).parent):
+                continue
+            key = file_experiment.relative_to(subject_folder).as_posix()
+            entry = indexed.get(key)
+            if entry is None or self._is_stale(file_experiment, entry):
+                entry = self._index_session(file_experiment)
+            sessions[key] = entry
+        self._folders[str(subject_folder)] = {'sessions': sessions, 'mtimes': mtimes, 'scanned': time.time()}
+        self._dirty = True
+
+    def update_session(self, session_path: Path) -> None:
+        """
+        Re-index a single session, e.g., at the end of a session or after it has been transferred.
+
+        Parameters
+        ----------
+        session_path : Path
+            The session path.
+        """
+        session_path = Path(session_path)
+        subject_folder = session_path.parents[1]
+        folder = self._folders.setdefault(str(subject_folder), {'sessions': {}})
+        for file_experiment in session_path.glob('_ibl_experiment.description*.yaml'):
+            key = file_experiment.relative_to(subject_folder).as_posix()
+            folder['sessions'][key] = self._index_session(file_experiment)
+
+    def iterate_protocols(self, subject_folder: Path, task_name: str, n: int = 1, min_trials: int = 43) -> list[dict]:
+        """
+        Return information on the last n sessions with matching protocol.
+
+        The subject folder is scanned if it is stale (see :meth:`is_stale`), the lookup is then served from the index.
+
+        Parameters
+        ----------
+        subject_folder : Path
+            A subject folder containing dated folders.
+        task_name : str
+            The task protocol name to look for.
+        n : int
+            The number of previous protocols to return.
+        min_trials : int
+            Skips sessions with fewer than this number of trials.
+
+        Returns
+        -------
+        list[dict]
+            list of dictionaries with keys: session_stub, session_path, experiment_description,
+            task_settings, file_task_data.
+        """
+        from ibllib.io.raw_data_loaders import load_settings
+
+        protocols = []
+        if subject_folder is None:
+            return protocols
+        subject_folder = Path(subject_folder)
+        if self.is_stale(subject_folder):
+            self.update(subject_folder)
+        sessions = self._folders.get(str(subject_folder), {}).get('sessions', {})
+        for key in sorted(sessions, reverse=True):
+            file_experiment = subject_folder.joinpath(key)
+            # reversed: we look for the last task first if the protocol ran twice
+            matches = filter(lambda x: x['task_name'] == task_name, sessions[key]['protocols'])
+            for p in sorted(matches, key=lambda x: x['protocol_number'], reverse=True):
+                # the number of trials of a protocol that was running when indexed is read from its settings file
+                if p['complete'] and (p['ntrials'] if p['ntrials'] is not None else min_trials + 1) < min_trials:
+                    continue
+                task_settings = load_settings(file_experiment.parent, task_collection=p['collection'])
+                if not task_settings or task_settings.get('NTRIALS', min_trials + 1) < min_trials:
+                    continue
+                protocols.append(_protocol_info(file_experiment, {'collection': p['collection']}, task_settings))
+                if len(protocols) >= n:
+                    return protocols
+        return protocols
+
+
 def get_local_and_remote_paths(
     local_path: str | Path | None = None, remote_path: str | Path | None = None, lab: str | None = None, iblrig_settings=None
 ) -> dict:
@@ -1,8 +1,10 @@
 from collections import abc
+from collections.abc import Iterator
 from datetime import date
 from pathlib import Path
-from typing import Annotated, Literal
+from typing import Annotated, Any, Literal
 
+import numpy as np
 import pandas as pd
 from annotated_types import Ge, Le
 from pydantic import (
@@ -204,6 +206,315 @@ class HardwareSettings(BunchModel):
     VERSION: str
 
 
+class TrialRecord(abc.Mapping):
+    """
+    A view of a single row of a :class:`TrialsTable`.
+
+    Values are read from the table on access, either by key or as attributes.
+    """
+
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table: 'TrialsTable', index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        return self._table.at[self._index, key]
+
+    def __getattr__(self, key: str) -> Any:
+        try:
+            return self[key]
+        except KeyError as e:
+            raise AttributeError(key) from e
+
+    def __iter__(self):
+        return iter(self._table.columns)
+
+    def __len__(self) -> int:
+        return len(self._table.columns)
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Return the row as a dictionary of Python scalars.
+
+        Returns
+        -------
+        dict
+            The values of the row, missing values of fields without default are pandas.NA.
+        """
+        return self._table._row(self._index)
+
+
+class _TrialsTableAtIndexer:
+    __slots__ = ('_table',)
+
+    def __init__(self, table: 'TrialsTable'):
+        self._table = table
+
+    def __getitem__(self, key: tuple[int, str]) -> Any:
+        index, column = key
+        if (missing := self._table._missing.get(column)) is not None and missing[index]:
+            return pd.NA
+        return self._table._columns[column][index]
+
+    def __setitem__(self, key: tuple[int, str], value: Any) -> None:
+        index, column = key
+        table = self._table
+        if column not in table._columns:
+            table._ensure_column(column, value)
+        if index >= table._n_rows:
+            table._grow(index + 1)
+        array = table._columns[column]
+        previous = array[index]
+        array[index] = value
+        if array.dtype.kind in 'biu' and array[index] != value:
+            array[index] = previous
+            raise ValueError(f'Value {value!r} of column "{column}" cannot be stored as {array.dtype}')
+        if (missing := table._missing.get(column)) is not None:
+            missing[index] = False
+
+
+class _TrialsTableILocIndexer:
+    __slots__ = ('_table',)
+
+    def __init__(self, table: 'TrialsTable'):
+        self._table = table
+
+    def __getitem__(self, index: Any) -> TrialRecord | pd.Series | pd.DataFrame:
+        if not isinstance(index, int | np.integer):
+            return self._table.to_dataframe().iloc[index]
+        n_rows = self._table._n_rows
+        if not -n_rows <= index < n_rows:
+            raise IndexError(f'Row {index} out of range for a table of {n_rows} rows')
+        return TrialRecord(self._table, int(index) % n_rows)
+
+
+class _TrialsTableLocIndexer:
+    __slots__ = ('_table',)
+
+    def __init__(self, table: 'TrialsTable'):
+        self._table = table
+
+    def __getitem__(self, key: Any) -> Any:
+        if isinstance(key, tuple) and isinstance(key[0], int | np.integer) and isinstance(key[1], str):
+            return self._table.at[key]
+        return self._table.to_dataframe().loc[key]
+
+    def __setitem__(self, key: tuple[Any, str], value: Any) -> None:
+        if not isinstance(key, tuple) or len(key) != 2 or not isinstance(key[1], str):
+            raise KeyError(f'Expected a (rows, column) key, got {key!r}')
+        rows, column = key
+        table = self._table
+        if isinstance(rows, int | np.integer):
+            table.at[rows, column] = value
+            return
+        # the row labels are the row numbers: slices are inclusive of their end, as for a DataFrame with a RangeIndex
+        positions = table.index.to_series().loc[rows].to_numpy()
+        table._ensure_column(column, np.asarray(value).item(0) if np.size(value) else value)
+        array = table._columns[column]
+        if array.dtype.kind in 'biu' and np.any(np.asarray(value).astype(array.dtype) != value):
+            raise ValueError(f'Values {value!r} of column "{column}" cannot be stored as {array.dtype}')
+        array[positions] = value
+        if (missing := table._missing.get(column)) is not None:
+            missing[positions] = False
+
+
+class TrialsTable:
+    """
+    Preallocated columnar store of the trials data, with one typed numpy array per column.
+
+    The columns are derived from the fields of a :class:`TrialDataModel`: float, int and bool fields are stored in
+    arrays of the corresponding dtype, all others in object arrays. Fields without default value are flagged as missing
+    until they are set, in which case they read as pandas.NA so that validating the trial raises a ValidationError.
+
+    The rows are labelled by their number. The table supports the pandas.DataFrame interface for reading: columns are
+    returned as pandas.Series, and the `loc` and `iloc` indexers as well as lists of columns and boolean masks return
+    pandas objects built from a copy of the table (see `to_dataframe`). Single values are set with `at` or `loc`, values
+    of a column with `loc[rows, column]` and whole columns by item assignment. A single row accessed with `iloc` is a
+    :class:`TrialRecord` view, which is cheap to read during the trial loop.
+
+    Examples
+    --------
+    >>> trials_table = TrialDataModel.preallocate_table(2000)
+    >>> trials_table.at[0, 'contrast'] = 0.5
+    >>> trials_table.loc[trials_table['contrast'] > 0, 'position'] = 35
+    >>> trial_data = trials_table.iloc[0].to_dict()
+    >>> df_trials = trials_table.to_dataframe()
+    """
+
+    _DTYPES = {float: np.float64, int: np.int64, bool: np.bool_}
+
+    def __init__(self, n_rows: int):
+        self._n_rows = n_rows
+        self._columns: dict[str, np.ndarray] = {}
+        self._fill_values: dict[str, Any] = {}
+        self._missing: dict[str, np.ndarray] = {}
+        self.at = _TrialsTableAtIndexer(self)
+        self.iloc = _TrialsTableILocIndexer(self)
+        self.loc = _TrialsTableLocIndexer(self)
+
+    @classmethod
+    def from_model(cls, model: type['TrialDataModel'], n_rows: int) -> 'TrialsTable':
+        """
+        Create a table with one column per field of a trial data model.
+
+        Parameters
+        ----------
+        model : type[TrialDataModel]
+            The trial data model.
+        n_rows : int
+            The number of rows to preallocate.
+
+        Returns
+        -------
+        TrialsTable
+            The preallocated table.
+        """
+        table = cls(n_rows)
+        for field, field_info in model.model_fields.items():
+            dtype = cls._DTYPES.get(field_info.annotation, object)
+            if field_info.default is PydanticUndefined:
+                table._add_column(field, dtype)
+                table._missing[field] = np.ones(n_rows, dtype=bool)
+            else:
+                table._add_column(field, dtype, field_info.default)
+        return table
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'TrialsTable':
+        """
+        Create a table from the columns of a DataFrame, e.g. a session template.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            The trials, the row labels are discarded.
+
+        Returns
+        -------
+        TrialsTable
+            A table with the rows and columns of the DataFrame.
+        """
+        table = cls(df.shape[0])
+        for column in df.columns:
+            table[column] = df[column].to_numpy()
+        return table
+
+    @staticmethod
+    def _default_fill_value(dtype: np.dtype | type) -> Any:
+        # the value of the rows that were never set: NaN for floats, None for objects and zero otherwise
+        dtype = np.dtype(dtype)
+        if dtype.kind == 'f':
+            return np.nan
+        return None if dtype.kind == 'O' else np.zeros(1, dtype).item()
+
+    def _add_column(self, column: str, dtype: np.dtype | type, fill_value: Any = None) -> None:
+        if fill_value is None:
+            fill_value = self._default_fill_value(dtype)
+        self._columns[column] = np.full(self._n_rows, fill_value, dtype=dtype)
+        self._fill_values[column] = fill_value
+
+    def _ensure_column(self, column: str, value: Any) -> None:
+        if column not in self._columns:
+            # as pandas does, numbers get a float column filled with NaN and other values an object column
+            is_number = isinstance(value, int | float | np.integer | np.floating) and not isinstance(value, bool | np.bool_)
+            self._add_column(column, np.float64 if is_number else object, np.nan)
+
+    def _grow(self, n_rows: int) -> None:
+        n_rows = max(n_rows, 2 * self._n_rows)
+        for column, array in self._columns.items():
+            fill_value = self._fill_values.get(column)
+            self._columns[column] = np.r_[array, np.full(n_rows - self._n_rows, fill_value, dtype=array.dtype)]
+        for column, missing in self._missing.items():
+            self._missing[column] = np.r_[missing, np.ones(n_rows - self._n_rows, dtype=bool)]
+        self._n_rows = n_rows
+
+    def _row(self, index: int) -> dict[str, Any]:
+        row = {column: array.item(index) for column, array in self._columns.items()}
+        for column, missing in self._missing.items():
+            if missing[index]:
+                row[column] = pd.NA
+        return row
+
+    def _values(self, column: str) -> np.ndarray:
+        # the values of a column, as a view unless int or bool values are missing
+        array = self._columns[column]
+        missing = self._missing.get(column)
+        if missing is None or array.dtype.kind == 'f' or not missing.any():
+            return array
+        return np.where(missing, pd.NA, array.astype(object))
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def __contains__(self, column: str) -> bool:
+        return column in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __getitem__(self, key: Any) -> pd.Series | pd.DataFrame:
+        if isinstance(key, str):
+            return pd.Series(self._values(key), index=self.index, name=key, copy=False)
+        return self.to_dataframe()[key]
+
+    def __setitem__(self, column: str, values: Any) -> None:
+        values = np.array(values)
+        if values.shape != (self._n_rows,):
+            raise ValueError(f'Expected {self._n_rows} values for column "{column}", got an array of shape {values.shape}')
+        self._columns[column] = values
+        self._fill_values[column] = self._default_fill_value(values.dtype)
+        self._missing.pop(column, None)
+
+    @property
+    def columns(self) -> list[str]:
+        """The column names."""
+        return list(self._columns)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """The number of rows and columns."""
+        return self._n_rows, len(self._columns)
+
+    @property
+    def index(self) -> pd.RangeIndex:
+        """The row labels, i.e. the row numbers."""
+        return pd.RangeIndex(self._n_rows)
+
+    @property
+    def empty(self) -> bool:
+        """True if the table has no rows or no columns."""
+        return 0 in self.shape
+
+    def iterrows(self) -> Iterator[tuple[int, TrialRecord]]:
+        """
+        Iterate over the rows of the table.
+
+        Yields
+        ------
+        int
+            The row number.
+        TrialRecord
+            A view of the row.
+        """
+        for index in range(self._n_rows):
+            yield index, TrialRecord(self, index)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Convert the table to a pandas DataFrame.
+
+        Missing values of float columns are NaN, those of int and bool columns are pandas.NA in an object column.
+
+        Returns
+        -------
+        pandas.DataFrame
+            A copy of the table.
+        """
+        return pd.DataFrame({column: self._values(column) for column in self._columns}, copy=True)
+
+
 class TrialDataModel(BaseModel):
     """
     A data model for trial data that extends BaseModel.
@@ -239,3 +550,23 @@ class TrialDataModel(BaseModel):
             default_value = field_info.default if field_info.default is not PydanticUndefined else pd.NA
             data[field] = [default_value] * n_rows
         return pd.DataFrame(data)
+
+    @classmethod
+    def preallocate_table(cls, n_rows: int) -> TrialsTable:
+        """
+        Preallocate a columnar trials table with specified number of rows.
+
+        Unlike `preallocate_dataframe`, each field is stored in a typed numpy array, which makes reading and writing
+        single values during the trial loop cheap. See :class:`TrialsTable`.
+
+        Parameters
+        ----------
+        n_rows : int
+            The number of rows to preallocate, the table grows if more rows are written.
+
+        Returns
+        -------
+        TrialsTable
+            A table with `n_rows` rows and columns corresponding to the model's fields.
+        """
+        return TrialsTable.from_model(cls, n_rows)
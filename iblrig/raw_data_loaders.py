@@ -1,12 +1,130 @@
 import json
 import logging
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable
+from importlib.util import find_spec
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
+import numpy as np
 import pandas as pd
 
+if TYPE_CHECKING:
+    import pyarrow as pa
+
 log = logging.getLogger(__name__)
 
+HAS_ORJSON = find_spec('orjson') is not None
+"""bool: True if the optional orjson package is installed - it is imported when a trial record is (de)serialized."""
+
+TRIALS_TABLE_FILE_NAME = '_iblrig_trialsTable.raw.pqt'
+"""str: Name of the columnar sidecar containing the scalar columns of the task data jsonable file."""
+
+JSONABLE_SIZE_KEY = b'iblrig.jsonable_size'
+"""bytes: Key of the sidecar metadata holding the size in bytes of the jsonable file when the sidecar was finalized."""
+
+JSON_BACKENDS = ('json', 'orjson')
+"""tuple[str]: Backends for (de)serializing the trial records: the standard library and the optional orjson package."""
+
+
+def _json_backend(backend: str | None) -> str:
+    if backend is None:
+        return 'orjson' if HAS_ORJSON else 'json'
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f'Unknown JSON backend "{backend}", expected one of {JSON_BACKENDS}')
+    if backend == 'orjson' and not HAS_ORJSON:
+        raise ValueError('The orjson backend requires the orjson package')
+    return backend
+
+
+def _json_default(value: Any) -> Any:
+    # values that neither encoder serializes natively: numpy scalars (standard library) and the pandas missing values
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is pd.NA or value is pd.NaT:
+        return None
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps_trial_data(trial_data: dict, backend: str | None = None) -> bytes:
+    """
+    Serialize a trial record to a line of the task data jsonable file.
+
+    The record is serialized in one pass by a single encoder. orjson writes the NaN and infinite values as null, which
+    :func:`loads_trial_data` reads back as NaN - the trial records hold NaN for the missing values, such as the
+    timestamps of the states that were not visited. The standard library writes them as NaN and Infinity tokens, as in
+    the files written by previous versions.
+
+    Parameters
+    ----------
+    trial_data : dict
+        The trial data, optionally including the bpod data as 'behavior_data'.
+    backend : str, optional
+        One of :data:`JSON_BACKENDS`. Defaults to orjson if it is installed.
+
+    Returns
+    -------
+    bytes
+        The serialized record, including the trailing newline.
+    """
+    if _json_backend(backend) == 'json':
+        return (json.dumps(trial_data, default=_json_default) + '\n').encode()
+    import orjson
+
+    options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+    return orjson.dumps(trial_data, default=_json_default, option=options)
+
+
+_NAN = json.loads('NaN')  # the object the standard library returns for all NaN values
+
+
+def _restore_nan(data: dict | list) -> None:
+    # Replace in place the null values by NaN, the missing value of the trial records, as written by orjson. As with the
+    # standard library, all NaN values are the same object so that the parsed lists compare equal.
+    for key, value in data.items() if isinstance(data, dict) else enumerate(data):
+        if value is None:
+            data[key] = _NAN
+        elif isinstance(value, dict) or (isinstance(value, list) and len(value) > 0 and isinstance(value[0], dict | list)):
+            _restore_nan(value)
+        elif isinstance(value, list) and None in value:
+            data[key] = [_NAN if v is None else v for v in value]
+
+
+def _loads(line: bytes, backend: str | None) -> dict:
+    if _json_backend(backend) == 'json':
+        return json.loads(line)
+    import orjson
+
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError:  # NaN and Infinity tokens written by the standard library
+        return json.loads(line)
+
+
+def loads_trial_data(line: bytes, backend: str | None = None) -> dict:
+    """
+    Deserialize a line of the task data jsonable file.
+
+    The record is parsed in one pass, whichever backend wrote it. The null values are read as NaN.
+
+    Parameters
+    ----------
+    line : bytes
+        A line of the task data jsonable file.
+    backend : str, optional
+        One of :data:`JSON_BACKENDS`. Defaults to orjson if it is installed.
+
+    Returns
+    -------
+    dict
+        The trial data, including the bpod data as 'behavior_data'.
+    """
+    trial_data = _loads(line, backend)
+    _restore_nan(trial_data)
+    return trial_data
+
 
 def load_task_jsonable(jsonable_file: str | Path, offset: int | None = None) -> tuple[pd.DataFrame, list[Any]]:
     """
@@ -24,11 +142,11 @@ def load_task_jsonable(jsonable_file: str | Path, offset: int | None = None) ->
         - bpod_data (list): timing data for each trial
     """
     trials_table = []
-    with open(jsonable_file) as f:
+    with open(jsonable_file, 'rb') as f:
         if offset is not None:
             f.seek(offset, 0)
         for line in f:
-            trials_table.append(json.loads(line))
+            trials_table.append(loads_trial_data(line))
 
     # pop-out the bpod data from the table
     bpod_data = []
@@ -37,3 +155,410 @@ def load_task_jsonable(jsonable_file: str | Path, offset: int | None = None) ->
 
     trials_table = pd.DataFrame(trials_table)
     return trials_table, bpod_data
+
+
+class TaskJsonableReader:
+    """
+    Incremental reader for task data jsonable files.
+
+    The reader keeps a byte-offset index of the trial records it has already seen, so that repeated calls on a file
+    that is still being written to only parse the trials that were appended since the last call. Incomplete lines
+    (i.e., a trial that is being written at the time of reading) are left for the next call.
+
+    Examples
+    --------
+    Tail a jsonable file during acquisition, skipping the bpod data:
+
+    >>> reader = TaskJsonableReader(jsonable_file, behavior_data=False)
+    >>> trials_table, _ = reader.read_new()  # all trials written so far
+    >>> trials_table, _ = reader.read_new()  # only the trials written since the last call
+
+    Random access to a single trial:
+
+    >>> trial_data, bpod_data = reader.read_trial(-1)
+    """
+
+    def __init__(self, jsonable_file: str | Path, behavior_data: bool = True, columns: Iterable[str] | None = None):
+        """
+        Incremental reader for task data jsonable files.
+
+        Parameters
+        ----------
+        jsonable_file : str or Path
+            Full path to the jsonable file.
+        behavior_data : bool, optional
+            Whether to parse and return the bpod data of each trial. Defaults to True.
+        columns : Iterable[str], optional
+            A subset of columns of the trials table to return. Defaults to all columns.
+        """
+        self.jsonable_file = Path(jsonable_file)
+        self.behavior_data = behavior_data
+        self.columns = list(columns) if columns is not None else None
+        self.offsets: list[int] = []
+        """list of int: Byte offsets of the start of each trial record indexed so far."""
+        self._position = 0
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def position(self) -> int:
+        """int: Byte offset up to which the file has been indexed."""
+        return self._position
+
+    def reset(self) -> None:
+        """Forget all indexed trials so that the next call to :meth:`read_new` reads the whole file."""
+        self.offsets = []
+        self._position = 0
+
+    def _parse_line(self, line: bytes, behavior_data: bool) -> tuple[dict, Any]:
+        if behavior_data:
+            trial_data = loads_trial_data(line)
+            bpod_data = trial_data.pop('behavior_data', None)
+        else:
+            # the whole record is parsed, but the NaN values are only restored in the trial data
+            trial_data, bpod_data = _loads(line, None), None
+            trial_data.pop('behavior_data', None)
+            _restore_nan(trial_data)
+        if self.columns is not None:
+            trial_data = {k: trial_data[k] for k in self.columns if k in trial_data}
+        return trial_data, bpod_data
+
+    def _to_dataframe(self, records: list[dict]) -> pd.DataFrame:
+        trials_table = pd.DataFrame(records)
+        if self.columns is not None:
+            trials_table = trials_table.reindex(columns=self.columns)
+        return trials_table
+
+    def read_new(self) -> tuple[pd.DataFrame, list[Any]]:
+        """
+        Read the trials that were appended to the file since the last call.
+
+        Returns
+        -------
+        pandas.DataFrame
+            A DataFrame with the new trials, indexed by trial number within the file.
+        list
+            The bpod data of each new trial (None for each trial if `behavior_data` is False).
+        """
+        if not self.jsonable_file.exists():
+            return self._to_dataframe([]), []
+        if self.jsonable_file.stat().st_size < self._position:
+            log.warning(f'{self.jsonable_file} shrank since last read - re-indexing from the start')
+            self.reset()
+        records, bpod_data = [], []
+        first_trial = len(self.offsets)
+        with open(self.jsonable_file, 'rb') as fp:
+            fp.seek(self._position)
+            for line in fp:
+                if not line.endswith(b'\n'):
+                    break  # incomplete record: leave it for the next call
+                offset, self._position = self._position, self._position + len(line)
+                if not line.strip():
+                    continue
+                self.offsets.append(offset)
+                trial_data, trial_bpod_data = self._parse_line(line, self.behavior_data)
+                records.append(trial_data)
+                bpod_data.append(trial_bpod_data)
+        trials_table = self._to_dataframe(records)
+        trials_table.index = pd.RangeIndex(first_trial, first_trial + len(records))
+        return trials_table, bpod_data
+
+    def read_trial(self, index: int, behavior_data: bool | None = None) -> tuple[dict, Any]:
+        """
+        Read a single trial by means of the offset index, without parsing any other trial.
+
+        Parameters
+        ----------
+        index : int
+            The trial index within the file, negative values index from the end.
+        behavior_data : bool, optional
+            Whether to parse the bpod data of the trial. Defaults to the value passed to the constructor.
+
+        Returns
+        -------
+        dict
+            The trial data.
+        Any
+            The bpod data of the trial (None if not requested).
+        """
+        if index >= len(self.offsets) or index < -len(self.offsets):
+            self.read_new()  # make sure the index is up-to-date
+        offset = self.offsets[index]
+        with open(self.jsonable_file, 'rb') as fp:
+            fp.seek(offset)
+            line = fp.readline()
+        return self._parse_line(line, self.behavior_data if behavior_data is None else behavior_data)
+
+
+class TrialsTableWriter:
+    """
+    Writer for the columnar sidecar of the task data jsonable file.
+
+    The scalar values of each trial are buffered as the trials are saved, and written to a Parquet file in row groups of
+    `row_group_size` trials when the sidecar is finalized with :meth:`close` - until then (or if the session crashed)
+    readers fall back on the jsonable file. The schema is inferred from all the trials: a column that first appears after
+    the first trial is null for the preceding trials, integers mixed with floats are stored as floats, and a column whose
+    values have no common type is stored as strings. The size of the jsonable file at the time the sidecar is finalized
+    is stored in its metadata, so that readers can tell whether the jsonable file has changed since.
+    """
+
+    def __init__(self, file_path: str | Path, row_group_size: int = 50, jsonable_file: str | Path | None = None):
+        """
+        Writer for the columnar sidecar of the task data jsonable file.
+
+        Parameters
+        ----------
+        file_path : str or Path
+            Full path to the Parquet file.
+        row_group_size : int, optional
+            Number of trials per row group of the Parquet file. Defaults to 50.
+        jsonable_file : str or Path, optional
+            Full path to the task data jsonable file. Defaults to the jsonable file in the same folder as the sidecar.
+        """
+        self.file_path = Path(file_path)
+        self.row_group_size = row_group_size
+        jsonable_file = jsonable_file if jsonable_file is not None else self.file_path.with_name('_iblrig_taskData.raw.jsonable')
+        self.jsonable_file = Path(jsonable_file)
+        self._buffer: list[dict] = []
+        self._discarded = False
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        """bool: True if the sidecar has been finalized or discarded."""
+        return self._closed or self._discarded
+
+    @staticmethod
+    def _scalars(trial_data: dict) -> dict:
+        scalars = {}
+        for key, value in trial_data.items():
+            if value is None or value is pd.NA:
+                scalars[key] = None
+            elif isinstance(value, bool | int | float | str | np.generic):
+                scalars[key] = value
+        return scalars
+
+    def _column(self, name: str, values: list) -> 'pa.Array':
+        import pyarrow as pa
+
+        try:
+            array = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            log.warning(f'{self.file_path.name}: values of column "{name}" have no common type, stored as strings')
+            array = pa.array([None if value is None else str(value) for value in values], type=pa.string())
+        # columns that only contain nulls are assumed to be floating point
+        return array.cast(pa.float64()) if pa.types.is_null(array.type) else array
+
+    def to_table(self) -> 'pa.Table':
+        """
+        Convert the buffered trials to an Arrow table.
+
+        Returns
+        -------
+        pyarrow.Table
+            The trials table, with one column per key found in any of the trials, in order of first appearance.
+        """
+        import pyarrow as pa
+
+        names = list(dict.fromkeys(key for scalars in self._buffer for key in scalars))
+        columns = [self._column(name, [scalars.get(name) for scalars in self._buffer]) for name in names]
+        return pa.Table.from_arrays(columns, names=names)
+
+    def append(self, trial_data: dict) -> None:
+        """
+        Append a trial to the sidecar - non-scalar values such as the bpod data are ignored.
+
+        Parameters
+        ----------
+        trial_data : dict
+            The trial data.
+        """
+        if self.closed:
+            return
+        self._buffer.append(self._scalars(trial_data))
+
+    def close(self) -> None:
+        """Write the buffered trials and finalize the sidecar."""
+        if self.closed:
+            return
+        self._closed = True
+        if len(self._buffer) == 0:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            table = self.to_table()
+            jsonable_size = self.jsonable_file.stat().st_size if self.jsonable_file.exists() else -1
+            table = table.replace_schema_metadata({JSONABLE_SIZE_KEY: str(jsonable_size)})
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            pq.write_table(table, self.file_path, row_group_size=self.row_group_size)
+        except (pa.ArrowException, OSError) as e:
+            log.warning(f'Discarding trials table sidecar {self.file_path.name}: {e}')
+            self.file_path.unlink(missing_ok=True)
+        self._buffer = []
+
+    def discard(self) -> None:
+        """Stop writing and remove the sidecar from disk."""
+        self.file_path.unlink(missing_ok=True)
+        self._buffer = []
+        self._discarded = True
+
+
+class BackgroundWriter:
+    """
+    Worker thread executing the writes of the trial data in order, off the task thread.
+
+    Calls are queued with :meth:`submit` and executed one at a time in submission order. The queue is bounded: if the
+    disk cannot keep up, :meth:`submit` blocks until there is room in the queue so that trials are delayed rather than
+    lost. A failing call is logged and counted, the following calls are still executed. The thread is not a daemon:
+    pending writes complete even if the task thread exits without calling :meth:`close`.
+    """
+
+    def __init__(self, max_queue_size: int = 32, name: str = 'trial_writer'):
+        """
+        Worker thread executing the writes of the trial data in order, off the task thread.
+
+        Parameters
+        ----------
+        max_queue_size : int, optional
+            Maximum number of pending calls before :meth:`submit` blocks. Defaults to 32.
+        name : str, optional
+            Name of the thread.
+        """
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._work, name=name)
+        self._closed = False
+        self.n_submitted = 0
+        self.n_errors = 0
+        self.max_queue_depth = 0
+        self.max_submit_wait = 0.0
+        self._latencies: list[float] = []
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        """bool: True once :meth:`close` has been called."""
+        return self._closed
+
+    @property
+    def queue_depth(self) -> int:
+        """int: Number of calls waiting to be executed."""
+        return self._queue.qsize()
+
+    @property
+    def metrics(self) -> dict[str, float]:
+        """dict[str, float]: Number of calls and errors, queue depth and latency from submission to completion in seconds."""
+        latencies = np.array(self._latencies)
+        return {
+            'n_submitted': self.n_submitted,
+            'n_completed': latencies.size,
+            'n_errors': self.n_errors,
+            'max_queue_depth': self.max_queue_depth,
+            'max_submit_wait': self.max_submit_wait,
+            'mean_latency': latencies.mean() if latencies.size else np.nan,
+            'max_latency': latencies.max() if latencies.size else np.nan,
+        }
+
+    def submit(self, fn: Callable, *args) -> None:
+        """
+        Queue a call, blocking if the queue is full.
+
+        Parameters
+        ----------
+        fn : Callable
+            The function to call.
+        *args
+            The arguments passed to `fn`.
+        """
+        if self._closed:
+            raise RuntimeError('Cannot submit to a closed writer')
+        t_submit = time.perf_counter()
+        try:
+            self._queue.put_nowait((fn, args, t_submit))
+        except queue.Full:
+            log.warning(f'{self._thread.name}: queue full ({self._queue.maxsize} pending writes), waiting for the disk')
+            self._queue.put((fn, args, t_submit))
+            self.max_submit_wait = max(self.max_submit_wait, time.perf_counter() - t_submit)
+        self.n_submitted += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                fn, args, t_submit = item
+                try:
+                    fn(*args)
+                except Exception as e:
+                    self.n_errors += 1
+                    log.error(f'{self._thread.name}: {getattr(fn, "__name__", fn)} failed: {e!r}')
+                self._latencies.append(time.perf_counter() - t_submit)
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Wait until all the queued calls have been executed."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Execute the queued calls in order and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def log_metrics(self) -> None:
+        """Log the number of writes, the maximum queue depth and the write latency."""
+        m = self.metrics
+        log.info(
+            f'{self._thread.name}: {m["n_completed"]} writes, max. queue depth {m["max_queue_depth"]}, '
+            f'latency mean {m["mean_latency"] * 1e3:.1f} ms / max. {m["max_latency"] * 1e3:.1f} ms'
+        )
+        if m['n_errors'] > 0:
+            log.error(f'{self._thread.name}: {m["n_errors"]} writes failed')
+
+
+def load_task_trials_table(jsonable_file: str | Path, columns: Iterable[str] | None = None) -> pd.DataFrame:
+    """
+    Load the trials table of a session, without the bpod data.
+
+    The columnar sidecar written alongside the jsonable file is preferred, as it allows for reading only the requested
+    columns. If the sidecar does not exist, has not been finalized, lacks any of the requested columns, or does not match
+    the jsonable file - whose size differs from the one recorded in the sidecar, e.g. because trials were appended
+    after the sidecar was finalized - the trials table is read from the jsonable file.
+
+    Parameters
+    ----------
+    jsonable_file : str or Path
+        Full path to the task data jsonable file.
+    columns : Iterable[str], optional
+        A subset of columns to load. Defaults to all columns.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The trials table.
+    """
+    jsonable_file = Path(jsonable_file)
+    columns = list(columns) if columns is not None else None
+    file_sidecar = jsonable_file.with_name(TRIALS_TABLE_FILE_NAME)
+    if not jsonable_file.exists():
+        raise FileNotFoundError(jsonable_file)
+    if file_sidecar.exists():
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            metadata = pq.read_schema(file_sidecar).metadata or {}
+            if metadata.get(JSONABLE_SIZE_KEY) == str(jsonable_file.stat().st_size).encode():
+                return pq.read_table(file_sidecar, columns=columns).to_pandas()
+            log.debug(f'{file_sidecar} does not match {jsonable_file.name}, falling back on jsonable file')
+        except (pa.ArrowException, OSError) as e:
+            log.debug(f'Could not read {file_sidecar}, falling back on jsonable file: {e}')
+    trials_table, _ = TaskJsonableReader(jsonable_file, behavior_data=False, columns=columns).read_new()
+    return trials_table
@@ -1,20 +1,32 @@
 """Creates sessions, pre-generates stim and ephys sessions."""
 
+import math
+import zlib
+from collections.abc import Callable, Sequence
+from typing import Any, Literal
+
 import numpy as np
 
 from iblrig import misc
 
 
-def draw_position(position_set, stim_probability_left) -> int:
-    return int(np.random.choice(position_set, p=[stim_probability_left, 1 - stim_probability_left]))
+def draw_position(
+    position_set, stim_probability_left, size: int | None = None, rng: np.random.Generator | None = None
+) -> int | np.ndarray:
+    rng = np.random if rng is None else rng
+    positions = rng.choice(position_set, p=[stim_probability_left, 1 - stim_probability_left], size=size)
+    return int(positions) if size is None else positions.astype(int)
 
 
-def draw_block_len(factor, min_=20, max_=100):
-    return int(misc.truncated_exponential(scale=factor, min_value=min_, max_value=max_))
+def draw_block_len(
+    factor, min_=20, max_=100, size: int | None = None, rng: np.random.Generator | None = None
+) -> int | np.ndarray:
+    block_lengths = misc.truncated_exponential(scale=factor, min_value=min_, max_value=max_, size=size, rng=rng)
+    return int(block_lengths) if size is None else block_lengths.astype(int)
 
 
 # EPHYS CHOICE WORLD
-def make_ephyscw_pc(prob_type='biased'):
+def make_ephyscw_pc(prob_type='biased', rng: np.random.Generator | None = None):
     """
     Create positions, contrasts and block lengths for ephysCW.
 
@@ -24,23 +36,142 @@ def make_ephyscw_pc(prob_type='biased'):
     ----------
     prob_type : str
         'biased': 0 contrast half has likely to be drawn, 'uniform': 0 contrast as likely as other contrasts
+    rng : numpy.random.Generator, optional
+        The random generator to draw from. Defaults to the global numpy random state.
     """
+    rng = np.random if rng is None else rng
     contrasts = [1.0, 0.25, 0.125, 0.0625, 0.0]
     len_block = [90]
     pos = [-35] * int(len_block[0] / 2) + [35] * int(len_block[0] / 2)
     cont = np.sort(contrasts * 10)[::-1][:-5].tolist()
     prob = [0.5] * len_block[0]
     pc = np.array([pos, cont + cont, prob]).T
-    np.random.shuffle(pc)  # only shuffles on the first dimension
-
-    prob_left = 0.8 if draw_position([-35, 35], 0.5) < 0 else 0.2
-    while len(pc) < 2001:
-        len_block.append(draw_block_len(60, min_=20, max_=100))
-        for _x in range(len_block[-1]):
-            p = draw_position([-35, 35], prob_left)
-            c = misc.draw_contrast(contrasts, probability_type=prob_type)
-            pc = np.append(pc, np.array([[p, c, prob_left]]), axis=0)
-            # do this in PC space
-        prob_left = np.round(np.abs(1 - prob_left), 1)
-
-    return pc, len_block
+    rng.shuffle(pc)  # only shuffles on the first dimension
+
+    # draw the blocks that are needed to reach 2001 trials at once, knowing that a block has at least 20 trials
+    prob_left = 0.8 if draw_position([-35, 35], 0.5, rng=rng) < 0 else 0.2
+    n_trials = 2001 - len(pc)
+    block_lengths = draw_block_len(60, min_=20, max_=100, size=math.ceil(n_trials / 20), rng=rng)
+    block_lengths = block_lengths[: np.searchsorted(np.cumsum(block_lengths), n_trials) + 1]
+    block_prob_left = np.where(np.arange(block_lengths.size) % 2, np.round(1 - prob_left, 1), prob_left)
+    trial_prob_left = np.repeat(block_prob_left, block_lengths)
+    p = np.where(rng.random(trial_prob_left.size) < trial_prob_left, -35, 35)
+    c = misc.draw_contrast(contrasts, probability_type=prob_type, size=trial_prob_left.size, rng=rng)
+    pc = np.concatenate([pc, np.c_[p, c, trial_prob_left]])
+
+    return pc, len_block + block_lengths.tolist()
+
+
+class TrialSequenceGenerator:
+    """
+    Pre-draw the random variables of the trials of a session in batches.
+
+    Each kind of draw - e.g., the quiescent period, or the contrast for a given contrast set - is a stream of values
+    that are drawn `batch_size` at a time by its own generator. The generator of a stream is seeded from the seed of
+    the session and from the parameters of the stream, so that the values of a stream do not depend on the draws of
+    the other streams: the trials of a session can be regenerated from the seed recorded in the task settings.
+
+    Examples
+    --------
+    >>> trial_sequence = TrialSequenceGenerator(seed=1234)
+    >>> trial_sequence.contrast([1.0, 0.25, 0.125, 0.0625, 0.0], 'uniform')
+    >>> trial_sequence.position([-35, 35], probability_left=0.8)
+    """
+
+    def __init__(self, seed: int | None = None, batch_size: int = 1000):
+        """
+        Pre-draw the random variables of the trials of a session in batches.
+
+        Parameters
+        ----------
+        seed : int, optional
+            The seed of the session. Defaults to a new seed drawn from the operating system's entropy.
+        batch_size : int, optional
+            Number of values drawn at once for each stream.
+        """
+        self.seed = int(np.random.SeedSequence().entropy) if seed is None else int(seed)
+        self.batch_size = batch_size
+        self._streams: dict[tuple, list] = {}
+
+    def _draw(self, draw: Callable[[np.random.Generator, int], np.ndarray], *key):
+        # the key is made of python scalars so that its representation, and thus the seed of the stream, is stable
+        key = tuple(tuple(v) if isinstance(v := np.asarray(k).tolist(), list) else v for k in key)
+        if (stream := self._streams.get(key)) is None:
+            rng = np.random.default_rng([self.seed, zlib.crc32(repr(key).encode())])
+            stream = self._streams[key] = [rng, np.empty(0), 0]
+        rng, values, i = stream
+        if i == values.size:
+            values, i = draw(rng, self.batch_size), 0
+            stream[1] = values
+        stream[2] = i + 1
+        return values[i]
+
+    def random(self) -> float:
+        """Draw a value from the uniform distribution over [0, 1)."""
+        return float(self._draw(lambda rng, n: rng.random(n), 'random'))
+
+    def normal(self, loc: float = 0.0, scale: float = 1.0) -> float:
+        """Draw a value from a normal distribution of mean `loc` and standard deviation `scale`."""
+        return loc + scale * float(self._draw(lambda rng, n: rng.standard_normal(n), 'normal'))
+
+    def choice(self, a: Sequence, p: Sequence[float] | None = None) -> Any:
+        """Draw an element of `a`, with probabilities `p` (defaults to uniform)."""
+        return self._draw(lambda rng, n: rng.choice(a, p=p, size=n), 'choice', a, p)
+
+    def stim_phase(self) -> float:
+        """Draw the phase of the visual stimulus, uniformly between 0 and 2π."""
+        return float(self._draw(lambda rng, n: rng.uniform(0, 2 * math.pi, n), 'stim_phase'))
+
+    def quiescent_period(self, scale: float = 0.35, min_value: float = 0.2, max_value: float = 0.5) -> float:
+        """Draw the variable part of the quiescent period, see :func:`iblrig.misc.truncated_exponential`."""
+        return float(
+            self._draw(
+                lambda rng, n: misc.truncated_exponential(scale, min_value, max_value, size=n, rng=rng),
+                'quiescent_period',
+                scale,
+                min_value,
+                max_value,
+            )
+        )
+
+    def block_length(self, factor: float, min_value: float, max_value: float) -> int:
+        """Draw the length of a block of trials, see :func:`draw_block_len`."""
+        return int(
+            self._draw(
+                lambda rng, n: draw_block_len(factor, min_value, max_value, size=n, rng=rng),
+                'block_length',
+                factor,
+                min_value,
+                max_value,
+            )
+        )
+
+    def position(self, position_set: Sequence[float], probability_left: float) -> int:
+        """Draw the position of the stimulus, the first position of `position_set` having probability `probability_left`."""
+        return int(
+            self._draw(
+                lambda rng, n: draw_position(position_set, probability_left, size=n, rng=rng),
+                'position',
+                position_set,
+                probability_left,
+            )
+        )
+
+    def contrast(
+        self,
+        contrast_set: Sequence[float],
+        probability_type: Literal['skew_zero', 'biased', 'uniform'] = 'biased',
+        idx: int = -1,
+        idx_probability: float = 0.5,
+    ) -> float:
+        """Draw the contrast of the stimulus, see :func:`iblrig.misc.draw_contrast`."""
+        return float(
+            self._draw(
+                lambda rng, n: misc.draw_contrast(contrast_set, probability_type, idx, idx_probability, size=n, rng=rng),
+                'contrast',
+                contrast_set,
+                probability_type,
+                idx,
+                idx_probability,
+            )
+        )
@@ -0,0 +1,670 @@
+"""
+Headless simulation of the Bpod and of the choice world tasks.
+
+The :class:`EmulatedBpod` interprets the state machines sent to it - state timers, input events, global timers,
+global counters, conditions, softcodes and serial messages - on a :class:`VirtualClock`, and exports its trials in the
+structure of the trials run by the hardware.
+
+The :class:`TaskSimulator` runs the trials of a session through the same methods as the task loop -
+:meth:`~iblrig.base_choice_world.ChoiceWorldSession.next_trial`,
+:meth:`~iblrig.base_choice_world.ChoiceWorldSession.get_state_machine_trial` and
+:meth:`~iblrig.base_choice_world.ChoiceWorldSession.trial_completed` - on an emulated Bpod, without any hardware and
+without sleeping. The wheel responses are drawn by a synthetic :class:`PsychometricAgent`.
+
+Examples
+--------
+Simulate 5 consecutive training sessions of the same subject, the training phase and the adaptive reward of each
+session being inferred from the previous one:
+
+>>> from iblrig_tasks._iblrig_tasks_trainingChoiceWorld.task import Session
+>>> agents = [PsychometricAgent(threshold=20, seed=i) for i in range(5)]
+>>> sessions = simulate_sessions(Session, agents, ntrials=600, subject='simulated_subject')
+"""
+
+import datetime
+import heapq
+import logging
+import math
+import re
+import time
+from collections.abc import Callable, Iterable
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from iblrig.hardware import SOFTCODE, Bpod, StateMachineTemplates
+from iblutil.util import Bunch
+from pybpodapi.bpod.bpod_io import BpodIO
+from pybpodapi.bpod_modules.bpod_module import BpodModule
+from pybpodapi.bpod_modules.bpod_modules import BpodModules
+from pybpodapi.com.messaging.end_trial import EndTrial
+from pybpodapi.com.messaging.event_occurrence import EventOccurrence
+from pybpodapi.com.messaging.softcode_occurrence import SoftcodeOccurrence
+from pybpodapi.com.messaging.state_transition import StateTransition
+from pybpodapi.com.messaging.trial import Trial
+from pybpodapi.exceptions.bpod_error import BpodErrorException
+from pybpodapi.state_machine import StateMachine
+
+log = logging.getLogger(__name__)
+
+
+class VirtualClock:
+    """Clock of a simulated session, advanced by the simulator instead of sleeping."""
+
+    def __init__(self, t0: float = 0.0):
+        self.time = t0
+
+    def __call__(self) -> float:
+        return self.time
+
+    def sleep(self, secs: float) -> None:
+        """Advance the clock by `secs` seconds."""
+        self.time += max(secs, 0)
+
+
+class EmulatedBpod(Bpod):
+    """
+    Software emulation of a Bpod state machine, behind the :class:`~iblrig.hardware.Bpod` interface.
+
+    The state machines are built and serialized against the hardware description of a Bpod 2 with its modules, then
+    interpreted: state timers and Tup transitions, input events, global timers, global counters, conditions, softcodes
+    and serial messages to the modules. The input events are either scheduled before running the trial with
+    :meth:`schedule_inputs` or produced by an `input_handler` upon entering each state. The trial is exported in the
+    structure of a trial run on the hardware, see :meth:`pybpodapi.com.messaging.trial.Trial.export`.
+
+    The emulator runs on a :class:`VirtualClock`: by default the trials are run as fast as possible, set the
+    `realtime_factor` to pace the virtual time relative to the wall clock.
+
+    Examples
+    --------
+    >>> bpod = EmulatedBpod()
+    >>> sma = StateMachine(bpod)
+    >>> sma.add_state('wait', 10, {'Port1In': 'reward', 'Tup': 'exit'})
+    >>> sma.add_state('reward', 0.1, {'Tup': 'exit'}, [('Valve1', 255)])
+    >>> bpod.send_state_machine(sma)
+    >>> bpod.schedule_inputs([(1.5, 'Port1In')])
+    >>> bpod.run_state_machine(sma)
+    >>> bpod.session.current_trial.export()['States timestamps']
+    {'wait': [(0.0, 1.5)], 'reward': [(1.5, 1.6)]}
+    """
+
+    def __new__(cls, *args, **kwargs):
+        # unlike the hardware, an emulator is not a per serial port singleton
+        return object.__new__(cls)
+
+    def __init__(
+        self,
+        serial_port: str = 'emulator',
+        modules: tuple[str | None, ...] = ('RotaryEncoder1', None, 'SoundCard1'),
+        clock: VirtualClock | None = None,
+        realtime_factor: float | None = None,
+        input_handler: Callable[[str, float, float, dict[str, str]], Iterable[tuple[float, str]]] | None = None,
+        serial_handler: Callable[[int, list[int], float], Iterable[tuple[float, str]]] | None = None,
+    ):
+        """
+        Software emulation of a Bpod state machine, behind the :class:`~iblrig.hardware.Bpod` interface.
+
+        Parameters
+        ----------
+        serial_port : str
+            Name of the emulated device.
+        modules : tuple of str or None
+            Names of the modules connected to the serial ports of the state machine, None for a free port.
+        clock : VirtualClock, optional
+            The clock of the state machine, starting at 0 by default.
+        realtime_factor : float, optional
+            Speed of the virtual time relative to the wall clock, e.g. 1 for real time or 10 for 10 times faster. By
+            default, the trials are run without waiting.
+        input_handler : callable, optional
+            Called upon entering each state with the name of the state, its start time, its timer and its transitions
+            as a dict of event name to state name. Returns the input events produced in response, as an iterable of
+            (time, event name) tuples.
+        serial_handler : callable, optional
+            Called with the serial port, the bytes and the time of each serial message sent to a module. Returns the
+            input events produced in response, as an iterable of (time, event name) tuples.
+        """
+        self._module_names = modules
+        self.clock = VirtualClock() if clock is None else clock
+        self.realtime_factor = realtime_factor
+        self.input_handler = input_handler
+        self.serial_handler = serial_handler
+        self.output_log: list[tuple[float, str, Any]] = []
+        self._serial_message_library: dict[tuple[int, int], list[int]] = {}
+        self._scheduled_inputs: list[tuple[float, str]] = []
+        self._state_machine = None
+        self._wall_time = None
+        self._stop_requested = False
+        BpodIO.__init__(self, serial_port=serial_port)
+        self.serial_messages = {}
+        self.actions = Bunch({})
+        self.can_control_led = False
+        self._is_initialized = True
+
+    def __del__(self):
+        pass
+
+    def open(self):
+        """Set up the hardware description of a Bpod 2 state machine and of its modules."""
+        hardware = self._hardware
+        hardware.firmware_version, hardware.machine_type = 23, 3
+        hardware.max_states, hardware.cycle_period, hardware.max_serial_events = 256, 100, 60
+        hardware.n_global_timers, hardware.n_global_counters, hardware.n_conditions = 16, 8, 16
+        hardware.inputs = 'U' * len(self._module_names) + 'XBBWWPPPP'
+        hardware.outputs = 'U' * len(self._module_names) + 'XBBWWPPPPVVVV'
+        hardware.inputs_enabled = [1] * len(hardware.inputs)
+        n_serial_events = int(hardware.max_serial_events / (len(self._module_names) + 1))
+        self.bpod_modules = BpodModules(self)
+        for i, name in enumerate(self._module_names):
+            self.bpod_modules += BpodModule(name is not None, name or '', 0, [], n_serial_events, i + 1)
+        hardware.setup(self.bpod_modules)
+        self._event_codes = {name: code for code, name in enumerate(hardware.channels.event_names)}
+        self.sock = self.socketin = self.stdin = None
+        self.bpod_com_ready = True
+        return self
+
+    def close(self):
+        self.bpod_com_ready = False
+        self._is_initialized = False
+
+    def load_serial_message(self, serial_channel, message_ID, serial_message):  # noqa: N803
+        self._serial_message_library[(serial_channel, message_ID)] = list(serial_message)
+
+    def reset_serial_messages(self):
+        self._serial_message_library = {}
+
+    def manual_override(self, channel_type, channel_name, channel_number, value):
+        self.output_log.append((self.clock(), f'{channel_name}{channel_number}', value))
+
+    def stop_trial(self):
+        self._stop_requested = True
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    def _bpodcom_send_state_machine(self, message):
+        self._state_machine_message = message
+
+    def send_state_machine(self, sma: StateMachine, run_asap=None):
+        super().send_state_machine(sma, run_asap=run_asap)
+        self._state_machine = sma
+
+    def schedule_inputs(self, events: Iterable[tuple[float, str]]) -> None:
+        """
+        Schedule input events for the next trial.
+
+        Parameters
+        ----------
+        events : iterable of (float, str)
+            Time (s) from the start of the trial and name of each event, e.g. ``(0.5, 'Port1In')``.
+        """
+        events = list(events)
+        if invalid := {event_name for _, event_name in events} - self._event_codes.keys():
+            raise BpodErrorException(f'Error: invalid event names {sorted(invalid)}.')
+        self._scheduled_inputs.extend(events)
+
+    def _tick(self, t: float) -> float:
+        """Round a time to the cycle of the state machine."""
+        return round(t * self._hardware.cycle_frequency) / self._hardware.cycle_frequency
+
+    def _push(self, t: float, event_name: str, timer: tuple[int, int] | None = None) -> None:
+        if event_name not in self._event_codes:
+            raise BpodErrorException(f'Error: {event_name} is an invalid event name.')
+        self._sequence += 1
+        heapq.heappush(self._pending, (t, self._sequence, event_name, timer))
+
+    def _wait(self, t: float) -> None:
+        """Pace the virtual time relative to the wall clock, in real-time mode."""
+        if self.realtime_factor:
+            dt = self._wall_time + (t - self._virtual_time) / self.realtime_factor - time.perf_counter()
+            if dt > 0:
+                time.sleep(dt)
+
+    def _start_global_timer(self, sma: StateMachine, i: int, t: float) -> None:
+        timers = sma.global_timers
+        self._timer_generation[i] += 1
+        t_start = t + timers.on_set_delays[i]
+        if timers.send_events[i]:
+            self._push(t_start, f'GlobalTimer{i + 1}_Start', (i, self._timer_generation[i]))
+        self._push(t_start + timers.timers[i], f'GlobalTimer{i + 1}_End', (i, self._timer_generation[i]))
+
+    def _apply_output_actions(self, sma: StateMachine, state: int, t: float) -> None:
+        channels = sma.hardware.channels
+        for code, value in sma.output_matrix[state]:
+            name = channels.output_channel_names[code]
+            self.output_log.append((t, name, value))
+            if name == 'SoftCode':
+                self.session += SoftcodeOccurrence(value, t)
+                self.softcode_handler_function(value)
+            elif name.startswith('Serial'):
+                port = int(name[len('Serial') :])
+                message = self._serial_message_library.get((port, value), [value])
+                for event in self.serial_handler(port, message, t) if self.serial_handler else ():
+                    self._push(*event)
+            elif name in ('GlobalTimerTrig', 'GlobalTimerCancel'):
+                # integers designate a timer, strings of bits a set of timers
+                indices = [value - 1] if isinstance(value, int) else [i for i, b in enumerate(reversed(value)) if b == '1']
+                for i in indices:
+                    if name == 'GlobalTimerTrig':
+                        self._start_global_timer(sma, i, t)
+                    else:
+                        self._timer_generation[i] += 1
+            elif name == 'GlobalCounterReset':
+                self._counters[value - 1] = 0
+
+    def _transition(self, sma: StateMachine, state: int, event_code: int) -> float | None:
+        """Return the destination of the transition of `state` on an event, None if the event has no effect."""
+        for matrix in (
+            sma.input_matrix,
+            sma.conditions.matrix,
+            sma.global_counters.matrix,
+            sma.global_timers.start_matrix,
+            sma.global_timers.end_matrix,
+        ):
+            # the global timer trigger and cancel events overwrite the end matrix of a state with a bit mask
+            if isinstance(transitions := matrix[state], list):
+                for code, destination in transitions:
+                    if code == event_code:
+                        return destination
+        return None
+
+    def _check_conditions(self, sma: StateMachine, state: int, t: float) -> None:
+        channels = sma.hardware.channels
+        for code, _ in sma.conditions.matrix[state]:
+            i = int(channels.event_names[code][len('Condition') :]) - 1
+            channel = channels.input_channel_names[sma.conditions.channels[i]]
+            if self._input_states.get(channel, 0) == sma.conditions.values[i]:
+                self._push(t, f'Condition{i + 1}')
+
+    def _state_transitions(self, sma: StateMachine, state: int) -> dict[str, str]:
+        """The transitions of a state, as a dict of event name to state name."""
+        channels = sma.hardware.channels
+        transitions = {}
+        for matrix in (
+            sma.input_matrix,
+            sma.conditions.matrix,
+            sma.global_counters.matrix,
+            sma.global_timers.start_matrix,
+            sma.global_timers.end_matrix,
+        ):
+            if isinstance(matrix[state], list):
+                transitions.update({channels.event_names[code]: destination for code, destination in matrix[state]})
+        if sma.state_timer_matrix[state] != state:
+            transitions['Tup'] = sma.state_timer_matrix[state]
+        return {k: 'exit' if math.isnan(v) else sma.state_names[int(v)] for k, v in transitions.items()}
+
+    def run_state_machine(self, sma: StateMachine) -> bool:
+        """
+        Run a state machine on the virtual clock and add the trial to the session.
+
+        Parameters
+        ----------
+        sma : pybpodapi.state_machine.StateMachine
+            The state machine, sent to the emulator with :meth:`send_state_machine`.
+
+        Returns
+        -------
+        bool
+            True when the trial ran to its end.
+        """
+        if not self.bpod_com_ready:
+            raise BpodErrorException('Error: the Bpod emulator is closed.')
+        if self._state_machine is None:
+            raise BpodErrorException('Error: no state machine was sent to the Bpod emulator.')
+        if self._skip_all_trials:
+            return False
+        self.session += Trial(sma)
+        trial = self.session.current_trial
+        cycle = 1 / self._hardware.cycle_frequency
+        # in real-time mode the virtual clock also runs between trials
+        if self.realtime_factor and self._wall_time is not None:
+            self.clock.sleep((time.perf_counter() - self._wall_time) * self.realtime_factor)
+        self._wall_time, self._virtual_time = time.perf_counter(), self.clock()
+        t = t_start = self._tick(self.clock())
+        if self.bpod_start_timestamp is None:
+            self.bpod_start_timestamp = t_start
+        self.output_log = []
+        self._pending, self._sequence, self._stop_requested = [], 0, False
+        self._counters = [0] * self._hardware.n_global_counters
+        self._timer_generation = [0] * self._hardware.n_global_timers
+        self._input_states = {}
+        for dt, event_name in self._scheduled_inputs:
+            self._push(t_start + dt, event_name)
+        self._scheduled_inputs = []
+        state = sma.current_state = 0
+        trial.states, trial.state_timestamps = [0], [t_start]
+        sma.is_running = True
+        while True:
+            # enter the state: set the outputs, check the conditions and collect the inputs answering the state
+            self._apply_output_actions(sma, state, t)
+            self._check_conditions(sma, state, t)
+            if self.input_handler is not None:
+                transitions = self._state_transitions(sma, state)
+                for event in self.input_handler(sma.state_names[state], t, sma.state_timers[state], transitions):
+                    self._push(*event)
+            # without a transition on Tup, the state timer has no effect
+            t_up = t + max(sma.state_timers[state], cycle) if sma.state_timer_matrix[state] != state else math.inf
+            destination = None
+            while destination is None and not self._stop_requested and self._pending and self._pending[0][0] < t_up:
+                t_event, _, event_name, timer = heapq.heappop(self._pending)
+                if timer is not None and timer[1] != self._timer_generation[timer[0]]:
+                    continue  # cancelled or re-triggered global timer
+                t_event = self._tick(max(t_event, t + cycle))
+                self._wait(t_event)
+                event_code = self._event_codes[event_name]
+                self.session += EventOccurrence(event_code, event_name, t_event)
+                # update the input channels and the global counters
+                if match := re.fullmatch(r'(\w+?)_?(In|High|Start|Out|Low|End)', event_name):
+                    self._input_states[match.group(1)] = int(match.group(2) in ('In', 'High', 'Start'))
+                    self._check_conditions(sma, state, t_event)
+                if match and match.group(2) == 'End' and event_name.startswith('GlobalTimer'):
+                    i = int(match.group(1)[len('GlobalTimer') :]) - 1
+                    if sma.global_timers.loop_mode[i]:
+                        self._start_global_timer(sma, i, t_event + sma.global_timers.loop_intervals[i])
+                for i, attached_event in enumerate(sma.global_counters.attached_events):
+                    if attached_event == event_code:
+                        self._counters[i] += 1
+                        if self._counters[i] == sma.global_counters.thresholds[i]:
+                            self._push(t_event, f'GlobalCounter{i + 1}_End')
+                if (destination := self._transition(sma, state, event_code)) is not None:
+                    t = t_event
+            if self._stop_requested:
+                break
+            if destination is None:
+                if t_up == math.inf:
+                    raise BpodErrorException(f'Error: state {sma.state_names[state]} waits for input events that never occur.')
+                t = self._tick(t_up)
+                self._wait(t)
+                self.session += EventOccurrence(self._event_codes['Tup'], 'Tup', t)
+                destination = sma.state_timer_matrix[state]
+            if math.isnan(destination):
+                break
+            if destination == 255 and sma.use_255_back_signal:
+                destination = trial.states[-2]
+            state = sma.current_state = int(destination)
+            trial.states.append(state)
+            trial.state_timestamps.append(t)
+            self.session += StateTransition(sma.state_names[state], t)
+        sma.is_running = False
+        self.session += EndTrial('The trial ended')
+        trial.state_timestamps.append(t)
+        trial.bpod_start_timestamp = self.bpod_start_timestamp
+        trial.trial_start_timestamp = t_start
+        trial.trial_end_timestamp = t
+        self.session.add_trial_events()
+        self.clock.time = t
+        self._wall_time = time.perf_counter()
+        return True
+
+
+class PsychometricAgent:
+    """
+    Synthetic subject answering the choice world trials according to a psychometric function.
+
+    The probability of reporting the stimulus on the right is an error function of the signed contrast with two lapse
+    rates, as in :func:`psychofit.erf_psycho_2gammas`. The response times are drawn from a log-normal distribution: a
+    response slower than the response window of the task results in a no-go trial.
+    """
+
+    def __init__(
+        self,
+        bias: float = 0.0,
+        threshold: float = 20.0,
+        lapse_left: float = 0.05,
+        lapse_right: float = 0.05,
+        rt_median: float = 0.5,
+        rt_sigma: float = 0.7,
+        p_quiescence_movement: float = 0.1,
+        seed: int | None = None,
+    ):
+        """
+        Synthetic subject answering the choice world trials according to a psychometric function.
+
+        Parameters
+        ----------
+        bias : float
+            Signed contrast (%) at which the subject is equally likely to report either side, positive values bias the
+            responses to the left.
+        threshold : float
+            Slope of the psychometric function (%): the smaller the threshold, the steeper the function.
+        lapse_left, lapse_right : float
+            Probability of reporting the right side on the lowest contrasts on the left, and of reporting the left side
+            on the highest contrasts on the right.
+        rt_median, rt_sigma : float
+            Median (s) and log standard deviation of the log-normal distribution of the response times.
+        p_quiescence_movement : float
+            Probability of moving the wheel during each quiescent period, which restarts the period.
+        seed : int, optional
+            Seed of the random generator of the agent.
+        """
+        self.bias = bias
+        self.threshold = threshold
+        self.lapse_left = lapse_left
+        self.lapse_right = lapse_right
+        self.rt_median = rt_median
+        self.rt_sigma = rt_sigma
+        self.p_quiescence_movement = p_quiescence_movement
+        self.rng = np.random.default_rng(seed)
+
+    def p_right(self, signed_contrast: float | np.ndarray) -> float | np.ndarray:
+        """
+        Probability of reporting the stimulus on the right.
+
+        Parameters
+        ----------
+        signed_contrast : float or numpy.ndarray
+            Contrast (%) of the stimulus, positive on the right and negative on the left.
+
+        Returns
+        -------
+        float or numpy.ndarray
+            Probability of a rightward report.
+        """
+        x = (np.asarray(signed_contrast, dtype=float) - self.bias) / self.threshold
+        erf = np.vectorize(math.erf, otypes=[float])(x)
+        return self.lapse_left + (1 - self.lapse_left - self.lapse_right) * (erf + 1) / 2
+
+    def respond(self, signed_contrast: float) -> tuple[int, float]:
+        """
+        Draw the response to a stimulus.
+
+        Parameters
+        ----------
+        signed_contrast : float
+            Contrast (%) of the stimulus, positive on the right and negative on the left.
+
+        Returns
+        -------
+        int
+            The reported side: 1 for right, -1 for left.
+        float
+            The response time (s) measured from the start of the response window.
+        """
+        side = 1 if self.rng.random() < self.p_right(signed_contrast) else -1
+        return side, float(self.rng.lognormal(math.log(self.rt_median), self.rt_sigma))
+
+    def quiescence_movement(self, duration: float) -> tuple[int, float] | None:
+        """
+        Draw a wheel movement during a quiescent period of `duration` seconds.
+
+        Returns
+        -------
+        tuple of (int, float) or None
+            The direction and time (s) of the movement from the start of the period, None if the wheel is kept still.
+        """
+        if self.rng.random() >= self.p_quiescence_movement:
+            return None
+        return int(self.rng.choice([-1, 1])), float(self.rng.uniform(0, duration))
+
+
+class TaskSimulator:
+    """
+    Run the trials of a choice world session headlessly, on a virtual clock.
+
+    The session is mocked and its state machines are run by an :class:`EmulatedBpod`. The inputs the states wait for
+    are produced by a simulated rig - the frame2ttl and the sound card answer after a fixed latency, and the camera
+    sends a frame TTL at the start of each trial - and by the agent, who moves the wheel during the quiescent period and
+    the response window.
+    """
+
+    def __init__(
+        self,
+        session,
+        agent: PsychometricAgent | None = None,
+        clock: VirtualClock | None = None,
+        trial_overhead: float = 0.02,
+        latencies: dict[str, float] | None = None,
+        camera_frame_delay: float = 1 / 30,
+    ):
+        """
+        Run the trials of a choice world session headlessly, on a virtual clock.
+
+        Parameters
+        ----------
+        session : iblrig.base_choice_world.ChoiceWorldSession
+            The session to simulate, it is mocked upon instantiation.
+        agent : PsychometricAgent, optional
+            The synthetic subject, defaults to an unbiased agent.
+        clock : VirtualClock, optional
+            The clock of the Bpod, starting at 0 by default.
+        trial_overhead : float
+            Duration (s) of the main loop between two trials, in addition to the wait for the inter-trial interval.
+        latencies : dict, optional
+            Latency (s) of the inputs of the rig answering a state, keyed by input event name.
+        camera_frame_delay : float
+            Delay (s) of the first camera frame TTL of each trial, on behavior port 1.
+        """
+        self.session = session
+        self.agent = PsychometricAgent() if agent is None else agent
+        self.clock = VirtualClock() if clock is None else clock
+        self.trial_overhead = trial_overhead
+        self.latencies = {'BNC1High': 1 / 60, 'BNC2High': 0.005}
+        self.latencies.update(latencies or {})
+        self.camera_frame_delay = camera_frame_delay
+        self.session.mock()
+        self.bpod = EmulatedBpod(clock=self.clock, input_handler=self._schedule_inputs)
+        self.bpod.define_rotary_encoder_actions()
+        self.bpod.define_harp_sounds_actions(self.bpod.sound_card)
+        self.bpod.register_softcodes({softcode: lambda: None for softcode in SOFTCODE})
+        self.session.bpod = self.bpod
+        if self.session.task_params.get('STATE_MACHINE_TEMPLATES', True):
+            self.session.state_machine_templates = StateMachineTemplates(self.bpod)
+
+    def run(self, ntrials: int | None = None, create_session: bool = True) -> Any:
+        """
+        Simulate a session.
+
+        The session is created, its trials are simulated and the session is closed as
+        :meth:`~iblrig.base_tasks.BaseSession.run` does: the task settings are saved and the subject's session index is
+        updated so that the next session of the subject picks up from this one.
+
+        Parameters
+        ----------
+        ntrials : int, optional
+            Number of trials, defaults to the NTRIALS task parameter.
+        create_session : bool
+            Whether to write the session to disk.
+
+        Returns
+        -------
+        iblrig.base_choice_world.ChoiceWorldSession
+            The simulated session.
+        """
+        ntrials = self.session.task_params.NTRIALS if ntrials is None else ntrials
+        if create_session:
+            self.session.create_session()
+        try:
+            for _ in range(ntrials):
+                self.run_trial()
+        finally:
+            self.session._close_trial_data()
+        if create_session:
+            self.session.session_info.SESSION_END_TIME = datetime.datetime.now().isoformat()
+            self.session.save_task_parameters_to_json_file()
+            self.session.update_session_index()
+        return self.session
+
+    def run_trial(self) -> dict[str, Any]:
+        """
+        Simulate the next trial of the session.
+
+        Returns
+        -------
+        dict
+            The Bpod data of the trial, as passed to :meth:`trial_completed`.
+        """
+        session = self.session
+        session.next_trial()
+        sma = session._get_state_machine_trial(session.trial_num)
+        self.bpod.send_state_machine(sma)
+        iti = session.task_params.ITI_DELAY_SECS - session.task_params.get('DEAD_TIME', 0.5)
+        self.clock.sleep(max(iti, 0) + (self.trial_overhead if session.trial_num > 0 else 0))
+        self.bpod.run_state_machine(sma)
+        bpod_data = self.bpod.session.current_trial.export()
+        session.trial_completed(bpod_data)
+        return bpod_data
+
+    def _schedule_inputs(self, state_name: str, t: float, timer: float, conditions: dict[str, str]) -> list[tuple[float, str]]:
+        """List the input events produced in response to entering a state, as (time, event name) tuples."""
+        session = self.session
+        inputs = [(t + latency, event) for event, latency in self.latencies.items() if event in conditions]
+        if len(self.bpod.session.current_trial.states) == 1:
+            inputs.append((t + self.camera_frame_delay, 'Port1In'))
+        if session.event_reward in conditions and session.event_error in conditions:
+            # response window: the agent reports a side, a response slower than the state timer is a no-go
+            position = session.trials_table.at[session.trial_num, 'position']
+            signed_contrast = session.trials_table.at[session.trial_num, 'contrast'] * np.sign(position) * 100
+            side, response_time = self.agent.respond(signed_contrast)
+            inputs.append((t + response_time, session.event_reward if side == np.sign(position) else session.event_error))
+        elif session.movement_left in conditions and session.movement_right in conditions:
+            # quiescent period: a movement of the wheel restarts the period
+            if (movement := self.agent.quiescence_movement(timer)) is not None:
+                direction, delay = movement
+                inputs.append((t + delay, session.movement_left if direction < 0 else session.movement_right))
+        return inputs
+
+
+def simulate_sessions(session_class, agents: Iterable[PsychometricAgent], ntrials: int | None = None, **kwargs) -> pd.DataFrame:
+    """
+    Simulate consecutive sessions of a subject, one per agent.
+
+    Each session is instantiated as on the rig, so that its training phase, adaptive reward and adaptive gain are
+    inferred from the sessions simulated before it.
+
+    Parameters
+    ----------
+    session_class : type
+        The choice world session class, e.g. ``iblrig_tasks._iblrig_tasks_trainingChoiceWorld.task.Session``.
+    agents : iterable of PsychometricAgent
+        The synthetic subject of each session, changing the agent models learning across sessions.
+    ntrials : int, optional
+        Number of trials per session, defaults to the NTRIALS task parameter.
+    **kwargs
+        Keyword arguments passed to the session class.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per session with the number of trials, the performance, the water delivered, and, for the training
+        sessions, the training phase at the start and the end of the session and the adaptive reward.
+    """
+    records = []
+    for agent in agents:
+        session = session_class(**kwargs)
+        training_phase = getattr(session, 'training_phase', None)
+        TaskSimulator(session, agent=agent).run(ntrials=ntrials)
+        records.append(
+            {
+                'session_path': session.paths.SESSION_FOLDER,
+                'ntrials': session.session_info.NTRIALS,
+                'ntrials_correct': session.session_info.NTRIALS_CORRECT,
+                'water_delivered': session.session_info.TOTAL_WATER_DELIVERED,
+                'training_phase_start': training_phase,
+                'training_phase_end': getattr(session, 'training_phase', None),
+                'adaptive_reward': session.session_info.get('ADAPTIVE_REWARD_AMOUNT_UL'),
+            }
+        )
+    return pd.DataFrame(records)
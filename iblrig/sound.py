@@ -2,12 +2,10 @@ import logging
 
 import numpy as np
 
-from pybpod_soundcard_module.module_api import DataType, SampleRate, SoundCardModule
-
 log = logging.getLogger(__name__)
 
 
-def make_sound(rate=44100, frequency=5000, duration=0.1, amplitude=1, fade=0.01, chans='L+TTL'):
+def make_sound(rate=44100, frequency=5000, duration=0.1, amplitude=1, fade=0.01, chans='L+TTL', rng=None):
     """
     Build sounds and save bin file for upload to soundcard or play via
     sounddevice lib.
@@ -27,6 +25,8 @@ def make_sound(rate=44100, frequency=5000, duration=0.1, amplitude=1, fade=0.01,
     :param chans: ['mono', 'L', 'R', 'stereo', 'L+TTL', 'TTL+R'] number of
                    sound channels and type of output, defaults to 'L+TTL'
     :type chans: str, optional
+    :param rng: random generator used to draw the white noise, defaults to the global numpy random state
+    :type rng: numpy.random.Generator, optional
     :return: streo sound from mono definitions
     :rtype: np.ndarray with shape (Nsamples, 2)
     """
@@ -52,7 +52,7 @@ def make_sound(rate=44100, frequency=5000, duration=0.1, amplitude=1, fade=0.01,
     null = np.zeros(len(tone))
 
     if frequency == -1:
-        tone = amplitude * np.random.rand(tone.size)
+        tone = amplitude * (np.random if rng is None else rng).random(tone.size)
 
     if chans == 'mono':
         sound = np.array(tone)
@@ -100,6 +100,8 @@ def format_sound(sound, file_path=None, flat=False):
 
 
 def configure_sound_card(card=None, sounds=None, indexes=None, sample_rate=96):
+    from pybpod_soundcard_module.module_api import DataType, SampleRate, SoundCardModule
+
     if indexes is None:
         indexes = []
     if sounds is None:
@@ -0,0 +1,79 @@
+"""
+Pre-warmed interpreter running a task.
+
+The wizard may start a worker as soon as a task is selected. The worker imports the task module along with its
+dependencies and reads the rig settings, then waits for the arguments of the session: a JSON list written as a single
+line to its standard input. The task then runs as if started from the command line, in the process of the worker. A
+worker runs a single session, so that each session keeps its own process.
+
+Examples
+--------
+Start a worker for a task, and run a session once the arguments are known:
+
+>>> worker = subprocess.Popen([sys.executable, '-m', 'iblrig.task_worker', task_file], stdin=subprocess.PIPE, text=True)
+>>> print(json.dumps(['--subject', 'algernon']), file=worker.stdin, flush=True)
+"""
+
+import argparse
+import json
+import logging
+import runpy
+import sys
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+def prewarm(task_file: Path) -> None:
+    """
+    Import the task module and its dependencies, and read the rig settings.
+
+    Parameters
+    ----------
+    task_file : Path
+        The path of the task.py file.
+    """
+    # as for `python task.py`, the folder of the task comes first in the import path
+    sys.path.insert(0, str(task_file.parent))
+    # the task module is imported under another name: running it as __main__ only re-executes its class definitions
+    spec = spec_from_file_location(f'_prewarmed_{task_file.parent.name}', task_file)
+    spec.loader.exec_module(module_from_spec(spec))
+    from iblrig.path_helper import load_pydantic_yaml
+    from iblrig.pydantic_definitions import HardwareSettings, RigSettings
+
+    try:
+        load_pydantic_yaml(HardwareSettings)
+        load_pydantic_yaml(RigSettings)
+    except Exception as e:
+        # the task reports invalid settings when it starts
+        log.debug('Failed to read the rig settings: %s', e)
+
+
+def run_task(task_file: Path, args: list[str]) -> None:
+    """
+    Run a task as if started from the command line.
+
+    Parameters
+    ----------
+    task_file : Path
+        The path of the task.py file.
+    args : list of str
+        The command line arguments of the task.
+    """
+    sys.argv = [str(task_file), *args]
+    runpy.run_path(str(task_file), run_name='__main__')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-warmed interpreter running a task, see iblrig.task_worker')
+    parser.add_argument('task_file', type=Path, help='path of the task.py file')
+    task_file = parser.parse_args().task_file.resolve()
+    prewarm(task_file)
+    # a closed standard input means the worker is discarded before running a session
+    if line := sys.stdin.readline():
+        run_task(task_file, json.loads(line))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -23,6 +23,7 @@ class TestInstantiationAdvanced(BaseTestCases.CommonTestInstantiateTask):
             contrast_set=[1.0, 0.5, 0.0, 0.0, 0.5, 1.0],
             reward_set_ul=[1.0, 1.5, 2.0, 2.0, 2.5, 2.6],
             position_set=[-35, -35, -35, 35, 35, 35],
+            random_seed=65432,
             **self.task_kwargs,
         )
 
@@ -33,13 +34,13 @@ class TestInstantiationAdvanced(BaseTestCases.CommonTestInstantiateTask):
         self.assertTrue(task.task_params['PROBABILITY_LEFT'] == 2 / 3)
         # run a fake task for 800 trials
         trial_fixtures = get_fixtures()
+        rng = np.random.default_rng(65432)
         nt = 800
-        np.random.seed(65432)
 
         for i in np.arange(nt):
             task.next_trial()
             # pc = task.psychometric_curve()
-            trial_type = np.random.choice(['correct', 'error', 'no_go'], p=[0.9, 0.05, 0.05])
+            trial_type = rng.choice(['correct', 'error', 'no_go'], p=[0.9, 0.05, 0.05])
             task.trial_completed(bpod_data=trial_fixtures[trial_type])
             if trial_type == 'correct':
                 assert task.trials_table['trial_correct'][task.trial_num]
@@ -51,7 +52,8 @@ class TestInstantiationAdvanced(BaseTestCases.CommonTestInstantiateTask):
 
         # check the contrasts and positions by aggregating the trials table
         df_contrasts = (
-            task.trials_table.iloc[:nt, :]
+            task.trials_table.to_dataframe()
+            .iloc[:nt, :]
             .groupby(['contrast', 'position'])
             .agg(
                 count=pd.NamedAgg(column='reward_amount', aggfunc='count'),
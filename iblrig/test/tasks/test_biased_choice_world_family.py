@@ -1,10 +1,12 @@
 import datetime
+import json
+import threading
 import time
 
 import numpy as np
 import pandas as pd
 
-from iblrig.raw_data_loaders import load_task_jsonable
+from iblrig.raw_data_loaders import TRIALS_TABLE_FILE_NAME, load_task_jsonable, load_task_trials_table
 from iblrig.test.base import PATH_FIXTURES, BaseTestCases, IntegrationFullRuns
 from iblrig_tasks._iblrig_tasks_biasedChoiceWorld.task import Session as BiasedChoiceWorldSession
 from iblrig_tasks._iblrig_tasks_ephysChoiceWorld.task import Session as EphysChoiceWorldSession
@@ -15,8 +17,7 @@ from iblrig_tasks._iblrig_tasks_neuroModulatorChoiceWorld.task import Session as
 class TestInstantiationBiased(BaseTestCases.CommonTestInstantiateTask):
     def setUp(self) -> None:
         self.get_task_kwargs()
-        self.task = BiasedChoiceWorldSession(**self.task_kwargs)
-        np.random.seed(12345)
+        self.task = BiasedChoiceWorldSession(**self.task_kwargs, random_seed=12345)
 
     def test_task(self, reward_set: np.ndarray | None = None):
         if reward_set is None:
@@ -24,13 +25,14 @@ class TestInstantiationBiased(BaseTestCases.CommonTestInstantiateTask):
         task = self.task
         task.create_session()
         trial_fixtures = get_fixtures()
+        rng = np.random.default_rng(12345)
         nt = 500
         t = np.zeros(nt)
         for i in np.arange(nt):
             t[i] = time.time()
             task.next_trial()
             # pc = task.psychometric_curve()
-            trial_type = np.random.choice(['correct', 'error', 'no_go'], p=[0.9, 0.05, 0.05])
+            trial_type = rng.choice(['correct', 'error', 'no_go'], p=[0.9, 0.05, 0.05])
             task.trial_completed(trial_fixtures[trial_type])
             if trial_type == 'correct':
                 self.assertTrue(task.trials_table['trial_correct'][task.trial_num])
@@ -39,8 +41,14 @@ class TestInstantiationBiased(BaseTestCases.CommonTestInstantiateTask):
             if i == 245:
                 task.show_trial_log()
             assert not np.isnan(task.reward_time)
+        # the columnar sidecar is finalized at the end of the session and matches the jsonable
+        task._trials_table_writer.close()
+        self.assertTrue(task.paths.DATA_FILE_PATH.with_name(TRIALS_TABLE_FILE_NAME).exists())
+        trials_table_jsonable, _ = load_task_jsonable(task.paths.DATA_FILE_PATH)
+        trials_table_sidecar = load_task_trials_table(task.paths.DATA_FILE_PATH)
+        pd.testing.assert_frame_equal(trials_table_sidecar, trials_table_jsonable, check_dtype=False)
         # test the trial table results
-        task.trials_table = task.trials_table[: task.trial_num + 1]
+        task.trials_table = task.trials_table.to_dataframe()[: task.trial_num + 1]
         np.testing.assert_array_equal(task.trials_table['trial_num'].values, np.arange(task.trial_num + 1))
         # makes sure the water reward counts check out
         assert task.trials_table['reward_amount'].sum() == task.session_info.TOTAL_WATER_DELIVERED
@@ -88,7 +96,7 @@ class TestInstantiationBiased(BaseTestCases.CommonTestInstantiateTask):
 class TestImagingChoiceWorld(TestInstantiationBiased):
     def setUp(self) -> None:
         self.get_task_kwargs()
-        self.task = ImagingChoiceWorldSession(**self.task_kwargs)
+        self.task = ImagingChoiceWorldSession(**self.task_kwargs, random_seed=12345)
 
     # TODO: Shouldn't the quiescent period for imaging choice world be different?
     # def check_quiescent_period(self):
@@ -103,7 +111,7 @@ class TestImagingChoiceWorld(TestInstantiationBiased):
 class TestInstantiationEphys(TestInstantiationBiased):
     def setUp(self) -> None:
         self.get_task_kwargs()
-        self.task = EphysChoiceWorldSession(**self.task_kwargs)
+        self.task = EphysChoiceWorldSession(**self.task_kwargs, random_seed=12345)
 
     def test_task(self, _=None):
         super().test_task()
@@ -114,13 +122,13 @@ class TestInstantiationEphys(TestInstantiationBiased):
             - {'index', 'reward_amount', 'reward_valve_time', 'response_side', 'response_time', 'trial_correct'}
         )
         template = self.task.get_session_template(0).head(len(self.task.trials_table))
-        assert (self.task.trials_table == template)[cols].all().all()
+        assert (self.task.trials_table[cols] == template[cols]).all().all()
 
 
 class TestNeuroModulatorBiasedChoiceWorld(TestInstantiationBiased):
     def setUp(self) -> None:
         self.get_task_kwargs()
-        self.task = NeuroModulatorChoiceWorldSession(**self.task_kwargs)
+        self.task = NeuroModulatorChoiceWorldSession(**self.task_kwargs, random_seed=12345)
 
     def test_task(self, _=None):
         super().test_task(reward_set=np.array([0, 1.0, 1.5, 3.0]))
@@ -128,6 +136,71 @@ class TestNeuroModulatorBiasedChoiceWorld(TestInstantiationBiased):
         assert np.abs(0.05 - np.mean(self.task.trials_table['omit_feedback'])) < 0.05
 
 
+class TestRandomSeed(BaseTestCases.CommonTestTask):
+    def setUp(self) -> None:
+        self.get_task_kwargs()
+
+    def test_regenerate_session(self):
+        n_trials = 300
+        tasks = [NeuroModulatorChoiceWorldSession(**self.task_kwargs, random_seed=seed) for seed in (1234, 1234, 4321)]
+        for task in tasks:
+            for _ in range(n_trials):
+                task.next_trial()
+        trials_tables = [task.trials_table.to_dataframe()[:n_trials] for task in tasks]
+        # the same seed yields the same trials, down to the block structure and the reward stagger
+        pd.testing.assert_frame_equal(trials_tables[0], trials_tables[1])
+        pd.testing.assert_frame_equal(tasks[0].blocks_table, tasks[1].blocks_table)
+        self.assertFalse(trials_tables[0]['contrast'].equals(trials_tables[2]['contrast']))
+        # the seeds are recorded in the task settings
+        with open(tasks[0].save_task_parameters_to_json_file()) as fp:
+            settings = json.load(fp)
+        self.assertEqual(1234, settings['RANDOM_SEED'])
+        self.assertEqual(1234, settings['TRIAL_SEQUENCE_SEED'])
+        # a seed is drawn when none is specified
+        task = BiasedChoiceWorldSession(**self.task_kwargs)
+        self.assertIsInstance(task.session_info['RANDOM_SEED'], int)
+        self.assertEqual(task.session_info['RANDOM_SEED'], task.trial_sequence.seed)
+
+
+class TestTrialWriter(BaseTestCases.CommonTestTask):
+    def setUp(self) -> None:
+        self.get_task_kwargs()
+        self.task = BiasedChoiceWorldSession(**self.task_kwargs, random_seed=12345)
+
+    def test_pipelined_trials(self):
+        """Test that the trial data written in the background matches the trials table, in order."""
+        task = self.task
+        task.create_session()
+        trial_fixtures = get_fixtures()
+        rng = np.random.default_rng(12345)
+        write_threads = set()
+        write_trial_data = task._write_trial_data
+
+        def _write_trial_data(trial_data):
+            write_threads.add(threading.current_thread())
+            write_trial_data(trial_data)
+
+        task._write_trial_data = _write_trial_data
+        task.start_trial_writer()
+        for _ in range(50):
+            task.next_trial()
+            task.trial_completed(trial_fixtures[rng.choice(['correct', 'error', 'no_go'])])
+        task.stop_trial_writer()
+        task._trials_table_writer.close()
+        self.assertNotIn(threading.main_thread(), write_threads)
+        self.assertTrue(task.paths.SESSION_FOLDER.joinpath('transfer_me.flag').exists())
+        self.assertTrue(task.paths.DATA_FILE_PATH.with_name('new_trial.flag').exists())
+        trials_table_jsonable, bpod_data = load_task_jsonable(task.paths.DATA_FILE_PATH)
+        self.assertEqual(50, len(bpod_data))
+        trials_table = task.trials_table.to_dataframe()[: task.trial_num + 1]
+        for column in ('trial_num', 'position', 'contrast', 'reward_amount', 'response_side'):
+            np.testing.assert_array_equal(trials_table[column].values, trials_table_jsonable[column].values)
+        # the trial data is written immediately once the writer is stopped
+        task.next_trial()
+        task.trial_completed(trial_fixtures['correct'])
+        self.assertEqual(51, load_task_jsonable(task.paths.DATA_FILE_PATH)[0].shape[0])
+
+
 class TestIntegrationFullRun(IntegrationFullRuns):
     def setUp(self) -> None:
         super().setUp()
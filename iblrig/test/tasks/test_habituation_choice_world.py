@@ -9,8 +9,7 @@ from iblrig_tasks._iblrig_tasks_habituationChoiceWorld.task import Session as Ha
 class TestInstantiateHabituationChoiceWorld(BaseTestCases.CommonTestInstantiateTask):
     def setUp(self) -> None:
         self.get_task_kwargs()
-        self.task = HabituationChoiceWorldSession(**self.task_kwargs)
-        np.random.seed(12345)
+        self.task = HabituationChoiceWorldSession(**self.task_kwargs, random_seed=12345)
 
     def test_task(self):
         task = self.task
@@ -23,11 +23,11 @@ class TestInstantiatePassiveChoiceWorld(BaseTestCases.CommonTestInstantiateTask)
     def test_fixtures(self) -> None:
         # assert that fixture are loaded correctly
         trials_table = self.task.trials_table
-        assert trials_table.session_id.unique() == [self.session_id]
+        assert trials_table['session_id'].unique() == [self.session_id]
         pqt_file = self.task.get_task_directory().joinpath('passiveChoiceWorld_trials_fixtures.pqt')
         fixtures = pd.read_parquet(pqt_file)
         assert fixtures.session_id.unique().tolist() == list(range(12))
-        assert fixtures[fixtures.session_id == self.session_id].stim_type.equals(trials_table.stim_type)
+        assert fixtures[fixtures.session_id == self.session_id].stim_type.reset_index(drop=True).equals(trials_table['stim_type'])
 
         # loop through fixtures
         for session_id in fixtures.session_id.unique():
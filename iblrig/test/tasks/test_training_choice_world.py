@@ -28,16 +28,16 @@ class TestTrainingPhaseChoiceWorld(BaseTestCases.CommonTestInstantiateTask):
         nt = 800
         for training_phase in np.arange(6):
             with self.subTest(training_phase=training_phase):
-                np.random.seed(12354)
+                rng = np.random.default_rng(12354)
                 task = TrainingPhaseChoiceWorldSession(
-                    **self.task_kwargs, adaptive_reward=adaptive_reward, training_level=training_phase
+                    **self.task_kwargs, adaptive_reward=adaptive_reward, training_level=training_phase, random_seed=12354
                 )
                 assert task.training_phase == training_phase
                 task.create_session()
                 for _i in np.arange(nt):
                     task.next_trial()
                     # pc = task.psychometric_curve()
-                    trial_type = np.random.choice(['correct', 'error', 'no_go'], p=[0.9, 0.05, 0.05])
+                    trial_type = rng.choice(['correct', 'error', 'no_go'], p=[0.9, 0.05, 0.05])
                     task.trial_completed(trial_fixtures[trial_type])
                     if trial_type == 'correct':
                         self.assertTrue(task.trials_table['trial_correct'][task.trial_num])
@@ -45,7 +45,7 @@ class TestTrainingPhaseChoiceWorld(BaseTestCases.CommonTestInstantiateTask):
                     else:
                         assert not task.trials_table['trial_correct'][task.trial_num]
                     assert not np.isnan(task.reward_time)
-                trials_table = task.trials_table[: task.trial_num].copy()
+                trials_table = task.trials_table.to_dataframe()[: task.trial_num]
                 contrasts = (
                     trials_table.groupby(['contrast']).agg(count=pd.NamedAgg(column='contrast', aggfunc='count')).reset_index()
                 )
@@ -91,12 +91,13 @@ class TestInstantiationTraining(BaseTestCases.CommonTestInstantiateTask):
         trial_fixtures = get_fixtures()
         adaptive_reward = 1.9
         nt = 800
-        task = TrainingChoiceWorldSession(**self.task_kwargs, adaptive_reward=adaptive_reward)
+        rng = np.random.default_rng(12354)
+        task = TrainingChoiceWorldSession(**self.task_kwargs, adaptive_reward=adaptive_reward, random_seed=12354)
         task.create_session()
         for i in np.arange(nt):
             task.next_trial()
             # pc = task.psychometric_curve()
-            trial_type = np.random.choice(['correct', 'error', 'no_go'], p=[0.9, 0.05, 0.05])
+            trial_type = rng.choice(['correct', 'error', 'no_go'], p=[0.9, 0.05, 0.05])
             task.trial_completed(trial_fixtures[trial_type])
             if trial_type == 'correct':
                 self.assertTrue(task.trials_table['trial_correct'][task.trial_num])
@@ -107,6 +108,19 @@ class TestInstantiationTraining(BaseTestCases.CommonTestInstantiateTask):
                 task.show_trial_log()
             assert not np.isnan(task.reward_time)
 
+    def test_check_training_phase(self):
+        """The subject moves from phase 1 to 2 once the performance on both -0.25 and 0.25 contrasts exceeds 80%."""
+        task = TrainingChoiceWorldSession(**self.task_kwargs, training_phase=1)
+        for i, position in enumerate(np.tile([-35, 35], 50)):
+            task.trials_table.at[i, 'contrast'] = 0.25
+            task.trials_table.at[i, 'position'] = position
+            task.trials_table.at[i, 'trial_correct'] = True
+        performance = task.compute_performance()
+        np.testing.assert_array_equal([-0.25, 0.25], performance.index)
+        np.testing.assert_array_equal([50, 50], performance['ntrials'])
+        task.check_training_phase()
+        self.assertEqual(2, task.training_phase)
+
     def test_acquisition_description(self):
         task = TrainingChoiceWorldSession(**self.task_kwargs)
         ad = task.experiment_description
@@ -90,7 +90,7 @@ class TestRegisterSession(BaseTestCases.CommonTestTask):
 
         # Test handling of errors
         with (
-            patch('iblrig.base_tasks.IBLRegistrationClient.register_session', side_effect=AssertionError),
+            patch('ibllib.oneibl.registration.IBLRegistrationClient.register_session', side_effect=AssertionError),
             self.assertLogs('iblrig.base_tasks', 'ERROR') as log,
         ):
             self.assertIsNone(chained.register_to_alyx())
@@ -99,7 +99,7 @@ class TestRegisterSession(BaseTestCases.CommonTestTask):
 
         # An empty session record should cause an error when attempting to register weight
         with (
-            patch('iblrig.base_tasks.IBLRegistrationClient.register_session', return_value=({}, None)),
+            patch('ibllib.oneibl.registration.IBLRegistrationClient.register_session', return_value=({}, None)),
             self.assertLogs('iblrig.base_tasks', 'ERROR') as log,
         ):
             self.assertIsNone(chained.register_to_alyx())
@@ -107,7 +107,7 @@ class TestRegisterSession(BaseTestCases.CommonTestTask):
 
         # ONE in offline mode should simply return
         self.one.mode = 'local'
-        with patch('iblrig.base_tasks.IBLRegistrationClient') as mock_client:
+        with patch('ibllib.oneibl.registration.IBLRegistrationClient') as mock_client:
             self.assertIsNone(chained.register_to_alyx())
             mock_client.assert_not_called()
 
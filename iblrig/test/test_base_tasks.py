@@ -23,6 +23,7 @@ from iblrig.misc import _post_parse_arguments, get_task_argument_parser
 from iblrig.path_helper import load_pydantic_yaml
 from iblrig.pydantic_definitions import HardwareSettings
 from iblrig.test.base import PATH_FIXTURES, BaseTestCases
+from iblrig.timing import TRIAL_TIMING_FILE_NAME, load_trial_timing
 from iblrig_tasks._iblrig_tasks_trainingChoiceWorld import task as tcw_task
 
 
@@ -287,6 +288,22 @@ class TestBaseChoiceWorld(BaseTestCases.CommonTestTask):
     def setUp(self):
         self.get_task_kwargs()
 
+    def test_start_hardware(self):
+        """The devices configured through the serial link of the Bpod are started after it."""
+        task = BiasedChoiceWorldSession(**self.task_kwargs)
+        task.bpod = mock.Mock()
+        with mock.patch('iblrig.base_choice_world.start_devices', return_value={}) as start_devices:
+            task.start_hardware()
+        steps = start_devices.call_args.args[0]
+
+        def dependencies(name):
+            return set(steps[name][1]).union(*(dependencies(d) for d in steps[name][1]))
+
+        for name in ('rotary_encoder', 'sound', 'bonsai_visual_stimulus'):
+            self.assertIn('bpod', dependencies(name), name)
+        self.assertIn('rotary_encoder', dependencies('bonsai_visual_stimulus'))
+        task.bpod.register_softcodes.assert_called_once()
+
     def test_pause_and_stop(self):
         """Test choice world pause and stop flag behaviour in _run method."""
         # Instantiate special task that touches pause and stop flags on specified trials
@@ -312,6 +329,11 @@ class TestBaseChoiceWorld(BaseTestCases.CommonTestTask):
         # Check trials updated with pause duration
         (idx,) = np.where(self.task.trials_table['pause_duration'][: self.task.task_params.NTRIALS] > 0)
         self.assertCountEqual(idx, [self.task.pause_trial], 'failed to correctly update pause_duration field')
+        # Check the phase durations were recorded for each trial, the pause is not part of the overhead
+        df_timing = load_trial_timing(self.task.paths.SESSION_RAW_DATA_FOLDER.joinpath(TRIAL_TIMING_FILE_NAME))
+        np.testing.assert_array_equal(df_timing.index, np.arange(self.task.stop_trial + 1))
+        self.assertGreater(df_timing.at[self.task.pause_trial, 'pause'], 0)
+        self.assertTrue(np.all(self.task.trial_timer.overhead < 0.5))
 
 
 class TestClassMethods(unittest.TestCase):
@@ -183,9 +183,45 @@ class TestsBiasedBlocksGeneration(unittest.TestCase):
         c = self.count_contrasts(pc)
         assert np.all(np.abs(1 - c * 9) <= 0.2)
 
+    def test_seeded(self):
+        pc, len_block = session_creator.make_ephyscw_pc(rng=np.random.default_rng(7816))
+        pc2, len_block2 = session_creator.make_ephyscw_pc(rng=np.random.default_rng(7816))
+        np.testing.assert_array_equal(pc, pc2)
+        self.assertEqual(len_block, len_block2)
+        # whole blocks are generated until reaching 2001 trials
+        self.assertEqual(pc.shape[0], sum(len_block))
+        self.assertLess(pc.shape[0] - len_block[-1], 2001)
+        self.assertGreaterEqual(pc.shape[0], 2001)
+        block_prob_left = pc[np.cumsum(len_block) - 1, 2]
+        self.assertEqual(block_prob_left[0], 0.5)
+        np.testing.assert_allclose(np.abs(np.diff(block_prob_left[1:])), 0.6)
+
     def test_uniform(self):
         # test uniform: signed contrasts are twice as likely for the 0 sample
         pc, _ = session_creator.make_ephyscw_pc(prob_type='uniform')
         c = self.count_contrasts(pc)
         c[4] /= 2
         assert np.all(np.abs(1 - c * 10) <= 0.2)
+
+
+class TestTrialSequenceGenerator(unittest.TestCase):
+    def draw(self, trial_sequence, order):
+        draws = {
+            'contrast': lambda: [trial_sequence.contrast([1.0, 0.25, 0.125, 0.0625, 0.0], 'uniform') for _ in range(50)],
+            'position': lambda: [trial_sequence.position([-35, 35], 0.8) for _ in range(50)],
+            'quiescent_period': lambda: [trial_sequence.quiescent_period() for _ in range(50)],
+            'block_length': lambda: [trial_sequence.block_length(60, 20, 100) for _ in range(50)],
+            'choice': lambda: [trial_sequence.choice([0.2, 0.8]) for _ in range(50)],
+        }
+        return {name: draws[name]() for name in order}
+
+    def test_reproducible(self):
+        trial_sequence = session_creator.TrialSequenceGenerator(batch_size=16)
+        order = ['contrast', 'position', 'quiescent_period', 'block_length', 'choice']
+        expected = self.draw(trial_sequence, order)
+        # the streams are independent: the same seed yields the same values whatever the order of the draws
+        actual = self.draw(session_creator.TrialSequenceGenerator(seed=trial_sequence.seed, batch_size=16), order[::-1])
+        self.assertEqual(expected, actual)
+        self.assertNotEqual(expected, self.draw(session_creator.TrialSequenceGenerator(), order))
+        self.assertEqual(set(expected['position']), {-35, 35})
+        self.assertTrue(all(20 <= x <= 100 for x in expected['block_length']))
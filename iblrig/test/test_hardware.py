@@ -1,6 +1,36 @@
+import threading
+import time
 import unittest
+from unittest import mock
 
-from iblrig.hardware import Bpod
+from iblrig.hardware import (
+    Bpod,
+    HardwareStartupError,
+    StateMachineRecorder,
+    StateMachineTemplate,
+    StateMachineTemplates,
+    start_devices,
+)
+from iblutil.util import Bunch
+from pybpodapi.bpod.hardware.hardware import Hardware
+from pybpodapi.state_machine import StateMachine
+
+
+def _setup_hardware(hardware: Hardware) -> Hardware:
+    """Describe the hardware of a Bpod r2 with a rotary encoder module, as reported by the device."""
+    hardware.max_states = 256
+    hardware.cycle_period = 100
+    hardware.max_serial_events = 60
+    hardware.n_global_timers = 16
+    hardware.n_global_counters = 8
+    hardware.n_conditions = 16
+    hardware.inputs = 'UUUXBBWWPPPP'
+    hardware.outputs = 'UUUXBBWWPPPPVVVV'
+    hardware.inputs_enabled = [1] * len(hardware.inputs)
+    module = Bunch(connected=True, name='RotaryEncoder1', event_names=[], n_serial_events=15)
+    modules = [module] + [Bunch(connected=False, name='', event_names=[], n_serial_events=15)] * 2
+    hardware.setup(modules)
+    return hardware
 
 
 class TestBpod(unittest.TestCase):
@@ -26,3 +56,140 @@ class TestBpod(unittest.TestCase):
         self.assertEqual(8, bpod.softcode_handler_function(6))
         with self.assertRaises(KeyError):
             bpod.softcode_handler_function(1)
+
+
+class TestStateMachineTemplates(unittest.TestCase):
+    def setUp(self):
+        self.bpod = Bunch(hardware=_setup_hardware(Hardware()))
+
+    @staticmethod
+    def define_trial(sma, quiescent_period: float, reward_time: float, event_reward: str = 'RotaryEncoder1_2'):
+        sma.add_state(
+            state_name='quiescent_period',
+            state_timer=quiescent_period,
+            state_change_conditions={'Tup': 'closed_loop', 'RotaryEncoder1_1': 'quiescent_period'},
+            output_actions=[('Serial1', 3)],
+        )
+        sma.add_state(
+            state_name='closed_loop',
+            state_timer=60,
+            state_change_conditions={'Tup': 'exit', event_reward: 'reward'},
+            output_actions=[('BNC1', 255)],
+        )
+        sma.add_state(
+            state_name='reward',
+            state_timer=reward_time,
+            state_change_conditions={'Tup': 'exit'},
+            output_actions=[('Valve1', 255)],
+        )
+        return sma
+
+    def serialize(self, sma):
+        sma.update_state_numbers()
+        body = sma.build_message() + sma.build_message_global_timer() + sma.build_message_32_bits()
+        return sma.build_header(None, len(body)) + body
+
+    def test_compile(self):
+        templates = StateMachineTemplates(self.bpod)
+        # actual state machines are passed through
+        sma = StateMachine(self.bpod)
+        self.assertIs(sma, templates.compile(sma))
+        for quiescent_period, reward_time, event_reward in [
+            (0.2, 0.1, 'RotaryEncoder1_2'),
+            (0.35, 0.15, 'RotaryEncoder1_2'),
+            (0.5, 0.2, 'RotaryEncoder1_3'),
+            (0.6, 0.05, 'RotaryEncoder1_2'),
+        ]:
+            template = templates.compile(self.define_trial(StateMachineRecorder(), quiescent_period, reward_time, event_reward))
+            self.assertIsInstance(template, StateMachineTemplate)
+            expected = self.define_trial(StateMachine(self.bpod), quiescent_period, reward_time, event_reward)
+            self.assertEqual(self.serialize(expected), self.serialize(template))
+            self.assertEqual(expected.state_names, template.state_names)
+            self.assertEqual(0, template.current_state)
+            template.current_state = float('nan')  # as left by a state machine run
+        # one template per topology
+        self.assertEqual(2, len(templates.templates))
+        self.assertEqual((2, 2), (templates.n_hits, templates.n_misses))
+
+    def test_global_timers(self):
+        recorder = StateMachineRecorder()
+        recorder.set_global_timer(timer_id=1, timer_duration=2)
+        recorder.add_state('wait', 1, {'GlobalTimer1_End': 'exit'}, [('GlobalTimerTrig', 1)])
+        expected = StateMachine(self.bpod)
+        expected.set_global_timer(timer_id=1, timer_duration=2)
+        expected.add_state('wait', 1, {'GlobalTimer1_End': 'exit'}, [('GlobalTimerTrig', 1)])
+        template = StateMachineTemplates(self.bpod).compile(recorder)
+        self.assertEqual(self.serialize(expected), self.serialize(template))
+
+    def test_send_state_machine(self):
+        self.bpod = Bpod('COM5', connect=False)
+        self.addCleanup(self.bpod.__del__)
+        _setup_hardware(self.bpod.hardware)
+        self.bpod.bpod_com_ready = True
+        templates = StateMachineTemplates(self.bpod)
+        with mock.patch.object(self.bpod, '_bpodcom_send_state_machine') as send_mock:
+            for quiescent_period in (0.2, 0.2, 0.3, 0.3):
+                sma = templates.compile(self.define_trial(StateMachineRecorder(), quiescent_period, 0.1))
+                self.bpod.send_state_machine(sma)
+            # identical state machines are not sent again
+            self.assertEqual(2, send_mock.call_count)
+            self.assertEqual(self.serialize(self.define_trial(StateMachine(self.bpod), 0.3, 0.1)), send_mock.call_args[0][0])
+            # sending another state machine in-between requires sending the template again
+            self.bpod.send_state_machine(self.define_trial(StateMachine(self.bpod), 0.3, 0.1))
+            self.bpod.send_state_machine(templates.compile(self.define_trial(StateMachineRecorder(), 0.3, 0.1)))
+            self.assertEqual(4, send_mock.call_count)
+
+
+class TestStartDevices(unittest.TestCase):
+    def setUp(self):
+        self.started = []
+        self.lock = threading.Lock()
+
+    def device(self, name: str, duration: float = 0.0, error: Exception | None = None):
+        def start():
+            time.sleep(duration)
+            if error is not None:
+                raise error
+            with self.lock:
+                self.started.append(name)
+
+        return start
+
+    def test_concurrent(self):
+        steps = {
+            'bpod': (self.device('bpod', 0.3), []),
+            'frame2ttl': (self.device('frame2ttl', 0.3), []),
+            'cameras': (self.device('cameras', 0.3), []),
+            'sound': (self.device('sound'), ['bpod']),
+            'visual_stimulus': (self.device('visual_stimulus'), ['bpod', 'cameras']),
+        }
+        t0 = time.perf_counter()
+        durations = start_devices(steps)
+        # the independent devices start at once
+        self.assertLess(time.perf_counter() - t0, 0.6)
+        self.assertEqual(set(steps), set(durations))
+        self.assertGreaterEqual(durations['bpod'], 0.3)
+        self.assertEqual({'sound', 'visual_stimulus'}, set(self.started[3:]))
+
+    def test_failure(self):
+        steps = {
+            'bpod': (self.device('bpod', error=OSError('no bpod on COM1')), []),
+            'frame2ttl': (self.device('frame2ttl', error=AssertionError('no frame2ttl')), []),
+            'valve': (self.device('valve'), []),
+            'sound': (self.device('sound'), ['bpod']),
+        }
+        with self.assertRaises(HardwareStartupError) as cm:
+            start_devices(steps)
+        self.assertEqual({'bpod', 'frame2ttl'}, set(cm.exception.errors))
+        self.assertEqual(['sound'], cm.exception.skipped)
+        self.assertEqual(['valve'], list(cm.exception.durations))
+        self.assertIn('bpod: OSError: no bpod on COM1', str(cm.exception))
+        self.assertIn('sound: not started', str(cm.exception))
+        self.assertNotIn('sound', self.started)
+
+    def test_invalid_dependencies(self):
+        with self.assertRaisesRegex(ValueError, 'unknown dependencies: bpod'):
+            start_devices({'sound': (self.device('sound'), ['bpod'])})
+        with self.assertRaisesRegex(ValueError, 'circular dependencies'):
+            start_devices({'a': (self.device('a'), ['b']), 'b': (self.device('b'), ['a']), 'c': (self.device('c'), [])})
+        self.assertEqual(['c'], self.started)
@@ -4,13 +4,20 @@ Those can be instantiated lazily, ie. on any computer.
 The start() methods of those mixins require the hardware to be connected.
 """
 
+import tempfile
+import threading
 import unittest
+from pathlib import Path
 from unittest import mock
 
+from pythonosc.udp_client import SimpleUDPClient
+
 from iblrig.base_choice_world import ChoiceWorldSession
 from iblrig.base_tasks import (
     BaseSession,
+    BonsaiHandshake,
     BonsaiRecordingMixin,
+    BonsaiStartupError,
     BonsaiVisualStimulusMixin,
     BpodMixin,
     Frame2TTLMixin,
@@ -18,6 +25,7 @@ from iblrig.base_tasks import (
     SoundMixin,
     ValveMixin,
 )
+from iblrig.constants import BASE_PATH
 from iblrig.hardware import SOFTCODE
 from iblrig.test.base import TASK_KWARGS
 
@@ -53,8 +61,9 @@ class BaseTestHardwareMixins(unittest.TestCase):
 
 
 class TestBonsaiMixins(unittest.TestCase):
+    @mock.patch('iblrig.base_tasks.BonsaiHandshake.wait')
     @mock.patch('iblrig.base_tasks.call_bonsai')
-    def test_bonsai_recording_mixin(self, mock_call_bonsai):
+    def test_bonsai_recording_mixin(self, mock_call_bonsai, mock_wait):
         # create a session with the bonsai recording mixin only and all tests parameters
         session = mixin_factory(BonsaiRecordingMixin)
         session.init_mixin_bonsai_recordings()
@@ -64,21 +73,96 @@ class TestBonsaiMixins(unittest.TestCase):
         # test the camera + microphone recording as in the behavior
         session.start_mixin_bonsai_cameras()
         session.trigger_bonsai_cameras()
+        # the handshake is awaited in the background as the cameras are triggered by a Bpod softcode
+        session.bonsai_camera.handshake.join()
+        mock_wait.assert_called_once_with(mock_call_bonsai.return_value, 60, name='camera recording')
+        mock_wait.side_effect = BonsaiStartupError('camera recording: Bonsai exited with code 1')
+        with self.assertLogs('iblrig.base_tasks', 'ERROR') as lg:
+            session.trigger_bonsai_cameras()
+            session.bonsai_camera.handshake.join()
+        self.assertIn('Bonsai exited with code 1', lg.output[-1])
+        mock_wait.side_effect = None
         # test the single microphone recording
         session.hardware_settings.device_cameras = None
         session.start_mixin_bonsai_microphone()
         session.stop_mixin_bonsai_recordings()
 
+    @mock.patch('iblrig.base_tasks.BonsaiHandshake.wait')
     @mock.patch('iblrig.base_tasks.call_bonsai')
-    def test_bonsai_visual_stimulus_mixin(self, _):
+    def test_bonsai_visual_stimulus_mixin(self, mock_call_bonsai, mock_wait):
         session = mixin_factory(BonsaiVisualStimulusMixin)
         session.start_mixin_bonsai_visual_stimulus()
         session.init_mixin_bonsai_visual_stimulus()
         session.choice_world_visual_stimulus()
+        mock_wait.assert_called_with(mock_call_bonsai.return_value, 60, delay=5, name='visual stimulus')
         session.run_passive_visual_stim()
         session.stop_mixin_bonsai_visual_stimulus()
 
 
+WORKFLOW = """<?xml version="1.0" encoding="utf-8"?>
+<WorkflowBuilder xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+                 xmlns:osc="clr-namespace:Bonsai.Osc;assembly=Bonsai.Osc"
+                 xmlns="https://bonsai-rx.org/2018/workflow">
+  <Workflow>
+    <Nodes>
+      <Expression xsi:type="osc:ReceiveMessage">
+        <osc:Address>{receive}</osc:Address>
+      </Expression>
+      <Expression xsi:type="osc:SendMessage">
+        <osc:Address>{send}</osc:Address>
+      </Expression>
+    </Nodes>
+  </Workflow>
+</WorkflowBuilder>
+"""
+
+
+class TestBonsaiHandshake(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.workflow_file = Path(tmp.name).joinpath('workflow.bonsai')
+        self.workflow_file.write_text(WORKFLOW.format(send='/ready', receive='/x'))
+        self.process = mock.Mock(poll=mock.Mock(return_value=None))
+
+    def test_ready(self):
+        with BonsaiHandshake(self.workflow_file, port=0) as handshake:
+            self.assertEqual(['/ready'], handshake.addresses)
+            client = SimpleUDPClient('127.0.0.1', handshake.port)
+            timer = threading.Timer(0.2, lambda: [client.send_message(a, 1) for a in ('/frame', '/ready')])
+            timer.start()
+            self.assertGreaterEqual(handshake.wait(self.process, timeout=5), 0.2)
+            self.assertEqual(['/ready'], list(handshake.received))
+
+    def test_failures(self):
+        with BonsaiHandshake(self.workflow_file, port=0) as handshake:
+            # a workflow that never reports is logged and the task carries on
+            with self.assertLogs('iblrig.base_tasks', 'WARNING') as lg:
+                self.assertIsNone(handshake.wait(self.process, timeout=0.2, name='visual stimulus'))
+            self.assertIn('visual stimulus: Bonsai did not report /ready within 0.2 s, carrying on', lg.output[-1])
+            self.process.poll.return_value = 1
+            with self.assertRaisesRegex(BonsaiStartupError, 'Bonsai exited with code 1 before reporting /ready'):
+                handshake.wait(self.process, timeout=5)
+
+    def test_shipped_workflows(self):
+        """The workflows of the visual stimulus, cameras and microphone report their first frame."""
+        for workflow_file in (
+            'visual_stim/GaborIBLTask/Gabor2D.bonsai',
+            'devices/camera_recordings/TrainingRig_SaveVideo_TrainingTasks.bonsai',
+            'devices/microphone/record_mic.bonsai',
+        ):
+            with self.subTest(workflow_file):
+                self.assertEqual({'/frame'}, BonsaiHandshake.sent_addresses(BASE_PATH.joinpath(workflow_file)))
+
+    def test_no_handshake(self):
+        """A workflow that does not report is given a fixed delay."""
+        self.workflow_file.write_text(WORKFLOW.format(send='/x', receive='/ready'))
+        with BonsaiHandshake(self.workflow_file, port=0) as handshake, mock.patch('iblrig.base_tasks.time.sleep') as sleep:
+            self.assertEqual([], handshake.addresses)
+            self.assertIsNone(handshake.wait(self.process, timeout=5, delay=5))
+            sleep.assert_called_once_with(5)
+
+
 class TestBpodMixin(unittest.TestCase):
     def test_bpod_mixin(self):
         session = mixin_factory(BpodMixin)
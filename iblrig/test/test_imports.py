@@ -0,0 +1,52 @@
+import subprocess
+import sys
+import unittest
+
+
+def imported_modules(module: str, candidates: list[str]) -> list[str]:
+    """Import `module` in a new interpreter and return which of the `candidates` modules are loaded as a result."""
+    code = f'import sys, {module}; print(" ".join(m for m in {candidates!r} if m in sys.modules))'
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+
+
+class TestLazyImports(unittest.TestCase):
+    """The heavy optional dependencies are imported when used, so that the command line tools and the tasks start fast."""
+
+    def test_iblrig(self):
+        # the version management of the package must not import the settings models nor the Alyx client
+        heavy = ['pandas', 'pydantic', 'ibllib', 'one.api', 'requests', 'iblrig.pydantic_definitions']
+        self.assertEqual([], imported_modules('iblrig', heavy))
+
+    def test_commands(self):
+        heavy = [
+            'ibllib.pipes.misc',
+            'ibllib.oneibl.registration',
+            'spikeglx',
+            'matplotlib',
+            'seaborn',
+            'sounddevice',
+            'pybpod_soundcard_module',
+            'pybpodapi',
+            'iblrig.online_plots',
+            'iblrig.hardware',
+        ]
+        self.assertEqual([], imported_modules('iblrig.commands', heavy))
+
+    def test_base_tasks(self):
+        heavy = [
+            'ibllib.pipes.misc',
+            'ibllib.oneibl.registration',
+            'spikeglx',
+            'matplotlib',
+            'seaborn',
+            'sounddevice',
+            'pybpod_soundcard_module',
+            'graphviz',
+            'PySpin',
+            'orjson',
+        ]
+        self.assertEqual([], imported_modules('iblrig.base_tasks', heavy))
+
+    def test_raw_data_loaders(self):
+        # pyarrow itself is imported by pandas when installed, and pyarrow.parquet by the ibllib session parameters
+        self.assertEqual([], imported_modules('iblrig.raw_data_loaders', ['pyarrow.parquet', 'orjson']))
@@ -1,9 +1,27 @@
+import json
+import math
+import tempfile
+import threading
+import time
 import unittest
 from pathlib import Path
+from unittest import mock
 
 import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
 
-from iblrig.raw_data_loaders import load_task_jsonable
+from iblrig.raw_data_loaders import (
+    HAS_ORJSON,
+    TRIALS_TABLE_FILE_NAME,
+    BackgroundWriter,
+    TaskJsonableReader,
+    TrialsTableWriter,
+    dumps_trial_data,
+    load_task_jsonable,
+    load_task_trials_table,
+    loads_trial_data,
+)
 
 
 class TestLoadTaskData(unittest.TestCase):
@@ -26,3 +44,246 @@ class TestLoadTaskData(unittest.TestCase):
                 np.testing.assert_equal(trials_table_full[c].values[-1], trials_table[c][0])
 
         assert bpod_data_full[-1] == bpod_data[0]
+
+
+@unittest.skipIf(not HAS_ORJSON, 'orjson is not installed')
+class TestJsonBackends(unittest.TestCase):
+    def setUp(self):
+        with open(Path(__file__).parent.joinpath('fixtures', 'task_data_short.jsonable'), 'rb') as fp:
+            self.lines = fp.readlines()
+
+    def test_round_trip(self):
+        for line in self.lines:
+            trial_data = json.loads(line)
+            for backend in ('json', 'orjson'):
+                record = dumps_trial_data(trial_data, backend=backend)
+                self.assertTrue(record.endswith(b'}\n'))
+                self.assertEqual(record.count(b'\n'), 1)
+                # the record compares equal to the one parsed by the standard library, NaN values included
+                self.assertEqual(loads_trial_data(record, backend=backend), trial_data)
+                # the records written by the standard library, i.e. with NaN tokens, are parsed by both backends
+                self.assertEqual(loads_trial_data(line, backend=backend), trial_data)
+            # orjson writes the NaN values as null, read back as NaN by both backends
+            record = dumps_trial_data(trial_data, backend='orjson')
+            self.assertNotIn(b'NaN', record)
+            self.assertEqual(loads_trial_data(record, backend='json'), trial_data)
+        with self.assertRaises(ValueError):
+            dumps_trial_data({}, backend='simplejson')
+
+    def test_numpy_and_missing_values(self):
+        trial_data = json.loads(self.lines[0])
+        trial_data.update(trial_num=np.int64(3), contrast=np.float32(0.5), stim_on=np.bool_(True), missing=pd.NA)
+        trial_data['behavior_data']['Trial end timestamp'] = math.nan
+        for backend in ('json', 'orjson'):
+            parsed = loads_trial_data(dumps_trial_data(trial_data, backend=backend), backend=backend)
+            self.assertEqual(parsed['trial_num'], 3)
+            self.assertEqual(parsed['contrast'], 0.5)
+            self.assertIs(parsed['stim_on'], True)
+            self.assertTrue(math.isnan(parsed['missing']))
+            self.assertTrue(math.isnan(parsed['behavior_data']['Trial end timestamp']))
+            with self.assertRaises(TypeError):
+                dumps_trial_data({'trial_num': object()}, backend=backend)
+
+
+class TestTaskJsonableReader(unittest.TestCase):
+    def setUp(self):
+        self.jsonable_fixture = Path(__file__).parent.joinpath('fixtures', 'task_data_short.jsonable')
+        self.td = tempfile.TemporaryDirectory()
+        self.jsonable_file = Path(self.td.name).joinpath('_iblrig_taskData.raw.jsonable')
+        with open(self.jsonable_fixture, 'rb') as fp:
+            self.lines = fp.readlines()
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def test_read_new(self):
+        trials_table_full, bpod_data_full = load_task_jsonable(self.jsonable_fixture)
+        reader = TaskJsonableReader(self.jsonable_file)
+        # the file doesn't exist yet
+        trials_table, bpod_data = reader.read_new()
+        self.assertEqual(trials_table.shape[0], 0)
+        self.assertEqual(bpod_data, [])
+        # first trial, the second one is still being written
+        with open(self.jsonable_file, 'wb') as fp:
+            fp.write(self.lines[0] + self.lines[1][:100])
+        trials_table, bpod_data = reader.read_new()
+        self.assertEqual(trials_table.shape[0], 1)
+        self.assertEqual(len(reader), 1)
+        self.assertEqual(reader.position, len(self.lines[0]))
+        self.assertEqual(bpod_data[0], bpod_data_full[0])
+        # nothing new to read until the second trial is complete
+        self.assertEqual(reader.read_new()[0].shape[0], 0)
+        with open(self.jsonable_file, 'ab') as fp:
+            fp.write(self.lines[1][100:])
+        trials_table, bpod_data = reader.read_new()
+        self.assertEqual(trials_table.shape[0], 1)
+        self.assertEqual(trials_table.index[0], 1)
+        self.assertEqual(bpod_data[0], bpod_data_full[1])
+        pd.testing.assert_series_equal(trials_table.iloc[0], trials_table_full.iloc[1])
+        # a file that shrinks (i.e., has been re-created) is re-indexed from the start
+        with open(self.jsonable_file, 'wb') as fp:
+            fp.write(self.lines[0])
+        trials_table, _ = reader.read_new()
+        self.assertEqual(trials_table.shape[0], 1)
+        self.assertEqual(reader.offsets, [0])
+
+    def test_projection(self):
+        trials_table_full, _ = load_task_jsonable(self.jsonable_fixture)
+        reader = TaskJsonableReader(self.jsonable_fixture, behavior_data=False)
+        trials_table, bpod_data = reader.read_new()
+        self.assertEqual(bpod_data, [None, None])
+        pd.testing.assert_frame_equal(trials_table, trials_table_full)
+        reader = TaskJsonableReader(self.jsonable_fixture, behavior_data=False, columns=['trial_correct', 'reward_amount'])
+        trials_table, _ = reader.read_new()
+        self.assertEqual(list(trials_table.columns), ['trial_correct', 'reward_amount'])
+        pd.testing.assert_frame_equal(trials_table, trials_table_full[['trial_correct', 'reward_amount']])
+
+    def test_read_trial(self):
+        trials_table_full, bpod_data_full = load_task_jsonable(self.jsonable_fixture)
+        reader = TaskJsonableReader(self.jsonable_fixture, behavior_data=False)
+        trial_data, bpod_data = reader.read_trial(-1)
+        self.assertIsNone(bpod_data)
+        self.assertEqual(trial_data['trial_num'], trials_table_full['trial_num'].iloc[-1])
+        trial_data, bpod_data = reader.read_trial(0, behavior_data=True)
+        self.assertEqual(bpod_data, bpod_data_full[0])
+        with self.assertRaises(IndexError):
+            reader.read_trial(2)
+
+
+class TestTrialsTableWriter(unittest.TestCase):
+    def setUp(self):
+        self.jsonable_fixture = Path(__file__).parent.joinpath('fixtures', 'task_data_short.jsonable')
+        self.td = tempfile.TemporaryDirectory()
+        self.jsonable_file = Path(self.td.name).joinpath('_iblrig_taskData.raw.jsonable')
+        self.file_sidecar = self.jsonable_file.with_name(TRIALS_TABLE_FILE_NAME)
+        self.trials_table, self.bpod_data = load_task_jsonable(self.jsonable_fixture)
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def _append_fixture_trials(self, writer, n=5):
+        """Append trials to the jsonable file and to the sidecar, as done by `BaseSession.save_trial_data_to_json`."""
+        for i in range(n):
+            trial_data = self.trials_table.iloc[i % 2].to_dict()
+            trial_data['behavior_data'] = self.bpod_data[i % 2]
+            with open(self.jsonable_file, 'ab') as fp:
+                fp.write(dumps_trial_data(trial_data))
+            writer.append(trial_data)
+
+    def test_write_and_load(self):
+        writer = TrialsTableWriter(self.file_sidecar, row_group_size=2)
+        self._append_fixture_trials(writer, n=5)
+        expected = self.trials_table.iloc[[0, 1, 0, 1, 0]].reset_index(drop=True)
+        # the sidecar is only written once finalized, until then the trials are read from the jsonable file
+        self.assertFalse(self.file_sidecar.exists())
+        pd.testing.assert_frame_equal(load_task_trials_table(self.jsonable_file), expected)
+        writer.close()
+        self.assertTrue(writer.closed)
+        self.assertEqual(pq.ParquetFile(self.file_sidecar).num_row_groups, 3)
+        with mock.patch('iblrig.raw_data_loaders.TaskJsonableReader', side_effect=AssertionError('jsonable file parsed')):
+            trials_table = load_task_trials_table(self.jsonable_file)
+        self.assertEqual(trials_table.shape, (5, self.trials_table.shape[1]))
+        self.assertNotIn('behavior_data', trials_table.columns)
+        pd.testing.assert_frame_equal(trials_table, expected, check_dtype=False)
+        trials_table = load_task_trials_table(self.jsonable_file, columns=['reward_amount'])
+        self.assertEqual(list(trials_table.columns), ['reward_amount'])
+
+    def test_fallback_on_jsonable(self):
+        writer = TrialsTableWriter(self.file_sidecar)
+        self._append_fixture_trials(writer, n=2)
+        writer.close()
+        # columns missing from the sidecar are read from the jsonable
+        trials_table = load_task_trials_table(self.jsonable_file, columns=['reward_amount', 'nonexistent'])
+        self.assertEqual(list(trials_table.columns), ['reward_amount', 'nonexistent'])
+        self.assertTrue(trials_table['nonexistent'].isna().all())
+        with self.assertRaises(FileNotFoundError):
+            load_task_trials_table(Path(self.td.name).joinpath('nonexistent', '_iblrig_taskData.raw.jsonable'))
+
+    def test_fallback_on_stale_sidecar(self):
+        writer = TrialsTableWriter(self.file_sidecar)
+        self._append_fixture_trials(writer, n=2)
+        writer.close()
+        # a trial appended to the jsonable file after the sidecar was finalized, e.g. by a recovered session
+        self._append_fixture_trials(TrialsTableWriter(self.file_sidecar), n=1)
+        trials_table = load_task_trials_table(self.jsonable_file)
+        pd.testing.assert_frame_equal(trials_table, self.trials_table.iloc[[0, 1, 0]].reset_index(drop=True))
+        # a sidecar that does not record the size of the jsonable file is not trusted either
+        pq.write_table(pq.read_table(self.file_sidecar).replace_schema_metadata(None), self.file_sidecar)
+        self.assertEqual(load_task_trials_table(self.jsonable_file).shape[0], 3)
+
+    def test_schema_promotion(self):
+        writer = TrialsTableWriter(self.file_sidecar, row_group_size=1)
+        writer.append({'trial_num': 0, 'value': 1, 'label': None, 'mixed': 1})
+        writer.append({'trial_num': 1, 'value': 1.5, 'label': 'a', 'mixed': 'b', 'late': True})
+        writer.append({'trial_num': 2, 'value': None, 'label': None, 'mixed': None})
+        with self.assertLogs('iblrig.raw_data_loaders', 'WARNING') as cm:
+            writer.close()
+        self.assertIn('mixed', cm.output[0])
+        self.assertTrue(writer.closed)
+        table = pq.read_table(self.file_sidecar)
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column_names, ['trial_num', 'value', 'label', 'mixed', 'late'])
+        self.assertEqual(table.column('value').to_pylist(), [1.0, 1.5, None])
+        self.assertEqual(table.column('label').to_pylist(), [None, 'a', None])
+        self.assertEqual(table.column('mixed').to_pylist(), ['1', 'b', None])
+        self.assertEqual(table.column('late').to_pylist(), [None, True, None])
+        writer.append({'trial_num': 3})
+        writer.close()
+        self.assertEqual(pq.read_table(self.file_sidecar).num_rows, 3)
+
+    def test_discard(self):
+        writer = TrialsTableWriter(self.file_sidecar)
+        writer.append({'trial_num': 0})
+        writer.discard()
+        self.assertTrue(writer.closed)
+        writer.close()
+        self.assertFalse(self.file_sidecar.exists())
+
+
+class TestBackgroundWriter(unittest.TestCase):
+    def test_order_and_errors(self):
+        written = []
+
+        def write(i):
+            if i == 3:
+                raise OSError('disk full')
+            written.append((i, threading.current_thread().name))
+
+        writer = BackgroundWriter(name='test_writer')
+        for i in range(10):
+            writer.submit(write, i)
+        with self.assertLogs('iblrig.raw_data_loaders', 'ERROR') as lg:
+            writer.close()
+            writer.log_metrics()
+        self.assertIn('disk full', lg.output[0])
+        # the calls are executed in order on the writer thread, a failing call does not stop the following ones
+        self.assertEqual([i for i in range(10) if i != 3], [i for i, _ in written])
+        self.assertEqual({'test_writer'}, {name for _, name in written})
+        metrics = writer.metrics
+        self.assertEqual((10, 10, 1), (metrics['n_submitted'], metrics['n_completed'], metrics['n_errors']))
+        self.assertGreaterEqual(metrics['max_latency'], metrics['mean_latency'])
+        writer.close()  # closing twice is a no-op
+        with self.assertRaises(RuntimeError):
+            writer.submit(write, 11)
+
+    def test_bounded_queue(self):
+        busy, disk = threading.Event(), threading.Event()
+
+        def write():
+            busy.set()
+            disk.wait()
+
+        writer = BackgroundWriter(max_queue_size=2)
+        self.addCleanup(writer.close)
+        writer.submit(write)  # blocks the writer thread until the disk is available
+        busy.wait()
+        writer.submit(time.sleep, 0)
+        writer.submit(time.sleep, 0)
+        self.assertEqual(2, writer.queue_depth)
+        threading.Timer(0.2, disk.set).start()
+        with self.assertLogs('iblrig.raw_data_loaders', 'WARNING'):
+            writer.submit(time.sleep, 0)  # the queue is full: blocks until the disk is available again
+        self.assertGreaterEqual(writer.metrics['max_submit_wait'], 0.1)
+        self.assertEqual(2, writer.metrics['max_queue_depth'])
+        writer.flush()
+        self.assertEqual(0, writer.queue_depth)
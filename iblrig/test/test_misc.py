@@ -39,6 +39,17 @@ class TestMisc(unittest.TestCase):
         self.assertRaises(ValueError, misc.draw_contrast, [], 'incorrect_type')  # assert exception for incorrect type
         self.assertRaises(IndexError, misc.draw_contrast, [0, 1], 'biased', 2)  # assert exception for out-of-range index
 
+    def test_truncated_exponential(self):
+        x = misc.truncated_exponential(scale=0.35, min_value=0.2, max_value=0.5, size=10000, rng=np.random.default_rng(0))
+        self.assertEqual(x.shape, (10000,))
+        self.assertTrue(np.all((x >= 0.2) & (x <= 0.5)))
+        # same distribution as rejection sampling of the exponential distribution
+        y = np.random.default_rng(1).exponential(0.35, 100000)
+        y = y[(y >= 0.2) & (y <= 0.5)]
+        assert stats.ks_2samp(x, y).pvalue > 0.01
+        self.assertIsInstance(misc.truncated_exponential(), float)
+        np.testing.assert_array_equal(x, misc.truncated_exponential(size=10000, rng=np.random.default_rng(0)))
+
     def test_online_std(self):
         n = 41
         b = np.random.rand(n)
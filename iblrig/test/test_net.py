@@ -1,7 +1,11 @@
 """Tests for iblrig.net module."""
 
 import asyncio
+import json
+import socket
 import tempfile
+import threading
+import time
 import unittest
 from pathlib import Path
 from unittest.mock import ANY, Mock, patch
@@ -213,5 +217,129 @@ class TestAuxiliaries(unittest.IsolatedAsyncioTestCase):
         self.assertRaises(RuntimeError, self.aux.push, 'EXPINIT', wait=True)
 
 
+class TestTrialChannel(unittest.TestCase):
+    """Tests for the TrialPublisher and TrialSubscriber classes."""
+
+    def setUp(self):
+        self.publisher = iblrig.net.TrialPublisher()
+        self.addCleanup(self.publisher.close)
+        self.trial_data = {'trial_num': 0, 'contrast': 0.5, 'response_time': float('nan')}
+        self.bpod_data = {'States timestamps': {'reward': [[1.5, 1.6]]}, 'Events timestamps': {'BNC1High': [0.1]}}
+
+    def test_publish(self):
+        # without subscribers nothing is sent, the task falls back on the flag file
+        self.assertFalse(self.publisher.publish(0, self.trial_data, self.bpod_data))
+        subscriber = iblrig.net.TrialSubscriber(self.publisher.port)
+        self.assertEqual([], subscriber.receive())
+        self.assertFalse(subscriber.is_registered)
+        self.assertTrue(self.publisher.publish(1, self.trial_data, self.bpod_data))
+        self.assertTrue(self.publisher.publish(2, self.trial_data, self.bpod_data))
+        records = subscriber.receive(timeout=1)
+        self.assertEqual([1, 2], [r[0] for r in records])
+        self.assertTrue(subscriber.is_registered)
+        trial_num, trial_data, bpod_data = records[0]
+        self.assertEqual(self.trial_data.keys(), trial_data.keys())
+        self.assertEqual({'States timestamps': {'reward': [[1.5, 1.6]]}}, bpod_data)
+        # records exceeding the datagram size only carry the trial number
+        bpod_data = {'States timestamps': {'reward': [[0.0] * 20_000]}}
+        self.assertTrue(self.publisher.publish(3, self.trial_data, bpod_data))
+        self.assertEqual([(3, None, None)], subscriber.receive(timeout=1))
+        # once unsubscribed the publisher falls back again
+        subscriber.close()
+        self.assertFalse(self.publisher.publish(4, self.trial_data, self.bpod_data))
+
+
+class TestTaskControl(unittest.TestCase):
+    """Tests for the TaskControl and TaskControlClient classes."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.session_folder = Path(tmp.name)
+        self.control = iblrig.net.TaskControl(self.session_folder)
+        self.addCleanup(self.control.close)
+
+    def test_commands(self):
+        self.assertIsNone(iblrig.net.TaskControlClient.from_session_folder(self.session_folder))
+        self.control.start()
+        client = iblrig.net.TaskControlClient.from_session_folder(self.session_folder)
+        self.addCleanup(client.close)
+        self.assertEqual(self.control.port, client.address[1])
+        self.control.trial_num = 4
+        acknowledgement = client.send('pause')
+        self.assertEqual(
+            {'command': 'pause', 'ok': True, 'trial_num': 4, 'paused': True, 'stop': False, 'stop_after': None},
+            {k: v for k, v in acknowledgement.items() if k != 'id'},
+        )
+        self.assertTrue(self.control.paused)
+        self.assertFalse(client.send('resume')['paused'])
+        self.assertFalse(self.control.paused)
+        # the task stops once the number of trials is completed
+        self.assertEqual(10, client.send('stop_after', 10)['stop_after'])
+        self.assertFalse(self.control.stop_requested)
+        self.control.trial_num = 9
+        self.assertTrue(client.send('status')['stop'])
+        acknowledgement = client.send('abort')
+        self.assertFalse(acknowledgement['ok'])
+        self.assertIn('unknown command', acknowledgement['error'])
+        # once closed the control file is removed and the commands are not acknowledged
+        self.control.close()
+        self.assertFalse(self.session_folder.joinpath(iblrig.net.CONTROL_CHANNEL_FILE_NAME).exists())
+        client.timeout = 0.1
+        self.assertIsNone(client.send('status'))
+
+    def test_flag_files(self):
+        """Without a control channel the pause and stop commands are relayed by the flag files."""
+        self.assertIsNone(iblrig.net.control_task(self.session_folder, 'pause'))
+        self.assertTrue(self.session_folder.joinpath('.pause').exists())
+        self.assertTrue(self.control.paused)
+        self.assertIsNone(iblrig.net.control_task(self.session_folder, 'resume'))
+        self.assertFalse(self.control.paused)
+        iblrig.net.control_task(self.session_folder, 'stop')
+        self.assertTrue(self.control.stop_requested)
+        self.control.clear_stop()
+        self.assertFalse(self.session_folder.joinpath('.stop').exists())
+        # a resume command received by the channel removes the pause flag
+        self.session_folder.joinpath('.pause').touch()
+        self.control.start()
+        self.assertTrue(iblrig.net.control_task(self.session_folder, 'status')['paused'])
+        self.assertFalse(iblrig.net.control_task(self.session_folder, 'resume')['paused'])
+        self.assertFalse(self.session_folder.joinpath('.pause').exists())
+
+    def test_resume(self):
+        """A paused task resumes as soon as the command is received, without waiting for the flag files to be polled."""
+        self.control.poll_interval = 10
+        self.control.start()
+        self.control.handle('pause')
+        thread = threading.Thread(target=self.control.wait_while_paused)
+        thread.start()
+        t0 = time.perf_counter()
+        self.assertIsNotNone(iblrig.net.control_task(self.session_folder, 'resume'))
+        thread.join(timeout=1)
+        self.assertFalse(thread.is_alive())
+        self.assertLess(time.perf_counter() - t0, 0.5)
+        # a stop request ends the wait as well
+        self.assertFalse(self.control.wait_for_stop(timeout=0.01))
+        threading.Timer(0.05, iblrig.net.control_task, args=(self.session_folder, 'stop')).start()
+        self.assertTrue(self.control.wait_for_stop(timeout=5))
+
+
+class TestProgressPublisher(unittest.TestCase):
+    def test_emit(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(receiver.close)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(1)
+        publisher = iblrig.net.ProgressPublisher(receiver.getsockname()[1])
+        publisher.emit('trial', trial_num=3, water_delivered=1.5)
+        record = json.loads(receiver.recv(1024))
+        self.assertEqual('trial', record.pop('event'))
+        self.assertAlmostEqual(time.time(), record.pop('time'), delta=1)
+        self.assertEqual({'trial_num': 3, 'water_delivered': 1.5}, record)
+        publisher.close()
+        publisher.emit('ended')  # does nothing once closed, as without a port
+        iblrig.net.ProgressPublisher().emit('started')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,6 +4,7 @@ from pathlib import Path
 
 import matplotlib
 import numpy as np
+import pandas as pd
 
 import iblrig.online_plots as op
 from iblrig.raw_data_loaders import load_task_jsonable
@@ -31,3 +32,92 @@ class TestOnlinePlots(unittest.TestCase):
     @classmethod
     def tearDownClass(cls) -> None:
         cls.task_file.unlink()
+
+
+class TestDataModel(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(42)
+        n = 50
+        self.trials_table = pd.DataFrame(
+            {
+                'position': rng.choice([-35, 35], n),
+                'contrast': rng.choice(op.CONTRAST_SET, n),
+                'stim_probability_left': rng.choice(op.PROBABILITY_SET, n),
+                'trial_correct': rng.choice([True, False], n),
+                'response_time': rng.uniform(0.1, 2, n),
+                'reward_amount': rng.choice([0, 1.5], n),
+            }
+        )
+        # a contrast that is not part of the contrast set
+        self.trials_table.loc[7, 'contrast'] = 0.75
+        self.bpod_data = [
+            {
+                'Bpod start timestamp': 0,
+                'Trial end timestamp': i * 10.0,
+                'States timestamps': {'stim_on': [[i + 0.1, i + 0.2]], 'reward': [[np.nan, np.nan]]},
+            }
+            for i in range(n)
+        ]
+
+    def test_update_trial(self):
+        data = op.DataModel(settings_file=None)
+        for i in range(self.trials_table.shape[0]):
+            data.update_trial(self.trials_table.iloc[i], self.bpod_data[i])
+        # compare the online statistics with the statistics computed from the full table
+        trials_table = self.trials_table.copy()
+        trials_table['signed_contrast'] = np.sign(trials_table['position']) * trials_table['contrast']
+        trials_table['choice'] = (trials_table['position'] > 0) == trials_table['trial_correct']
+        expected = trials_table.groupby(['stim_probability_left', 'signed_contrast']).agg(
+            count=pd.NamedAgg(column='signed_contrast', aggfunc='count'),
+            response_time=pd.NamedAgg(column='response_time', aggfunc='mean'),
+            choice=pd.NamedAgg(column='choice', aggfunc='mean'),
+            response_time_std=pd.NamedAgg(column='response_time', aggfunc=lambda x: x.std(ddof=0)),
+            choice_std=pd.NamedAgg(column='choice', aggfunc=lambda x: x.std(ddof=0)),
+        )
+        psychometrics = data.psychometrics
+        self.assertEqual(psychometrics['count'].sum(), trials_table.shape[0])
+        self.assertIn(0.75, data.signed_contrasts)
+        self.assertTrue(np.all(np.diff(data.signed_contrasts) > 0))
+        pd.testing.assert_frame_equal(
+            psychometrics.loc[expected.index], expected, check_dtype=False, check_names=False, check_index_type=False
+        )
+        x, choice, response_time = data.psychometric_curve(0.5)
+        np.testing.assert_array_equal(x, expected.loc[0.5].index)
+        np.testing.assert_array_almost_equal(choice, expected.loc[0.5, 'choice'])
+        np.testing.assert_array_almost_equal(response_time, expected.loc[0.5, 'response_time'])
+        # the last trials are ordered from the oldest to the most recent
+        last_trials = data.last_trials
+        np.testing.assert_array_equal(last_trials['response_time'], trials_table['response_time'].iloc[-op.NTRIALS_PLOT :])
+        np.testing.assert_array_equal(last_trials['stim_on'], np.arange(30, 50) + 0.1)
+        self.assertTrue(np.all(np.isnan(last_trials['play_tone'])))
+        correct = trials_table['trial_correct'].iloc[-op.NTRIALS_PLOT :].values
+        np.testing.assert_array_equal(data.rgb_background[correct, 0], [[0, 255, 0]] * correct.sum())
+        np.testing.assert_array_equal(data.rgb_background[~correct, 0], [[255, 0, 0]] * (~correct).sum())
+        signed_contrast = trials_table['signed_contrast'].iloc[-op.NTRIALS_PLOT :].values
+        np.testing.assert_array_equal(data.last_contrasts[:, 1] - data.last_contrasts[:, 0], signed_contrast)
+        self.assertEqual(data.ntrials, 50)
+        self.assertAlmostEqual(data.percent_correct, trials_table['trial_correct'].mean() * 100)
+
+
+class TestBlitting(unittest.TestCase):
+    def test_draw(self):
+        myop = op.OnlinePlots()
+        trials_table, bpod_data = load_task_jsonable(Path(__file__).parent.joinpath('fixtures', 'task_data_short.jsonable'))
+        myop.draw()  # full redraw caching the background
+        self.assertIsNotNone(myop._background)
+        self.assertFalse(myop._stale)
+        for i in np.arange(trials_table.shape[0]):
+            myop.update_trial(trials_table.iloc[i], bpod_data[i])
+            self.assertTrue(myop._stale)
+            myop.draw()
+        blitted = np.asarray(myop.h.fig.canvas.buffer_rgba()).copy()
+        # a change of the figure color invalidates the background
+        myop.h.fig.set_facecolor('#eb5757')
+        myop.update_graphics()
+        self.assertIsNone(myop._background)
+        myop.draw()
+        np.testing.assert_array_equal(blitted, np.asarray(myop.h.fig.canvas.buffer_rgba()))
+        self.assertEqual(myop.frame_time.count, trials_table.shape[0] + 2)
+        self.assertGreater(myop.frame_time.max, 0)
+        with self.assertLogs(op.log, 'INFO'):
+            myop.log_frame_time()
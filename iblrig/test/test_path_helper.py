@@ -2,14 +2,19 @@
 
 import logging
 import os
+import shutil
 import tempfile
+import threading
 import unittest
 from copy import deepcopy
 from pathlib import Path
+from unittest.mock import Mock, patch
 
 import yaml
 
 import ibllib.tests.fixtures.utils as fu
+import iblrig.commands
+from ibllib.io import session_params
 from iblrig import path_helper
 from iblrig.constants import BASE_DIR
 from iblrig.path_helper import load_pydantic_yaml, save_pydantic_yaml
@@ -193,6 +198,132 @@ class TestIterateProtocols(unittest.TestCase):
         self.assertEqual([], path_helper._iterate_protocols(subject_folder, task))
 
 
+class TestSessionIndex(unittest.TestCase):
+    """Test for iblrig.path_helper.SessionIndex."""
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmpdir = Path(tmp.name)
+        self.subject_folder = self.tmpdir / 'fakelab' / 'Subjects' / 'fakemouse'
+        self.task = 'ephysCW'
+        self.session_paths = []
+        for date, ntrials in (('1900-01-01', 260), ('1900-01-02', 260), ('1900-01-03', 10)):
+            self.session_paths.append(self._create_session(date, ntrials))
+        self.index = path_helper.SessionIndex.for_subject('fakemouse', self.subject_folder.parent)
+
+    def _create_session(self, date, ntrials, task=None):
+        session_path = fu.create_fake_session_folder(self.tmpdir, date=date)
+        p = fu.create_fake_raw_behavior_data_folder(
+            session_path, task=task or self.task, folder='raw_task_data_00', write_pars_stub=True
+        )
+        fu.populate_task_settings(p, {'NTRIALS': ntrials, 'SESSION_END_TIME': None})
+        return session_path
+
+    def test_iterate_protocols(self):
+        self.assertEqual(self.index.file_index, self.tmpdir.joinpath('fakelab', '.session_index', 'fakemouse.json'))
+        expected = path_helper._iterate_protocols(self.subject_folder, self.task, n=4)
+        protocols = path_helper._iterate_protocols(self.subject_folder, self.task, n=4, index=self.index)
+        self.assertEqual([p['session_path'] for p in expected], [p['session_path'] for p in protocols])
+        self.assertEqual(self.session_paths[1], protocols[0]['session_path'])
+        self.assertEqual(260, protocols[0]['task_settings']['NTRIALS'])
+        self.assertIn('tasks', protocols[0]['experiment_description'])
+        self.index.save()
+        self.assertTrue(self.index.file_index.exists())
+
+        # a fresh instance is loaded from disk, doesn't list the subject folder and doesn't read the experiment
+        # description of sessions not returned
+        index = path_helper.SessionIndex(self.index.file_index)
+        with (
+            patch('ibllib.io.session_params.read_params', wraps=session_params.read_params) as rp,
+            patch.object(path_helper.SessionIndex, 'update') as update,
+        ):
+            protocols = index.iterate_protocols(self.subject_folder, self.task, n=1)
+        self.assertEqual(self.session_paths[1], protocols[0]['session_path'])
+        rp.assert_called_once()
+        update.assert_not_called()
+
+        # the settings of a session running when indexed are read at each lookup
+        fu.populate_task_settings(self.session_paths[2].joinpath('raw_task_data_00'), {'NTRIALS': 400, 'SESSION_END_TIME': 1})
+        protocols = index.iterate_protocols(self.subject_folder, self.task, n=1)
+        self.assertEqual(self.session_paths[2], protocols[0]['session_path'])
+
+        # sessions created after the index was built, e.g. by another rig, are found at the next lookup, and removed
+        # sessions are dropped
+        session_path = self._create_session('1900-01-04', 300, task='foobarCW')
+        shutil.rmtree(self.session_paths[2])
+        self.assertTrue(index.is_stale(self.subject_folder))
+        protocols = index.iterate_protocols(self.subject_folder, 'foobarCW', n=1)
+        self.assertEqual(session_path, protocols[0]['session_path'])
+        self.assertEqual(3, len(index._folders[str(self.subject_folder)]['sessions']))
+        protocols = index.iterate_protocols(self.subject_folder, self.task, n=4)
+        self.assertEqual(self.session_paths[1::-1], [p['session_path'] for p in protocols])
+        session_path = self._create_session('1900-01-04', 300, task='foobarCW')
+        protocols = index.iterate_protocols(self.subject_folder, 'foobarCW', n=1)
+        self.assertEqual(session_path, protocols[0]['session_path'])
+        # an index older than max_age is refreshed even if no folder changed
+        self.assertFalse(index.is_stale(self.subject_folder))
+        with patch.object(path_helper.SessionIndex, 'max_age', -1):
+            self.assertTrue(index.is_stale(self.subject_folder))
+
+        # a missing subject folder is dropped from the index
+        shutil.rmtree(self.subject_folder)
+        index.update(self.subject_folder)
+        self.assertEqual([], index.iterate_protocols(self.subject_folder, self.task))
+        self.assertEqual([], index.iterate_protocols(None, self.task))
+
+    def test_update_session(self):
+        session_path = self.session_paths[0]
+        fu.populate_task_settings(session_path.joinpath('raw_task_data_00'), {'NTRIALS': 260, 'SESSION_END_TIME': 1})
+        os.utime(session_path, ns=(0, 0))  # the session ran earlier than the index was built
+        self.index.update(self.subject_folder)
+        # chaining a protocol rewrites the experiment description in place and doesn't change the date folder
+        p = fu.create_fake_raw_behavior_data_folder(session_path, task='passiveCW', folder='raw_task_data_01')
+        fu.populate_task_settings(p, {'NTRIALS': 100, 'SESSION_END_TIME': 1})
+        file_experiment = next(session_path.glob('_ibl_experiment.description*.yaml'))
+        ad = session_params.read_params(file_experiment)
+        ad['tasks'].append({'passiveCW': {'collection': 'raw_task_data_01'}})
+        session_params.write_params(session_path, ad)
+        # the new collection folder changes the session folder: the next lookup picks up the appended protocol, as does
+        # re-indexing the session
+        reindexed = deepcopy(self.index)
+        reindexed.update_session(session_path)
+        for index in (reindexed, self.index):
+            protocols = index.iterate_protocols(self.subject_folder, 'passiveCW', n=1)
+            self.assertEqual(session_path, protocols[0]['session_path'])
+            self.assertEqual('raw_task_data_01', protocols[0]['task_collection'])
+
+    def test_concurrent_updates(self):
+        """The sessions transferred concurrently are all added to the index of their subject."""
+        copiers = [
+            Mock(state=iblrig.commands.CopyState.COMPLETE, session_path=session_path, remote_session_path=session_path)
+            for session_path in self.session_paths
+        ]
+        iblrig.commands._update_session_indices(copiers, self.subject_folder.parent)
+        index = path_helper.SessionIndex(self.index.file_index)
+        sessions = index._folders[str(self.subject_folder)]['sessions']
+        self.assertEqual(3, len(sessions))
+
+        # concurrent writers don't share a temporary file
+        errors = []
+
+        def save():
+            for _ in range(20):
+                index._dirty = True
+                try:
+                    index.save()
+                except OSError as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=save) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual([self.index.file_index], list(self.index.file_index.parent.iterdir()))
+
+
 class TestPatchSettings(unittest.TestCase):
     """Test for iblrig.path_helper.patch_settings."""
 
@@ -1,7 +1,11 @@
 import unittest
 from pathlib import Path
 
-from iblrig.pydantic_definitions import BunchModel, RigSettings
+import numpy as np
+import pandas as pd
+from pydantic import ValidationError
+
+from iblrig.pydantic_definitions import BunchModel, RigSettings, TrialDataModel, TrialsTable
 
 
 class TestBunchModel(unittest.TestCase):
@@ -56,3 +60,107 @@ class TestRigSettings(unittest.TestCase):
             rig_settings.ALYX_USER = 'John Doe'
         with self.assertRaises(ValueError):
             rig_settings.iblrig_remote_data_path = True
+
+
+class TestTrialsTable(unittest.TestCase):
+    def setUp(self):
+        class TestTrialData(TrialDataModel):
+            contrast: float
+            trial_num: int
+            trial_correct: bool = False
+            pause_duration: float = 0.0
+            label: str | None = None
+
+        self.model = TestTrialData
+        self.table = TestTrialData.preallocate_table(3)
+
+    def test_columns(self):
+        table = self.table
+        self.assertEqual(table.shape, (3, 5))
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.columns, ['contrast', 'trial_num', 'trial_correct', 'pause_duration', 'label'])
+        self.assertEqual(table['contrast'].dtype, np.float64)
+        self.assertEqual(table['trial_num'].dtype, object)  # as long as values are missing
+        self.assertEqual(table['trial_correct'].dtype, bool)
+        self.assertEqual(table['label'].dtype, object)
+        np.testing.assert_array_equal(table['pause_duration'], 0)
+        # fields without default are missing until set, and fail validation
+        self.assertIs(table.at[0, 'contrast'], pd.NA)
+        self.assertIs(table.iloc[0]['trial_num'], pd.NA)
+        self.assertRaises(ValidationError, self.model.model_validate, table.iloc[0].to_dict())
+        # setting a whole column
+        table['trial_num'] = np.arange(3)
+        self.assertEqual(table['trial_num'].dtype, np.int64)
+        table['trial_correct'] = [True, False, True]
+        np.testing.assert_array_equal(table['trial_correct'], [True, False, True])
+        self.assertRaises(ValueError, table.__setitem__, 'trial_correct', [True])
+
+    def test_at_and_iloc(self):
+        table = self.table
+        table.at[1, 'contrast'] = 0.5
+        table.at[1, 'trial_num'] = 1
+        table.at[1, 'trial_correct'] = True
+        self.assertEqual(table.at[1, 'contrast'], 0.5)
+        self.assertRaises(ValueError, table.at.__setitem__, (1, 'trial_num'), 1.5)
+        record = table.iloc[-2]
+        self.assertEqual(record.trial_num, 1)
+        self.assertRaises(AttributeError, getattr, record, 'foo')
+        self.assertRaises(IndexError, table.iloc.__getitem__, 3)
+        trial_data = record.to_dict()
+        self.assertEqual(
+            trial_data, {'contrast': 0.5, 'trial_num': 1, 'trial_correct': True, 'pause_duration': 0.0, 'label': None}
+        )
+        self.assertIs(type(trial_data['trial_num']), int)
+        self.model.model_validate(trial_data)
+        # new columns are created as pandas does, and the table grows when writing past the last row
+        table.at[1, 'extra'] = 2
+        self.assertTrue(np.isnan(table.at[0, 'extra']))
+        table.at[4, 'trial_num'] = 4
+        self.assertEqual(len(table), 6)
+        self.assertEqual(table.at[4, 'trial_num'], 4)
+        self.assertEqual(table.at[5, 'pause_duration'], 0.0)
+        self.assertIs(table.at[5, 'trial_num'], pd.NA)
+
+    def test_to_dataframe(self):
+        table = self.table
+        table.at[0, 'contrast'] = 1.0
+        table.at[0, 'trial_num'] = 0
+        df = table.to_dataframe()
+        self.assertEqual(df.shape, (3, 5))
+        self.assertEqual(df.loc[0, 'trial_num'], 0)
+        self.assertIs(df.loc[1, 'trial_num'], pd.NA)
+        self.assertTrue(np.isnan(df.loc[1, 'contrast']))
+        self.assertEqual(df['trial_correct'].dtype, bool)
+        # the dataframe is a copy
+        df.loc[0, 'contrast'] = 0.5
+        self.assertEqual(table.at[0, 'contrast'], 1.0)
+
+    def test_dataframe_interface(self):
+        table = self.table
+        table['contrast'] = [0.0, 0.5, 1.0]
+        table.loc[1:2, 'trial_num'] = [1, 2]
+        table.loc[0, 'trial_num'] = 0
+        table.loc[table['contrast'] > 0, 'trial_correct'] = True
+        table.loc[[0, 2], 'extra'] = 'x'
+        np.testing.assert_array_equal(table['trial_num'], [0, 1, 2])
+        self.assertEqual(table['trial_num'].dtype, np.int64)
+        np.testing.assert_array_equal(table['trial_correct'], [False, True, True])
+        self.assertEqual(table['extra'].fillna('').tolist(), ['x', '', 'x'])
+        self.assertRaises(ValueError, table.loc.__setitem__, (slice(None), 'trial_num'), 0.5)
+        self.assertRaises(KeyError, table.loc.__setitem__, 0, 1)
+        # columns are Series, and row selections DataFrames
+        self.assertIsInstance(table['contrast'], pd.Series)
+        self.assertEqual(table.loc[1, 'contrast'], 0.5)
+        pd.testing.assert_frame_equal(table[table['trial_correct']], table.to_dataframe().iloc[1:])
+        pd.testing.assert_frame_equal(table.loc[table['contrast'] > 0.4, ['contrast', 'trial_num']], table.iloc[1:, :2])
+        pd.testing.assert_series_equal(table.iloc[-2:]['trial_num'], pd.Series([1, 2], index=[1, 2], name='trial_num'))
+        self.assertEqual(list(table), table.columns)
+        self.assertEqual([i for i, _ in table.iterrows()], [0, 1, 2])
+        self.assertFalse(table.empty)
+
+    def test_from_dataframe(self):
+        df = pd.DataFrame({'stim_type': ['G', 'V'], 'stim_delay': [0.5, 1.0]}, index=[10, 11])
+        table = TrialsTable.from_dataframe(df)
+        self.assertEqual(table.shape, (2, 2))
+        self.assertEqual(table.iloc[1].stim_type, 'V')
+        pd.testing.assert_frame_equal(table.to_dataframe(), df.reset_index(drop=True))
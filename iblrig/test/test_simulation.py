@@ -0,0 +1,231 @@
+import json
+import socket
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from iblrig.net import control_task
+from iblrig.raw_data_loaders import load_task_jsonable
+from iblrig.simulation import EmulatedBpod, PsychometricAgent, TaskSimulator, VirtualClock, simulate_sessions
+from iblrig.test.base import BaseTestCases
+from iblrig.test.tasks.test_biased_choice_world_family import get_fixtures
+from iblrig_tasks._iblrig_tasks_biasedChoiceWorld.task import Session as BiasedChoiceWorldSession
+from iblrig_tasks._iblrig_tasks_habituationChoiceWorld.task import Session as HabituationChoiceWorldSession
+from iblrig_tasks._iblrig_tasks_trainingChoiceWorld.task import Session as TrainingChoiceWorldSession
+from pybpodapi.exceptions.bpod_error import BpodErrorException
+from pybpodapi.state_machine import StateMachine
+
+
+class TestPsychometricAgent(unittest.TestCase):
+    def test_p_right(self):
+        agent = PsychometricAgent(bias=10, threshold=20, lapse_left=0.1, lapse_right=0.2)
+        self.assertAlmostEqual(0.1 + 0.7 / 2, agent.p_right(10))
+        np.testing.assert_allclose(agent.p_right([-1000, 1000]), [0.1, 0.8])
+        self.assertTrue(np.all(np.diff(agent.p_right(np.linspace(-100, 100, 11))) > 0))
+
+    def test_respond(self):
+        agent = PsychometricAgent(lapse_left=0, lapse_right=0, rt_median=0.5, seed=0)
+        responses = np.array([agent.respond(c) for c in np.tile([-100, 100], 500)])
+        np.testing.assert_array_equal(responses[:, 0], np.tile([-1, 1], 500))
+        self.assertAlmostEqual(0.5, np.median(responses[:, 1]), delta=0.05)
+        self.assertIsNone(PsychometricAgent(p_quiescence_movement=0).quiescence_movement(0.5))
+
+
+class TestEmulatedBpod(unittest.TestCase):
+    def setUp(self):
+        self.bpod = EmulatedBpod()
+
+    def run_state_machine(self, sma, inputs=()):
+        self.bpod.send_state_machine(sma)
+        self.bpod.schedule_inputs(inputs)
+        self.assertTrue(self.bpod.run_state_machine(sma))
+        return self.bpod.session.current_trial.export()
+
+    def test_scripted_inputs(self):
+        sma = StateMachine(self.bpod)
+        sma.add_state('wait', 10, {'Port1In': 'reward', 'Port2In': 'error', 'Tup': 'exit'})
+        sma.add_state('reward', 0.1, {'Tup': 'exit'}, [('Valve1', 255)])
+        sma.add_state('error', 0.5, {'Tup': 'exit'})
+        bpod_data = self.run_state_machine(sma, [(1.5, 'Port1In'), (1.55, 'Port2In')])
+        self.assertEqual(
+            ['Bpod start timestamp', 'Trial start timestamp', 'Trial end timestamp', 'States timestamps', 'Events timestamps'],
+            list(bpod_data.keys()),
+        )
+        self.assertEqual([(0, 1.5)], bpod_data['States timestamps']['wait'])
+        self.assertEqual([(1.5, 1.6)], bpod_data['States timestamps']['reward'])
+        self.assertTrue(np.all(np.isnan(bpod_data['States timestamps']['error'])))
+        # all the input events are timestamped, whether they trigger a transition or not
+        self.assertEqual({'Port1In': [1.5], 'Port2In': [1.55], 'Tup': [1.6]}, bpod_data['Events timestamps'])
+        self.assertEqual([(1.5, 'Valve1', 255)], self.bpod.output_log)
+        # the next trial starts where the previous one ended, without an input the wait state times out
+        bpod_data = self.run_state_machine(sma)
+        self.assertEqual([(1.6, 11.6)], bpod_data['States timestamps']['wait'])
+        self.assertEqual(0, bpod_data['Bpod start timestamp'])
+        with self.assertRaises(BpodErrorException):
+            self.bpod.schedule_inputs([(0, 'Port9In')])
+
+    def test_global_timers_and_counters(self):
+        sma = StateMachine(self.bpod)
+        sma.set_global_timer(timer_id=1, timer_duration=2)
+        sma.set_global_timer(timer_id=2, timer_duration=1, send_events=0)
+        sma.set_global_counter(counter_number=1, target_event='Port1In', threshold=3)
+        sma.add_state('start', 0, {'Tup': 'wait'}, [('GlobalTimerTrig', 1), ('GlobalTimerTrig', 2), ('GlobalCounterReset', 1)])
+        sma.add_state('wait', 0, {'GlobalCounter1_End': 'counted', 'GlobalTimer2_End': 'cancel'})
+        sma.add_state('cancel', 0.5, {'GlobalTimer1_End': 'exit', 'Tup': 'counted'}, [('GlobalTimerCancel', 1)])
+        sma.add_state('counted', 0, {'Tup': 'exit'})
+        bpod_data = self.run_state_machine(sma)
+        # timer 2 ends first and the state cancels timer 1
+        self.assertEqual([(1.0, 1.5)], bpod_data['States timestamps']['cancel'])
+        self.assertEqual([1.0], bpod_data['Events timestamps']['GlobalTimer2_End'])
+        # events occurring within the first cycle of a state are timestamped on the next cycle
+        self.assertEqual([0.0001], bpod_data['Events timestamps']['GlobalTimer1_Start'])
+        self.assertNotIn('GlobalTimer1_End', bpod_data['Events timestamps'])
+        # the global counter ends on its third event
+        bpod_data = self.run_state_machine(sma, [(0.1, 'Port1In'), (0.2, 'Port1In'), (0.3, 'Port1In')])
+        self.assertAlmostEqual(0.3, bpod_data['States timestamps']['counted'][0][0] - bpod_data['Trial start timestamp'])
+
+    def test_softcodes_and_serial_messages(self):
+        self.bpod.define_rotary_encoder_actions()
+        softcodes, messages = [], []
+        self.bpod.register_softcodes({3: lambda: softcodes.append(3)})
+        self.bpod.serial_handler = lambda port, message, t: messages.append((port, message)) or [(t + 0.01, 'BNC1High')]
+        sma = StateMachine(self.bpod)
+        sma.add_state('show', 1, {'BNC1High': 'exit', 'Tup': 'exit'}, [self.bpod.actions.bonsai_show_stim, ('SoftCode', 3)])
+        bpod_data = self.run_state_machine(sma)
+        self.assertEqual([3], softcodes)
+        self.assertEqual([(1, [ord('#'), 8])], messages)
+        self.assertEqual([(0, 0.01)], bpod_data['States timestamps']['show'])
+
+    def test_input_handler(self):
+        events = []
+
+        def input_handler(state_name, t, timer, transitions):
+            events.append((state_name, timer, transitions))
+            return [(t + 0.2, 'BNC2High')] if state_name == 'play' else []
+
+        self.bpod.input_handler = input_handler
+        sma = StateMachine(self.bpod)
+        sma.add_state('play', 1, {'BNC2High': 'wait', 'Tup': 'exit'})
+        sma.add_state('wait', 0.5, {'Tup': 'exit'})
+        self.run_state_machine(sma)
+        self.assertEqual([('play', 1, {'BNC2High': 'wait', 'Tup': 'exit'}), ('wait', 0.5, {'Tup': 'exit'})], events)
+        # a state that waits for an input that never occurs raises instead of blocking
+        sma = StateMachine(self.bpod)
+        sma.add_state('wait', 0, {'Port1In': 'exit'})
+        self.bpod.send_state_machine(sma)
+        with self.assertRaises(BpodErrorException):
+            self.bpod.run_state_machine(sma)
+
+    def test_pulse_valve_repeatedly(self):
+        self.assertEqual(4, self.bpod.pulse_valve_repeatedly(4, open_time_s=0.05, close_time_s=0.1))
+        self.assertEqual(0.5, self.bpod.session.current_trial.export()['Trial end timestamp'])
+        self.assertTrue(np.all(np.isnan(list(self.bpod.get_ambient_sensor_reading().values()))))
+
+    def test_realtime_factor(self):
+        self.bpod.realtime_factor = 4
+        sma = StateMachine(self.bpod)
+        sma.add_state('wait', 0.4, {'Tup': 'exit'})
+        t0 = time.perf_counter()
+        self.run_state_machine(sma)
+        self.assertAlmostEqual(0.1, time.perf_counter() - t0, delta=0.05)
+        self.assertEqual(0.4, self.bpod.clock())
+
+
+class TestTaskSimulator(BaseTestCases.CommonTestTask):
+    def setUp(self):
+        self.get_task_kwargs()
+
+    def test_biased_choice_world(self):
+        task = BiasedChoiceWorldSession(**self.task_kwargs)
+        simulator = TaskSimulator(task, agent=PsychometricAgent(lapse_left=0, lapse_right=0, threshold=1, seed=0))
+        t0 = time.time()
+        simulator.run(ntrials=100)
+        # 100 trials last several minutes of virtual time but are simulated without waiting
+        self.assertGreater(simulator.clock(), 100)
+        self.assertLess(time.time() - t0, simulator.clock())
+        bpod_data = simulator.run_trial()
+        self.assertEqual(get_fixtures()['correct'].keys(), bpod_data.keys())
+        self.assertEqual(simulator.clock(), bpod_data['Trial end timestamp'])
+        states = bpod_data['States timestamps']
+        self.assertEqual(states['stim_on'][0][1], bpod_data['Events timestamps']['BNC1High'][0])
+        self.assertEqual(task.trials_table.at[task.trial_num, 'trial_correct'], np.isnan(states['error'][0][0]))
+        # the response time is read from the simulated states
+        trials_table = task.trials_table.to_dataframe().iloc[: task.trial_num + 1]
+        np.testing.assert_array_equal(trials_table['trial_correct'][trials_table['contrast'] > 0], True)
+        response_time = states['closed_loop'][0][1] - states['stim_on'][0][0]
+        self.assertEqual(response_time, task.trials_table.at[task.trial_num, 'response_time'])
+        self.assertEqual(101, task.session_info.NTRIALS)
+
+    def test_task_loop(self):
+        """The main loop of the task runs on the emulated Bpod."""
+        task = BiasedChoiceWorldSession(**self.task_kwargs)
+        simulator = TaskSimulator(task)
+        task.task_params.NTRIALS = 20
+        task.task_params.ITI_DELAY_SECS = task.task_params.get('DEAD_TIME', 0.5)
+        task.create_session()
+        task._run()
+        self.assertEqual(19, task.trial_num)
+        self.assertGreater(simulator.clock(), 20)
+        self.assertEqual(19, task.state_machine_templates.n_hits + task.state_machine_templates.n_misses - 1)
+
+    def test_task_control(self):
+        """The task loop pauses and stops on the commands of the control channel."""
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(receiver.close)
+        receiver.bind(('127.0.0.1', 0))
+        task = BiasedChoiceWorldSession(**self.task_kwargs, progress_port=receiver.getsockname()[1])
+        TaskSimulator(task)
+        task.task_params.ITI_DELAY_SECS = task.task_params.get('DEAD_TIME', 0.5)
+        task.create_session()
+        task.control.start()
+        self.addCleanup(task.control.close)
+        task.control.handle('stop_after', 5)
+        task.control.handle('pause')
+        threading.Timer(0.2, control_task, args=(task.paths.SESSION_FOLDER, 'resume')).start()
+        task._run()
+        self.assertEqual(4, task.trial_num)
+        self.assertGreater(task.trials_table.at[0, 'pause_duration'], 0.1)
+        np.testing.assert_array_equal([0], np.where(task.trials_table['pause_duration'][:5] > 0)[0])
+        # the pause duration is saved with the trial data, although the trial was reported before the pause
+        trials_table, _ = load_task_jsonable(task.paths.DATA_FILE_PATH)
+        self.assertEqual(task.trials_table.at[0, 'pause_duration'], trials_table.at[0, 'pause_duration'])
+        # the progress of the session is sent with each trial, before pausing
+        receiver.setblocking(False)
+        records = [json.loads(receiver.recv(1024)) for _ in range(7)]
+        self.assertEqual(['trial', 'paused', 'resumed', 'trial', 'trial', 'trial', 'trial'], [r['event'] for r in records])
+        self.assertEqual(list(range(5)), [r['trial_num'] for r in records if r['event'] == 'trial'])
+        self.assertEqual(task.session_info.NTRIALS_CORRECT, records[-1]['ntrials_correct'])
+        self.assertEqual(task.session_info.TOTAL_WATER_DELIVERED, records[-1]['water_delivered'])
+
+    def test_no_go(self):
+        task = BiasedChoiceWorldSession(**self.task_kwargs)
+        task.task_params.RESPONSE_WINDOW = 1
+        simulator = TaskSimulator(task, agent=PsychometricAgent(rt_median=100), clock=VirtualClock(t0=10))
+        simulator.run(ntrials=10)
+        trials_table = task.trials_table.to_dataframe().iloc[:10]
+        np.testing.assert_array_equal(trials_table['response_side'], 0)
+        np.testing.assert_array_equal(trials_table['reward_amount'], 0)
+
+    def test_habituation_choice_world(self):
+        task = HabituationChoiceWorldSession(**self.task_kwargs)
+        TaskSimulator(task).run(ntrials=10)
+        self.assertEqual(10, task.session_info.NTRIALS)
+        self.assertGreater(task.session_info.TOTAL_WATER_DELIVERED, 0)
+
+    def test_simulate_sessions(self):
+        """The training phase and the adaptive reward of each session are inferred from the previous session."""
+        self.task_kwargs['subject_weight_grams'] = 20
+        agents = [PsychometricAgent(threshold=5, seed=i) for i in range(3)]
+        sessions = simulate_sessions(TrainingChoiceWorldSession, agents, ntrials=400, **self.task_kwargs)
+        self.assertEqual(3, sessions.shape[0])
+        np.testing.assert_array_equal(sessions['training_phase_start'].values[1:], sessions['training_phase_end'].values[:-1])
+        self.assertEqual(0, sessions['training_phase_start'].iloc[0])
+        self.assertGreater(sessions['training_phase_end'].iloc[-1], 1)
+        # the water delivered exceeds the subject's daily dose: the reward decreases after each session
+        np.testing.assert_allclose(sessions['adaptive_reward'], [3.0, 2.9, 2.8])
+
+
+if __name__ == '__main__':
+    unittest.main()
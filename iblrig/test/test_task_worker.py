@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+TASK = """
+import sys
+
+import task_helper
+
+if __name__ == '__main__':
+    print(__name__, task_helper.NAME, sys.argv[1:], flush=True)
+"""
+
+
+class TestTaskWorker(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.task_file = Path(tmp.name).joinpath('task.py')
+        self.task_file.write_text(TASK)
+        # a module in the folder of the task, importable as when running `python task.py`
+        self.task_file.with_name('task_helper.py').write_text("NAME = 'helper'\n")
+
+    def run_worker(self, stdin: str) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [sys.executable, '-m', 'iblrig.task_worker', str(self.task_file)],
+            input=stdin,
+            capture_output=True,
+            text=True,
+            timeout=60,
+            check=False,
+        )
+
+    def test_run_task(self):
+        process = self.run_worker(json.dumps(['--subject', 'algernon', '--weight', '25']) + '\n')
+        self.assertEqual(0, process.returncode, process.stderr)
+        self.assertEqual("__main__ helper ['--subject', 'algernon', '--weight', '25']", process.stdout.strip())
+
+    def test_discarded(self):
+        """The worker exits without running the task once its standard input is closed."""
+        process = self.run_worker('')
+        self.assertEqual(0, process.returncode, process.stderr)
+        self.assertEqual('', process.stdout)
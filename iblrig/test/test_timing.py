@@ -0,0 +1,83 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from iblrig.timing import TRIAL_PHASES, TRIAL_TIMING_FILE_NAME, TrialPhaseTimer, load_trial_timing
+
+
+class TestTrialPhaseTimer(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.file_timing = Path(self.tempdir.name).joinpath(TRIAL_TIMING_FILE_NAME)
+
+    def test_phases(self):
+        timer = TrialPhaseTimer(self.file_timing)
+        self.addCleanup(timer.close)
+        for trial_num in range(3):
+            with timer.phase('next_trial'):
+                time.sleep(0.01)
+            with timer.phase('run_state_machine'):
+                time.sleep(0.02)
+            # a phase entered several times is accumulated
+            for _ in range(2):
+                with timer.phase('show_trial_log'):
+                    time.sleep(0.005)
+            durations = timer.end_trial(trial_num)
+            self.assertCountEqual(TRIAL_PHASES, durations)
+            self.assertGreaterEqual(durations['next_trial'], 0.01)
+            self.assertGreaterEqual(durations['show_trial_log'], 0.01)
+            self.assertEqual(durations['send_state_machine'], 0)
+            # the file is readable while the session is running
+            df_timing = load_trial_timing(self.file_timing)
+            self.assertEqual(trial_num + 1, df_timing.shape[0])
+        self.assertEqual(3, timer.ntrials)
+        np.testing.assert_array_equal(timer.durations.index, [0, 1, 2])
+        self.assertEqual(list(TRIAL_PHASES), list(df_timing.columns))
+        np.testing.assert_allclose(df_timing.values, timer.durations.values, atol=1e-6)
+        # the state machine run is not part of the overhead
+        np.testing.assert_allclose(timer.overhead, timer.durations[['next_trial', 'show_trial_log']].sum(axis=1))
+        self.assertTrue(np.all(timer.overhead < timer.durations['run_state_machine'] + 0.01))
+        # the phase is recorded even if the enclosed block raises
+        with self.assertRaises(RuntimeError), timer.phase('trial_completed'):
+            raise RuntimeError
+        self.assertGreater(timer.current['trial_completed'], 0)
+
+    def test_summary(self):
+        timer = TrialPhaseTimer()
+        self.assertTrue(timer.summary()['max'].isna().all())
+        with self.assertNoLogs('iblrig.timing'):
+            timer.log_summary()
+        for trial_num in range(100):
+            with timer.phase('ambient_sensor'):
+                pass
+            timer.end_trial(trial_num)
+        summary = timer.summary()
+        self.assertEqual([*TRIAL_PHASES, 'overhead'], list(summary.index))
+        self.assertEqual(['mean', 'median', 'p95', 'max'], list(summary.columns))
+        self.assertEqual(0, summary.loc['next_trial', 'max'])
+        self.assertGreater(summary.loc['ambient_sensor', 'max'], 0)
+        with self.assertLogs('iblrig.timing', 'INFO'):
+            timer.log_summary()
+
+    def test_max_overhead(self):
+        timer = TrialPhaseTimer(max_overhead=0.01)
+        with timer.phase('iti_wait'):
+            time.sleep(0.02)
+        with self.assertNoLogs('iblrig.timing', 'WARNING'):
+            timer.end_trial(0)
+        with timer.phase('send_state_machine'):
+            time.sleep(0.02)
+        with self.assertLogs('iblrig.timing', 'WARNING') as lg:
+            timer.end_trial(1)
+        self.assertIn('longest phase: send_state_machine', lg.output[0])
+        with self.assertLogs('iblrig.timing', 'WARNING') as lg:
+            timer.log_summary()
+        self.assertIn('in 1 trials', lg.output[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
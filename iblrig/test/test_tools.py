@@ -68,7 +68,7 @@ class TestInternetAvailableFunction(unittest.TestCase):
 
 class TestCallBonsai(unittest.TestCase):
     @patch('subprocess.run', return_value=subprocess.CompletedProcess(args='', returncode=0))
-    @patch('iblrig.tools.create_bonsai_layout_from_template')
+    @patch('iblrig.path_helper.create_bonsai_layout_from_template')
     @patch('pathlib.Path.exists', return_value=False)
     def test_call_bonsai(self, mock_exists, mock_create_layout, mock_check_call):
         workflow_file = Path('some', 'dir', 'example_workflow.bonsai')
@@ -1,4 +1,7 @@
 import copy
+import hashlib
+import json
+import os
 import random
 import tempfile
 import unittest
@@ -16,7 +19,17 @@ from ibllib.io import session_params
 from ibllib.tests.fixtures.utils import populate_raw_spikeglx
 from iblrig.path_helper import HardwareSettings, load_pydantic_yaml
 from iblrig.test.base import TASK_KWARGS
-from iblrig.transfer_experiments import BehaviorCopier, EphysCopier, SessionCopier, VideoCopier
+from iblrig.transfer_experiments import (
+    BandwidthLimiter,
+    BehaviorCopier,
+    EphysCopier,
+    SessionCopier,
+    TransferManifest,
+    VideoCopier,
+    _blake2b,
+    _copy_file_checksum,
+    copy_folders,
+)
 from iblrig_tasks._iblrig_tasks_trainingChoiceWorld.task import Session
 
 
@@ -346,3 +359,185 @@ class TestBuildGlobPattern(unittest.TestCase):
         self.assertEqual('foo/*-*-*/*/flag.file', glob_pattern)
         glob_pattern = iblrig.commands._build_glob_pattern(flag_file='flag.file', glob_pattern='foo/bar/baz.*')
         self.assertEqual('foo/bar/baz.*', glob_pattern)
+
+
+class TestTransferData(unittest.TestCase):
+    """Test the handling of failed sessions by iblrig.commands.transfer_data."""
+
+    def test_failed_sessions(self):
+        copiers = [mock.Mock(session_path=Path(f'subject/2024-01-01/00{i}'), state=0) for i in range(4)]
+        copiers[0].run.side_effect = OSError('disk full')
+        copiers[2].run.side_effect = RuntimeError('connection lost')
+        local_and_remote = (Path('local'), Path('remote'))
+        with (
+            mock.patch('iblrig.commands._get_subjects_folders', return_value=local_and_remote),
+            mock.patch('iblrig.commands._get_copiers', return_value=copiers),
+            mock.patch('iblrig.commands._update_session_indices') as update_session_indices,
+            self.assertLogs('iblrig.commands', 'ERROR') as lg,
+            self.assertRaises(iblrig.commands.TransferError) as cm,
+        ):
+            iblrig.commands.transfer_data(tag='behavior', max_sessions=2, cleanup_weeks=False)
+        # every session is run, every failure is logged and reported, and the session indices are updated
+        for copier in copiers:
+            copier.run.assert_called_once()
+        self.assertEqual(2, sum('Could not transfer' in line for line in lg.output))
+        self.assertEqual([str(copiers[0].session_path), str(copiers[2].session_path)], list(cm.exception.errors))
+        self.assertIn('connection lost', str(cm.exception))
+        self.assertIsInstance(cm.exception.__cause__, OSError)
+        update_session_indices.assert_called_once_with(copiers, local_and_remote[0])
+
+
+class TestCopyFolders(unittest.TestCase):
+    """Test iblrig.transfer_experiments.copy_folders and the underlying checksummed copy."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.session_path = Path(tmp.name).joinpath('local', 'subject', '2024-01-01', '001')
+        self.local_folder = self.session_path.joinpath('raw_video_data')
+        self.remote_folder = Path(tmp.name).joinpath('remote', 'subject', '2024-01-01', '001', 'raw_video_data')
+        self.local_folder.joinpath('sub').mkdir(parents=True)
+        rng = random.Random(42)
+        self.files = {
+            'video.avi': rng.randbytes(5 * 1024 + 17),
+            'sub/frameData.bin': rng.randbytes(3 * 1024),
+            'empty.txt': b'',
+        }
+        for name, content in self.files.items():
+            self.local_folder.joinpath(name).write_bytes(content)
+        self.local_folder.joinpath('transfer_me.flag').touch()
+        self.manifest = TransferManifest(self.session_path)
+
+    def assert_copied(self):
+        copied = {f.relative_to(self.remote_folder).as_posix() for f in self.remote_folder.rglob('*') if f.is_file()}
+        self.assertEqual(set(self.files), copied)
+        for name, content in self.files.items():
+            self.assertEqual(content, self.remote_folder.joinpath(name).read_bytes())
+
+    def test_copy_folders(self):
+        with self.assertLogs('iblrig.transfer_experiments', 'INFO') as lg:
+            self.assertTrue(copy_folders(self.local_folder, self.remote_folder, manifest=self.manifest, max_workers=2))
+        self.assert_copied()
+        self.assertTrue(any('MB/s' in line for line in lg.output))
+        # the manifest is persisted in the local session folder
+        manifest = TransferManifest(self.session_path)
+        entry = manifest.get(self.local_folder.joinpath('video.avi'))
+        self.assertEqual(len(self.files['video.avi']), entry['size'])
+        self.assertEqual(hashlib.blake2b(self.files['video.avi']).hexdigest(), entry['blake2b'])
+        # the remote folder exists
+        self.assertFalse(copy_folders(self.local_folder, self.remote_folder))
+        # files already transferred are skipped based on their stats
+        with self.assertLogs('iblrig.transfer_experiments', 'DEBUG') as lg:
+            self.assertTrue(copy_folders(self.local_folder, self.remote_folder, overwrite=True, manifest=manifest))
+        self.assertEqual(3, sum('unchanged since last verified copy' in line for line in lg.output))
+
+    def test_manifest(self):
+        # the entries are appended as the files are copied, without rewriting the manifest file
+        with mock.patch('iblrig.transfer_experiments.os.replace', wraps=os.replace) as replace:
+            self.assertTrue(copy_folders(self.local_folder, self.remote_folder, manifest=self.manifest))
+        file_manifest = self.session_path.joinpath(TransferManifest.file_name)
+        self.assertNotIn(file_manifest, [call.args[1] for call in replace.call_args_list])
+        self.assertEqual(3, len(file_manifest.read_text().splitlines()))
+        # superseded entries are dropped once the folder has been copied
+        self.assertTrue(copy_folders(self.local_folder, self.remote_folder, overwrite=True, manifest=self.manifest, verify=True))
+        lines = file_manifest.read_text().splitlines()
+        self.assertEqual(3, len(lines))
+        self.assertEqual({f'raw_video_data/{name}' for name in self.files}, {json.loads(line)['file'] for line in lines})
+        # an entry truncated by a crash is skipped
+        with open(file_manifest, 'a') as fp:
+            fp.write(lines[0][:20])
+        with self.assertLogs('iblrig.transfer_experiments', 'WARNING'):
+            manifest = TransferManifest(self.session_path)
+        self.assertEqual(
+            self.manifest.get(self.local_folder.joinpath('video.avi')), manifest.get(self.local_folder.joinpath('video.avi'))
+        )
+        manifest.compact()
+        self.assertEqual(lines, file_manifest.read_text().splitlines())
+
+    def test_verify(self):
+        self.assertTrue(copy_folders(self.local_folder, self.remote_folder, manifest=self.manifest))
+        # corrupt the remote file without changing its stats: only a full verification detects it
+        dst = self.remote_folder.joinpath('video.avi')
+        stat = dst.stat()
+        dst.write_bytes(bytes(stat.st_size))
+        os.utime(dst, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        with mock.patch('iblrig.transfer_experiments._blake2b', wraps=_blake2b) as blake2b:
+            self.assertTrue(copy_folders(self.local_folder, self.remote_folder, overwrite=True, manifest=self.manifest))
+        blake2b.assert_not_called()
+        self.assertNotEqual(self.files['video.avi'], dst.read_bytes())
+        with self.assertLogs('iblrig.transfer_experiments', 'INFO') as lg:
+            self.assertTrue(
+                copy_folders(self.local_folder, self.remote_folder, overwrite=True, manifest=self.manifest, verify=True)
+            )
+        self.assertEqual(2, sum('hashes match, skipping copy' in line for line in lg.output))
+        self.assert_copied()
+        # a local file modified after the copy is copied again
+        self.files['video.avi'] = b'foo'
+        self.local_folder.joinpath('video.avi').write_bytes(b'foo')
+        self.assertTrue(copy_folders(self.local_folder, self.remote_folder, overwrite=True, manifest=self.manifest))
+        self.assert_copied()
+        # a missing local folder fails
+        self.assertFalse(copy_folders(self.local_folder.with_name('foo'), self.remote_folder.with_name('foo')))
+
+    def test_resume_and_hash_mismatch(self):
+        # an interrupted copy is resumed from the last complete chunk
+        dst = self.remote_folder.joinpath('video.avi')
+        dst.parent.mkdir(parents=True)
+        dst.with_name('video.avi.part').write_bytes(self.files['video.avi'][:2500])
+        with self.assertLogs('iblrig.transfer_experiments', 'INFO') as lg:
+            _copy_file_checksum(self.local_folder.joinpath('video.avi'), dst, self.manifest, chunk_size=1024)
+        self.assertIn('resumed at', lg.output[-1])
+        self.assertEqual(self.files['video.avi'], dst.read_bytes())
+        self.assertFalse(dst.with_name('video.avi.part').exists())
+        # a corrupted copy raises and is removed
+        src = self.local_folder.joinpath('sub', 'frameData.bin')
+        dst = self.remote_folder.joinpath('sub', 'frameData.bin')
+        dst.parent.mkdir()
+        with mock.patch('iblrig.transfer_experiments._blake2b', return_value=hashlib.blake2b(b'foo')):
+            self.assertRaises(OSError, _copy_file_checksum, src, dst)
+        self.assertFalse(dst.exists())
+        self.assertFalse(dst.with_name('frameData.bin.part').exists())
+
+    def test_modified_during_copy(self):
+        src = self.local_folder.joinpath('video.avi')
+        dst = self.remote_folder.joinpath('video.avi')
+        dst.parent.mkdir(parents=True)
+
+        def append_to_source(file, *args, **kwargs):
+            # the local file is written to while its copy is being verified
+            if file == dst.with_name('video.avi.part'):
+                with open(src, 'ab') as fp:
+                    fp.write(b'foo')
+            return _blake2b(file, *args, **kwargs)
+
+        with (
+            mock.patch('iblrig.transfer_experiments._blake2b', side_effect=append_to_source),
+            self.assertLogs('iblrig.transfer_experiments', 'WARNING') as lg,
+        ):
+            _copy_file_checksum(src, dst, self.manifest)
+        self.assertIn('modified during the copy', lg.output[-1])
+        self.assertEqual(self.files['video.avi'], dst.read_bytes())
+        self.assertIsNone(self.manifest.get(src))
+        # the next transfer copies the file again and records it
+        self.files['video.avi'] += b'foo'
+        self.assertTrue(copy_folders(self.local_folder, self.remote_folder, overwrite=True, manifest=self.manifest))
+        self.assert_copied()
+        self.assertEqual(hashlib.blake2b(self.files['video.avi']).hexdigest(), self.manifest.get(src)['blake2b'])
+
+    def test_bandwidth_limiter(self):
+        self.assertRaises(ValueError, BandwidthLimiter, 0)
+        # the wait is charged after each chunk: 8 chunks of 1 kB at 100 kB/s take 80 ms, the first chunk included
+        clock = [100.0]
+        with (
+            mock.patch('iblrig.transfer_experiments.time.monotonic', side_effect=lambda: clock[0]),
+            mock.patch('iblrig.transfer_experiments.time.sleep', side_effect=lambda dt: clock.__setitem__(0, clock[0] + dt)),
+        ):
+            limiter = BandwidthLimiter(100 * 1024)
+            for _ in range(8):
+                limiter.consume(1024)
+        self.assertAlmostEqual(0.08, clock[0] - 100.0)
+        # every byte copied is charged to the limiter shared by the concurrent copies
+        limiter = mock.Mock(wraps=BandwidthLimiter(100 * 1024 * 1024))
+        self.assertTrue(copy_folders(self.local_folder, self.remote_folder, bandwidth_limiter=limiter))
+        self.assert_copied()
+        self.assertEqual(sum(map(len, self.files.values())), sum(c.args[0] for c in limiter.consume.call_args_list))
@@ -0,0 +1,155 @@
+"""
+Benchmark of the per-trial hot path of the choice world tasks, on an emulated Bpod.
+
+Sessions are simulated by iblrig.simulation.TaskSimulator. The methods that run between two trials are timed on the
+session instance: next_trial, get_state_machine_trial, save_trial_data_to_json (as called by trial_completed) and
+show_trial_log, along with the DataModel.update_trial of the online plots fed with each trial record. Once the session
+is closed, load_task_jsonable reads back the task data file and get_subject_training_info reads the history of the
+subject.
+
+Two checks are made on the per-trial costs:
+- the median cost of each method must stay within its absolute budget in PER_TRIAL_BUDGET (or SESSION_BUDGET), so
+  that a uniform slowdown is caught;
+- the median cost of the last 10% of the trials must stay within MAX_SCALING times that of the first 10%, so that a
+  cost growing with the number of trials is caught.
+
+The tests are marked as benchmark and can be deselected with `pytest -m "not benchmark"`. The script
+scripts/benchmark_trial_loop.py runs the same benchmark on every choice world variant, for up to 2000 trials.
+"""
+
+import logging
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from iblrig import choiceworld
+from iblrig.online_plots import DataModel
+from iblrig.raw_data_loaders import load_task_jsonable
+from iblrig.simulation import PsychometricAgent, TaskSimulator
+from iblrig.test.base import TaskArgsMixin
+from iblrig_tasks._iblrig_tasks_biasedChoiceWorld.task import Session as BiasedChoiceWorldSession
+from iblrig_tasks._iblrig_tasks_trainingChoiceWorld.task import Session as TrainingChoiceWorldSession
+
+# maximum median cost per trial, in seconds, of the methods run between two trials: about 2.5 times the cost measured
+# on a developer workstation, so that a uniform slowdown of 3 times fails
+PER_TRIAL_BUDGET = {
+    'next_trial': 1e-3,
+    'get_state_machine_trial': 1.25e-3,
+    'save_trial_data_to_json': 0.75e-3,
+    'show_trial_log': 2e-3,
+    'update_trial': 0.5e-3,
+}
+# the training choice world computes the performance of the previous trials to set the training phase of the next one
+SESSION_BUDGET = {TrainingChoiceWorldSession.protocol_name: {'next_trial': 12e-3}}
+PER_TRIAL = list(PER_TRIAL_BUDGET)
+MAX_SCALING = 2.0  # maximum ratio of the per-trial cost between the last and the first 10% of the trials
+
+
+class Timer:
+    def __init__(self, fcn):
+        self.fcn = fcn
+        self.durations = []
+        self.output = None
+
+    def __call__(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        self.output = self.fcn(*args, **kwargs)
+        self.durations.append(time.perf_counter() - t0)
+        return self.output
+
+
+def run_session(session_class, ntrials: int, task_kwargs: dict) -> dict[str, np.ndarray]:
+    """
+    Simulate a session and time its per-trial hot path.
+
+    Parameters
+    ----------
+    session_class : type
+        The choice world session class to instantiate.
+    ntrials : int
+        The number of trials to simulate.
+    task_kwargs : dict
+        The keyword arguments of the session, as returned by TaskArgsMixin.create_task_kwargs.
+
+    Returns
+    -------
+    dict[str, numpy.ndarray]
+        The durations in seconds of each call of the timed methods, keyed by method name.
+    """
+    session = session_class(**task_kwargs)
+    simulator = TaskSimulator(session, agent=PsychometricAgent(seed=ntrials))
+    # the trial log is written to the session log file as on the rig, but not printed to the terminal
+    for handler in logging.getLogger('iblrig').handlers:
+        if type(handler) is logging.StreamHandler:
+            handler.setLevel(logging.WARNING)
+    timers = {name: Timer(getattr(session, name)) for name in PER_TRIAL[:-1]}
+    for name, timer in timers.items():
+        setattr(session, name, timer)
+    data_model = DataModel(settings_file=None)
+    timers['update_trial'] = Timer(data_model.update_trial)
+    session.create_session()
+    for _ in range(ntrials):
+        bpod_data = simulator.run_trial()
+        session.show_trial_log()
+        timers['update_trial'](pd.Series(timers['save_trial_data_to_json'].output), bpod_data)
+    session._close_trial_data()
+    timers['load_task_jsonable'] = Timer(load_task_jsonable)
+    timers['load_task_jsonable'](session.paths.DATA_FILE_PATH)
+    timers['get_subject_training_info'] = Timer(choiceworld.get_subject_training_info)
+    timers['get_subject_training_info'](
+        subject_name=session.session_info.SUBJECT_NAME,
+        task_name=session.protocol_name,
+        local_path=session.iblrig_settings['iblrig_local_data_path'],
+        remote_path=session.iblrig_settings['iblrig_remote_data_path'],
+        lab=session.iblrig_settings['ALYX_LAB'],
+        iblrig_settings=session.iblrig_settings,
+    )
+    return {name: np.array(timer.durations) for name, timer in timers.items()}
+
+
+def per_trial_cost(durations: dict[str, np.ndarray]) -> dict[str, float]:
+    """Median cost per trial of each timed method, the first trial compiling the state machine templates."""
+    return {name: float(np.median(durations[name][1:])) for name in PER_TRIAL}
+
+
+def scaling(durations: dict[str, np.ndarray]) -> dict[str, float]:
+    """Ratio of the median cost per trial of each timed method between the last and the first 10% of the trials."""
+    n = len(durations[PER_TRIAL[0]]) // 10
+    return {name: float(np.median(durations[name][-n:]) / np.median(durations[name][1 : n + 1])) for name in PER_TRIAL}
+
+
+def budget(protocol_name: str) -> dict[str, float]:
+    """Maximum median cost per trial, in seconds, of each timed method for a given task protocol."""
+    return PER_TRIAL_BUDGET | SESSION_BUDGET.get(protocol_name, {})
+
+
+def regressions(durations: dict[str, np.ndarray], protocol_name: str) -> list[str]:
+    """List the timed methods over their budget per trial, or whose cost per trial grows with the number of trials."""
+    cost, ratios, limits = per_trial_cost(durations), scaling(durations), budget(protocol_name)
+    over_budget = [
+        f'{name} {cost[name] * 1e3:.3f} ms per trial > {limits[name] * 1e3:.3f} ms'
+        for name in PER_TRIAL
+        if cost[name] > limits[name]
+    ]
+    growing = [f'{name} last / first x{ratios[name]:.2f} > x{MAX_SCALING}' for name in PER_TRIAL if ratios[name] > MAX_SCALING]
+    return over_budget + growing
+
+
+@pytest.mark.benchmark
+class TestTrialLoopBenchmark(unittest.TestCase):
+    ntrials = 1_000
+
+    def setUp(self):
+        self.task_kwargs, tmpdir = TaskArgsMixin.create_task_kwargs()
+        self.task_kwargs['log_level'] = 'INFO'
+        self.addCleanup(tmpdir.cleanup)
+        self.addCleanup(TaskArgsMixin.cleanup_handlers)
+
+    def test_trial_loop(self):
+        for session_class in (TrainingChoiceWorldSession, BiasedChoiceWorldSession):
+            with self.subTest(session=session_class.protocol_name):
+                durations = run_session(session_class, self.ntrials, self.task_kwargs)
+                self.assertEqual([], regressions(durations, session_class.protocol_name))
@@ -0,0 +1,220 @@
+"""Instrumentation of the time spent in the phases of the main trial loop."""
+
+import contextlib
+import logging
+import time
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+TRIAL_TIMING_FILE_NAME = '_iblrig_trialTiming.raw.csv'
+"""str: Name of the file containing the duration of the phases of each trial."""
+
+TRIAL_PHASES = (
+    'next_trial',
+    'get_state_machine_trial',
+    'send_state_machine',
+    'iti_wait',
+    'run_state_machine',
+    'trial_completed',
+    'ambient_sensor',
+    'show_trial_log',
+    'pause',
+)
+"""tuple[str]: Phases of the main trial loop of :meth:`~iblrig.base_choice_world.ChoiceWorldSession._run`."""
+
+IDLE_PHASES = ('iti_wait', 'run_state_machine', 'pause')
+"""tuple[str]: Phases that are not counted as overhead: waiting for the ITI, running the state machine and pausing."""
+
+
+class TrialPhaseTimer:
+    """
+    Record the duration of the phases of each trial of the main loop.
+
+    Durations are measured with :func:`time.perf_counter` and written as one CSV row per trial. The file is flushed after
+    each trial so that the record survives a crash. The overhead of a trial is the summed duration of the phases that
+    are not listed in `idle_phases`, i.e. the time spent by the task computer in-between state machines.
+    """
+
+    def __init__(
+        self,
+        file_path: str | Path | None = None,
+        phases: Sequence[str] = TRIAL_PHASES,
+        idle_phases: Sequence[str] = IDLE_PHASES,
+        max_overhead: float | None = None,
+    ):
+        """
+        Record the duration of the phases of each trial of the main loop.
+
+        Parameters
+        ----------
+        file_path : str or Path, optional
+            Full path to the CSV file. If None, the durations are only kept in memory.
+        phases : Sequence[str], optional
+            Names of the phases, in order of execution.
+        idle_phases : Sequence[str], optional
+            Names of the phases that are not counted as overhead.
+        max_overhead : float, optional
+            Log a warning for each trial whose overhead exceeds this duration, in seconds.
+        """
+        self.file_path = None if file_path is None else Path(file_path)
+        self.phases = tuple(phases)
+        self.max_overhead = max_overhead
+        self._iphase = {phase: i for i, phase in enumerate(self.phases)}
+        self._overhead_mask = np.array([phase not in idle_phases for phase in self.phases])
+        self._durations = np.zeros((0, len(self.phases)))
+        self._trial_nums = np.zeros(0, dtype=int)
+        self._current = np.zeros(len(self.phases))
+        self._ntrials = 0
+        self._fp = None
+
+    @property
+    def ntrials(self) -> int:
+        """int: Number of trials recorded."""
+        return self._ntrials
+
+    @property
+    def durations(self) -> pd.DataFrame:
+        """pd.DataFrame: Duration of the phases of each recorded trial in seconds, indexed by trial number."""
+        return pd.DataFrame(
+            self._durations[: self._ntrials],
+            columns=list(self.phases),
+            index=pd.Index(self._trial_nums[: self._ntrials], name='trial_num'),
+        )
+
+    @property
+    def overhead(self) -> np.ndarray:
+        """np.ndarray: Overhead of each recorded trial in seconds."""
+        return self._durations[: self._ntrials, self._overhead_mask].sum(axis=1)
+
+    @property
+    def current(self) -> dict[str, float]:
+        """dict[str, float]: Duration of the phases of the trial in progress, in seconds."""
+        return dict(zip(self.phases, self._current.tolist(), strict=True))
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time the enclosed block and add its duration to the phase `name` of the trial in progress.
+
+        Parameters
+        ----------
+        name : str
+            Name of the phase.
+        """
+        iphase = self._iphase[name]
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current[iphase] += time.perf_counter() - t0
+
+    def end_trial(self, trial_num: int) -> dict[str, float]:
+        """
+        Store the durations of the trial in progress and start a new trial.
+
+        Parameters
+        ----------
+        trial_num : int
+            Number of the trial in progress.
+
+        Returns
+        -------
+        dict[str, float]
+            Duration of the phases of the trial, in seconds.
+        """
+        if self._ntrials == self._durations.shape[0]:
+            n = max(self._ntrials * 2, 64)
+            self._durations = np.resize(self._durations, (n, len(self.phases)))
+            self._trial_nums = np.resize(self._trial_nums, n)
+        self._durations[self._ntrials] = self._current
+        self._trial_nums[self._ntrials] = trial_num
+        self._ntrials += 1
+        self._write_row(trial_num)
+        overhead = self._current[self._overhead_mask].sum()
+        if self.max_overhead is not None and overhead > self.max_overhead:
+            worst = self.phases[np.argmax(np.where(self._overhead_mask, self._current, -np.inf))]
+            log.warning(
+                f'Trial {trial_num}: overhead of {overhead * 1e3:.1f} ms exceeds the dead time of '
+                f'{self.max_overhead * 1e3:.1f} ms (longest phase: {worst})'
+            )
+        durations = self.current
+        self._current = np.zeros(len(self.phases))
+        return durations
+
+    def _write_row(self, trial_num: int) -> None:
+        if self.file_path is None:
+            return
+        try:
+            if self._fp is None:
+                self.file_path.parent.mkdir(parents=True, exist_ok=True)
+                self._fp = open(self.file_path, 'w')  # noqa: SIM115 - the file stays open for the whole session
+                self._fp.write(','.join(('trial_num',) + self.phases) + '\n')
+            self._fp.write(f'{trial_num},' + ','.join(f'{d:.6f}' for d in self._current) + '\n')
+            self._fp.flush()
+        except OSError as e:
+            log.warning(f'Unable to write the trial timing to {self.file_path}: {e}')
+            self.file_path = None
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Summarize the durations of the phases over the recorded trials.
+
+        Returns
+        -------
+        pd.DataFrame
+            Mean, median, 95th percentile and maximum duration of each phase and of the overhead in milliseconds,
+            indexed by phase.
+        """
+        durations = self.durations
+        durations['overhead'] = self.overhead
+        if self._ntrials == 0:
+            return pd.DataFrame(index=durations.columns, columns=['mean', 'median', 'p95', 'max'], dtype=float)
+        return (
+            pd.DataFrame(
+                {
+                    'mean': durations.mean(),
+                    'median': durations.median(),
+                    'p95': durations.quantile(0.95),
+                    'max': durations.max(),
+                }
+            )
+            * 1e3
+        )
+
+    def log_summary(self) -> None:
+        """Log the summary of the phase durations, with the number of trials whose overhead exceeded the dead time."""
+        if self._ntrials == 0:
+            return
+        log.info(f'Duration of the trial phases over {self._ntrials} trials (ms):\n{self.summary().round(2).to_string()}')
+        if self.max_overhead is not None:
+            n_exceeded = np.sum(self.overhead > self.max_overhead)
+            if n_exceeded > 0:
+                log.warning(f'The overhead exceeded the dead time of {self.max_overhead * 1e3:.1f} ms in {n_exceeded} trials')
+
+    def close(self) -> None:
+        """Close the timing file."""
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+
+def load_trial_timing(file_path: str | Path) -> pd.DataFrame:
+    """
+    Load the duration of the phases of each trial written by :class:`TrialPhaseTimer`.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        Full path to the CSV file.
+
+    Returns
+    -------
+    pd.DataFrame
+        Duration of the phases of each trial in seconds, indexed by trial number.
+    """
+    return pd.read_csv(file_path, index_col='trial_num')
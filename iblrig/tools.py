@@ -11,14 +11,16 @@ from dataclasses import dataclass
 from datetime import date
 from functools import cache
 from pathlib import Path
-from typing import Any, TypeVar
+from typing import TYPE_CHECKING, Any, TypeVar
 
 from iblrig import version_management
 from iblrig.constants import BONSAI_EXE, IS_GIT
-from iblrig.path_helper import create_bonsai_layout_from_template, load_pydantic_yaml
-from iblrig.pydantic_definitions import HardwareSettings, RigSettings
 from iblutil.util import get_mac
 
+if TYPE_CHECKING:
+    # the settings models pull in pydantic and pandas, which the version management does not need at import
+    from iblrig.pydantic_definitions import HardwareSettings, RigSettings
+
 log = logging.getLogger(__name__)
 
 
@@ -188,6 +190,9 @@ def alyx_reachable() -> bool:
     bool
         True if Alyx can be connected to, False otherwise.
     """
+    from iblrig.path_helper import load_pydantic_yaml
+    from iblrig.pydantic_definitions import RigSettings
+
     settings: RigSettings = load_pydantic_yaml(RigSettings)
     if settings.ALYX_URL is not None:
         return internet_available(host=settings.ALYX_URL.host, port=443, timeout=1, force_update=True)
@@ -232,6 +237,8 @@ def _build_bonsai_cmd(
         If the Bonsai executable does not exist.
         If the specified workflow file does not exist.
     """
+    from iblrig.path_helper import create_bonsai_layout_from_template
+
     if not BONSAI_EXE.exists():
         raise FileNotFoundError(BONSAI_EXE)
     workflow_file = Path(workflow_file)
@@ -388,7 +395,7 @@ class ANSI:
 cached_check_output = cache(subprocess.check_output)
 
 
-def get_lab_location_dict(hardware_settings: HardwareSettings, iblrig_settings: RigSettings) -> dict[str, Any]:
+def get_lab_location_dict(hardware_settings: 'HardwareSettings', iblrig_settings: 'RigSettings') -> dict[str, Any]:
     lab_location = dict()
     lab_location['rig_name'] = hardware_settings.RIG_NAME
     lab_location['iblrig_version'] = str(version_management.get_local_version())
@@ -1,22 +1,24 @@
 import datetime
+import functools
+import hashlib
 import json
 import logging
 import os
 import shutil
 import socket
+import threading
+import time
 import traceback
 import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from enum import IntEnum
-from os.path import samestat
 from pathlib import Path
 
-import ibllib.pipes.misc
 import iblrig
 import one.alf.files as alfiles
 from ibllib.io import raw_data_loaders, session_params
-from ibllib.pipes.misc import sleepless
-from iblrig.raw_data_loaders import load_task_jsonable
-from iblutil.io import hashfile
+from iblrig.raw_data_loaders import TRIALS_TABLE_FILE_NAME, TaskJsonableReader
 from one.util import ensure_list
 
 log = logging.getLogger(__name__)
@@ -33,27 +35,207 @@ class CopyState(IntEnum):
     FINALIZED = 3
 
 
+TRANSFER_CHUNK_SIZE = 8 * 1024**2
+"""int: Size in bytes of the chunks in which files are streamed to the remote server."""
+
+TRANSFER_MAX_WORKERS = 4
+"""int: Default number of files copied concurrently."""
+
+
+class BandwidthLimiter:
+    """
+    Thread-safe bandwidth cap shared by concurrent copies.
+
+    Each chunk written reserves a time slot proportional to its size, following the slots already reserved; callers
+    sleep until the end of their slot so that the combined throughput, over the whole transfer, does not exceed the cap.
+    """
+
+    def __init__(self, max_bytes_per_second: float):
+        """
+        Thread-safe bandwidth cap shared by concurrent copies.
+
+        Parameters
+        ----------
+        max_bytes_per_second : float
+            The maximum combined throughput, in bytes per second.
+        """
+        if max_bytes_per_second <= 0:
+            raise ValueError('The bandwidth cap must be positive')
+        self.max_bytes_per_second = max_bytes_per_second
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def consume(self, n_bytes: int) -> None:
+        """
+        Charge `n_bytes` to the bandwidth cap, waiting until they would have been transferred at the capped rate.
+
+        Parameters
+        ----------
+        n_bytes : int
+            The number of bytes just transferred.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._next_slot = end = max(self._next_slot, now) + n_bytes / self.max_bytes_per_second
+        if end > now:
+            time.sleep(end - now)
+
+
+class TransferManifest:
+    """
+    Hashes of the files of a session copied to the remote server.
+
+    The manifest is a JSON lines file in the local session folder. An entry is appended after each file has been copied
+    and verified, and the file is compacted to one line per file once a folder has been copied. For each local file an
+    entry holds the size, modification time and BLAKE2B hash of the file, as well as the size and modification time of
+    the remote copy. Files whose local and remote stats are unchanged since they were verified are not read again,
+    unless a full verification is requested.
+    """
+
+    file_name = 'transfer_manifest.jsonl'
+    """str: Name of the manifest file within the local session folder."""
+
+    def __init__(self, session_path: str | Path):
+        """
+        Hashes of the files of a session copied to the remote server.
+
+        Parameters
+        ----------
+        session_path : str or Path
+            The local session path - the manifest keys are file paths relative to this folder.
+        """
+        self.session_path = Path(session_path)
+        self.file_manifest = self.session_path.joinpath(self.file_name)
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._n_lines = 0
+        if self.file_manifest.exists():
+            try:
+                with open(self.file_manifest) as fp:
+                    lines = fp.readlines()
+            except OSError as e:
+                log.warning(f'Discarding transfer manifest {self.file_manifest}: {e}')
+                return
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                    self._entries[entry.pop('file')] = entry
+                except (ValueError, KeyError, AttributeError):  # e.g. a line truncated by a crash during the transfer
+                    log.warning(f'{self.file_manifest}: skipping invalid entry {line.strip()[:80]}')
+            self._n_lines = len(lines)
+
+    def key(self, file: Path) -> str:
+        """Return the manifest key of a local file, i.e., its path relative to the session path."""
+        return Path(file).relative_to(self.session_path).as_posix()
+
+    def get(self, file: Path) -> dict | None:
+        """Return the manifest entry of a local file, if any."""
+        with self._lock:
+            return self._entries.get(self.key(file))
+
+    @staticmethod
+    def stat(file: Path) -> list[int] | None:
+        """Return the size and modification time (in ns) of a file, or None if it doesn't exist."""
+        try:
+            stat = Path(file).stat()
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def is_verified(self, src: Path, dst: Path) -> bool:
+        """Return True if neither the local file nor its remote copy changed since the copy was verified."""
+        entry = self.get(src)
+        return entry is not None and entry.get('stat') == self.stat(src) and entry.get('remote_stat') == self.stat(dst)
+
+    def set(self, file: Path, **entry) -> None:
+        """Record a local file in the manifest and append its entry to the manifest file."""
+        key = self.key(file)
+        line = json.dumps({'file': key, **entry}) + '\n'
+        with self._lock:
+            self._entries[key] = entry
+            with open(self.file_manifest, 'a') as fp:
+                fp.write(line)
+            self._n_lines += 1
+
+    def compact(self) -> None:
+        """Rewrite the manifest file with a single line per file, if entries have been superseded."""
+        with self._lock:
+            if self._n_lines == len(self._entries):
+                return
+            file_tmp = self.file_manifest.with_suffix('.tmp')
+            with open(file_tmp, 'w') as fp:
+                fp.writelines(json.dumps({'file': key, **entry}) + '\n' for key, entry in self._entries.items())
+            os.replace(file_tmp, self.file_manifest)
+            self._n_lines = len(self._entries)
+
+
+def _blake2b(file: Path, chunk_size: int = TRANSFER_CHUNK_SIZE, size: int | None = None) -> hashlib.blake2b:
+    """Return the BLAKE2B hash object of a file, or of its first `size` bytes."""
+    file_hash = hashlib.blake2b()
+    with open(file, 'rb') as fp:
+        while size is None or fp.tell() < size:
+            chunk = fp.read(chunk_size if size is None else min(chunk_size, size - fp.tell()))
+            if not chunk:
+                break
+            file_hash.update(chunk)
+    return file_hash
+
+
+def sleepless(func: Callable) -> Callable:
+    """
+    Prevent the system from sleeping while `func` runs, see :func:`ibllib.pipes.misc.sleepless`.
+
+    :mod:`ibllib.pipes.misc` is only imported when `func` is called, as it pulls in the electrophysiology libraries.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        from ibllib.pipes.misc import sleepless as _sleepless
+
+        return _sleepless(func)(*args, **kwargs)
+
+    return wrapper
+
+
 @sleepless
-def _copy2_checksum(src: str, dst: str, *args, **kwargs) -> str:
+def _copy_file_checksum(
+    src: Path,
+    dst: Path,
+    manifest: TransferManifest | None = None,
+    bandwidth_limiter: BandwidthLimiter | None = None,
+    verify: bool = False,
+    chunk_size: int = TRANSFER_CHUNK_SIZE,
+) -> Path:
     """
     Copy a file from source to destination with checksum verification.
 
-    This function copies a file from the source path to the destination path
-    while verifying the BLAKE2B hash of the source and destination files. If the
-    BLAKE2B hashes do not match after copying, an OSError is raised.
+    The BLAKE2B hash of the source is computed while streaming the copy, so that the source file is only read once. The
+    file is written to a temporary `.part` file, which is verified against the hash of the source before being renamed.
+    An existing `.part` file from an interrupted copy is resumed from its last complete chunk.
+
+    If the manifest shows that the file has already been copied and neither the local file nor the remote copy changed
+    since (as per their size and modification time), the copy is skipped without reading either file. In `verify` mode,
+    both files are hashed instead and the copy is only skipped if both hashes match the manifest. The stat of the source is
+    taken before it is read: a file modified while being hashed or copied is not recorded in the manifest.
 
     Parameters
     ----------
-    src : str
+    src : Path
         The path to the source file.
-    dst : str
+    dst : Path
         The path to the destination file.
-    *args, **kwargs
-        Additional arguments and keyword arguments to pass to `shutil.copy2`.
+    manifest : TransferManifest, optional
+        The manifest in which to look up and record the hash of the file.
+    bandwidth_limiter : BandwidthLimiter, optional
+        A bandwidth cap shared by concurrent copies.
+    verify : bool, optional
+        If True, hash the local and remote files rather than relying on the stats recorded in the manifest.
+    chunk_size : int, optional
+        The size in bytes of the chunks in which the file is streamed.
 
     Returns
     -------
-    str
+    Path
         The path to the copied file.
 
     Raises
@@ -61,33 +243,64 @@ def _copy2_checksum(src: str, dst: str, *args, **kwargs) -> str:
     OSError
         If the BLAKE2B hashes of the source and destination files do not match.
     """
-    log.info(f'Processing `{src}`:')
-    log.info('  - calculating hash of local file')
-    src_md5 = hashfile.blake2b(src, False)
-    if os.path.exists(dst) and samestat(os.stat(src), os.stat(dst)):
-        log.info('  - file already exists at destination')
-        log.info('  - calculating hash of remote file')
-        if src_md5 == hashfile.blake2b(dst, False):
-            log.info('  - local and remote BLAKE2B hashes match, skipping copy')
+    # the stat recorded in the manifest is taken before the file is read, so that a write during the copy invalidates it
+    src_stat = TransferManifest.stat(src)
+    size = src.stat().st_size
+    entry = manifest.get(src) if manifest is not None else None
+    if entry is not None and not verify and manifest.is_verified(src, dst):
+        log.debug(f'{src}: unchanged since last verified copy, skipping')
+        return dst
+    if entry is not None and verify and dst.exists() and dst.stat().st_size == size == entry['size']:
+        src_digest, dst_digest = (_blake2b(f, chunk_size).hexdigest() for f in (src, dst))
+        if src_digest == dst_digest == entry['blake2b'] and manifest.stat(src) == src_stat:
+            manifest.set(src, stat=src_stat, remote_stat=manifest.stat(dst), size=size, blake2b=src_digest)
+            log.info(f'{src}: local and remote hashes match, skipping copy')
             return dst
-        else:
-            log.info('  - local and remote hashes DO NOT match')
-    log.info(f'  - copying file to `{dst}`')
-    return_val = shutil.copy2(src, dst, *args, **kwargs)
-    log.info('  - calculating hash of remote file')
-    if not src_md5 == hashfile.blake2b(dst, False):
+    t0 = time.perf_counter()
+    part = dst.with_name(dst.name + '.part')
+    # resume an interrupted copy from the last complete chunk: only the hash of the transferred bytes is recomputed
+    offset = min(part.stat().st_size // chunk_size * chunk_size, size) if part.exists() else 0
+    src_hash = _blake2b(src, chunk_size, size=offset) if offset else hashlib.blake2b()
+    with open(src, 'rb') as fsrc, open(part, 'r+b' if offset else 'wb') as fdst:
+        fsrc.seek(offset)
+        fdst.seek(offset)
+        fdst.truncate()
+        while chunk := fsrc.read(chunk_size):
+            src_hash.update(chunk)
+            fdst.write(chunk)
+            if bandwidth_limiter is not None:
+                bandwidth_limiter.consume(len(chunk))
+    if src_hash.hexdigest() != _blake2b(part, chunk_size).hexdigest():
+        part.unlink()
         raise OSError(f'Error copying {src}: hash mismatch.')
-    log.info('  - local and remote hashes match, copy successful')
-    return return_val
-
-
-def copy_folders(local_folder: Path, remote_folder: Path, overwrite: bool = False) -> bool:
+    shutil.copystat(src, part)
+    os.replace(part, dst)
+    if manifest is not None and manifest.stat(src) == src_stat:
+        manifest.set(src, stat=src_stat, remote_stat=manifest.stat(dst), size=size, blake2b=src_hash.hexdigest())
+    elif manifest is not None:
+        log.warning(f'{src}: modified during the copy, not recorded in the transfer manifest')
+    dt = time.perf_counter() - t0
+    megabytes = (size - offset) / 1024**2
+    resumed = f', resumed at {offset / 1024**2:.1f} MB' if offset else ''
+    log.info(f'{src}: {megabytes:.1f} MB in {dt:.2f} s ({megabytes / max(dt, 1e-6):.1f} MB/s{resumed})')
+    return dst
+
+
+def copy_folders(
+    local_folder: Path,
+    remote_folder: Path,
+    overwrite: bool = False,
+    max_workers: int = TRANSFER_MAX_WORKERS,
+    manifest: TransferManifest | None = None,
+    bandwidth_limiter: BandwidthLimiter | None = None,
+    verify: bool = False,
+) -> bool:
     """
     Copy folders and files from a local location to a remote location.
 
     This function copies all folders and files from a local directory to a
-    remote directory. It provides options to overwrite existing files in
-    the remote directory and ignore specific file patterns.
+    remote directory. Files are copied concurrently and verified by means of
+    their BLAKE2B hash, see :func:`_copy_file_checksum`.
 
     Parameters
     ----------
@@ -97,26 +310,52 @@ def copy_folders(local_folder: Path, remote_folder: Path, overwrite: bool = Fals
         The path to the remote folder to copy to.
     overwrite : bool, optional
         If True, overwrite existing files in the remote folder. Default is False.
+    max_workers : int, optional
+        The maximum number of files copied concurrently.
+    manifest : TransferManifest, optional
+        The manifest used to skip files that have already been transferred.
+    bandwidth_limiter : BandwidthLimiter, optional
+        A bandwidth cap shared by concurrent copies.
+    verify : bool, optional
+        If True, files recorded in the manifest are hashed on both ends rather than compared by their stats.
 
     Returns
     -------
     bool
         True if the copying is successful, False otherwise.
     """
-    status = True
+    if not local_folder.exists():
+        log.error(f'{local_folder} does not exist')
+        log.info(f'Could not copy {local_folder} to {remote_folder}')
+        return False
+    if remote_folder.exists() and not overwrite:
+        log.error(f'{remote_folder} already exists')
+        log.info(f'Could not copy {local_folder} to {remote_folder}')
+        return False
+    files = []
     try:
-        remote_folder.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copytree(
-            local_folder,
-            remote_folder,
-            dirs_exist_ok=overwrite,
-            ignore=shutil.ignore_patterns('transfer_me.flag'),
-            copy_function=_copy2_checksum,
-        )
+        for root, _, file_names in os.walk(local_folder):
+            remote_root = remote_folder.joinpath(Path(root).relative_to(local_folder))
+            remote_root.mkdir(parents=True, exist_ok=True)
+            files.extend((Path(root, f), remote_root.joinpath(f)) for f in file_names if f != 'transfer_me.flag')
     except OSError:
         log.error(traceback.format_exc())
         log.info(f'Could not copy {local_folder} to {remote_folder}')
-        status = False
+        return False
+    status = True
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_copy_file_checksum, src, dst, manifest, bandwidth_limiter, verify): src for src, dst in files}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except OSError:
+                log.error(traceback.format_exc())
+                log.info(f'Could not copy {futures[future]}')
+                status = False
+    if manifest is not None:
+        manifest.compact()
+    if not status:
+        log.info(f'Could not copy {local_folder} to {remote_folder}')
     return status
 
 
@@ -132,7 +371,15 @@ class SessionCopier:
     tag = f'{socket.gethostname()}_{uuid.getnode()}'
     """str: The device name (adds this to the experiment description stub file on the remote server)."""
 
-    def __init__(self, session_path, remote_subjects_folder=None, tag=None):
+    def __init__(
+        self,
+        session_path,
+        remote_subjects_folder=None,
+        tag=None,
+        max_workers: int = TRANSFER_MAX_WORKERS,
+        bandwidth_limiter: BandwidthLimiter | None = None,
+        verify: bool = False,
+    ):
         """
         Initialize and copy session data to a remote server.
 
@@ -144,10 +391,19 @@ class SessionCopier:
             The remote server path to which to copy the session data.
         tag : str
             The device name (adds this to the experiment description stub file on the remote server).
+        max_workers : int
+            The maximum number of files copied concurrently.
+        bandwidth_limiter : BandwidthLimiter
+            An optional bandwidth cap, possibly shared with other copiers.
+        verify : bool
+            If True, re-hash files that were already copied rather than trusting the transfer manifest.
         """
         self.tag = tag or self.tag
         self.session_path = Path(session_path)
         self.remote_subjects_folder = Path(remote_subjects_folder) if remote_subjects_folder else None
+        self.max_workers = max_workers
+        self.bandwidth_limiter = bandwidth_limiter
+        self.verify = verify
 
     def __repr__(self):
         return f'{super().__repr__()} \n local: {self.session_path} \n remote: {self.remote_session_path}'
@@ -273,10 +529,13 @@ class SessionCopier:
             log.info(f'transferring {self.session_path} - {collection}')
             remote_collection = self.remote_session_path.joinpath(collection)
             if remote_collection.exists():
-                # this is far from ideal: we currently recopy all files even if some already copied
-                log.warning(f'Collection {remote_collection} already exists, removing')
-                shutil.rmtree(remote_collection)
-            status &= copy_folders(local_collection, remote_collection)
+                # resume the copy: files already transferred are skipped, files that no longer exist locally are removed
+                log.warning(f'Collection {remote_collection} already exists, resuming copy')
+                for remote_file in filter(Path.is_file, list(remote_collection.rglob('*'))):
+                    local_file = local_collection.joinpath(remote_file.relative_to(remote_collection))
+                    if not (local_file.exists() or (remote_file.suffix == '.part' and local_file.with_suffix('').exists())):
+                        remote_file.unlink()
+            status &= self._copy_folders(local_collection, remote_collection, overwrite=True)
         status &= self.copy_snapshots()  # special case: copy snapshots without deleting or overwriting remote files
         return status
 
@@ -314,7 +573,19 @@ class SessionCopier:
             return False
         # 'overwrite' actually means 'don't raise if remote folder exists'.
         # We've already checked that filenames don't conflict.
-        return copy_folders(snapshots, remote_snapshots, overwrite=True)
+        return self._copy_folders(snapshots, remote_snapshots, overwrite=True)
+
+    def _copy_folders(self, local_folder: Path, remote_folder: Path, overwrite: bool = False) -> bool:
+        """Copy a folder of the session with this copier's manifest, number of workers and bandwidth cap."""
+        return copy_folders(
+            local_folder,
+            remote_folder,
+            overwrite=overwrite,
+            max_workers=self.max_workers,
+            manifest=TransferManifest(self.session_path),
+            bandwidth_limiter=self.bandwidth_limiter,
+            verify=self.verify,
+        )
 
     def copy_collections(self):
         """
@@ -505,8 +776,12 @@ class BehaviorCopier(SessionCopier):
                     ):
                         shutil.rmtree(self.remote_session_path)  # remove likely dud
                     return False
-                trials, bpod_data = load_task_jsonable(jsonable)
+                # we only need a few scalar columns of the trials table and the bpod data of the last trial
+                reader = TaskJsonableReader(jsonable, behavior_data=False, columns=['trial_correct', 'reward_amount'])
+                trials, _ = reader.read_new()
                 ntrials = trials.shape[0]
+                # the columnar sidecar was not finalized by the crashed session and is unreadable
+                jsonable.with_name(TRIALS_TABLE_FILE_NAME).unlink(missing_ok=True)
                 # We have the case where the session hard crashed.
                 # Patch the settings file to wrap the session and continue the copying.
                 log.warning(f'Recovering crashed session {self.session_path}')
@@ -518,7 +793,8 @@ class BehaviorCopier(SessionCopier):
                 raw_settings['TOTAL_WATER_DELIVERED'] = int(trials['reward_amount'].sum())
                 # cast the timestamp in a datetime object and add the session length to it
                 end_time = datetime.datetime.strptime(raw_settings['SESSION_START_TIME'], '%Y-%m-%dT%H:%M:%S.%f')
-                end_time += datetime.timedelta(seconds=bpod_data[-1]['Trial end timestamp'])
+                _, last_bpod_data = reader.read_trial(-1, behavior_data=True)
+                end_time += datetime.timedelta(seconds=last_bpod_data['Trial end timestamp'])
                 raw_settings['SESSION_END_TIME'] = end_time.strftime('%Y-%m-%dT%H:%M:%S.%f')
                 with open(settings_file, 'w') as fid:
                     json.dump(raw_settings, fid)
@@ -559,6 +835,8 @@ class EphysCopier(SessionCopier):
 
     def _copy_collections(self):
         """Here we overload the copy to be able to rename the probes properly and also create the insertions."""
+        import ibllib.pipes.misc
+
         log.info(f'Transferring ephys session: {self.session_path} to {self.remote_session_path}')
         ibllib.pipes.misc.rename_ephys_files(self.session_path)
         ibllib.pipes.misc.move_ephys_files(self.session_path)
@@ -575,7 +853,7 @@ class EphysCopier(SessionCopier):
         except Exception:
             log.error(traceback.print_exc())
             log.info('Probe creation failed, please create the probe insertions manually. Continuing transfer...')
-        return copy_folders(
+        return self._copy_folders(
             local_folder=self.session_path.joinpath('raw_ephys_data'),
             remote_folder=self.remote_session_path.joinpath('raw_ephys_data'),
             overwrite=True,
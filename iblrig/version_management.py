@@ -6,7 +6,6 @@ from pathlib import Path
 from subprocess import STDOUT, CalledProcessError, SubprocessError, check_call, check_output
 from typing import Any, Literal
 
-import requests
 from packaging import version
 
 from iblrig import __version__
@@ -253,6 +252,8 @@ def get_changelog() -> str:
     This method relies on the presence of a CHANGELOG.md file either in the
     repository or locally.
     """
+    import requests
+
     try:
         if (branch := get_branch()) is None:
             raise RuntimeError()
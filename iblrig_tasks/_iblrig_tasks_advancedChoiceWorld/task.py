@@ -62,7 +62,7 @@ class Session(ActiveChoiceWorldSession):
 
     def draw_next_trial_info(self, **kwargs):
         nc = self.df_contingencies.shape[0]
-        ic = np.random.choice(np.arange(nc), p=self.df_contingencies['probability'])
+        ic = self.trial_sequence.choice(np.arange(nc), p=self.df_contingencies['probability'])
         # now calling the super class with the proper parameters
         super().draw_next_trial_info(
             pleft=self.task_params.PROBABILITY_LEFT,
@@ -17,16 +17,21 @@ class Session(BiasedChoiceWorldSession):
     def __init__(self, *args, session_template_id=0, **kwargs):
         super().__init__(*args, **kwargs)
         self.task_params.SESSION_TEMPLATE_ID = session_template_id
-        self.trials_table = self.get_session_template(session_template_id)
+        template = self.get_session_template(session_template_id)
+        self.trials_table = self.TrialDataModel.preallocate_table(template.shape[0])
+        for column in template.columns:
+            self.trials_table[column] = template[column].to_numpy()
         # reconstruct the block dataframe from the trials table
-        self.blocks_table = self.trials_table.groupby('block_num').agg(
+        self.blocks_table = template.groupby('block_num').agg(
             probability_left=pd.NamedAgg(column='stim_probability_left', aggfunc='first'),
             block_length=pd.NamedAgg(column='stim_probability_left', aggfunc='count'),
         )
 
     def next_trial(self):
         self.trial_num += 1
-        trial_params = self.trials_table.iloc[self.trial_num].drop(['index', 'trial_num']).to_dict()
+        trial_params = self.trials_table.iloc[self.trial_num].to_dict()
+        for key in ('index', 'trial_num'):
+            trial_params.pop(key)
         self.block_num = trial_params['block_num']
         self.draw_next_trial_info(**trial_params)
 
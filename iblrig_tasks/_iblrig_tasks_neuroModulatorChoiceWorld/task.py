@@ -6,7 +6,6 @@ from pydantic import NonNegativeFloat
 import iblrig.misc
 from iblrig.base_choice_world import BiasedChoiceWorldSession, BiasedChoiceWorldTrialData
 from iblrig.hardware import SOFTCODE
-from pybpodapi.protocol import StateMachine
 
 REWARD_AMOUNTS_UL = (1, 3)
 log = logging.getLogger(__name__)
@@ -27,20 +26,22 @@ class Session(BiasedChoiceWorldSession):
     def next_trial(self):
         super().next_trial()
         # then there is a probability of omitting feedback regardless of the choice
-        self.trials_table.at[self.trial_num, 'omit_feedback'] = np.random.random() < self.task_params.OMIT_FEEDBACK_PROBABILITY
+        self.trials_table.at[self.trial_num, 'omit_feedback'] = (
+            self.trial_sequence.random() < self.task_params.OMIT_FEEDBACK_PROBABILITY
+        )
 
         # then drawing the delay for the choice
         choice_delay_strategy = 'binned'
         if choice_delay_strategy == 'binary':  # this is a choice with probabilities 1/3 2/3
-            self.trials_table.at[self.trial_num, 'choice_delay'] = np.random.choice([1.5, 3.0], p=[2 / 3, 1 / 3])
+            self.trials_table.at[self.trial_num, 'choice_delay'] = self.trial_sequence.choice([1.5, 3.0], p=[2 / 3, 1 / 3])
         elif choice_delay_strategy == 'uniform':  # uniform probability draw between 1.5s and 3s
-            self.trials_table.at[self.trial_num, 'choice_delay'] = np.random.random() * 1.5 + 1.5
+            self.trials_table.at[self.trial_num, 'choice_delay'] = self.trial_sequence.random() * 1.5 + 1.5
         elif choice_delay_strategy == 'binned':  # 5 valures from 0 to 2.5 secs The "Charline Way"
-            self.trials_table.at[self.trial_num, 'choice_delay'] = np.random.choice(np.linspace(0, 2.5, 3))
+            self.trials_table.at[self.trial_num, 'choice_delay'] = self.trial_sequence.choice(np.linspace(0, 2.5, 3))
 
         if self.task_params.VARIABLE_REWARDS:
             # the reward is a draw within an uniform distribution between 3 and 1
-            reward_amount = 1.5 if self.block_num == 0 else np.random.choice(REWARD_AMOUNTS_UL, p=[0.8, 0.2])
+            reward_amount = 1.5 if self.block_num == 0 else self.trial_sequence.choice(REWARD_AMOUNTS_UL, p=[0.8, 0.2])
             self.trials_table.at[self.trial_num, 'reward_amount'] = reward_amount
 
     @property
@@ -52,7 +53,7 @@ class Session(BiasedChoiceWorldSession):
         return self.trials_table.at[self.trial_num, 'choice_delay']
 
     def get_state_machine_trial(self, i):
-        sma = StateMachine(self.bpod)
+        sma = self._instantiate_state_machine(trial_number=i)
 
         if i == 0:  # First trial exception start camera
             session_delay_start = self.task_params.get('SESSION_DELAY_START', 0)
@@ -251,7 +252,7 @@ class SessionRelatedBlocks(Session):
         self.trials_table['choice_delay'] = np.zeros(self.trials_table.shape[0], dtype=np.float32)
         self.trials_table['probability_left_rich'] = np.zeros(self.trials_table.shape[0], dtype=np.float32)
         self.blocks_table['probability_left_rich'] = np.zeros(self.blocks_table.shape[0], dtype=np.float32)
-        self.BLOCK_REWARD_STAGGER = np.random.randint(0, 2)
+        self.BLOCK_REWARD_STAGGER = int(self.rng.integers(0, 2))
 
     def new_block(self):
         super(Session, self).new_block()
@@ -277,7 +278,7 @@ class SessionRelatedBlocks(Session):
             probas = [plr, (1 - plr)]  # right
         else:
             probas = [(1 - plr), plr]  # left
-        return np.random.choice(reward_amounts, p=probas)
+        return self.trial_sequence.choice(reward_amounts, p=probas)
 
 
 if __name__ == '__main__':  # pragma: no cover
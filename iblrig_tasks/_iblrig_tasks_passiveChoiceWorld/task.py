@@ -9,6 +9,8 @@ import yaml
 
 import iblrig.misc
 from iblrig.base_choice_world import ChoiceWorldSession
+from iblrig.hardware import start_devices
+from iblrig.pydantic_definitions import TrialsTable
 
 log = logging.getLogger('iblrig.task')
 
@@ -32,7 +34,9 @@ class Session(ChoiceWorldSession):
         super(ChoiceWorldSession, self).__init__(**kwargs)
         self.task_params.SESSION_TEMPLATE_ID = session_template_id
         all_trials = pd.read_parquet(Path(__file__).parent.joinpath('passiveChoiceWorld_trials_fixtures.pqt'))
-        self.trials_table = all_trials[all_trials['session_id'] == self.task_params.SESSION_TEMPLATE_ID].copy()
+        self.trials_table = TrialsTable.from_dataframe(
+            all_trials[all_trials['session_id'] == self.task_params.SESSION_TEMPLATE_ID]
+        )
         self.trials_table['reward_valve_time'] = self.compute_reward_time(amount_ul=self.trials_table['reward_amount'])
         assert duration_spontaneous < 60 * 60 * 24
         self.task_params['SPONTANEOUS_ACTIVITY_SECONDS'] = duration_spontaneous
@@ -71,13 +75,18 @@ class Session(ChoiceWorldSession):
 
     def start_hardware(self):
         if not self.is_mock:
-            self.start_mixin_frame2ttl()
-            self.start_mixin_bpod()
-            self.start_mixin_valve()
-            self.start_mixin_sound()
-            self.start_mixin_bonsai_cameras()
-            self.start_mixin_bonsai_microphone()
-            self.start_mixin_rotary_encoder()
+            self.hardware_startup_durations = start_devices(
+                {
+                    'frame2ttl': (self.start_mixin_frame2ttl, []),
+                    'bpod': (self.start_mixin_bpod, []),
+                    'valve': (self.start_mixin_valve, []),
+                    'sound_upload': (self.upload_sounds, []),
+                    'sound': (self.define_sound_actions, ['bpod', 'sound_upload']),
+                    'bonsai_cameras': (self.start_mixin_bonsai_cameras, []),
+                    'bonsai_microphone': (self.start_mixin_bonsai_microphone, ['bonsai_cameras']),
+                    'rotary_encoder': (self.start_mixin_rotary_encoder, ['bpod']),
+                }
+            )
 
     def get_state_machine_trial(self, *args, **kwargs):
         pass
@@ -123,8 +132,9 @@ class Session(ChoiceWorldSession):
                 self.bonsai_visual_udp_client.send_message(r'/re', byte_show_stim)
                 time.sleep(0.3)  # todo: this is a very inaccurate way of controlling stim duration!
                 self.bonsai_visual_udp_client.send_message(r'/re', byte_hide_stim)
-            if self.paths.SESSION_FOLDER.joinpath('.stop').exists():
-                self.paths.SESSION_FOLDER.joinpath('.stop').unlink()
+            self.control.trial_num = trial_num
+            if self.control.stop_requested:
+                self.control.clear_stop()
                 break
 
 
@@ -0,0 +1,62 @@
+# Audit the import time of the iblrig entry points
+#
+# Each module is imported in a fresh interpreter run with `python -X importtime`, which reports the time spent importing
+# every module. For each entry point, the total import time is printed along with the distributions that take the longest
+# to import - the time spent in the modules of a distribution, excluding their imports of other distributions - and the
+# heavy optional dependencies that end up loaded.
+# Those dependencies are meant to be imported when used: see iblrig/test/test_imports.py.
+
+import subprocess
+import sys
+from collections import defaultdict
+
+N_REPEATS = 5
+N_TOP = 8
+MODULES = ['iblrig', 'iblrig.commands', 'iblrig.hardware', 'iblrig.base_tasks', 'iblrig.online_plots']
+HEAVY = [
+    'pandas',
+    'pydantic',
+    'one.api',
+    'ibllib.oneibl.registration',
+    'ibllib.pipes.misc',
+    'matplotlib',
+    'seaborn',
+    'sounddevice',
+    'pybpod_soundcard_module',
+    'requests',
+    'graphviz',
+    'PySpin',
+]
+
+
+def import_times(module: str) -> tuple[int, dict[str, int], list[str]]:
+    """Return the import time of `module` and of each top-level package it imports in µs, and the heavy modules."""
+    code = f'import sys, {module}; print(" ".join(m for m in {HEAVY!r} if m in sys.modules))'
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+    total, self_us = 0, defaultdict(int)
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        self_time, cumulative_time, name = line.removeprefix('import time:').split('|')
+        # the modules imported at interpreter start-up end with the site module
+        if name.strip() == 'site':
+            self_us.clear()
+            continue
+        self_us[name.strip().split('.')[0]] += int(self_time)
+        # the parent packages of the module are imported first, the modules they import are indented
+        if not name.startswith('  ') and (module + '.').startswith(name.strip() + '.'):
+            total += int(cumulative_time)
+        if name.strip() == module:
+            return total, self_us, process.stdout.split()
+    raise RuntimeError(f'no import time reported for {module}')
+
+
+print(f'median of {N_REPEATS} imports in a new interpreter')
+for module in MODULES:
+    runs = [import_times(module) for _ in range(N_REPEATS)]
+    packages = {name for _, self_us, _ in runs for name in self_us}
+    median = {name: sorted(self_us.get(name, 0) for _, self_us, _ in runs)[N_REPEATS // 2] for name in packages}
+    print(f'\n{module}: {sorted(total for total, _, _ in runs)[N_REPEATS // 2] / 1e3:.0f} ms')
+    for name in sorted(median, key=median.get, reverse=True)[:N_TOP]:
+        print(f'{name:>28} {median[name] / 1e3:>8.1f} ms')
+    print(f'{"heavy dependencies loaded":>28} {", ".join(runs[0][2]) or "-"}')
@@ -0,0 +1,37 @@
+# Benchmark the JSON backends used to write and read the trial records of the task data jsonable file
+#
+# Each trial of the test fixture is serialized with dumps_trial_data, as done by BaseSession.save_trial_data_to_json,
+# and parsed back with loads_trial_data, as done by load_task_jsonable and TaskJsonableReader. The fixture trials hold
+# about 8000 bpod events each, the states that were not visited being timestamped with NaN - written as null by orjson.
+
+import json
+import time
+from pathlib import Path
+
+from iblrig.raw_data_loaders import HAS_ORJSON, dumps_trial_data, loads_trial_data
+
+N_REPEATS = 200
+FIXTURE = Path(__file__).parents[1].joinpath('iblrig', 'test', 'fixtures', 'task_data_short.jsonable')
+
+
+def timeit(fcn, *args, **kwargs) -> float:
+    t0 = time.perf_counter()
+    for _ in range(N_REPEATS):
+        fcn(*args, **kwargs)
+    return (time.perf_counter() - t0) / N_REPEATS
+
+
+with open(FIXTURE, 'rb') as fp:
+    lines = fp.readlines()
+print(f'average record size: {sum(len(line) for line in lines) / len(lines) / 1024:.1f} kB')
+
+print(f'{"backend":>8} {"dumps":>10} {"loads":>10} {"size":>8}')
+for backend in ('json', 'orjson') if HAS_ORJSON else ('json',):
+    t_dumps = t_loads = size = 0
+    for line in lines:
+        trial_data = json.loads(line)
+        record = dumps_trial_data(trial_data, backend=backend)
+        t_dumps += timeit(dumps_trial_data, trial_data, backend=backend) / len(lines)
+        t_loads += timeit(loads_trial_data, record, backend=backend) / len(lines)
+        size += len(record) / len(lines) / 1024
+    print(f'{backend:>8} {t_dumps * 1e3:>8.2f}ms {t_loads * 1e3:>8.2f}ms {size:>6.1f}kB')
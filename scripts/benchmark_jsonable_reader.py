@@ -0,0 +1,66 @@
+# Benchmark the incremental TaskJsonableReader against load_task_jsonable
+#
+# Synthetic task data files of increasing length are generated by replicating the trials of the test fixture, with the
+# number of bpod events per event type capped at N_EVENTS to obtain a realistic record size. We time (1) loading the
+# full file, (2) loading the full file without the bpod data and (3) tailing the file during acquisition, i.e., reading
+# the new trials after every trial, which is what the online plots do.
+#
+# NOTE: the tailing benchmark with load_task_jsonable re-parses from a byte offset, as the online plots used to do.
+
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from iblrig.raw_data_loaders import TaskJsonableReader, load_task_jsonable
+
+N_TRIALS = [1_000, 5_000, 20_000]
+N_TAIL = 200  # number of trials appended one by one in the tailing benchmark
+N_EVENTS = 20  # maximum number of bpod events per event type and trial
+FIXTURE = Path(__file__).parents[1].joinpath('iblrig', 'test', 'fixtures', 'task_data_short.jsonable')
+
+
+def timeit(fcn, *args, **kwargs) -> float:
+    t0 = time.perf_counter()
+    fcn(*args, **kwargs)
+    return time.perf_counter() - t0
+
+
+lines = []
+with open(FIXTURE) as fp:
+    for line in fp:
+        trial = json.loads(line)
+        events = trial['behavior_data']['Events timestamps']
+        trial['behavior_data']['Events timestamps'] = {k: v[:N_EVENTS] for k, v in events.items()}
+        lines.append((json.dumps(trial) + '\n').encode())
+print(f'average record size: {sum(len(line) for line in lines) / len(lines) / 1024:.1f} kB')
+
+print(
+    f'{"trials":>8} {"full (legacy)":>14} {"full (reader)":>14} {"no bpod data":>14} {"tail (legacy)":>14} {"tail (reader)":>14}'
+)
+with tempfile.TemporaryDirectory() as td:
+    for n_trials in N_TRIALS:
+        file_jsonable = Path(td).joinpath(f'_iblrig_taskData_{n_trials}.raw.jsonable')
+        with open(file_jsonable, 'wb') as fp:
+            fp.writelines(lines[i % len(lines)] for i in range(n_trials - N_TAIL))
+
+        t_legacy = timeit(load_task_jsonable, file_jsonable)
+        t_reader = timeit(TaskJsonableReader(file_jsonable).read_new)
+        t_no_bpod = timeit(TaskJsonableReader(file_jsonable, behavior_data=False).read_new)
+
+        # tailing: append one trial at a time and read what is new
+        reader = TaskJsonableReader(file_jsonable)
+        reader.read_new()
+        offset = file_jsonable.stat().st_size
+        t_tail_legacy, t_tail_reader = 0, 0
+        for i in range(N_TAIL):
+            with open(file_jsonable, 'ab') as fp:
+                fp.write(lines[i % len(lines)])
+            t_tail_legacy += timeit(load_task_jsonable, file_jsonable, offset=offset)
+            offset = file_jsonable.stat().st_size
+            t_tail_reader += timeit(reader.read_new)
+
+        print(
+            f'{n_trials:>8} {t_legacy:>13.3f}s {t_reader:>13.3f}s {t_no_bpod:>13.3f}s '
+            f'{t_tail_legacy / N_TAIL * 1e3:>12.2f}ms {t_tail_reader / N_TAIL * 1e3:>12.2f}ms'
+        )
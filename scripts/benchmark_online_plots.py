@@ -0,0 +1,101 @@
+# Benchmark the per-trial update cost of the online plots data model
+#
+# The array-backed DataModel is compared with the previous pandas implementation, reproduced below as LegacyDataModel:
+# the psychometrics were stored in a MultiIndex DataFrame updated with .loc and the last trials in a DataFrame shifted
+# after every trial. Only the data model update is timed, not the graphics.
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from iblrig.misc import online_std
+from iblrig.online_plots import CONTRAST_SET, NTRIALS_INIT, NTRIALS_PLOT, PROBABILITY_SET, DataModel
+
+N_TRIALS = 2_000
+
+
+class LegacyDataModel:
+    ntrials = 0
+    ntrials_correct = 0
+    water_delivered = 0.0
+
+    def __init__(self):
+        self.last_trials = pd.DataFrame(
+            columns=['correct', 'signed_contrast', 'stim_on', 'play_tone', 'reward_time', 'error_time', 'response_time'],
+            index=np.arange(NTRIALS_PLOT),
+        )
+        signed_contrasts = np.r_[-np.flipud(np.unique(np.abs(CONTRAST_SET))[1:]), np.unique(np.abs(CONTRAST_SET))]
+        self.psychometrics = pd.DataFrame(
+            columns=['count', 'response_time', 'choice', 'response_time_std', 'choice_std'],
+            index=pd.MultiIndex.from_product([PROBABILITY_SET, signed_contrasts]),
+        )
+        self.psychometrics['count'] = 0
+        self.trials_table = pd.DataFrame(columns=['response_time'], index=np.arange(NTRIALS_INIT))
+        self.rgb_background = np.ones((NTRIALS_PLOT, 1, 3), dtype=np.uint8) * 229
+        self.last_contrasts = np.zeros((NTRIALS_PLOT, 2))
+
+    def update_trial(self, trial_data, bpod_data) -> None:
+        self.ntrials += 1
+        self.water_delivered += trial_data.reward_amount
+        self.ntrials_correct += trial_data.trial_correct
+        signed_contrast = np.sign(trial_data['position']) * trial_data['contrast']
+        choice = trial_data.position > 0 if trial_data.trial_correct else trial_data.position < 0
+        self.trials_table.at[self.ntrials, 'response_time'] = trial_data.response_time
+        indexer = (trial_data.stim_probability_left, signed_contrast)
+        self.psychometrics.loc[indexer, ('count')] += 1
+        self.psychometrics.loc[indexer, ('response_time')], self.psychometrics.loc[indexer, ('response_time_std')] = online_std(
+            new_sample=trial_data.response_time,
+            new_count=self.psychometrics.loc[indexer, ('count')],
+            old_mean=self.psychometrics.loc[indexer, ('response_time')],
+            old_std=self.psychometrics.loc[indexer, ('response_time_std')],
+        )
+        self.psychometrics.loc[indexer, ('choice')], self.psychometrics.loc[indexer, ('choice_std')] = online_std(
+            new_sample=float(choice),
+            new_count=self.psychometrics.loc[indexer, ('count')],
+            old_mean=self.psychometrics.loc[indexer, ('choice')],
+            old_std=self.psychometrics.loc[indexer, ('choice_std')],
+        )
+        self.last_trials = self.last_trials.shift(-1)
+        i = NTRIALS_PLOT - 1
+        self.last_trials.at[i, 'correct'] = trial_data.trial_correct
+        self.last_trials.at[i, 'signed_contrast'] = signed_contrast
+        self.last_trials.at[i, 'stim_on'] = bpod_data['States timestamps'].get('stim_on', [[np.nan]])[0][0]
+        self.last_trials.at[i, 'play_tone'] = bpod_data['States timestamps'].get('play_tone', [[np.nan]])[0][0]
+        self.last_trials.at[i, 'reward_time'] = bpod_data['States timestamps'].get('reward', [[np.nan]])[0][0]
+        self.last_trials.at[i, 'error_time'] = bpod_data['States timestamps'].get('error', [[np.nan]])[0][0]
+        self.last_trials.at[i, 'response_time'] = trial_data.response_time
+        self.rgb_background = np.roll(self.rgb_background, -1, axis=0)
+        self.rgb_background[-1] = np.array([0, 255, 0]) if trial_data.trial_correct else np.array([255, 0, 0])
+        self.last_contrasts = np.roll(self.last_contrasts, -1, axis=0)
+        self.last_contrasts[-1, :] = 0
+        self.last_contrasts[-1, int(self.last_trials.signed_contrast.iloc[-1] > 0)] = abs(
+            self.last_trials.signed_contrast.iloc[-1]
+        )
+        self.percent_correct = self.ntrials_correct / self.ntrials * 100
+
+
+rng = np.random.default_rng(0)
+trials_table = pd.DataFrame(
+    {
+        'position': rng.choice([-35, 35], N_TRIALS),
+        'contrast': rng.choice(CONTRAST_SET, N_TRIALS),
+        'stim_probability_left': rng.choice(PROBABILITY_SET, N_TRIALS),
+        'trial_correct': rng.choice([True, False], N_TRIALS),
+        'response_time': rng.uniform(0.1, 2, N_TRIALS),
+        'reward_amount': rng.choice([0, 1.5], N_TRIALS),
+    }
+)
+trials = [trials_table.iloc[i] for i in range(N_TRIALS)]
+bpod_data = {
+    'Bpod start timestamp': 0,
+    'Trial end timestamp': 10.0,
+    'States timestamps': {'stim_on': [[0.1, 0.2]], 'play_tone': [[0.1, 0.2]], 'reward': [[np.nan, np.nan]]},
+}
+
+print(f'{"model":>8} {"per trial":>12}')
+for name, model in (('legacy', LegacyDataModel()), ('array', DataModel(settings_file=None))):
+    t0 = time.perf_counter()
+    for trial in trials:
+        model.update_trial(trial, bpod_data)
+    print(f'{name:>8} {(time.perf_counter() - t0) / N_TRIALS * 1e6:>10.1f}µs')
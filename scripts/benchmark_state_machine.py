@@ -0,0 +1,72 @@
+# Benchmark the per-trial cost of building and serializing the choice world state machine
+#
+# ChoiceWorldSession.get_state_machine_trial is run on a Bpod r2 hardware description, either instantiating a new
+# StateMachine for each trial or recording the definition and compiling it with StateMachineTemplates. The serialization
+# is the one performed by Bpod.send_state_machine before the message is written to the serial port. On the rig, the
+# duration of the transfer itself is recorded in the send_state_machine column of _iblrig_trialTiming.raw.csv - sending
+# is skipped altogether when a template is identical to the last state machine sent.
+
+import random
+import time
+
+from iblrig.base_choice_world import ChoiceWorldSession
+from iblrig.hardware import StateMachineTemplates
+from iblutil.util import Bunch
+from pybpodapi.bpod.hardware.hardware import Hardware
+
+N_TRIALS = 1_000
+
+hardware = Hardware()
+hardware.max_states, hardware.cycle_period, hardware.max_serial_events = 256, 100, 60
+hardware.n_global_timers, hardware.n_global_counters, hardware.n_conditions = 16, 8, 16
+hardware.inputs, hardware.outputs = 'UUUXBBWWPPPP', 'UUUXBBWWPPPPVVVV'
+hardware.inputs_enabled = [1] * len(hardware.inputs)
+modules = [Bunch(connected=True, name='RotaryEncoder1', event_names=[], n_serial_events=15)]
+hardware.setup(modules + [Bunch(connected=False, name='', event_names=[], n_serial_events=15)] * 2)
+
+
+class Session:
+    get_state_machine_trial = ChoiceWorldSession.get_state_machine_trial
+    _instantiate_state_machine = ChoiceWorldSession._instantiate_state_machine
+    _get_state_machine_trial = ChoiceWorldSession._get_state_machine_trial
+
+    def __init__(self, state_machine_templates: bool):
+        self.bpod = Bunch(hardware=hardware, actions=Bunch())
+        for i, action in enumerate(
+            ['stop_sound', 'play_tone', 'play_noise', 'rotary_encoder_reset']
+            + ['bonsai_show_stim', 'bonsai_hide_stim', 'bonsai_closed_loop', 'bonsai_freeze_stim', 'bonsai_show_center']
+        ):
+            self.bpod.actions[action] = ('Serial1', i + 1)
+        self.task_params = Bunch(INTERACTIVE_DELAY=0.0, RESPONSE_WINDOW=60, ITI_DELAY_SECS=0.5)
+        self.movement_left, self.movement_right = 'RotaryEncoder1_3', 'RotaryEncoder1_4'
+        self.feedback_nogo_delay, self.feedback_error_delay, self.feedback_correct_delay = 2, 2, 1
+        self.state_machine_templates = StateMachineTemplates(self.bpod) if state_machine_templates else None
+        self._record_state_machine = False
+
+    def next_trial(self):
+        position = random.choice([-1, 1])
+        self.event_error = f'RotaryEncoder1_{1 + (position > 0)}'
+        self.event_reward = f'RotaryEncoder1_{1 + (position < 0)}'
+        self.quiescent_period = 0.2 + random.expovariate(1 / 0.35)
+        self.reward_time = random.uniform(0.03, 0.1)
+
+
+def serialize(sma) -> bytes:
+    sma.update_state_numbers()
+    body = sma.build_message() + sma.build_message_global_timer() + sma.build_message_32_bits()
+    return sma.build_header(None, len(body)) + body
+
+
+print(f'{"state machine":>14} {"build":>10} {"serialize":>10} {"bytes":>6}')
+for name, state_machine_templates in (('new', False), ('template', True)):
+    random.seed(0)
+    session = Session(state_machine_templates)
+    t_build = t_serialize = 0
+    for i in range(1, N_TRIALS + 1):
+        session.next_trial()
+        t0 = time.perf_counter()
+        sma = session._get_state_machine_trial(i)
+        t1 = time.perf_counter()
+        message = serialize(sma)
+        t_build, t_serialize = t_build + t1 - t0, t_serialize + time.perf_counter() - t1
+    print(f'{name:>14} {t_build / N_TRIALS * 1e6:>8.1f}µs {t_serialize / N_TRIALS * 1e6:>8.1f}µs {len(message):>6}')
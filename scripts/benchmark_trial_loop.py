@@ -0,0 +1,56 @@
+# Benchmark the per-trial hot path of the choice world tasks, on an emulated Bpod
+#
+# Sessions of each choice world variant are simulated for an increasing number of trials, with the timers and budgets of
+# iblrig/test/test_trial_loop_benchmark.py, which runs a reduced version of this benchmark as part of the test suite.
+# The script exits with an error when the median cost per trial of a timed method exceeds its budget, or when the
+# per-trial cost of the longest sessions grows by more than MAX_SCALING between the first and the last 10% of the trials.
+
+import sys
+
+from iblrig.test.base import TaskArgsMixin
+from iblrig.test.test_trial_loop_benchmark import PER_TRIAL, regressions, run_session, scaling
+from iblrig_tasks._iblrig_tasks_advancedChoiceWorld.task import Session as AdvancedChoiceWorldSession
+from iblrig_tasks._iblrig_tasks_biasedChoiceWorld.task import Session as BiasedChoiceWorldSession
+from iblrig_tasks._iblrig_tasks_ephysChoiceWorld.task import Session as EphysChoiceWorldSession
+from iblrig_tasks._iblrig_tasks_habituationChoiceWorld.task import Session as HabituationChoiceWorldSession
+from iblrig_tasks._iblrig_tasks_neuroModulatorChoiceWorld.task import Session as NeuroModulatorChoiceWorldSession
+from iblrig_tasks._iblrig_tasks_trainingChoiceWorld.task import Session as TrainingChoiceWorldSession
+
+N_TRIALS = [100, 500, 2_000]
+SESSIONS = {
+    'habituation': HabituationChoiceWorldSession,
+    'training': TrainingChoiceWorldSession,
+    'biased': BiasedChoiceWorldSession,
+    'ephys': EphysChoiceWorldSession,
+    'advanced': AdvancedChoiceWorldSession,
+    'neuromodulator': NeuroModulatorChoiceWorldSession,
+}
+
+
+def main() -> int:
+    task_kwargs, tmpdir = TaskArgsMixin.create_task_kwargs()
+    task_kwargs['log_level'] = 'INFO'
+    failures = []
+    print(f'{"session":>14} {"ntrials":>7} ' + ' '.join(f'{name[:12]:>12}' for name in PER_TRIAL) + ' (mean ms per trial)')
+    for session_name, session_class in SESSIONS.items():
+        for ntrials in N_TRIALS:
+            durations = run_session(session_class, ntrials, task_kwargs)
+            print(
+                f'{session_name:>14} {ntrials:>7} '
+                + ' '.join(f'{durations[name].mean() * 1e3:>12.3f}' for name in PER_TRIAL)
+                + f'   load_task_jsonable {durations["load_task_jsonable"][0] * 1e3:.0f}ms'
+                + f'   get_subject_training_info {durations["get_subject_training_info"][0] * 1e3:.0f}ms'
+            )
+        ratios = scaling(durations)
+        print(f'{"last / first":>22} ' + ' '.join(f'{ratios[name]:>12.2f}' for name in PER_TRIAL))
+        failures.extend(f'{session_name} {failure}' for failure in regressions(durations, session_class.protocol_name))
+    TaskArgsMixin.cleanup_handlers()
+    tmpdir.cleanup()
+    if failures:
+        print('regressions of the per-trial cost:\n' + '\n'.join(failures))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# Benchmark the per-trial cost of writing to and reading from the trials table
+#
+# The access pattern of a biased choice world trial is replayed on the pandas DataFrame returned by
+# TrialDataModel.preallocate_dataframe and on the columnar TrialsTable returned by TrialDataModel.preallocate_table:
+# the writes of draw_next_trial_info and trial_completed, the reads of the state machine and the record extracted by
+# save_trial_data_to_json. The pydantic validation is timed separately as it does not depend on the table.
+
+import math
+import random
+import time
+
+from iblrig.base_choice_world import NTRIALS_INIT, BiasedChoiceWorldTrialData
+
+N_TRIALS = 1_000
+
+
+def run_trial(trials_table, i: int) -> dict:
+    # draw_next_trial_info
+    trials_table.at[i, 'quiescent_period'] = random.uniform(0.4, 0.8)
+    trials_table.at[i, 'contrast'] = 0.25
+    trials_table.at[i, 'stim_phase'] = random.uniform(0, 2 * math.pi)
+    trials_table.at[i, 'stim_sigma'] = 7.0
+    trials_table.at[i, 'stim_angle'] = 0.0
+    trials_table.at[i, 'stim_gain'] = 4.0
+    trials_table.at[i, 'stim_freq'] = 0.1
+    trials_table.at[i, 'stim_reverse'] = False
+    trials_table.at[i, 'trial_num'] = i
+    trials_table.at[i, 'position'] = 35.0
+    trials_table.at[i, 'reward_amount'] = 1.5
+    trials_table.at[i, 'stim_probability_left'] = 0.5
+    trials_table.at[i, 'block_num'] = 0
+    trials_table.at[i, 'block_trial_num'] = i
+    # state machine and trial outcome
+    _ = trials_table.at[i, 'quiescent_period'], trials_table.at[i, 'position'], trials_table.at[i, 'reward_amount']
+    trials_table.at[i, 'response_time'] = 0.5
+    trials_table.at[i, 'trial_correct'] = True
+    trials_table.at[i, 'response_side'] = -1
+    trials_table.at[i, 'reward_valve_time'] = 0.05
+    # save_trial_data_to_json
+    return trials_table.iloc[i].to_dict()
+
+
+print(f'{"table":>10} {"per trial":>12}')
+for name, trials_table in (
+    ('DataFrame', BiasedChoiceWorldTrialData.preallocate_dataframe(NTRIALS_INIT)),
+    ('columnar', BiasedChoiceWorldTrialData.preallocate_table(NTRIALS_INIT)),
+):
+    t0 = time.perf_counter()
+    for i in range(N_TRIALS):
+        trial_data = run_trial(trials_table, i)
+    print(f'{name:>10} {(time.perf_counter() - t0) / N_TRIALS * 1e6:>10.1f}µs')
+
+t0 = time.perf_counter()
+for _ in range(N_TRIALS):
+    BiasedChoiceWorldTrialData.model_validate(trial_data).model_dump()
+print(f'{"validation":>10} {(time.perf_counter() - t0) / N_TRIALS * 1e6:>10.1f}µs')